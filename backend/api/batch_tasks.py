@@ -3,15 +3,30 @@
 
 from sanic import Blueprint, json, request
 from sanic.exceptions import NotFound, BadRequest, Forbidden
+from sanic.response import file_stream
+import asyncio
 import logging
 
 from backend.services.batch_processing_service import batch_service, BatchTaskStatus
+from backend.services.progress_events import encode_event, is_final_event, progress_bus
+from backend.services.streaming_export import get_export_file
 from backend.utils.jwt import require_auth
 
 logger = logging.getLogger(__name__)
 
 batch_tasks_bp = Blueprint('batch_tasks', url_prefix='/batch-tasks')
 
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE_SECONDS = 15
+
+# Bytes per chunk when streaming a result file to the client
+EXPORT_STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def _sse_message(event: dict, event_type: str = 'progress') -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event_type}\ndata: {encode_event(event)}\n\n"
+
 
 @batch_tasks_bp.route('', methods=['GET'])
 @require_auth
@@ -124,6 +139,115 @@ async def get_batch_task(req: request.Request, task_id: str):
         }, status=500)
 
 
+@batch_tasks_bp.route('/<task_id>/events', methods=['GET'])
+@require_auth
+async def stream_batch_task_events(req: request.Request, task_id: str):
+    """
+    Stream batch task progress as Server-Sent Events
+    
+    Sends the current task state first, then a `progress` event per update
+    (coalesced to PROGRESS_EVENT_INTERVAL) until the task completes, fails
+    or is cancelled. Replaces polling GET /batch-tasks/<task_id>.
+    
+    Events:
+        event: progress
+        data: {"id": "...", "status": "processing", "progress": 42, ...}
+    """
+    # Get current user
+    current_user = getattr(req, 'current_user', {})
+    user_id = current_user.get('user_id')
+    
+    if not user_id:
+        return json({
+            'success': False,
+            'error': 'Authentication required',
+            'message': 'User not authenticated'
+        }, status=401)
+    
+    # Task store reads (SQL/Redis) block, so they run off the event loop
+    loop = asyncio.get_running_loop()
+    task = await loop.run_in_executor(None, batch_service.get_task, task_id)
+    
+    if not task:
+        raise NotFound("Task not found")
+    
+    # Check permissions
+    if task.user_id != user_id:
+        raise Forbidden("You don't have permission to view this task")
+    
+    subscription = await progress_bus.subscribe(task_id)
+    try:
+        response = await req.respond(
+            content_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        
+        # Snapshot taken after subscribing, so no update in between is lost
+        event = (await loop.run_in_executor(None, task.refresh)).to_dict()
+        await response.send(_sse_message(event))
+        
+        while not is_final_event(event):
+            next_event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+            if next_event is None:
+                await response.send(": keep-alive\n\n")
+                continue
+            event = next_event
+            await response.send(_sse_message(event))
+        
+        await response.eof()
+    except Exception as e:
+        logger.error(f"Batch task event stream failed: {str(e)}")
+    finally:
+        await subscription.close()
+
+
+@batch_tasks_bp.route('/<task_id>/download/<file_name>', methods=['GET'])
+@require_auth
+async def download_batch_task_result(req: request.Request, task_id: str, file_name: str):
+    """
+    Download the file produced by a completed batch task
+    
+    Only the file named in the task's result_url is served, and only to the
+    task's owner.
+    """
+    # Get current user
+    current_user = getattr(req, 'current_user', {})
+    user_id = current_user.get('user_id')
+    
+    if not user_id:
+        return json({
+            'success': False,
+            'error': 'Authentication required',
+            'message': 'User not authenticated'
+        }, status=401)
+    
+    # Task store reads (SQL/Redis) block, so they run off the event loop
+    loop = asyncio.get_running_loop()
+    task = await loop.run_in_executor(None, batch_service.get_task, task_id)
+    
+    if not task:
+        raise NotFound("Task not found")
+    
+    # Check permissions
+    if task.user_id != user_id:
+        raise Forbidden("You don't have permission to download this file")
+    
+    if task.status != BatchTaskStatus.COMPLETED or not (task.result_url or '').endswith(f"/download/{file_name}"):
+        raise NotFound("File not found")
+    
+    export_file = get_export_file(file_name)
+    if not export_file:
+        raise NotFound("File not found (it may have expired)")
+    
+    file_path, content_type = export_file
+    return await file_stream(
+        file_path,
+        chunk_size=EXPORT_STREAM_CHUNK_SIZE,
+        mime_type=content_type,
+        filename=file_name
+    )
+
+
 @batch_tasks_bp.route('/<task_id>', methods=['DELETE'])
 @require_auth
 async def cancel_batch_task(req: request.Request, task_id: str):
@@ -211,12 +335,12 @@ async def get_batch_task_stats(req: request.Request):
                 'message': 'User not authenticated'
             }, status=401)
         
-        # Get all tasks for user
-        all_tasks = batch_service.list_tasks(user_id=user_id, limit=1000)
+        # Count tasks per status in the shared store
+        counts = batch_service.count_tasks_by_status(user_id=user_id)
         
         # Calculate statistics
         stats = {
-            'total': len(all_tasks),
+            'total': sum(counts.values()),
             'by_status': {
                 'pending': 0,
                 'processing': 0,
@@ -226,9 +350,9 @@ async def get_batch_task_stats(req: request.Request):
             }
         }
         
-        for task in all_tasks:
-            if task.status in stats['by_status']:
-                stats['by_status'][task.status] += 1
+        for status, count in counts.items():
+            if status in stats['by_status']:
+                stats['by_status'][status] += count
         
         return json({
             'success': True,
@@ -10,6 +10,8 @@ from decimal import Decimal
 
 from backend.models.database_models import SettlementRecord, Customer
 from backend.dao.database_dao import DatabaseSessionFactory
+from backend.services.customer_ledger import get_balance
+from backend.services.response_cache import cached_response
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,7 @@ customer_analytics_bp = Blueprint('customer_analytics', url_prefix='/customers')
 
 
 @customer_analytics_bp.route('/segmentation', methods=['GET'])
+@cached_response(tags=('settlements', 'customers'))
 async def get_customer_segmentation(req: request.Request):
     """
     Get customer segmentation based on RFM model
@@ -119,6 +122,7 @@ async def get_customer_segmentation(req: request.Request):
 
 
 @customer_analytics_bp.route('/risks', methods=['GET'])
+@cached_response(tags=('settlements', 'customers'))
 async def get_customer_risks(req: request.Request):
     """
     Get customer risk warning list
@@ -316,55 +320,35 @@ def calculate_rfm_score(customer: Customer, session) -> dict:
 
 
 def check_overdue_risk(customer: Customer, session) -> dict:
-    """Check if customer has overdue payments"""
-    # Get pending/approved settlements
-    pending_settlements = session.query(SettlementRecord).filter(
-        SettlementRecord.customer_id == customer.id,
-        SettlementRecord.status.in_(['pending', 'approved'])
-    ).all()
+    """Check if customer has overdue payments (from the customer's ledger balance)"""
+    balance = get_balance(session, customer.id)
     
-    if not pending_settlements:
+    if balance is None or balance.overdue_amount <= 0:
         return {
             'has_overdue': False,
             'overdue_amount': 0,
             'overdue_days': 0
         }
     
-    # Check for overdue (> 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    overdue_settlements = [s for s in pending_settlements if s.created_at < thirty_days_ago]
-    
-    if not overdue_settlements:
-        return {
-            'has_overdue': False,
-            'overdue_amount': 0,
-            'overdue_days': 0
-        }
-    
-    total_overdue = sum([s.total_amount for s in overdue_settlements])
-    max_overdue_days = max([(datetime.utcnow() - s.created_at).days for s in overdue_settlements])
-    
     return {
         'has_overdue': True,
-        'overdue_amount': float(total_overdue),
-        'overdue_days': max_overdue_days
+        'overdue_amount': float(balance.overdue_amount),
+        'overdue_days': (datetime.utcnow() - balance.oldest_open_at).days
     }
 
 
 def check_churn_risk(customer: Customer, session) -> dict:
     """Check if customer is at risk of churning"""
-    # Get last settlement
-    last_settlement = session.query(SettlementRecord).filter(
-        SettlementRecord.customer_id == customer.id
-    ).order_by(SettlementRecord.created_at.desc()).first()
+    # Last settlement date from the customer's ledger balance
+    balance = get_balance(session, customer.id)
     
-    if not last_settlement:
+    if balance is None or balance.last_settlement_at is None:
         return {
             'is_churn_risk': True,
             'inactive_days': 999
         }
     
-    inactive_days = (datetime.utcnow() - last_settlement.created_at).days
+    inactive_days = (datetime.utcnow() - balance.last_settlement_at).days
     
     # Churn risk if no activity in 90 days
     is_churn_risk = inactive_days > 90
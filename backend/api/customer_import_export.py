@@ -4,6 +4,8 @@
 from sanic import Blueprint, json, request
 from sanic.exceptions import NotFound, BadRequest
 from typing import Optional, List, Dict
+from json import loads as json_loads
+import asyncio
 import logging
 import base64
 import io
@@ -11,23 +13,38 @@ from datetime import datetime
 
 from backend.models.database_models import Customer
 from backend.dao.database_dao import DatabaseSessionFactory
-from backend.services.data_validation_service import DataValidationService
+from backend.services.batch_processing_service import batch_service
+from backend.services.customer_import_pipeline import (
+    CustomerImportPipeline, ImportPipelineError, MultipartUploadSpooler,
+    DEFAULT_CHUNK_SIZE, IMPORT_MODES, MAX_CHUNK_SIZE, estimate_row_count, iter_file_rows,
+    remove_spooled_file, spool_bytes
+)
 
 logger = logging.getLogger(__name__)
 
 customer_import_export_bp = Blueprint('customer_import_export', url_prefix='/customers')
 
 
-@customer_import_export_bp.route('/import', methods=['POST'])
+@customer_import_export_bp.route('/import', methods=['POST'], stream=True)
 async def import_customers(req: request.Request):
     """
     Import customers from Excel/CSV file
     
-    Request Body:
+    The upload is spooled to disk and imported chunk by chunk, so memory
+    stays flat for large files.
+    
+    Request Body (multipart/form-data, preferred):
+        file: customers.xlsx (or .csv)
+        import_mode: skip_duplicates  // skip_duplicates, update_duplicates, create_all
+        validate_only: false
+        chunk_size: 1000
+        async: false  // true: queue a resumable Celery import and return 202
+    
+    Request Body (JSON, legacy):
     {
         "file": "base64_encoded_file",
         "file_name": "customers.xlsx",
-        "import_mode": "skip_duplicates",  // skip_duplicates, update_duplicates, create_all
+        "import_mode": "skip_duplicates",
         "validate_only": false
     }
     
@@ -39,91 +56,170 @@ async def import_customers(req: request.Request):
             "imported": 95,
             "skipped": 5,
             "updated": 0,
-            "errors": [...]
+            "errors": [...],
+            "task_id": "..."
         }
     }
     """
+    file_path = None
     try:
-        data = req.json
+        content_type = req.headers.get('content-type', '')
         
-        # Validate required fields
-        file_data = data.get('file')
-        file_name = data.get('file_name', 'import.xlsx')
-        import_mode = data.get('import_mode', 'skip_duplicates')
-        validate_only = data.get('validate_only', False)
-        
-        if not file_data:
+        # Spool upload to disk
+        try:
+            if content_type.startswith('multipart/form-data'):
+                spooler = MultipartUploadSpooler(content_type)
+                while True:
+                    body = await req.stream.read()
+                    if body is None:
+                        break
+                    spooler.feed(body)
+                file_path = spooler.finalize()
+                file_name = spooler.file_name
+                options = spooler.fields
+            else:
+                body = bytearray()
+                while True:
+                    chunk = await req.stream.read()
+                    if chunk is None:
+                        break
+                    body.extend(chunk)
+                options = json_loads(bytes(body) or b'{}')
+                
+                file_data = options.get('file')
+                file_name = options.get('file_name', 'import.xlsx')
+                if not file_data:
+                    return json({
+                        'success': False,
+                        'error': 'Missing required fields',
+                        'message': 'file is required'
+                    }, status=400)
+                
+                file_path = spool_bytes(base64.b64decode(file_data), file_name)
+        except ImportPipelineError as e:
             return json({
                 'success': False,
-                'error': 'Missing required fields',
-                'message': 'file is required'
+                'error': 'Invalid file',
+                'message': str(e)
             }, status=400)
-        
-        if import_mode not in ['skip_duplicates', 'update_duplicates', 'create_all']:
+        except Exception as e:
             return json({
                 'success': False,
-                'error': 'Invalid import mode',
-                'message': f'Invalid import mode: {import_mode}. Valid modes: skip_duplicates, update_duplicates, create_all'
+                'error': 'Invalid file',
+                'message': f'Failed to decode file: {str(e)}'
             }, status=400)
         
-        # Decode file
+        import_mode = options.get('import_mode', 'skip_duplicates')
+        validate_only = str(options.get('validate_only', False)).lower() in ['true', '1', 'yes']
         try:
-            file_content = base64.b64decode(file_data)
-        except Exception as e:
+            chunk_size = int(options.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        except (TypeError, ValueError):
+            chunk_size = 0
+        
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            remove_spooled_file(file_path)
             return json({
                 'success': False,
-                'error': 'Invalid file',
-                'message': f'Failed to decode file: {str(e)}'
+                'error': 'Invalid chunk size',
+                'message': f'chunk_size must be an integer between 1 and {MAX_CHUNK_SIZE}'
             }, status=400)
         
-        # Parse Excel/CSV file
-        rows = parse_file(file_content, file_name)
-        
-        if not rows:
+        if import_mode not in IMPORT_MODES:
+            remove_spooled_file(file_path)
             return json({
                 'success': False,
-                'error': 'Empty file',
-                'message': 'No data found in file'
+                'error': 'Invalid import mode',
+                'message': f'Invalid import mode: {import_mode}. Valid modes: skip_duplicates, update_duplicates, create_all'
             }, status=400)
         
-        # Get database session
-        session_factory = DatabaseSessionFactory()
-        session = session_factory.get_session()
+        # Track progress as a batch task so clients can poll /batch-tasks/<id>
+        current_user = getattr(req, 'current_user', None) or {}
+        total_estimate = estimate_row_count(file_path, file_name)
+        task = batch_service.create_task('import', current_user.get('user_id') or 1, total_estimate)
         
-        try:
-            # Initialize validation service
-            validation_service = DataValidationService()
+        if str(options.get('async', False)).lower() in ['true', '1', 'yes'] and not validate_only:
+            from backend.tasks import import_customers_task
             
-            # Validate all rows
-            validation_report = validation_service.validate_batch(rows, session)
+            # Only the spooled file path travels through the broker
+            import_customers_task.delay(file_path, file_name, import_mode, chunk_size, batch_task_id=task.id)
+            file_path = None  # The worker removes the spooled file when done
             
-            # If validate_only, return validation results
-            if validate_only:
-                return json({
-                    'success': True,
-                    'data': {
-                        'validation_only': True,
-                        **validation_report
-                    },
-                    'message': 'Validation completed'
-                })
+            return json({
+                'success': True,
+                'data': {
+                    'task_id': task.id,
+                    'status': task.status,
+                    'total_estimate': total_estimate
+                },
+                'message': 'Import queued'
+            }, status=202)
+        
+        task.start()
+        
+        def on_progress(progress: dict):
+            task.update_progress(progress['processed'], progress['imported'] + progress['updated'], progress['failed'])
+        
+        def run_import() -> dict:
+            session_factory = DatabaseSessionFactory()
+            session = session_factory.get_session()
             
-            # Import data based on mode
-            import_result = execute_import(
-                session=session,
-                rows=rows,
-                validation_results=validation_report['results'],
-                import_mode=import_mode
-            )
+            try:
+                pipeline = CustomerImportPipeline(
+                    session=session,
+                    import_mode=import_mode,
+                    chunk_size=chunk_size,
+                    progress_callback=on_progress
+                )
+                rows = iter_file_rows(file_path, file_name)
+                
+                if validate_only:
+                    return pipeline.validate(rows, total_estimate=total_estimate)
+                return pipeline.run(rows, total_estimate=total_estimate)
+            finally:
+                session.close()
+        
+        # Run the blocking import off the event loop
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, run_import)
+        except Exception as e:
+            task.fail(str(e))
+            raise
+        
+        task.complete()
+        
+        if validate_only:
+            if result['total_rows'] == 0:
+                return json({
+                    'success': False,
+                    'error': 'Empty file',
+                    'message': 'No data found in file'
+                }, status=400)
             
             return json({
                 'success': True,
-                'data': import_result,
-                'message': f'Import completed: {import_result["imported"]} imported, {import_result["skipped"]} skipped, {import_result["updated"]} updated'
+                'data': {
+                    'validation_only': True,
+                    'task_id': task.id,
+                    **result
+                },
+                'message': 'Validation completed'
             })
-            
-        finally:
-            session.close()
+        
+        if result['total_rows'] == 0:
+            return json({
+                'success': False,
+                'error': 'Empty file',
+                'message': 'No data found in file'
+            }, status=400)
+        
+        return json({
+            'success': True,
+            'data': {
+                'task_id': task.id,
+                **result
+            },
+            'message': f'Import completed: {result["imported"]} imported, {result["skipped"]} skipped, {result["updated"]} updated'
+        })
             
     except Exception as e:
         logger.error(f"Failed to import customers: {str(e)}")
@@ -132,6 +228,8 @@ async def import_customers(req: request.Request):
             'error': 'Internal server error',
             'message': str(e)
         }, status=500)
+    finally:
+        remove_spooled_file(file_path)
 
 
 @customer_import_export_bp.route('/export', methods=['POST'])
@@ -241,162 +339,6 @@ async def export_customers(req: request.Request):
         }, status=500)
 
 
-def parse_file(file_content: bytes, file_name: str) -> List[Dict[str, any]]:
-    """
-    Parse Excel/CSV file and return list of rows
-    
-    Args:
-        file_content: File content as bytes
-        file_name: File name with extension
-        
-    Returns:
-        List of row dictionaries
-    """
-    try:
-        import pandas as pd
-        
-        # Create BytesIO object
-        file_io = io.BytesIO(file_content)
-        
-        # Parse based on file extension
-        if file_name.endswith('.csv'):
-            df = pd.read_csv(file_io)
-        else:  # Excel
-            df = pd.read_excel(file_io, engine='openpyxl')
-        
-        # Convert to list of dicts
-        rows = df.to_dict('records')
-        
-        # Clean data (remove None, strip strings)
-        cleaned_rows = []
-        for row in rows:
-            cleaned_row = {}
-            for key, value in row.items():
-                if pd.isna(value):
-                    cleaned_row[key] = None
-                elif isinstance(value, str):
-                    cleaned_row[key] = value.strip()
-                else:
-                    cleaned_row[key] = value
-            cleaned_rows.append(cleaned_row)
-        
-        return cleaned_rows
-        
-    except Exception as e:
-        logger.error(f"Failed to parse file: {str(e)}")
-        raise BadRequest(f"Failed to parse file: {str(e)}")
-
-
-def execute_import(
-    session,
-    rows: List[Dict[str, any]],
-    validation_results: List[Dict[str, any]],
-    import_mode: str
-) -> Dict[str, any]:
-    """
-    Execute customer import
-    
-    Args:
-        session: Database session
-        rows: List of row data
-        validation_results: List of validation results
-        import_mode: Import mode (skip_duplicates, update_duplicates, create_all)
-        
-    Returns:
-        Import result summary
-    """
-    imported = 0
-    skipped = 0
-    updated = 0
-    errors = []
-    
-    validation_service = DataValidationService()
-    
-    for idx, (row_data, validation) in enumerate(zip(rows, validation_results), 1):
-        try:
-            # Check validation
-            if not validation['is_valid']:
-                skipped += 1
-                errors.append({
-                    'row': idx,
-                    'errors': validation['errors'],
-                    'action': 'skipped'
-                })
-                continue
-            
-            # Check duplicates
-            duplicates = validation_service.check_duplicates(row_data, session)
-            
-            if duplicates and import_mode == 'skip_duplicates':
-                skipped += 1
-                errors.append({
-                    'row': idx,
-                    'duplicates': duplicates,
-                    'action': 'skipped'
-                })
-                continue
-            
-            if duplicates and import_mode == 'update_duplicates':
-                # Update existing customer
-                customer_id = duplicates[0]['customer_id']
-                customer = session.query(Customer).filter(Customer.id == customer_id).first()
-                
-                if customer:
-                    # Update fields
-                    for key, value in row_data.items():
-                        if hasattr(customer, key) and value is not None:
-                            setattr(customer, key, value)
-                    
-                    session.commit()
-                    updated += 1
-                    continue
-            
-            # Create new customer (create_all or no duplicates)
-            import uuid
-            new_customer = Customer(
-                customer_id=str(uuid.uuid4()),
-                company_name=row_data.get('company_name'),
-                contact_name=row_data.get('contact_name'),
-                contact_phone=row_data.get('contact_phone'),
-                credit_code=row_data.get('credit_code'),
-                customer_type=row_data.get('customer_type', 'enterprise'),
-                province=row_data.get('province'),
-                city=row_data.get('city'),
-                address=row_data.get('address'),
-                email=row_data.get('email'),
-                website=row_data.get('website'),
-                industry=row_data.get('industry'),
-                erp_system=row_data.get('erp_system'),
-                erp_customer_code=row_data.get('erp_customer_code'),
-                status=row_data.get('status', 'active'),
-                level=row_data.get('level', 'standard'),
-                source=row_data.get('source', 'direct'),
-                remarks=row_data.get('remarks')
-            )
-            
-            session.add(new_customer)
-            session.commit()
-            imported += 1
-            
-        except Exception as e:
-            session.rollback()
-            skipped += 1
-            errors.append({
-                'row': idx,
-                'error': str(e),
-                'action': 'failed'
-            })
-    
-    return {
-        'total_rows': len(rows),
-        'imported': imported,
-        'skipped': skipped,
-        'updated': updated,
-        'errors': errors[:100],  # Limit errors to first 100
-        'import_mode': import_mode
-    }
-
-
 def generate_export_file(
     customers_data: List[Dict[str, any]],
     export_format: str,
@@ -28,6 +28,7 @@ from backend.models.database_models import (
 )
 from backend.dao.database_dao import DatabaseSessionFactory
 from backend.services.excel_import_service import CustomerExcelService, ExcelImportError
+from backend.services.company_name_matcher import company_name_index
 
 logger = logging.getLogger(__name__)
 
@@ -303,6 +304,7 @@ async def create_customer(req: request.Request):
             session.add(new_customer)
             session.commit()
             session.refresh(new_customer)
+            company_name_index.add(new_customer.id, new_customer.company_name)
             
             # Return created customer
             response_data = CustomerResponse(
@@ -492,6 +494,7 @@ async def update_customer(req: request.Request, customer_id: str):
             
             session.commit()
             session.refresh(customer)
+            company_name_index.update(customer.id, customer.company_name)
             
             response_data = CustomerResponse(
                 id=customer.id,
@@ -636,8 +639,10 @@ async def delete_customer(req: request.Request, customer_id: str):
                 }, status=404)
             
             # Delete customer (cascade will handle related records)
+            customer_pk = customer.id
             session.delete(customer)
             session.commit()
+            company_name_index.remove(customer_pk)
             
             return json({
                 'success': True,
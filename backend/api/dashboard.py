@@ -10,6 +10,9 @@ from decimal import Decimal
 
 from backend.models.database_models import SettlementRecord, Customer, PriceConfig
 from backend.dao.database_dao import DatabaseSessionFactory
+from backend.services.customer_stats import get_distributions
+from backend.services.fx_rates import receivable_totals, settlement_totals
+from backend.services.response_cache import cached_response
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +20,7 @@ dashboard_bp = Blueprint('dashboard', url_prefix='/dashboard')
 
 
 @dashboard_bp.route('/metrics', methods=['GET'])
+@cached_response(tags=('settlements', 'customers'))
 async def get_dashboard_metrics(req: request.Request):
     """
     Get core dashboard metrics
@@ -28,7 +32,10 @@ async def get_dashboard_metrics(req: request.Request):
     {
         "success": true,
         "data": {
-            "total_revenue": 1000000,
+            "total_revenue": 1000000,  // In base_currency
+            "base_currency": "CNY",
+            "revenue_by_currency": {"CNY": 800000, "USD": 28000},
+            "unconverted_revenue": {},  // Native amounts without an exchange rate
             "total_customers": 1320,
             "active_customers": 1200,
             "pending_payment": 200000,
@@ -49,11 +56,9 @@ async def get_dashboard_metrics(req: request.Request):
         
         try:
             # Calculate metrics
-            # Total revenue (sum of all paid settlements)
-            total_revenue_query = session.query(SettlementRecord).filter(
-                SettlementRecord.status == 'paid'
-            )
-            total_revenue = sum([s.total_amount for s in total_revenue_query.all()]) if total_revenue_query.count() > 0 else Decimal('0')
+            # Total revenue (sum of all paid settlements, converted to the base currency)
+            paid = settlement_totals(session, SettlementRecord.status == 'paid')
+            total_revenue = Decimal(str(paid['base_total']))
             
             # Total customers
             total_customers = session.query(Customer).count()
@@ -64,22 +69,13 @@ async def get_dashboard_metrics(req: request.Request):
             ).distinct()
             active_customers = session.query(Customer).filter(Customer.id.in_(active_customer_ids)).count()
             
-            # Pending payment (approved but not paid)
-            pending_payment_query = session.query(SettlementRecord).filter(
-                SettlementRecord.status.in_(['pending', 'approved'])
-            )
-            pending_payment = sum([s.total_amount for s in pending_payment_query.all()]) if pending_payment_query.count() > 0 else Decimal('0')
-            
-            # Overdue payment (pending for > 30 days)
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-            overdue_query = session.query(SettlementRecord).filter(
-                SettlementRecord.status.in_(['pending', 'approved']),
-                SettlementRecord.created_at < thirty_days_ago
-            )
-            overdue_payment = sum([s.total_amount for s in overdue_query.all()]) if overdue_query.count() > 0 else Decimal('0')
+            # Pending and overdue payment (open settlements net of write-offs, converted to the base currency)
+            receivables = receivable_totals(session)
+            pending_payment = Decimal(str(receivables['open_amount']))
+            overdue_payment = Decimal(str(receivables['overdue_amount']))
             
             # Collection rate (paid / (paid + pending))
-            paid_amount = sum([s.total_amount for s in session.query(SettlementRecord).filter(SettlementRecord.status == 'paid').all()]) if session.query(SettlementRecord).filter(SettlementRecord.status == 'paid').count() > 0 else Decimal('0')
+            paid_amount = total_revenue
             total_amount = paid_amount + pending_payment
             collection_rate = float(paid_amount / total_amount) if total_amount > 0 else 0.0
             
@@ -92,29 +88,38 @@ async def get_dashboard_metrics(req: request.Request):
             customer_churn_rate = 1.0 - (active_customers_recent / total_customers) if total_customers > 0 else 0.0
             
             # Month-over-month growth (simplified)
-            current_month_revenue = sum([s.total_amount for s in session.query(SettlementRecord).filter(
+            current_month_start = datetime.utcnow().replace(day=1)
+            current_month_revenue = settlement_totals(
+                session,
                 SettlementRecord.status == 'paid',
-                SettlementRecord.created_at >= datetime.utcnow().replace(day=1)
-            ).all()])
+                SettlementRecord.created_at >= current_month_start,
+                since=current_month_start
+            )['base_total']
             
             last_month_start = (datetime.utcnow().replace(day=1) - timedelta(days=1)).replace(day=1)
             last_month_end = datetime.utcnow().replace(day=1) - timedelta(days=1)
-            last_month_revenue = sum([s.total_amount for s in session.query(SettlementRecord).filter(
+            last_month_revenue = settlement_totals(
+                session,
                 SettlementRecord.status == 'paid',
                 SettlementRecord.created_at >= last_month_start,
-                SettlementRecord.created_at <= last_month_end
-            ).all()])
+                SettlementRecord.created_at <= last_month_end,
+                since=last_month_start
+            )['base_total']
             
-            month_over_month_growth = float((current_month_revenue - last_month_revenue) / last_month_revenue) if last_month_revenue > 0 else 0.0
+            month_over_month_growth = (current_month_revenue - last_month_revenue) / last_month_revenue if last_month_revenue > 0 else 0.0
             
             return json({
                 'success': True,
                 'data': {
                     'total_revenue': float(total_revenue),
+                    'base_currency': paid['base_currency'],
+                    'revenue_by_currency': paid['native'],
+                    'unconverted_revenue': paid['unconverted'],
                     'total_customers': total_customers,
                     'active_customers': active_customers,
                     'pending_payment': float(pending_payment),
                     'overdue_payment': float(overdue_payment),
+                    'unconverted_receivables': receivables['unconverted'],
                     'collection_rate': collection_rate,
                     'customer_churn_rate': customer_churn_rate,
                     'month_over_month_growth': month_over_month_growth,
@@ -136,6 +141,7 @@ async def get_dashboard_metrics(req: request.Request):
 
 
 @dashboard_bp.route('/trends', methods=['GET'])
+@cached_response(tags=('settlements', 'customers'))
 async def get_dashboard_trends(req: request.Request):
     """
     Get trend data for charts
@@ -187,31 +193,35 @@ async def get_dashboard_trends(req: request.Request):
             # Get revenue trend
             revenue_trend = []
             for date_range in reversed(date_ranges):  # Reverse to get chronological order
-                revenue = session.query(SettlementRecord).filter(
+                revenue = settlement_totals(
+                    session,
                     SettlementRecord.status == 'paid',
                     SettlementRecord.created_at >= date_range['start'],
-                    SettlementRecord.created_at <= date_range['end']
-                ).all()
+                    SettlementRecord.created_at <= date_range['end'],
+                    since=date_range['start']
+                )
                 
-                total = sum([s.total_amount for s in revenue]) if revenue else Decimal('0')
                 revenue_trend.append({
                     'date': date_range['label'],
-                    'value': float(total)
+                    'value': revenue['base_total'],
+                    'by_currency': revenue['native']
                 })
             
             # Get payment trend
             payment_trend = []
             for date_range in reversed(date_ranges):
-                payments = session.query(SettlementRecord).filter(
+                payments = settlement_totals(
+                    session,
                     SettlementRecord.status.in_(['pending', 'approved', 'paid']),
                     SettlementRecord.created_at >= date_range['start'],
-                    SettlementRecord.created_at <= date_range['end']
-                ).all()
+                    SettlementRecord.created_at <= date_range['end'],
+                    since=date_range['start']
+                )
                 
-                total = sum([s.total_amount for s in payments]) if payments else Decimal('0')
                 payment_trend.append({
                     'date': date_range['label'],
-                    'value': float(total)
+                    'value': payments['base_total'],
+                    'by_currency': payments['native']
                 })
             
             # Get customer growth
@@ -252,6 +262,7 @@ async def get_dashboard_trends(req: request.Request):
 
 
 @dashboard_bp.route('/customer-stats', methods=['GET'])
+@cached_response(tags=('customers',))
 async def get_customer_stats(req: request.Request):
     """
     Get customer statistics for charts
@@ -272,40 +283,12 @@ async def get_customer_stats(req: request.Request):
         session = session_factory.get_session()
         
         try:
-            # Get industry distribution
-            all_customers = session.query(Customer).all()
-            
-            industry_stats = {}
-            region_stats = {}
-            level_stats = {}
-            
-            for customer in all_customers:
-                # Industry
-                industry = customer.industry or '未分类'
-                industry_stats[industry] = industry_stats.get(industry, 0) + 1
-                
-                # Region
-                region = customer.province or '未分类'
-                region_stats[region] = region_stats.get(region, 0) + 1
-                
-                # Level
-                level = customer.level or 'standard'
-                level_stats[level] = level_stats.get(level, 0) + 1
+            # Distributions from the maintained counters (no scan of the customers table)
+            stats = get_distributions(session)
             
             return json({
                 'success': True,
-                'data': {
-                    'industry_distribution': [
-                        {'name': k, 'value': v} for k, v in industry_stats.items()
-                    ],
-                    'region_distribution': [
-                        {'name': k, 'value': v} for k, v in region_stats.items()
-                    ],
-                    'level_distribution': [
-                        {'name': k, 'value': v} for k, v in level_stats.items()
-                    ],
-                    'total_customers': len(all_customers)
-                },
+                'data': stats,
                 'message': 'Customer statistics retrieved successfully'
             })
             
@@ -0,0 +1,128 @@
+# OP_CMS FX Rate API
+# Story 4.1: Management Dashboard - multi-currency totals
+
+from sanic import Blueprint, json, request
+import logging
+
+from backend.models.fx_models import ExchangeRate
+from backend.dao.database_dao import DatabaseSessionFactory
+from backend.services.fx_rates import BASE_CURRENCY, FxRateError, save_rates
+from backend.utils.jwt import require_auth, require_role
+
+logger = logging.getLogger(__name__)
+
+fx_rate_bp = Blueprint('fx_rates', url_prefix='/fx-rates')
+
+
+@fx_rate_bp.route('', methods=['GET'])
+@require_auth
+async def list_fx_rates(req: request.Request):
+    """
+    List dated exchange rates against the base currency
+
+    Query Parameters:
+    - currency: Filter by quoted currency (e.g. USD)
+
+    Returns:
+    {
+        "success": true,
+        "data": {
+            "base_currency": "CNY",
+            "rates": [{"currency": "USD", "rate": 7.2, "effective_date": "2026-02-01", ...}]
+        }
+    }
+    """
+    try:
+        currency = req.args.get('currency', '').strip().upper()
+
+        session_factory = DatabaseSessionFactory()
+        session = session_factory.get_session()
+
+        try:
+            query = session.query(ExchangeRate).filter(ExchangeRate.base_currency == BASE_CURRENCY)
+            if currency:
+                query = query.filter(ExchangeRate.currency == currency)
+            rates = query.order_by(ExchangeRate.currency, ExchangeRate.effective_date.desc()).all()
+
+            return json({
+                'success': True,
+                'data': {
+                    'base_currency': BASE_CURRENCY,
+                    'rates': [rate.to_dict() for rate in rates]
+                }
+            })
+
+        finally:
+            session.close()
+
+    except Exception as e:
+        logger.error(f"Failed to list FX rates: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
+
+
+@fx_rate_bp.route('', methods=['PUT'])
+@require_auth
+@require_role('admin')
+async def save_fx_rates(req: request.Request):
+    """
+    Add or replace dated exchange rates (the rate table reloads on commit)
+
+    Request Body:
+    {
+        "rates": [
+            {"currency": "USD", "effective_date": "2026-02-01", "rate": 7.2},
+            {"currency": "EUR", "effective_date": "2026-02-01", "rate": 7.8}
+        ],
+        "source": "PBOC"  // Optional
+    }
+
+    Returns:
+    {
+        "success": true,
+        "data": {"created": 1, "updated": 1}
+    }
+    """
+    data = req.json or {}
+    if not data.get('rates') or not isinstance(data['rates'], list):
+        return json({
+            'success': False,
+            'error': 'Missing required fields',
+            'message': 'rates must be a non-empty list'
+        }, status=400)
+
+    try:
+        session_factory = DatabaseSessionFactory()
+        session = session_factory.get_session()
+
+        try:
+            result = save_rates(session, data['rates'], source=data.get('source'))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        return json({
+            'success': True,
+            'data': result,
+            'message': f"Saved FX rates: {result['created']} created, {result['updated']} updated"
+        })
+
+    except FxRateError as e:
+        return json({
+            'success': False,
+            'error': 'Invalid rate',
+            'message': str(e)
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Failed to save FX rates: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
@@ -6,12 +6,15 @@ from sanic.exceptions import NotFound, BadRequest, Unauthorized
 from typing import Optional
 from sqlalchemy import or_, and_
 import logging
+from datetime import datetime
 
 from backend.models.database_models import (
     PriceConfig, PriceConfigCreate, PriceConfigUpdate, 
     PriceConfigResponse, PriceConfigListResponse
 )
 from backend.dao.database_dao import DatabaseSessionFactory
+from backend.services.price_config_cache import price_config_cache
+from backend.services.price_versioning import PriceVersionError, record_version
 
 logger = logging.getLogger(__name__)
 
@@ -157,7 +160,8 @@ async def create_pricing_config(req: request.Request):
         "base_price": decimal (optional),
         "volume_discount": decimal (optional),
         "pricing_rules": dict (optional),
-        "is_active": boolean (optional, default: true)
+        "is_active": boolean (optional, default: true),
+        "effective_from": ISO datetime (optional, default: now)
     }
     
     Returns:
@@ -202,6 +206,15 @@ async def create_pricing_config(req: request.Request):
         session_factory = DatabaseSessionFactory()
         session = session_factory.get_session()
         
+        try:
+            effective_from = _parse_effective_from(data)
+        except ValueError:
+            return json({
+                'success': False,
+                'error': 'Invalid date format',
+                'message': 'effective_from must be an ISO datetime'
+            }, status=400)
+        
         try:
             # Check for duplicate (customer_id + device_series)
             existing = session.query(PriceConfig).filter(
@@ -236,6 +249,16 @@ async def create_pricing_config(req: request.Request):
             )
             
             session.add(new_config)
+            session.flush()
+            
+            # Version 1, used to price periods from effective_from on
+            record_version(
+                session, new_config,
+                changed_by=getattr(req, 'current_user', {}).get('user_id'),
+                change_reason='Created',
+                effective_from=effective_from
+            )
+            
             session.commit()
             session.refresh(new_config)
             
@@ -288,7 +311,7 @@ async def get_pricing_config(req: request.Request, config_id: int):
         session = session_factory.get_session()
         
         try:
-            config = session.query(PriceConfig).filter(PriceConfig.id == config_id).first()
+            config = price_config_cache.get_config(session, config_id)
             
             if not config:
                 return json({
@@ -350,7 +373,9 @@ async def update_pricing_config(req: request.Request, config_id: int):
         "base_price": decimal,
         "volume_discount": decimal,
         "pricing_rules": dict,
-        "is_active": boolean
+        "is_active": boolean,
+        "effective_from": ISO datetime (default: now),
+        "change_reason": string
     }
     
     Returns:
@@ -409,6 +434,32 @@ async def update_pricing_config(req: request.Request, config_id: int):
             if 'is_active' in data:
                 config.is_active = data['is_active']
             
+            try:
+                effective_from = _parse_effective_from(data)
+            except ValueError:
+                return json({
+                    'success': False,
+                    'error': 'Invalid date format',
+                    'message': 'effective_from must be an ISO datetime'
+                }, status=400)
+            
+            # Committing the bump invalidates the cached config in every worker
+            config.current_version_number = (config.current_version_number or 1) + 1
+            try:
+                record_version(
+                    session, config,
+                    changed_by=getattr(req, 'current_user', {}).get('user_id'),
+                    change_reason=data.get('change_reason'),
+                    effective_from=effective_from
+                )
+            except PriceVersionError as e:
+                session.rollback()
+                return json({
+                    'success': False,
+                    'error': 'Invalid version',
+                    'message': str(e)
+                }, status=400)
+            
             session.commit()
             session.refresh(config)
             
@@ -488,3 +539,9 @@ async def delete_pricing_config(req: request.Request, config_id: int):
             'error': 'Internal server error',
             'message': str(e)
         }, status=500)
+
+
+def _parse_effective_from(data: dict) -> Optional[datetime]:
+    """effective_from of a request body (None: now)"""
+    value = data.get('effective_from')
+    return datetime.fromisoformat(value) if value else None
@@ -6,17 +6,33 @@ from sanic.exceptions import NotFound, BadRequest
 from typing import Optional
 import logging
 from datetime import datetime, timedelta
-from decimal import Decimal
+from sqlalchemy import func, select
+import asyncio
 import csv
 import io
+import os
 
 from backend.models.database_models import SettlementRecord, Customer, PriceConfig
 from backend.dao.database_dao import DatabaseSessionFactory
+from backend.services.archive_tier import route, source
+from backend.services.batch_processing_service import batch_service
+from backend.services.fx_rates import fx_rates, settlement_totals_by
+from backend.services.streaming_export import (
+    DEFAULT_EXPORT_BATCH_SIZE, ExportError, count_rows, export_dataset_to_file,
+    get_export_dataset, get_export_writer
+)
+from backend.utils.jwt import require_auth
 
 logger = logging.getLogger(__name__)
 
 reports_bp = Blueprint('reports', url_prefix='/reports')
 
+# Datasets only administrators may export
+RESTRICTED_EXPORT_DATASETS = ('audit_logs',)
+
+# Bytes per chunk when streaming an export file to the client
+EXPORT_STREAM_CHUNK_SIZE = 1024 * 1024
+
 
 @reports_bp.route('/export', methods=['POST'])
 async def export_report(req: request.Request):
@@ -126,6 +142,127 @@ async def export_report(req: request.Request):
         }, status=500)
 
 
+@reports_bp.route('/datasets/<dataset>/export', methods=['POST'])
+@require_auth
+async def export_dataset(req: request.Request, dataset: str):
+    """
+    Export a dataset (customers, settlements, payments, audit_logs) for analytics
+    
+    Rows are streamed from the database into the file in batches. Parquet
+    and Arrow exports use typed schemas (decimal128 amounts, UTC timestamps).
+    
+    Request Body:
+    {
+        "format": "parquet",  // parquet, arrow, csv, jsonl, excel
+        "compression": "zstd",  // parquet: snappy, zstd, gzip, brotli, lz4, none; arrow: lz4, zstd, none
+        "filters": {
+            "status": "approved",
+            "date_from": "2026-01-01",
+            "date_to": "2026-02-28"
+        },
+        "fields": ["record_id", "total_amount", ...],
+        "async": false  // true: run as a Celery task and return 202 with a batch task ID
+    }
+    
+    Returns:
+        The export file (sync), or the batch task to follow via /batch-tasks/<id> (async)
+    """
+    data = req.json or {}
+    export_format = data.get('format', 'parquet')
+    filters = data.get('filters') or {}
+    fields = data.get('fields')
+    compression = data.get('compression')
+    writer_options = {'compression': compression} if compression else None
+    
+    try:
+        get_export_dataset(dataset)
+        writer_class = get_export_writer(export_format)
+    except ExportError as e:
+        return json({
+            'success': False,
+            'error': 'Invalid export',
+            'message': str(e)
+        }, status=400)
+    
+    current_user = req.current_user
+    if dataset in RESTRICTED_EXPORT_DATASETS and current_user.get('role') != 'admin':
+        return json({
+            'success': False,
+            'error': 'Forbidden',
+            'message': f'Only administrators may export {dataset}'
+        }, status=403)
+    
+    if str(data.get('async', False)).lower() in ['true', '1', 'yes']:
+        from backend.tasks import export_dataset_task
+        
+        session = DatabaseSessionFactory().get_session()
+        try:
+            total = count_rows(session, dataset, filters)
+        finally:
+            session.close()
+        
+        task = batch_service.create_task('export', current_user.get('user_id') or 1, total)
+        export_dataset_task.delay(
+            dataset, filters, export_format, fields, compression,
+            DEFAULT_EXPORT_BATCH_SIZE, batch_task_id=task.id
+        )
+        
+        return json({
+            'success': True,
+            'data': {
+                'task_id': task.id,
+                'status': task.status,
+                'total_records': total
+            },
+            'message': 'Export queued'
+        }, status=202)
+    
+    def run_export() -> dict:
+        session = DatabaseSessionFactory().get_session()
+        try:
+            return export_dataset_to_file(
+                session, dataset, export_format, filters, fields, writer_options=writer_options
+            )
+        finally:
+            session.close()
+    
+    # Run the blocking export off the event loop
+    try:
+        export = await asyncio.get_running_loop().run_in_executor(None, run_export)
+    except ExportError as e:
+        return json({
+            'success': False,
+            'error': 'Invalid export',
+            'message': str(e)
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Failed to export {dataset}: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
+    
+    # Stream the file in chunks, then remove it
+    try:
+        response = await req.respond(
+            content_type=writer_class.content_type,
+            headers={
+                'Content-Disposition': f'attachment; filename="{export["file_name"]}"',
+                'X-Total-Records': str(export['total'])
+            }
+        )
+        with open(export['file_path'], 'rb') as f:
+            while True:
+                chunk = f.read(EXPORT_STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await response.send(chunk)
+        await response.eof()
+    finally:
+        os.remove(export['file_path'])
+
+
 def generate_customer_analysis_report(session, filters: dict) -> dict:
     """Generate customer analysis report data"""
     # Get date range
@@ -139,6 +276,20 @@ def generate_customer_analysis_report(session, filters: dict) -> dict:
         query = query.filter(Customer.id.in_(customer_ids))
     customers = query.all()
     
+    # Revenue and usage of all customers, grouped in the database
+    in_range = [SettlementRecord.created_at >= date_from, SettlementRecord.created_at <= date_to]
+    if customer_ids:
+        in_range.append(SettlementRecord.customer_id.in_(customer_ids))
+    revenue_by_customer = settlement_totals_by(session, SettlementRecord.customer_id, *in_range, since=date_from)
+    usage_by_customer = dict(session.execute(route(
+        session,
+        select(SettlementRecord.customer_id, func.sum(SettlementRecord.usage_quantity))
+        .where(*in_range)
+        .group_by(SettlementRecord.customer_id),
+        since=date_from
+    )).all())
+    base_currency = fx_rates.base_currency
+    
     # Generate report data
     report_data = {
         'title': '客户分析报表',
@@ -150,21 +301,15 @@ def generate_customer_analysis_report(session, filters: dict) -> dict:
         'summary': {
             'total_customers': len(customers),
             'active_customers': sum(1 for c in customers if c.status == 'active'),
-            'vip_customers': sum(1 for c in customers if c.level == 'vip')
+            'vip_customers': sum(1 for c in customers if c.level == 'vip'),
+            'base_currency': base_currency
         },
         'customers': []
     }
     
     for customer in customers:
-        # Get customer settlements
-        settlements = session.query(SettlementRecord).filter(
-            SettlementRecord.customer_id == customer.id,
-            SettlementRecord.created_at >= date_from,
-            SettlementRecord.created_at <= date_to
-        ).all()
-        
-        total_revenue = sum([s.total_amount for s in settlements]) if settlements else Decimal('0')
-        total_usage = sum([s.usage_quantity for s in settlements]) if settlements else Decimal('0')
+        revenue = revenue_by_customer.get(customer.id)
+        total_usage = usage_by_customer.get(customer.id)
         
         report_data['customers'].append({
             'customer_id': customer.customer_id,
@@ -173,9 +318,10 @@ def generate_customer_analysis_report(session, filters: dict) -> dict:
             'contact_phone': customer.contact_phone,
             'level': customer.level,
             'status': customer.status,
-            'total_revenue': float(total_revenue),
+            'total_revenue': revenue['base_total'] if revenue else 0.0,
+            'revenue_by_currency': revenue['native'] if revenue else {},
             'total_usage': float(total_usage) if total_usage else 0,
-            'settlement_count': len(settlements)
+            'settlement_count': revenue['settlements'] if revenue else 0
         })
     
     return report_data
@@ -186,19 +332,21 @@ def generate_revenue_report(session, filters: dict) -> dict:
     date_from = datetime.fromisoformat(filters.get('date_from')) if filters.get('date_from') else datetime.utcnow() - timedelta(days=30)
     date_to = datetime.fromisoformat(filters.get('date_to')) if filters.get('date_to') else datetime.utcnow()
     
-    # Get settlements
-    settlements = session.query(SettlementRecord).filter(
-        SettlementRecord.created_at >= date_from,
-        SettlementRecord.created_at <= date_to
+    # Get settlements (archived settlements too when the range reaches back that far)
+    settlements_source = source(session, SettlementRecord, since=date_from)
+    settlements = session.query(settlements_source).filter(
+        settlements_source.created_at >= date_from,
+        settlements_source.created_at <= date_to
     ).all()
     
-    # Calculate revenue by status
-    revenue_by_status = {}
-    for settlement in settlements:
-        status = settlement.status
-        if status not in revenue_by_status:
-            revenue_by_status[status] = Decimal('0')
-        revenue_by_status[status] += settlement.total_amount
+    # Calculate revenue by status (in the base currency)
+    totals_by_status = settlement_totals_by(
+        session, SettlementRecord.status,
+        SettlementRecord.created_at >= date_from,
+        SettlementRecord.created_at <= date_to,
+        since=date_from
+    )
+    revenue_by_status = {status: totals['base_total'] for status, totals in totals_by_status.items()}
     
     report_data = {
         'title': '收入报表',
@@ -208,10 +356,13 @@ def generate_revenue_report(session, filters: dict) -> dict:
             'to': date_to.isoformat()
         },
         'summary': {
-            'total_revenue': float(sum(revenue_by_status.values())),
-            'paid_revenue': float(revenue_by_status.get('paid', Decimal('0'))),
-            'pending_revenue': float(revenue_by_status.get('pending', Decimal('0'))),
-            'approved_revenue': float(revenue_by_status.get('approved', Decimal('0')))
+            'total_revenue': round(sum(revenue_by_status.values()), 2),
+            'paid_revenue': revenue_by_status.get('paid', 0.0),
+            'pending_revenue': revenue_by_status.get('pending', 0.0),
+            'approved_revenue': revenue_by_status.get('approved', 0.0),
+            'base_currency': fx_rates.base_currency,
+            'revenue_by_currency': _merge_native(totals_by_status.values()),
+            'unconverted_revenue': _merge_native(totals_by_status.values(), 'unconverted')
         },
         'settlements': []
     }
@@ -225,6 +376,7 @@ def generate_revenue_report(session, filters: dict) -> dict:
             'usage_quantity': float(settlement.usage_quantity) if settlement.usage_quantity else 0,
             'unit_price': float(settlement.unit_price) if settlement.unit_price else 0,
             'total_amount': float(settlement.total_amount) if settlement.total_amount else 0,
+            'currency': settlement.currency,
             'status': settlement.status,
             'created_at': settlement.created_at.isoformat() if settlement.created_at else None
         })
@@ -237,18 +389,27 @@ def generate_collection_report(session, filters: dict) -> dict:
     date_from = datetime.fromisoformat(filters.get('date_from')) if filters.get('date_from') else datetime.utcnow() - timedelta(days=30)
     date_to = datetime.fromisoformat(filters.get('date_to')) if filters.get('date_to') else datetime.utcnow()
     
-    # Get settlements
-    settlements = session.query(SettlementRecord).filter(
-        SettlementRecord.created_at >= date_from,
-        SettlementRecord.created_at <= date_to
+    # Get settlements (archived settlements too when the range reaches back that far)
+    settlements_source = source(session, SettlementRecord, since=date_from)
+    settlements = session.query(settlements_source).filter(
+        settlements_source.created_at >= date_from,
+        settlements_source.created_at <= date_to
     ).all()
     
-    # Calculate collection metrics
-    total_amount = sum([s.total_amount for s in settlements])
-    paid_amount = sum([s.total_amount for s in settlements if s.status == 'paid'])
-    pending_amount = sum([s.total_amount for s in settlements if s.status in ['pending', 'approved']])
+    # Calculate collection metrics (in the base currency)
+    totals_by_status = settlement_totals_by(
+        session, SettlementRecord.status,
+        SettlementRecord.created_at >= date_from,
+        SettlementRecord.created_at <= date_to,
+        since=date_from
+    )
+    total_amount = round(sum(totals['base_total'] for totals in totals_by_status.values()), 2)
+    paid_amount = totals_by_status['paid']['base_total'] if 'paid' in totals_by_status else 0.0
+    pending_amount = round(sum(
+        totals['base_total'] for status, totals in totals_by_status.items() if status in ['pending', 'approved']
+    ), 2)
     
-    collection_rate = paid_amount / total_amount if total_amount > 0 else Decimal('0')
+    collection_rate = paid_amount / total_amount if total_amount > 0 else 0.0
     
     report_data = {
         'title': '回款报表',
@@ -261,7 +422,9 @@ def generate_collection_report(session, filters: dict) -> dict:
             'total_amount': float(total_amount),
             'paid_amount': float(paid_amount),
             'pending_amount': float(pending_amount),
-            'collection_rate': float(collection_rate)
+            'collection_rate': float(collection_rate),
+            'base_currency': fx_rates.base_currency,
+            'unconverted_amount': _merge_native(totals_by_status.values(), 'unconverted')
         },
         'settlements': []
     }
@@ -273,6 +436,7 @@ def generate_collection_report(session, filters: dict) -> dict:
             'period_start': settlement.period_start.isoformat() if settlement.period_start else None,
             'period_end': settlement.period_end.isoformat() if settlement.period_end else None,
             'total_amount': float(settlement.total_amount) if settlement.total_amount else 0,
+            'currency': settlement.currency,
             'status': settlement.status,
             'created_at': settlement.created_at.isoformat() if settlement.created_at else None
         })
@@ -296,7 +460,7 @@ def export_to_excel(report_data: dict, report_type: str):
         # Add data based on report type
         if report_type == 'customer_analysis':
             # Add headers
-            headers = ['客户 ID', '公司名称', '联系人', '联系电话', '等级', '状态', '总收入', '总用量', '结算次数']
+            headers = ['客户 ID', '公司名称', '联系人', '联系电话', '等级', '状态', f"总收入 ({report_data['summary']['base_currency']})", '总用量', '结算次数']
             for col, header in enumerate(headers, 1):
                 ws.cell(row=4, column=col, value=header)
             
@@ -334,7 +498,7 @@ def export_to_csv(report_data: dict, report_type: str):
         writer = csv.writer(output)
         
         # Add headers
-        writer.writerow(['客户 ID', '公司名称', '联系人', '联系电话', '等级', '状态', '总收入', '总用量', '结算次数'])
+        writer.writerow(['客户 ID', '公司名称', '联系人', '联系电话', '等级', '状态', f"总收入 ({report_data['summary']['base_currency']})", '总用量', '结算次数'])
         
         # Add data
         for customer in report_data['customers']:
@@ -371,3 +535,12 @@ def export_to_pdf_text(report_data: dict, report_type: str):
     
     file_name = f"{report_type}_{datetime.utcnow().strftime('%Y%m%d')}.pdf"
     return output.getvalue().encode('utf-8'), file_name
+
+
+def _merge_native(totals: list, key: str = 'native') -> dict:
+    """Sum per-currency amounts of several settlement_totals_by groups"""
+    merged = {}
+    for group in totals:
+        for currency, amount in group[key].items():
+            merged[currency] = round(merged.get(currency, 0.0) + amount, 2)
+    return merged
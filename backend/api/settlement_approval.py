@@ -3,15 +3,23 @@
 
 from sanic import Blueprint, json, request
 from sanic.exceptions import NotFound, BadRequest
-from typing import List
 import logging
-from datetime import datetime
 
-from backend.models.database_models import SettlementRecord
 from backend.dao.database_dao import DatabaseSessionFactory
+from backend.services.settlement_approval_service import (
+    NOT_FOUND,
+    UPDATED,
+    SettlementApprovalError,
+    settlement_approval_service
+)
+from backend.utils.jwt import require_auth, require_role
 
 logger = logging.getLogger(__name__)
 
+# Roles allowed to approve or reject settlements; the acting user is the
+# authenticated one and is recorded in the audit log
+APPROVER_ROLES = ('admin', 'supervisor')
+
 # Use the existing settlement_bp from settlements.py
 # These routes will be added to the existing blueprint
 
@@ -20,174 +28,69 @@ def register_approval_routes(bp: Blueprint):
     """Register approval workflow routes to the settlement blueprint"""
     
     @bp.route('/<record_id:int>/approve', methods=['PUT'])
+    @require_auth
+    @require_role(*APPROVER_ROLES)
     async def approve_settlement(req: request.Request, record_id: int):
         """
-        Approve a settlement
+        Approve a settlement as the authenticated user
+        
+        Runs through the bulk workflow: status guard and audit entry included.
         
         Request Body:
         {
-            "approved_by": 1,  // User ID
-            "approval_remarks": "Approved"
+            "approval_remarks": "Approved"  // Optional
         }
         """
-        try:
-            data = req.json
-            
-            # Validate required fields
-            if not data.get('approved_by'):
-                return json({
-                    'success': False,
-                    'error': 'Missing required fields',
-                    'message': 'approved_by is required'
-                }, status=400)
-            
-            # Get database session
-            session_factory = DatabaseSessionFactory()
-            session = session_factory.get_session()
-            
-            try:
-                # Find settlement
-                settlement = session.query(SettlementRecord).filter(
-                    SettlementRecord.id == record_id
-                ).first()
-                
-                if not settlement:
-                    raise NotFound("Settlement not found")
-                
-                # Check if already approved
-                if settlement.status == 'approved':
-                    return json({
-                        'success': False,
-                        'error': 'Already approved',
-                        'message': 'This settlement has already been approved'
-                    }, status=400)
-                
-                # Update settlement
-                settlement.status = 'approved'
-                settlement.approved_at = datetime.utcnow()
-                settlement.approved_by = data['approved_by']
-                settlement.approval_remarks = data.get('approval_remarks', '')
-                
-                session.commit()
-                
-                return json({
-                    'success': True,
-                    'data': {
-                        'id': settlement.id,
-                        'status': 'approved',
-                        'approved_at': settlement.approved_at.isoformat() if settlement.approved_at else None,
-                        'approved_by': settlement.approved_by
-                    },
-                    'message': 'Settlement approved successfully'
-                })
-                
-            finally:
-                session.close()
-                
-        except NotFound as e:
-            raise
-        except Exception as e:
-            logger.error(f"Failed to approve settlement: {str(e)}")
-            return json({
-                'success': False,
-                'error': 'Internal server error',
-                'message': str(e)
-            }, status=500)
+        data = req.json or {}
+        return _single_transition(
+            req, record_id, 'approve', req.current_user['user_id'], data.get('approval_remarks')
+        )
     
     
     @bp.route('/<record_id:int>/reject', methods=['PUT'])
+    @require_auth
+    @require_role(*APPROVER_ROLES)
     async def reject_settlement(req: request.Request, record_id: int):
         """
-        Reject a settlement
+        Reject a settlement as the authenticated user
+        
+        Runs through the bulk workflow: status guard and audit entry included.
         
         Request Body:
         {
-            "rejected_by": 1,  // User ID
             "rejection_reason": "Incorrect usage data"
         }
         """
-        try:
-            data = req.json
-            
-            # Validate required fields
-            if not data.get('rejected_by'):
-                return json({
-                    'success': False,
-                    'error': 'Missing required fields',
-                    'message': 'rejected_by is required'
-                }, status=400)
-            
-            if not data.get('rejection_reason'):
-                return json({
-                    'success': False,
-                    'error': 'Missing required fields',
-                    'message': 'rejection_reason is required'
-                }, status=400)
-            
-            # Get database session
-            session_factory = DatabaseSessionFactory()
-            session = session_factory.get_session()
-            
-            try:
-                # Find settlement
-                settlement = session.query(SettlementRecord).filter(
-                    SettlementRecord.id == record_id
-                ).first()
-                
-                if not settlement:
-                    raise NotFound("Settlement not found")
-                
-                # Check if already rejected
-                if settlement.status == 'rejected':
-                    return json({
-                        'success': False,
-                        'error': 'Already rejected',
-                        'message': 'This settlement has already been rejected'
-                    }, status=400)
-                
-                # Update settlement
-                settlement.status = 'rejected'
-                settlement.rejected_at = datetime.utcnow()
-                settlement.rejected_by = data['rejected_by']
-                settlement.rejection_reason = data['rejection_reason']
-                
-                session.commit()
-                
-                return json({
-                    'success': True,
-                    'data': {
-                        'id': settlement.id,
-                        'status': 'rejected',
-                        'rejected_at': settlement.rejected_at.isoformat() if settlement.rejected_at else None,
-                        'rejected_by': settlement.rejected_by,
-                        'rejection_reason': settlement.rejection_reason
-                    },
-                    'message': 'Settlement rejected successfully'
-                })
-                
-            finally:
-                session.close()
-                
-        except NotFound as e:
-            raise
-        except Exception as e:
-            logger.error(f"Failed to reject settlement: {str(e)}")
+        data = req.json or {}
+        if not data.get('rejection_reason'):
             return json({
                 'success': False,
-                'error': 'Internal server error',
-                'message': str(e)
-            }, status=500)
+                'error': 'Missing required fields',
+                'message': 'rejection_reason is required'
+            }, status=400)
+        return _single_transition(
+            req, record_id, 'reject', req.current_user['user_id'], data['rejection_reason']
+        )
     
     
     @bp.route('/bulk-approve', methods=['POST'])
+    @require_auth
+    @require_role(*APPROVER_ROLES)
     async def bulk_approve_settlements(req: request.Request):
         """
-        Bulk approve multiple settlements
+        Bulk approve settlements selected by id or filter, as the authenticated user
         
         Request Body:
         {
-            "settlement_ids": [1, 2, 3],
-            "approved_by": 1
+            "settlement_ids": [1, 2, 3],  // Or "filter" below
+            "filter": {
+                "period_start": "2026-02-01",  // Settlement period of a generation run
+                "period_end": "2026-02-28",
+                "status": ["pending"],
+                "customer_ids": [1, 2]
+            },
+            "from_statuses": ["pending"],  // Optional, default: pending, rejected
+            "approval_remarks": "Approved"
         }
         
         Returns:
@@ -195,93 +98,158 @@ def register_approval_routes(bp: Blueprint):
             "success": true,
             "data": {
                 "total": 3,
-                "approved": 3,
-                "failed": 0,
-                "errors": []
+                "approved": 2,
+                "failed": 1,
+                "conflicts": 1,
+                "not_found": 0,
+                "outcomes": [{"settlement_id": 1, "outcome": "updated", "status": "approved"}, ...],
+                "errors": [{"settlement_id": 3, "error": "Status conflict: approved"}]
             }
         }
         """
-        try:
-            data = req.json
-            
-            # Validate required fields
-            if not data.get('settlement_ids') or not data.get('approved_by'):
-                return json({
-                    'success': False,
-                    'error': 'Missing required fields',
-                    'message': 'settlement_ids and approved_by are required'
-                }, status=400)
-            
-            settlement_ids: List[int] = data['settlement_ids']
-            approved_by: int = data['approved_by']
-            
-            # Get database session
-            session_factory = DatabaseSessionFactory()
-            session = session_factory.get_session()
-            
-            try:
-                approved = 0
-                failed = 0
-                errors = []
-                
-                for settlement_id in settlement_ids:
-                    try:
-                        # Find settlement
-                        settlement = session.query(SettlementRecord).filter(
-                            SettlementRecord.id == settlement_id
-                        ).first()
-                        
-                        if not settlement:
-                            failed += 1
-                            errors.append({
-                                'settlement_id': settlement_id,
-                                'error': 'Settlement not found'
-                            })
-                            continue
-                        
-                        # Skip if already approved
-                        if settlement.status == 'approved':
-                            failed += 1
-                            errors.append({
-                                'settlement_id': settlement_id,
-                                'error': 'Already approved'
-                            })
-                            continue
-                        
-                        # Update settlement
-                        settlement.status = 'approved'
-                        settlement.approved_at = datetime.utcnow()
-                        settlement.approved_by = approved_by
-                        
-                        approved += 1
-                        
-                    except Exception as e:
-                        failed += 1
-                        errors.append({
-                            'settlement_id': settlement_id,
-                            'error': str(e)
-                        })
-                
-                session.commit()
-                
-                return json({
-                    'success': True,
-                    'data': {
-                        'total': len(settlement_ids),
-                        'approved': approved,
-                        'failed': failed,
-                        'errors': errors
-                    },
-                    'message': f'Bulk approval completed: {approved} approved, {failed} failed'
-                })
-                
-            finally:
-                session.close()
-                
-        except Exception as e:
-            logger.error(f"Failed to bulk approve settlements: {str(e)}")
+        data = req.json or {}
+        return _bulk_transition(
+            req, data, 'approve', req.current_user['user_id'], data.get('approval_remarks')
+        )
+    
+    
+    @bp.route('/bulk-reject', methods=['POST'])
+    @require_auth
+    @require_role(*APPROVER_ROLES)
+    async def bulk_reject_settlements(req: request.Request):
+        """
+        Bulk reject settlements selected by id or filter, as the authenticated user
+        
+        Request Body: as /bulk-approve, with
+        {
+            "rejection_reason": "Incorrect usage data"
+        }
+        """
+        data = req.json or {}
+        if not data.get('rejection_reason'):
             return json({
                 'success': False,
-                'error': 'Internal server error',
-                'message': str(e)
-            }, status=500)
+                'error': 'Missing required fields',
+                'message': 'rejection_reason is required'
+            }, status=400)
+        return _bulk_transition(
+            req, data, 'reject', req.current_user['user_id'], data['rejection_reason']
+        )
+
+
+def _single_transition(req: request.Request, record_id: int, action: str, actor_id: int, remarks):
+    """Approve/reject one settlement through the bulk workflow and build the response"""
+    try:
+        session_factory = DatabaseSessionFactory()
+        session = session_factory.get_session()
+        
+        try:
+            result = settlement_approval_service.bulk_transition(
+                session, action, actor_id, settlement_ids=[record_id], remarks=remarks, ip_address=req.ip
+            )
+        finally:
+            session.close()
+        
+    except (SettlementApprovalError, ValueError, TypeError) as e:
+        return json({
+            'success': False,
+            'error': 'Invalid request',
+            'message': str(e)
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Failed to {action} settlement: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
+    
+    outcome = result['outcomes'][0]
+    if outcome['outcome'] == NOT_FOUND:
+        raise NotFound("Settlement not found")
+    if outcome['outcome'] != UPDATED:
+        return json({
+            'success': False,
+            'error': 'Status conflict',
+            'message': f"Cannot {action} a settlement in status: {outcome['status']}"
+        }, status=409)
+    
+    done = 'approved' if action == 'approve' else 'rejected'
+    return json({
+        'success': True,
+        'data': {
+            'id': record_id,
+            'status': outcome['status'],
+            f'{done}_by': actor_id
+        },
+        'message': f'Settlement {done} successfully'
+    })
+
+
+def _bulk_transition(req: request.Request, data: dict, action: str, actor_id: int, remarks):
+    """Run a bulk approval/rejection and build the response"""
+    settlement_ids = data.get('settlement_ids')
+    filters = data.get('filter')
+    if not settlement_ids and not filters:
+        return json({
+            'success': False,
+            'error': 'Missing required fields',
+            'message': 'settlement_ids or filter is required'
+        }, status=400)
+    
+    try:
+        session_factory = DatabaseSessionFactory()
+        session = session_factory.get_session()
+        
+        try:
+            result = settlement_approval_service.bulk_transition(
+                session,
+                action,
+                actor_id,
+                settlement_ids=settlement_ids or None,
+                filters=filters if not settlement_ids else None,
+                from_statuses=data.get('from_statuses'),
+                remarks=remarks,
+                ip_address=req.ip
+            )
+        finally:
+            session.close()
+        
+        done = 'approved' if action == 'approve' else 'rejected'
+        failed = result['conflicts'] + result['not_found']
+        errors = [
+            {
+                'settlement_id': outcome['settlement_id'],
+                'error': 'Settlement not found' if outcome['outcome'] == NOT_FOUND
+                else f"Status conflict: {outcome['status']}"
+            }
+            for outcome in result['outcomes'] if outcome['outcome'] != UPDATED
+        ]
+        
+        return json({
+            'success': True,
+            'data': {
+                'total': result['total'],
+                done: result['updated'],
+                'failed': failed,
+                'conflicts': result['conflicts'],
+                'not_found': result['not_found'],
+                'outcomes': result['outcomes'],
+                'errors': errors
+            },
+            'message': f'Bulk {action} completed: {result["updated"]} {done}, {failed} failed'
+        })
+        
+    except (SettlementApprovalError, ValueError, TypeError) as e:
+        return json({
+            'success': False,
+            'error': 'Invalid request',
+            'message': str(e)
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Failed to bulk {action} settlements: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
@@ -8,9 +8,13 @@ import logging
 from datetime import datetime
 from decimal import Decimal
 
-from backend.models.database_models import SettlementRecord, PriceConfig, Customer
+from backend.models.database_models import SettlementRecord, Customer
 from backend.dao.database_dao import DatabaseSessionFactory
 from backend.services.settlement_service import SettlementService, SettlementCalculationError
+from backend.services.price_config_cache import price_config_cache
+from backend.services.price_versioning import EffectivePrice, PriceVersionIndex
+from backend.services.pricing_simulation import PricingSimulationError, TierTable, pricing_simulator
+from backend.api.settlement_approval import register_approval_routes
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +26,9 @@ async def generate_settlement(req: request.Request):
     """
     Generate settlement for customers
     
+    Back-dated periods are priced with the config versions in effect at
+    period_start.
+    
     Request Body:
     {
         "period_start": "2026-02-01",
@@ -77,6 +84,14 @@ async def generate_settlement(req: request.Request):
                 query = query.filter(Customer.id.in_(customer_ids))
             customers = query.all()
             
+            # Drop cached configs whose version changed outside the API
+            price_config_cache.revalidate(session)
+            
+            # Price versions of the run's customers, resolved in memory per customer
+            price_index = PriceVersionIndex.load(
+                session, [customer.id for customer in customers] if customer_ids else None
+            )
+            
             # Get settlement service
             settlement_service = SettlementService()
             
@@ -88,12 +103,12 @@ async def generate_settlement(req: request.Request):
             
             for customer in customers:
                 try:
-                    # Get customer's pricing config
-                    config_query = session.query(PriceConfig).filter(
-                        PriceConfig.customer_id == customer.id,
-                        PriceConfig.is_active == True
-                    )
-                    config = config_query.first()
+                    # Get the pricing in effect at the period start
+                    if price_index.has_history(customer.id):
+                        config = price_index.resolve_customer(customer.id, period_start)
+                    else:
+                        # Configs without version history: current pricing
+                        config = price_config_cache.get_active_config(session, customer.id)
                     
                     if not config:
                         logger.warning(f"No active pricing config for customer {customer.id}")
@@ -115,6 +130,8 @@ async def generate_settlement(req: request.Request):
                         period_start=period_start,
                         period_end=period_end
                     )
+                    if isinstance(config, EffectivePrice):
+                        calc_result['remarks'] = f"Price config {config.config_id} version {config.version_number}"
                     
                     # Create settlement record
                     settlement = settlement_service.create_settlement_record(
@@ -276,6 +293,121 @@ async def list_settlements(req: request.Request):
         }, status=500)
 
 
+@settlement_bp.route('/simulate', methods=['POST'])
+async def simulate_pricing(req: request.Request):
+    """
+    Re-rate historical settlements under a candidate pricing (nothing is written)
+    
+    Request Body:
+    {
+        "period_start": "2026-04-01",
+        "period_end": "2026-06-30",
+        "candidate": {  // Or "candidate_config_id": 12
+            "price_model": "tiered",
+            "tiers": [
+                {"min_quantity": 0, "max_quantity": 100, "unit_price": 0.10},
+                {"min_quantity": 100, "max_quantity": null, "unit_price": 0.08}
+            ]
+        },
+        "customer_ids": [1, 2, 3],  // Optional, default: all customers with settlements
+        "top": 100  // Optional, per-customer deltas to return (largest first)
+    }
+    
+    Returns:
+    {
+        "success": true,
+        "data": {
+            "candidate": {...},
+            "summary": {
+                "customers": 20000,
+                "old_total": 1250000.0,
+                "new_total": 1190000.0,
+                "delta_total": -60000.0,
+                "delta_pct_percentiles": {"p5": -12.5, "p50": -4.8, "p95": 2.1},
+                "delta_pct_histogram": [...]
+            },
+            "customers": [{"customer_id": 1, "old_total": 120.0, "new_total": 100.0, "delta": -20.0, "delta_pct": -16.67}]
+        }
+    }
+    """
+    try:
+        data = req.json or {}
+        
+        if not data.get('period_start') or not data.get('period_end'):
+            return json({
+                'success': False,
+                'error': 'Missing required fields',
+                'message': 'period_start and period_end are required'
+            }, status=400)
+        if not data.get('candidate') and not data.get('candidate_config_id'):
+            return json({
+                'success': False,
+                'error': 'Missing required fields',
+                'message': 'candidate or candidate_config_id is required'
+            }, status=400)
+        
+        try:
+            period_start = datetime.fromisoformat(data['period_start'])
+            period_end = datetime.fromisoformat(data['period_end'])
+        except ValueError:
+            return json({
+                'success': False,
+                'error': 'Invalid date format',
+                'message': 'Dates must be in ISO format (YYYY-MM-DD)'
+            }, status=400)
+        
+        top = data.get('top')
+        if top is not None and (type(top) is not int or top < 1):
+            return json({
+                'success': False,
+                'error': 'Invalid top',
+                'message': 'top must be a positive integer'
+            }, status=400)
+        
+        session_factory = DatabaseSessionFactory()
+        session = session_factory.get_session()
+        
+        try:
+            if data.get('candidate'):
+                table = TierTable.from_spec(data['candidate'])
+            else:
+                config = price_config_cache.get_config(session, int(data['candidate_config_id']))
+                if not config:
+                    raise NotFound("Pricing config not found")
+                table = TierTable.from_config(config)
+            
+            result = pricing_simulator.simulate(
+                session, table, period_start, period_end,
+                customer_ids=data.get('customer_ids') or None,
+                top=top
+            )
+            
+            return json({
+                'success': True,
+                'data': result,
+                'message': f"Simulated pricing for {result['summary']['customers']} customers"
+            })
+            
+        finally:
+            session.close()
+            
+    except NotFound:
+        raise
+    except PricingSimulationError as e:
+        return json({
+            'success': False,
+            'error': 'Invalid candidate pricing',
+            'message': str(e)
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Failed to simulate pricing: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
+
+
 @settlement_bp.route('/<record_id:int>', methods=['GET'])
 async def get_settlement(req: request.Request, record_id: int):
     """
@@ -334,3 +466,7 @@ async def get_settlement(req: request.Request, record_id: int):
             'error': 'Internal server error',
             'message': str(e)
         }, status=500)
+
+
+# Approval workflow routes (approve, reject, bulk-approve, bulk-reject)
+register_approval_routes(settlement_bp)
@@ -10,6 +10,10 @@ import os
 from datetime import datetime, timedelta
 
 from backend.utils.jwt import require_auth, require_role
+# Imported from the validation service, which registers the built-in rules
+from backend.services.settlement_validation_service import settlement_rule_engine
+from backend.services.price_config_cache import price_config_cache
+from backend.services.response_cache import response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -296,6 +300,136 @@ async def get_system_errors(req: request.Request):
         }, status=500)
 
 
+@system_monitor_bp.route('/validation-rules', methods=['GET'])
+@require_auth
+@require_role('admin')
+async def get_validation_rule_metrics(req: request.Request):
+    """
+    Get settlement validation rules with call counters and latency histograms
+    
+    Returns:
+    {
+        "success": true,
+        "data": {
+            "rules": {
+                "usage_spike": {
+                    "severity": "warning",
+                    "calls": 1200,
+                    "failures": 12,
+                    "exceptions": 0,
+                    "latency": {"count": 1200, "p50_ms": 0.05, "p95_ms": 0.1, ...}
+                }
+            },
+            "parameters": {...}
+        }
+    }
+    """
+    try:
+        return json({
+            'success': True,
+            'data': {
+                'rules': settlement_rule_engine.metrics(),
+                'parameters': {key: str(value) for key, value in settlement_rule_engine.parameters().items()},
+                'timestamp': datetime.utcnow().isoformat()
+            },
+            'message': 'Validation rule metrics retrieved successfully'
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to get validation rule metrics: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
+
+
+@system_monitor_bp.route('/price-config-cache', methods=['GET'])
+@require_auth
+@require_role('admin')
+async def get_price_config_cache_metrics(req: request.Request):
+    """
+    Get price config cache hit/miss counters
+    
+    Returns:
+    {
+        "success": true,
+        "data": {
+            "hits": 15000,
+            "redis_hits": 120,
+            "misses": 40,
+            "hit_ratio": 0.9974,
+            "evictions": 0,
+            "invalidations": 6,
+            "stale_versions": 1,
+            "size": 812,
+            "shared": true
+        }
+    }
+    """
+    try:
+        metrics = price_config_cache.metrics()
+        metrics['timestamp'] = datetime.utcnow().isoformat()
+        
+        return json({
+            'success': True,
+            'data': metrics,
+            'message': 'Price config cache metrics retrieved successfully'
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to get price config cache metrics: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
+
+
+
+@system_monitor_bp.route('/response-cache', methods=['GET'])
+@require_auth
+@require_role('admin')
+async def get_response_cache_metrics(req: request.Request):
+    """
+    Get dashboard/analytics response cache counters
+    
+    Returns:
+    {
+        "success": true,
+        "data": {
+            "hits": 5200,
+            "stale_hits": 310,
+            "coalesced": 45,
+            "misses": 120,
+            "not_modified": 2400,
+            "hit_ratio": 0.9787,
+            "refreshes": 300,
+            "invalidations": 18,
+            "generations": {"settlements": 12, "customers": 6},
+            "size": 64,
+            "shared": true
+        }
+    }
+    """
+    try:
+        metrics = response_cache.metrics()
+        metrics['timestamp'] = datetime.utcnow().isoformat()
+        
+        return json({
+            'success': True,
+            'data': metrics,
+            'message': 'Response cache metrics retrieved successfully'
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to get response cache metrics: {str(e)}")
+        return json({
+            'success': False,
+            'error': 'Internal server error',
+            'message': str(e)
+        }, status=500)
+
 def check_service_status(service_name: str) -> str:
     """
     Check if a service is running
@@ -6,9 +6,10 @@ from sanic.exceptions import NotFound, BadRequest, Forbidden
 from typing import Optional
 import logging
 
-from backend.models.database_models import SystemParameter
+from backend.models.system_parameters import SystemParameter
 from backend.dao.database_dao import DatabaseSessionFactory
 from backend.utils.jwt import require_auth, require_role
+from backend.services.settlement_rule_engine import settlement_rule_engine
 
 logger = logging.getLogger(__name__)
 
@@ -173,6 +174,10 @@ async def update_system_parameter(req: request.Request, param_key: str):
             session.commit()
             session.refresh(parameter)
             
+            # Validation rules re-read their parameters on the next run
+            if param_key.startswith('validation_'):
+                settlement_rule_engine.invalidate_parameters()
+            
             return json({
                 'success': True,
                 'data': {
@@ -222,6 +227,12 @@ async def initialize_system_parameters(req: request.Request):
                 {'key': 'settlement_cycle', 'value': 'monthly', 'value_type': 'string', 'description': 'Settlement cycle: daily, weekly, monthly, quarterly, yearly', 'category': 'settlement'},
                 {'key': 'settlement_day', 'value': '1', 'value_type': 'integer', 'description': 'Day of month for settlement (1-28)', 'category': 'settlement'},
                 
+                # Settlement validation rule parameters
+                {'key': 'validation_usage_spike_percent', 'value': '50', 'value_type': 'decimal', 'description': 'Usage increase over the previous period that raises a warning (%)', 'category': 'settlement'},
+                {'key': 'validation_usage_drop_percent', 'value': '50', 'value_type': 'decimal', 'description': 'Usage decrease from the previous period that raises a warning (%)', 'category': 'settlement'},
+                {'key': 'validation_price_tolerance_percent', 'value': '1', 'value_type': 'decimal', 'description': 'Allowed unit price deviation from the price config (%)', 'category': 'settlement'},
+                {'key': 'validation_amount_tolerance', 'value': '0.01', 'value_type': 'decimal', 'description': 'Allowed difference between total amount and usage x unit price', 'category': 'settlement'},
+                
                 # Warning parameters
                 {'key': 'overdue_warning_days', 'value': '30', 'value_type': 'integer', 'description': 'Days before payment is considered overdue', 'category': 'warning'},
                 {'key': 'overdue_critical_days', 'value': '60', 'value_type': 'integer', 'description': 'Days before payment is critically overdue', 'category': 'warning'},
@@ -265,6 +276,7 @@ async def initialize_system_parameters(req: request.Request):
                     created.append(param_data['key'])
             
             session.commit()
+            settlement_rule_engine.invalidate_parameters()
             
             return json({
                 'success': True,
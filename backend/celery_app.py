@@ -1,17 +1,98 @@
 # OP_CMS Celery Configuration
 # Story 7.5: Celery Async Tasks Integration
 
+"""
+Celery application, queue topology and worker profiles
+
+Every task is routed to a dedicated queue so heavy work never starves
+latency sensitive work:
+
+    notifications  e-mail and message sends (short, latency sensitive)
+    settlements    settlement runs
+    imports        customer imports
+    exports        data exports (long running, memory heavy)
+    maintenance    backups and cleanup (scheduled)
+    default        fallback for tasks without a route
+
+Prefetch, concurrency and autoscaling are per worker process in Celery, so
+they are defined as worker profiles (WORKER_PROFILES): each profile is one
+worker consuming a set of queues, started with
+``python backend/scripts/start_celery_worker.py <profile>``.
+
+``check_task_routes`` verifies every registered task has a route and every
+beat entry names a registered task; workers run it at startup.
+"""
+
+import os
+from fnmatch import fnmatch
+from typing import Any, Dict, List
+
 from celery import Celery
 from celery.schedules import crontab
-import os
+from celery.signals import worker_init
+from kombu import Exchange, Queue
+
+BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 
 # Celery configuration
 celery_app = Celery(
     'op_cms',
-    broker=os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+    broker=BROKER_URL,
     backend=os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
 )
 
+# Priority levels: Redis treats 0 as the highest priority, AMQP treats the
+# highest number as the highest priority
+MAX_PRIORITY = 9
+if BROKER_URL.startswith('redis'):
+    PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW = 0, 5, 9
+else:
+    PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW = 9, 5, 0
+
+DEFAULT_QUEUE = 'default'
+
+# Queue names
+QUEUES = ['notifications', 'settlements', 'imports', 'exports', 'maintenance', DEFAULT_QUEUE]
+
+# Task routes (task name or glob pattern -> queue and priority)
+TASK_ROUTES: Dict[str, Dict[str, Any]] = {
+    'backend.tasks.send_email_notification': {'queue': 'notifications', 'priority': PRIORITY_HIGH},
+    # Nightly bulk run; kept off the notifications workers so single sends stay fast
+    'backend.tasks.dispatch_overdue_reminders_task': {'queue': 'maintenance', 'priority': PRIORITY_NORMAL},
+    'backend.tasks.*settlement*': {'queue': 'settlements', 'priority': PRIORITY_NORMAL},
+    'backend.tasks.auto_writeoff_task': {'queue': 'settlements', 'priority': PRIORITY_NORMAL},
+    'backend.tasks.rebuild_customer_balances_task': {'queue': 'maintenance', 'priority': PRIORITY_NORMAL},
+    'backend.tasks.archive_partitions_task': {'queue': 'maintenance', 'priority': PRIORITY_LOW},
+    'backend.tasks.import_customers_task': {'queue': 'imports', 'priority': PRIORITY_NORMAL},
+    'backend.tasks.export_customers_task': {'queue': 'exports', 'priority': PRIORITY_NORMAL},
+    'backend.tasks.export_dataset_task': {'queue': 'exports', 'priority': PRIORITY_LOW},
+    'backend.tasks.daily_backup_task': {'queue': 'maintenance', 'priority': PRIORITY_NORMAL},
+    'backend.tasks.cleanup_old_tasks': {'queue': 'maintenance', 'priority': PRIORITY_LOW},
+}
+
+# Worker profiles: one worker process per profile
+#   queues: queues consumed by the worker
+#   prefetch_multiplier: messages reserved per process (1 for long tasks)
+#   concurrency: fixed pool size (used when autoscale is not set)
+#   autoscale: (max, min) pool size
+WORKER_PROFILES: Dict[str, Dict[str, Any]] = {
+    'notifications': {'queues': ['notifications'], 'prefetch_multiplier': 4, 'autoscale': (8, 2)},
+    'settlements': {'queues': ['settlements'], 'prefetch_multiplier': 1, 'autoscale': (4, 1)},
+    'imports': {'queues': ['imports'], 'prefetch_multiplier': 1, 'autoscale': (4, 1)},
+    'exports': {'queues': ['exports'], 'prefetch_multiplier': 1, 'autoscale': (2, 1)},
+    'maintenance': {'queues': ['maintenance', DEFAULT_QUEUE], 'prefetch_multiplier': 1, 'concurrency': 1},
+    # Development: a single worker for every queue
+    'all': {'queues': QUEUES, 'prefetch_multiplier': 1, 'concurrency': 4},
+}
+
+
+class CeleryConfigError(Exception):
+    """Custom exception for Celery configuration errors"""
+    pass
+
+
+_exchange = Exchange('op_cms', type='direct')
+
 # Load configuration from environment
 celery_app.conf.update(
     task_serializer='json',
@@ -24,20 +105,52 @@ celery_app.conf.update(
     task_soft_time_limit=3300,  # 55 minutes soft limit
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=100,
-    
-    # Task routes
-    task_routes={
-        'backend.tasks.import_customers': {'queue': 'import'},
-        'backend.tasks.export_customers': {'queue': 'export'},
-        'backend.tasks.send_email': {'queue': 'email'},
+
+    # Queue topology
+    task_queues=[
+        Queue(name, _exchange, routing_key=name, queue_arguments={'x-max-priority': MAX_PRIORITY + 1})
+        for name in QUEUES
+    ],
+    task_default_queue=DEFAULT_QUEUE,
+    task_default_exchange='op_cms',
+    task_default_routing_key=DEFAULT_QUEUE,
+    task_default_priority=PRIORITY_NORMAL,
+    task_queue_max_priority=MAX_PRIORITY + 1,
+    broker_transport_options={
+        # Redis emulates priorities with one list per priority step
+        'priority_steps': list(range(MAX_PRIORITY + 1)),
+        'sep': ':',
+        'queue_order_strategy': 'priority',
     },
-    
+
+    # Task routes
+    task_routes=[{
+        pattern: dict(route, exchange='op_cms', routing_key=route['queue'])
+        for pattern, route in TASK_ROUTES.items()
+    }],
+
     # Scheduled tasks
     beat_schedule={
+        'auto-writeoff': {
+            'task': 'backend.tasks.auto_writeoff_task',
+            'schedule': crontab(hour=0, minute=30),  # 0:30 AM daily, before reminders
+        },
+        'customer-balances': {
+            'task': 'backend.tasks.rebuild_customer_balances_task',
+            'schedule': crontab(hour=0, minute=45),  # 0:45 AM daily, after write-off
+        },
+        'overdue-reminders': {
+            'task': 'backend.tasks.dispatch_overdue_reminders_task',
+            'schedule': crontab(hour=1, minute=0),  # 1 AM daily
+        },
         'daily-backup': {
-            'task': 'backend.tasks.daily_backup',
+            'task': 'backend.tasks.daily_backup_task',
             'schedule': crontab(hour=2, minute=0),  # 2 AM daily
         },
+        'archive-partitions': {
+            'task': 'backend.tasks.archive_partitions_task',
+            'schedule': crontab(hour=3, minute=30, day_of_month=1),  # 3:30 AM on the 1st, after the backup
+        },
         'cleanup-old-tasks': {
             'task': 'backend.tasks.cleanup_old_tasks',
             'schedule': crontab(hour=3, minute=0, day_of_week=0),  # 3 AM every Sunday
@@ -47,3 +160,83 @@ celery_app.conf.update(
 
 # Auto-discover tasks in installed apps
 celery_app.autodiscover_tasks(['backend.tasks'])
+
+
+def route_for(task_name: str) -> Dict[str, Any]:
+    """
+    Look up the route of a task (exact names take precedence over patterns)
+
+    Returns:
+        Route with queue and priority, or an empty dict if unrouted
+    """
+    if task_name in TASK_ROUTES:
+        return TASK_ROUTES[task_name]
+    for pattern, route in TASK_ROUTES.items():
+        if fnmatch(task_name, pattern):
+            return route
+    return {}
+
+
+def check_task_routes(app: Celery = None) -> None:
+    """
+    Verify the routing table covers every registered task
+
+    Raises:
+        CeleryConfigError: A task has no route, a route names an unknown
+            queue, or a beat entry names an unregistered task
+    """
+    app = app or celery_app
+    app.loader.import_default_modules()
+    task_names = [name for name in app.tasks if not name.startswith('celery.')]
+
+    problems: List[str] = []
+    for name in sorted(task_names):
+        route = route_for(name)
+        if not route:
+            problems.append(f"task {name} has no route")
+        elif route['queue'] not in QUEUES:
+            problems.append(f"task {name} routes to unknown queue {route['queue']}")
+    for entry, schedule in app.conf.beat_schedule.items():
+        if schedule['task'] not in app.tasks:
+            problems.append(f"beat entry {entry} runs unregistered task {schedule['task']}")
+
+    if problems:
+        raise CeleryConfigError("Invalid Celery routing: " + '; '.join(problems))
+
+
+def worker_argv(profile: str) -> List[str]:
+    """
+    Build the ``celery worker`` arguments of a worker profile
+
+    Args:
+        profile: Name in WORKER_PROFILES
+
+    Returns:
+        Arguments for ``celery_app.worker_main``
+    """
+    settings = WORKER_PROFILES.get(profile)
+    if settings is None:
+        raise CeleryConfigError(
+            f"Unknown worker profile: {profile}. Must be one of {', '.join(WORKER_PROFILES)}"
+        )
+
+    argv = [
+        'worker',
+        '--loglevel=info',
+        f"--hostname={profile}@%h",
+        f"--queues={','.join(settings['queues'])}",
+        f"--prefetch-multiplier={settings['prefetch_multiplier']}",
+        # Hand tasks only to idle processes so a long task never holds a reserved one
+        '-O', 'fair',
+    ]
+    if settings.get('autoscale'):
+        argv.append(f"--autoscale={settings['autoscale'][0]},{settings['autoscale'][1]}")
+    else:
+        argv.append(f"--concurrency={settings.get('concurrency', 1)}")
+    return argv
+
+
+@worker_init.connect
+def _check_routes_on_worker_start(sender=None, **kwargs):
+    """Refuse to start a worker with an incomplete routing table"""
+    check_task_routes(getattr(sender, 'app', None))
@@ -208,12 +208,22 @@ class DatabaseSessionFactory:
         from sqlalchemy import create_engine
         from sqlalchemy.orm import sessionmaker
         
-        self.engine = create_engine(self.connection_string, pool_pre_ping=True)
+        # Balance and write-off recomputes read after taking row locks and must see
+        # rows committed while they waited (InnoDB defaults to REPEATABLE READ)
+        engine_options = {}
+        if self.connection_string.startswith('mysql'):
+            engine_options['isolation_level'] = 'READ COMMITTED'
+        self.engine = create_engine(self.connection_string, pool_pre_ping=True, **engine_options)
         self.SessionLocal = sessionmaker(
             autocommit=False,
             autoflush=False,
             bind=self.engine
         )
+        
+        # Keep derived data in step with committed writes: customer balances,
+        # customer stat counters and the price config, FX rate and response caches
+        from ..services.session_tracking import track_sessions
+        track_sessions(self.SessionLocal)
     
     def get_session(self) -> Session:
         """Get database session"""
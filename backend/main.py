@@ -14,12 +14,16 @@ Development:
 from sanic import Sanic
 from sanic_cors import CORS
 from sanic_ext import Extend
+import asyncio
 import logging
 
 from backend.api.customers import customer_bp
 from backend.api.auth import auth_bp
 from backend.api.pricing import pricing_bp
 from backend.api.settlements import settlement_bp
+from backend.api.fx_rates import fx_rate_bp
+from backend.dao.database_dao import DatabaseSessionFactory
+from backend.services.company_name_matcher import INDEX_SYNC_INTERVAL, company_name_index
 
 # Configure logging
 logging.basicConfig(
@@ -81,6 +85,7 @@ app.blueprint(customer_bp, url_prefix="/api/v1")
 app.blueprint(auth_bp, url_prefix="/api/v1")
 app.blueprint(pricing_bp, url_prefix="/api/v1")
 app.blueprint(settlement_bp, url_prefix="/api/v1")
+app.blueprint(fx_rate_bp, url_prefix="/api/v1")
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
@@ -106,10 +111,38 @@ async def root(request):
         }
     }
 
+def _database_session():
+    return DatabaseSessionFactory().get_session()
+
+
+async def sync_company_name_index():
+    """Catch the company name index up with customers written by other workers and save it"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(INDEX_SYNC_INTERVAL)
+        if not company_name_index.is_ready:
+            continue
+        try:
+            await loop.run_in_executor(None, company_name_index.sync, _database_session)
+        except Exception as e:
+            logger.warning(f"Failed to sync company name index: {str(e)}")
+
 @app.before_server_start
 async def before_server_start(app, loop):
     """Initialize before server starts"""
     logger.info("Starting OP_CMS Backend Server...")
+    
+    # Warm start the company name matching index from its last saved snapshot,
+    # then catch up with customers created since it was saved
+    try:
+        if await loop.run_in_executor(None, company_name_index.load):
+            await loop.run_in_executor(None, company_name_index.sync, _database_session)
+        else:
+            logger.info("No company name index snapshot found; fuzzy matching uses SQL LIKE until it is built")
+    except Exception as e:
+        logger.warning(f"Failed to load company name index: {str(e)}")
+    app.add_task(sync_company_name_index())
+    
     logger.info("="*60)
     logger.info("Service Information:")
     logger.info(f"  - Name: OP_CMS Backend API")
@@ -0,0 +1,51 @@
+"""Add durable batch task store - Story 6.4
+
+Revision ID: 006_batch_tasks
+Revises: 005_version_control
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006_batch_tasks'
+down_revision = '005_version_control'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create batch_tasks table shared by API workers and Celery processes
+    op.create_table('batch_tasks',
+        sa.Column('id', sa.String(36), nullable=False, comment='Task ID (UUID)'),
+        sa.Column('task_type', sa.String(30), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False, comment='Owner user ID'),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+
+        # Progress
+        sa.Column('progress', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_records', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('processed_records', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('successful_records', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed_records', sa.Integer(), nullable=False, server_default='0'),
+
+        # Result
+        sa.Column('result_url', sa.String(500), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('cancelled', sa.Boolean(), nullable=False, server_default=sa.false()),
+
+        # Timestamps
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+
+        sa.PrimaryKeyConstraint('id'),
+        sa.Index('idx_batch_task_user_created', 'user_id', 'created_at'),
+        sa.Index('idx_batch_task_status_created', 'status', 'created_at'),
+        sa.Index('idx_batch_task_completed', 'completed_at')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('batch_tasks')
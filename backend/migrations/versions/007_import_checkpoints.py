@@ -0,0 +1,46 @@
+"""Add import checkpoints for resumable async imports - Story 6.2
+
+Revision ID: 007_import_checkpoints
+Revises: 006_batch_tasks
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_import_checkpoints'
+down_revision = '006_batch_tasks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create import_checkpoints table (written in the same transaction as each chunk)
+    op.create_table('import_checkpoints',
+        sa.Column('import_id', sa.String(64), nullable=False, comment='Batch task ID or Celery task ID'),
+        sa.Column('file_name', sa.String(255), nullable=True, comment='Original upload file name'),
+        sa.Column('import_mode', sa.String(30), nullable=False, server_default='skip_duplicates'),
+        sa.Column('status', sa.String(20), nullable=False, server_default='processing'),
+
+        # Position and counters as of the last committed chunk
+        sa.Column('last_committed_row', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_estimate', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('imported', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('skipped', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('chunks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+
+        # Timestamps
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+
+        sa.PrimaryKeyConstraint('import_id'),
+        sa.Index('idx_import_checkpoint_status_updated', 'status', 'updated_at')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('import_checkpoints')
@@ -0,0 +1,51 @@
+"""Add reminder records and overdue dispatch indexes - Story 3.5
+
+Revision ID: 008_reminder_dispatch
+Revises: 007_import_checkpoints
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_reminder_dispatch'
+down_revision = '007_import_checkpoints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # reminder_records was created outside migrations on some installations
+    if 'reminder_records' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('reminder_records',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('reminder_no', sa.String(36), nullable=False, comment='Reminder number (UUID)'),
+            sa.Column('settlement_id', sa.Integer(), nullable=False, comment='Settlement ID'),
+            sa.Column('customer_id', sa.Integer(), nullable=False, comment='Customer ID'),
+            sa.Column('reminder_type', sa.String(20), nullable=False, comment='Reminder type: email, sms, phone'),
+            sa.Column('reminder_method', sa.String(50), nullable=True),
+            sa.Column('recipient', sa.String(255), nullable=False, comment='Recipient (email or phone)'),
+            sa.Column('reminder_content', sa.Text(), nullable=True),
+            sa.Column('send_status', sa.String(20), nullable=False, server_default='pending'),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.Column('reminder_count', sa.Integer(), nullable=True, server_default='1'),
+            sa.Column('created_by', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['settlement_id'], ['settlement_records.id']),
+            sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+            sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('reminder_no')
+        )
+
+    # Overdue range scan: status IN (...) AND created_at < cutoff
+    op.create_index('idx_settlement_status_created', 'settlement_records', ['status', 'created_at'])
+
+    # Last reminder per settlement
+    op.create_index('idx_reminder_settlement_created', 'reminder_records', ['settlement_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_reminder_settlement_created', table_name='reminder_records')
+    op.drop_index('idx_settlement_status_created', table_name='settlement_records')
@@ -0,0 +1,58 @@
+"""Add materialized customer balances - Story 3.4
+
+Revision ID: 009_customer_balances
+Revises: 008_reminder_dispatch
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_customer_balances'
+down_revision = '008_reminder_dispatch'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create customer_balances table (populate with backend/scripts/rebuild_customer_balances.py)
+    money = sa.DECIMAL(14, 2)
+    op.create_table('customer_balances',
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+
+        # Lifetime totals
+        sa.Column('total_billed', money, nullable=False, server_default='0'),
+        sa.Column('total_paid', money, nullable=False, server_default='0'),
+        sa.Column('total_written_off', money, nullable=False, server_default='0'),
+
+        # Open receivables
+        sa.Column('open_amount', money, nullable=False, server_default='0'),
+        sa.Column('open_settlements', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unapplied_amount', money, nullable=False, server_default='0'),
+
+        # Aging buckets
+        sa.Column('current_amount', money, nullable=False, server_default='0'),
+        sa.Column('overdue_1_30', money, nullable=False, server_default='0'),
+        sa.Column('overdue_31_60', money, nullable=False, server_default='0'),
+        sa.Column('overdue_61_90', money, nullable=False, server_default='0'),
+        sa.Column('overdue_90_plus', money, nullable=False, server_default='0'),
+        sa.Column('oldest_open_at', sa.DateTime(), nullable=True),
+
+        # Last activity
+        sa.Column('last_settlement_at', sa.DateTime(), nullable=True),
+        sa.Column('last_payment_at', sa.DateTime(), nullable=True),
+        sa.Column('last_writeoff_at', sa.DateTime(), nullable=True),
+
+        # Timestamps
+        sa.Column('aged_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id']),
+        sa.PrimaryKeyConstraint('customer_id'),
+        sa.Index('idx_customer_balance_open', 'open_amount')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('customer_balances')
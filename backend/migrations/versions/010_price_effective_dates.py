@@ -0,0 +1,55 @@
+"""Add effective dates to price config versions - Story 2.4
+
+Revision ID: 010_price_effective_dates
+Revises: 009_customer_balances
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010_price_effective_dates'
+down_revision = '009_customer_balances'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Versions apply from effective_from until the next version's effective_from
+    op.add_column('price_config_versions',
+        sa.Column('effective_from', sa.DateTime(), nullable=True,
+                  comment='Time from which this version applies')
+    )
+
+    # Existing versions took effect when they were written
+    op.execute("UPDATE price_config_versions SET effective_from = COALESCE(created_at, CURRENT_TIMESTAMP)")
+
+    # Configs without history get their current state as a version effective since creation
+    op.execute("""
+        INSERT INTO price_config_versions (
+            version_id, config_id, version_number, name, description, price_model, device_series,
+            currency, unit_price, pricing_rules, is_active, change_reason, effective_from, created_at
+        )
+        SELECT
+            UUID(), c.id, COALESCE(c.current_version_number, 1), c.name, c.description, c.price_model,
+            c.device_series, COALESCE(c.currency, 'CNY'), c.unit_price, c.pricing_rules, c.is_active,
+            'Baseline version', COALESCE(c.created_at, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP
+        FROM price_configs c
+        WHERE NOT EXISTS (SELECT 1 FROM price_config_versions v WHERE v.config_id = c.id)
+    """)
+
+    op.alter_column('price_config_versions', 'effective_from',
+        existing_type=sa.DateTime(), nullable=False,
+        existing_comment='Time from which this version applies'
+    )
+
+    op.create_index('idx_version_config_effective', 'price_config_versions', ['config_id', 'effective_from'])
+
+
+def downgrade() -> None:
+    # Drop index
+    op.drop_index('idx_version_config_effective', table_name='price_config_versions')
+
+    # Drop column (baseline versions are kept)
+    op.drop_column('price_config_versions', 'effective_from')
@@ -0,0 +1,39 @@
+"""Add dated exchange rates - Story 4.1
+
+Revision ID: 011_exchange_rates
+Revises: 010_price_effective_dates
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_exchange_rates'
+down_revision = '010_price_effective_dates'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create exchange_rates table (one row per currency, base currency and effective date)
+    op.create_table('exchange_rates',
+        sa.Column('id', sa.Integer(), nullable=False, autoincrement=True),
+        sa.Column('currency', sa.String(length=3), nullable=False, comment='Quoted currency code'),
+        sa.Column('base_currency', sa.String(length=3), nullable=False, comment='Currency the rate is expressed in'),
+        sa.Column('rate', sa.DECIMAL(18, 8), nullable=False, comment='Base currency units per unit of currency'),
+        sa.Column('effective_date', sa.Date(), nullable=False, comment='Date from which the rate applies'),
+        sa.Column('source', sa.String(length=50), nullable=True, comment='Rate source, e.g. PBOC'),
+        sa.Column('created_at', sa.DateTime(), nullable=True, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('currency', 'base_currency', 'effective_date', name='uq_exchange_rate_date'),
+        sa.Index('idx_exchange_rate_base', 'base_currency', 'currency', 'effective_date')
+    )
+
+    # Settlement totals are grouped by currency and billing date before conversion
+    op.create_index('idx_settlement_currency_period', 'settlement_records', ['currency', 'period_end'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_settlement_currency_period', table_name='settlement_records')
+    op.drop_table('exchange_rates')
@@ -0,0 +1,46 @@
+"""Add customer distribution counters - Story 4.1
+
+Revision ID: 012_customer_stat_counters
+Revises: 011_exchange_rates
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_customer_stat_counters'
+down_revision = '011_exchange_rates'
+branch_labels = None
+depends_on = None
+
+# (dimension, customers column, label of missing values) as in backend.services.customer_stats
+DIMENSIONS = (
+    ('industry', 'industry', '未分类'),
+    ('region', 'province', '未分类'),
+    ('level', 'level', 'standard'),
+)
+
+
+def upgrade() -> None:
+    # Create customer_stat_counters table
+    op.create_table('customer_stat_counters',
+        sa.Column('dimension', sa.String(length=20), nullable=False, comment='Dimension: industry, region, level'),
+        sa.Column('value', sa.String(length=100), nullable=False, comment="Dimension value (missing values use the dimension's label)"),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.PrimaryKeyConstraint('dimension', 'value')
+    )
+
+    # Backfill from the customers table
+    for dimension, column, label in DIMENSIONS:
+        op.execute(f"""
+            INSERT INTO customer_stat_counters (dimension, value, count, updated_at)
+            SELECT '{dimension}', COALESCE(NULLIF({column}, ''), '{label}') AS value, COUNT(*), CURRENT_TIMESTAMP
+            FROM customers
+            GROUP BY COALESCE(NULLIF({column}, ''), '{label}')
+        """)
+
+
+def downgrade() -> None:
+    op.drop_table('customer_stat_counters')
@@ -0,0 +1,125 @@
+"""Add monthly access log partitions and archive tables - Story 5.3
+
+Revision ID: 013_partitioning_archive
+Revises: 012_customer_stat_counters
+Create Date: 2026-10-19
+
+access_logs is partitioned by month on created_at (MySQL). InnoDB does not
+support foreign keys on partitioned tables, so the access_logs -> users
+foreign key is dropped and the primary key becomes (id, created_at).
+
+settlement_records is referenced by settlement_writeoffs and
+reminder_records and stays unpartitioned; closed settlements are moved to
+settlement_records_archive (with their write-offs and reminders) instead.
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_partitioning_archive'
+down_revision = '012_customer_stat_counters'
+branch_labels = None
+depends_on = None
+
+# (live table, archive table, archive indexes) as in backend.models.archive_models
+ARCHIVES = (
+    ('settlement_records', 'settlement_records_archive', (
+        ('idx_settlement_archive_customer', ['customer_id']),
+        ('idx_settlement_archive_created', ['created_at']),
+        ('idx_settlement_archive_period', ['period_start', 'period_end']),
+    )),
+    ('settlement_writeoffs', 'settlement_writeoffs_archive', (
+        ('idx_writeoff_archive_settlement', ['settlement_id']),
+        ('idx_writeoff_archive_payment', ['payment_id']),
+    )),
+    ('reminder_records', 'reminder_records_archive', (
+        ('idx_reminder_archive_settlement', ['settlement_id']),
+    )),
+    ('access_logs', 'access_logs_archive', (
+        ('idx_access_logs_archive_created', ['created_at']),
+        ('idx_access_logs_archive_user', ['user_id']),
+    )),
+)
+
+# Monthly partitions created ahead of the current month
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partitions(first: datetime, last: datetime) -> str:
+    """Monthly partitions pYYYYMM from first to last, then p_future"""
+    definitions = []
+    month = datetime(first.year, first.month, 1)
+    while month <= last:
+        definitions.append(
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{_add_months(month, 1):%Y-%m-%d}'))"
+        )
+        month = _add_months(month, 1)
+    definitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return ',\n            '.join(definitions)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # Create archive tables with the columns of their live tables
+    for live, archive, indexes in ARCHIVES:
+        columns = [
+            sa.Column(column['name'], column['type'], nullable=column['nullable'], autoincrement=False,
+                      comment=column.get('comment'))
+            for column in inspector.get_columns(live)
+        ]
+        op.create_table(archive,
+            *columns,
+            sa.Column('archived_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP'),
+                      comment='Archive timestamp'),
+            sa.PrimaryKeyConstraint('id'),
+            *[sa.Index(name, *index_columns) for name, index_columns in indexes],
+            comment=f'Archived rows of {live}',
+            mysql_row_format='COMPRESSED'
+        )
+
+    if bind.dialect.name != 'mysql':
+        return
+
+    # Partition access_logs by month: no foreign keys, created_at in the primary key
+    for foreign_key in inspector.get_foreign_keys('access_logs'):
+        op.drop_constraint(foreign_key['name'], 'access_logs', type_='foreignkey')
+    op.execute("UPDATE access_logs SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.execute("""
+        ALTER TABLE access_logs
+            MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, created_at)
+    """)
+
+    now = datetime.utcnow()
+    first = bind.execute(sa.text("SELECT MIN(created_at) FROM access_logs")).scalar() or now
+    op.execute(f"""
+        ALTER TABLE access_logs PARTITION BY RANGE (TO_DAYS(created_at)) (
+            {_partitions(first, _add_months(datetime(now.year, now.month, 1), PARTITIONS_AHEAD))}
+        )
+    """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'mysql':
+        op.execute("ALTER TABLE access_logs REMOVE PARTITIONING")
+        op.execute("""
+            ALTER TABLE access_logs
+                MODIFY created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (id)
+        """)
+        op.create_foreign_key(None, 'access_logs', 'users', ['user_id'], ['id'])
+
+    for _, archive, _ in reversed(ARCHIVES):
+        op.drop_table(archive)
@@ -0,0 +1,66 @@
+# OP_CMS Archive Models
+# Story 5.3: Operation Audit Log - archival tier
+
+"""
+Archive tables of the settlement and access log tables
+
+Each archive table has the columns of its live table (same names and
+types, no foreign keys or unique constraints) plus ``archived_at``.
+Rows keep their primary key when moved, so live and archived rows never
+collide. backend.services.archive_tier moves the rows and unions the
+archive back into queries that reach back far enough.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Table
+
+from backend.models.auth import AccessLog
+from backend.models.database_models import Base, SettlementRecord
+from backend.models.payment_models import SettlementWriteoff
+from backend.models.reminder_models import ReminderRecord
+
+
+def _archive_of(live: Table, name: str, *indexes: Index) -> Table:
+    """Archive table with the columns of a live table"""
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+               autoincrement=False, comment=column.comment)
+        for column in live.columns
+    ]
+    return Table(
+        name, Base.metadata,
+        *columns,
+        Column('archived_at', DateTime, nullable=False, default=datetime.utcnow, comment="Archive timestamp"),
+        *indexes,
+        comment=f"Archived rows of {live.name}",
+        mysql_row_format='COMPRESSED'
+    )
+
+
+# Closed settlements moved out of settlement_records
+settlement_records_archive = _archive_of(
+    SettlementRecord.__table__, 'settlement_records_archive',
+    Index('idx_settlement_archive_customer', 'customer_id'),
+    Index('idx_settlement_archive_created', 'created_at'),
+    Index('idx_settlement_archive_period', 'period_start', 'period_end'),
+)
+
+# Write-offs and reminders of archived settlements
+settlement_writeoffs_archive = _archive_of(
+    SettlementWriteoff.__table__, 'settlement_writeoffs_archive',
+    Index('idx_writeoff_archive_settlement', 'settlement_id'),
+    # Payments stay live; the write-off matcher sums their archived write-offs
+    Index('idx_writeoff_archive_payment', 'payment_id'),
+)
+reminder_records_archive = _archive_of(
+    ReminderRecord.__table__, 'reminder_records_archive',
+    Index('idx_reminder_archive_settlement', 'settlement_id'),
+)
+
+# Access log rows of dropped access_logs partitions
+access_logs_archive = _archive_of(
+    AccessLog.__table__, 'access_logs_archive',
+    Index('idx_access_logs_archive_created', 'created_at'),
+    Index('idx_access_logs_archive_user', 'user_id'),
+)
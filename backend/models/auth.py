@@ -37,7 +37,7 @@ class User(Base):
     
     # Relationships
     access_logs = relationship("AccessLog", back_populates="user")
-    customer_access = relationship("CustomerAccess", back_populates="user")
+    customer_access = relationship("CustomerAccess", back_populates="user", foreign_keys="CustomerAccess.user_id")
     
     def set_password(self, password: str):
         """Hash and set password"""
@@ -72,7 +72,12 @@ class User(Base):
 
 
 class AccessLog(Base):
-    """Access log for audit trail"""
+    """Access log for audit trail
+
+    On MySQL the table is partitioned by month on created_at (migration
+    013), without the users foreign key and with primary key
+    (id, created_at); old months move to access_logs_archive.
+    """
     __tablename__ = 'access_logs'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -0,0 +1,42 @@
+# OP_CMS Batch Task Models
+# Story 6.4: Batch Processing - durable task store
+
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index
+from datetime import datetime
+
+from backend.models.database_models import Base
+
+
+class BatchTaskRecord(Base):
+    """Persisted batch task state shared by all API workers and Celery processes"""
+    __tablename__ = 'batch_tasks'
+
+    id = Column(String(36), primary_key=True, comment="Task ID (UUID)")
+    task_type = Column(String(30), nullable=False, comment="Task type: import, export, update, delete, ...")
+    user_id = Column(Integer, nullable=False, comment="Owner user ID")
+    status = Column(String(20), nullable=False, default='pending',
+                    comment="Status: pending, processing, completed, failed, cancelled")
+
+    # Progress
+    progress = Column(Integer, nullable=False, default=0, comment="Progress 0-100")
+    total_records = Column(Integer, nullable=False, default=0)
+    processed_records = Column(Integer, nullable=False, default=0)
+    successful_records = Column(Integer, nullable=False, default=0)
+    failed_records = Column(Integer, nullable=False, default=0)
+
+    # Result
+    result_url = Column(String(500), comment="Result file URL")
+    error_message = Column(Text, comment="Failure reason")
+    cancelled = Column(Boolean, nullable=False, default=False)
+
+    # Timestamps
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_batch_task_user_created', 'user_id', 'created_at'),
+        Index('idx_batch_task_status_created', 'status', 'created_at'),
+        Index('idx_batch_task_completed', 'completed_at'),
+    )
@@ -0,0 +1,83 @@
+# OP_CMS Customer Balance Models
+# Story 3.4: Settlement Payment Writeoff - customer ledger
+
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, DECIMAL, Index
+from datetime import datetime
+
+from backend.models.database_models import Base
+
+
+class CustomerBalance(Base):
+    """Materialized ledger balance of one customer
+
+    Maintained from settlements, payments and write-offs by
+    backend.services.customer_ledger in the same transaction as the source
+    rows. Aging buckets are as of ``aged_at`` and re-aged nightly.
+    """
+    __tablename__ = 'customer_balances'
+
+    customer_id = Column(Integer, ForeignKey('customers.id'), primary_key=True)
+
+    # Lifetime totals
+    total_billed = Column(DECIMAL(14, 2), nullable=False, default=0, comment="Settlements, excluding cancelled/rejected")
+    total_paid = Column(DECIMAL(14, 2), nullable=False, default=0, comment="Payments received")
+    total_written_off = Column(DECIMAL(14, 2), nullable=False, default=0, comment="Payments allocated to settlements")
+
+    # Open receivables (pending/approved settlements net of write-offs)
+    open_amount = Column(DECIMAL(14, 2), nullable=False, default=0)
+    open_settlements = Column(Integer, nullable=False, default=0)
+    unapplied_amount = Column(DECIMAL(14, 2), nullable=False, default=0, comment="Payments not yet written off")
+
+    # Aging of open_amount by days past the payment term
+    current_amount = Column(DECIMAL(14, 2), nullable=False, default=0, comment="Not yet due")
+    overdue_1_30 = Column(DECIMAL(14, 2), nullable=False, default=0)
+    overdue_31_60 = Column(DECIMAL(14, 2), nullable=False, default=0)
+    overdue_61_90 = Column(DECIMAL(14, 2), nullable=False, default=0)
+    overdue_90_plus = Column(DECIMAL(14, 2), nullable=False, default=0)
+    oldest_open_at = Column(DateTime, comment="Creation time of the oldest open settlement")
+
+    # Last activity
+    last_settlement_at = Column(DateTime)
+    last_payment_at = Column(DateTime)
+    last_writeoff_at = Column(DateTime)
+
+    # Timestamps
+    aged_at = Column(DateTime, nullable=False, default=datetime.utcnow, comment="Reference time of the aging buckets")
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_customer_balance_open', 'open_amount'),
+    )
+
+    @property
+    def overdue_amount(self):
+        """Open amount past the payment term"""
+        return self.overdue_1_30 + self.overdue_31_60 + self.overdue_61_90 + self.overdue_90_plus
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        def iso(value):
+            return value.isoformat() if value else None
+
+        return {
+            'customer_id': self.customer_id,
+            'total_billed': float(self.total_billed),
+            'total_paid': float(self.total_paid),
+            'total_written_off': float(self.total_written_off),
+            'open_amount': float(self.open_amount),
+            'open_settlements': self.open_settlements,
+            'unapplied_amount': float(self.unapplied_amount),
+            'current_amount': float(self.current_amount),
+            'overdue_amount': float(self.overdue_amount),
+            'overdue_1_30': float(self.overdue_1_30),
+            'overdue_31_60': float(self.overdue_31_60),
+            'overdue_61_90': float(self.overdue_61_90),
+            'overdue_90_plus': float(self.overdue_90_plus),
+            'oldest_open_at': iso(self.oldest_open_at),
+            'last_settlement_at': iso(self.last_settlement_at),
+            'last_payment_at': iso(self.last_payment_at),
+            'last_writeoff_at': iso(self.last_writeoff_at),
+            'aged_at': iso(self.aged_at),
+            'updated_at': iso(self.updated_at)
+        }
@@ -0,0 +1,33 @@
+# OP_CMS Customer Stats Models
+# Story 4.1: Management Dashboard - customer distributions
+
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+
+from backend.models.database_models import Base
+
+
+class CustomerStatCounter(Base):
+    """Number of customers with one value of a dashboard dimension
+
+    One row per (dimension, value), e.g. ('level', 'vip'). Adjusted by
+    backend.services.customer_stats in the same transaction as customer
+    creates, updates and deletes.
+    """
+    __tablename__ = 'customer_stat_counters'
+
+    dimension = Column(String(20), primary_key=True, comment="Dimension: industry, region, level")
+    value = Column(String(100), primary_key=True, comment="Dimension value (missing values use the dimension's label)")
+    count = Column(Integer, nullable=False, default=0)
+
+    # Timestamps
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'dimension': self.dimension,
+            'value': self.value,
+            'count': self.count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
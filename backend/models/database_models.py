@@ -229,6 +229,7 @@ class PriceConfig(Base):
     name = Column(String(100), nullable=False, comment="Configuration name")
     description = Column(Text, comment="Configuration description")
     price_model = Column(String(20), nullable=False, comment="Price model: tiered, volume, dynamic")
+    device_series = Column(String(10), nullable=False, default='X', server_default='X', comment="Device series: X, N, L")
     currency = Column(String(3), default='CNY', comment="Currency code: CNY, USD, EUR")
     
     # Tiered pricing attributes
@@ -244,6 +245,7 @@ class PriceConfig(Base):
     pricing_rules = Column(JSON, comment="Dynamic pricing rules in JSON format")
     
     is_active = Column(Boolean, default=True, comment="Is this configuration active?")
+    current_version_number = Column(Integer, default=1, server_default='1', comment="Current version number")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -251,6 +253,7 @@ class PriceConfig(Base):
     __table_args__ = (
         Index('idx_price_config_customer', 'customer_id'),
         Index('idx_price_config_active', 'is_active'),
+        Index('idx_price_config_version', 'current_version_number'),
     )
     
     # Relationships
@@ -316,6 +319,8 @@ class SettlementRecord(Base):
         Index('idx_settlement_period', 'period_start', 'period_end'),
         Index('idx_settlement_status', 'status'),
         Index('idx_settlement_record_id', 'record_id'),
+        Index('idx_settlement_status_created', 'status', 'created_at'),
+        Index('idx_settlement_currency_period', 'currency', 'period_end'),
     )
     
     # Relationships
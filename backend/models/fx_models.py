@@ -0,0 +1,44 @@
+# OP_CMS FX Rate Models
+# Story 4.1: Management Dashboard - multi-currency totals
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, DECIMAL, Index, UniqueConstraint
+from datetime import datetime
+
+from backend.models.database_models import Base
+
+
+class ExchangeRate(Base):
+    """Dated exchange rate of one currency against a base currency
+
+    One unit of ``currency`` is worth ``rate`` units of ``base_currency``
+    from ``effective_date`` until the currency's next rate. Rates are read
+    by backend.services.fx_rates to report amounts in the base currency.
+    """
+    __tablename__ = 'exchange_rates'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    currency = Column(String(3), nullable=False, comment="Quoted currency code")
+    base_currency = Column(String(3), nullable=False, comment="Currency the rate is expressed in")
+    rate = Column(DECIMAL(18, 8), nullable=False, comment="Base currency units per unit of currency")
+    effective_date = Column(Date, nullable=False, comment="Date from which the rate applies")
+    source = Column(String(50), comment="Rate source, e.g. PBOC")
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Indexes
+    __table_args__ = (
+        UniqueConstraint('currency', 'base_currency', 'effective_date', name='uq_exchange_rate_date'),
+        Index('idx_exchange_rate_base', 'base_currency', 'currency', 'effective_date'),
+    )
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'currency': self.currency,
+            'base_currency': self.base_currency,
+            'rate': float(self.rate) if self.rate is not None else None,
+            'effective_date': self.effective_date.isoformat() if self.effective_date else None,
+            'source': self.source,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
@@ -0,0 +1,59 @@
+# OP_CMS Import Checkpoint Models
+# Story 6.2: Import/Export Enhancement - resumable async import
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+
+from backend.models.database_models import Base
+
+
+class ImportCheckpoint(Base):
+    """Last committed row of an async customer import
+
+    Updated in the same transaction as each imported chunk, so a retried or
+    redelivered import resumes after the last committed row.
+    """
+    __tablename__ = 'import_checkpoints'
+
+    import_id = Column(String(64), primary_key=True, comment="Batch task ID or Celery task ID")
+    file_name = Column(String(255), comment="Original upload file name")
+    import_mode = Column(String(30), nullable=False, default='skip_duplicates')
+    status = Column(String(20), nullable=False, default='processing',
+                    comment="Status: processing, completed, failed")
+
+    # Position and counters as of the last committed chunk
+    last_committed_row = Column(Integer, nullable=False, default=0)
+    total_estimate = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    chunks = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0, comment="Number of runs (first run and resumes)")
+
+    # Timestamps
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_import_checkpoint_status_updated', 'status', 'updated_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'import_id': self.import_id,
+            'file_name': self.file_name,
+            'import_mode': self.import_mode,
+            'status': self.status,
+            'last_committed_row': self.last_committed_row,
+            'total_estimate': self.total_estimate,
+            'imported': self.imported,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'chunks': self.chunks,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
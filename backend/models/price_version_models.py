@@ -0,0 +1,69 @@
+# OP_CMS Price Config Version Models
+# Story 2.4: Price Config Version Control
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, DECIMAL, Boolean, JSON, ForeignKey, Index
+from datetime import datetime
+
+from backend.models.database_models import Base
+
+
+class PriceConfigVersion(Base):
+    """Snapshot of a price config as of one version
+
+    A version applies from ``effective_from`` until the ``effective_from``
+    of the config's next version. Versions are written by
+    backend.services.price_versioning when a config is created or updated.
+    """
+    __tablename__ = 'price_config_versions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    version_id = Column(String(36), unique=True, nullable=False)
+    config_id = Column(Integer, ForeignKey('price_configs.id', ondelete='CASCADE'), nullable=False, comment="Reference to current config")
+    version_number = Column(Integer, nullable=False, comment="Version number (1, 2, 3...)")
+
+    # Snapshot of config data
+    name = Column(String(100), nullable=False)
+    description = Column(Text)
+    price_model = Column(String(20), nullable=False)
+    device_series = Column(String(10), nullable=False)
+    currency = Column(String(3), nullable=False)
+    unit_price = Column(DECIMAL(12, 4), nullable=False)
+    pricing_rules = Column(JSON)
+    is_active = Column(Boolean, nullable=False)
+
+    # Change tracking
+    changed_by = Column(Integer, comment="User ID who made the change")
+    change_reason = Column(String(500), comment="Reason for this version")
+    changes_summary = Column(JSON, comment="JSON of changed fields")
+
+    # Timestamps
+    effective_from = Column(DateTime, nullable=False, default=datetime.utcnow, comment="Time from which this version applies")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_version_config', 'config_id'),
+        Index('idx_version_number', 'version_number'),
+        Index('idx_version_config_number', 'config_id', 'version_number'),
+        Index('idx_version_config_effective', 'config_id', 'effective_from'),
+    )
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'version_id': self.version_id,
+            'config_id': self.config_id,
+            'version_number': self.version_number,
+            'name': self.name,
+            'price_model': self.price_model,
+            'device_series': self.device_series,
+            'currency': self.currency,
+            'unit_price': float(self.unit_price) if self.unit_price is not None else None,
+            'pricing_rules': self.pricing_rules,
+            'is_active': self.is_active,
+            'changed_by': self.changed_by,
+            'change_reason': self.change_reason,
+            'changes_summary': self.changes_summary,
+            'effective_from': self.effective_from.isoformat() if self.effective_from else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
@@ -1,7 +1,7 @@
 # OP_CMS Reminder Models
 # Story 3.5: Overdue Reminder Functionality
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta
 import uuid
@@ -35,6 +35,11 @@ class ReminderRecord(Base):
     created_by = Column(Integer, ForeignKey('users.id'), comment="Created by user ID")
     created_at = Column(DateTime, default=datetime.utcnow, comment="Creation timestamp")
     
+    # Indexes
+    __table_args__ = (
+        Index('idx_reminder_settlement_created', 'settlement_id', 'created_at'),
+    )
+    
     # Relationships
     settlement = relationship("SettlementRecord", backref="reminders")
     customer = relationship("Customer", backref="reminders")
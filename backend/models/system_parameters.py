@@ -4,6 +4,7 @@
 from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 
 from backend.models.database_models import Base
 
@@ -15,7 +16,7 @@ class SystemParameter(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     key = Column(String(100), unique=True, nullable=False, index=True, comment="Parameter key")
     value = Column(Text, nullable=False, comment="Parameter value")
-    value_type = Column(String(20), nullable=False, default='string', comment="Value type: string, integer, boolean, json")
+    value_type = Column(String(20), nullable=False, default='string', comment="Value type: string, integer, decimal, boolean, json")
     description = Column(String(500), comment="Parameter description")
     category = Column(String(50), nullable=False, default='general', index=True, comment="Category: settlement, warning, import, export, general")
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="Last update timestamp")
@@ -44,6 +45,11 @@ class SystemParameter(Base):
                 return int(self.value)
             except:
                 return 0
+        elif self.value_type == 'decimal':
+            try:
+                return Decimal(self.value)
+            except InvalidOperation:
+                return Decimal('0')
         elif self.value_type == 'boolean':
             return self.value.lower() in ['true', '1', 'yes']
         elif self.value_type == 'json':
@@ -59,6 +65,8 @@ class SystemParameter(Base):
         """Set value with type conversion"""
         if self.value_type == 'integer':
             self.value = str(int(typed_value))
+        elif self.value_type == 'decimal':
+            self.value = str(Decimal(str(typed_value)))
         elif self.value_type == 'boolean':
             self.value = 'true' if typed_value else 'false'
         elif self.value_type == 'json':
@@ -15,7 +15,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from backend.models.database_models import Base, Customer
 from backend.models.auth import User
-from datetime import datetime
+from backend.services.fx_rates import save_rates
+from datetime import date, datetime
 import uuid
 
 
@@ -95,6 +96,13 @@ def seed_database():
         
         print(f"✅ Created {len(demo_customers)} demo customers")
         
+        # Demo exchange rates against CNY; load published rates with load_fx_rates.py
+        save_rates(session, [
+            {'currency': 'USD', 'effective_date': date(2026, 1, 1), 'rate': '7.10'},
+            {'currency': 'EUR', 'effective_date': date(2026, 1, 1), 'rate': '7.75'},
+        ], source='seed')
+        print("✅ Created demo exchange rates (USD, EUR)")
+        
         session.commit()
         print("🎉 Database seeding completed!")
         
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Celery Worker Start Script
+Start a Celery worker with the queues, prefetch and autoscale settings of
+a worker profile (see WORKER_PROFILES in backend/celery_app.py)
+
+Usage:
+    python backend/scripts/start_celery_worker.py <profile> [extra celery worker options]
+
+Profiles:
+    notifications, settlements, imports, exports, maintenance, all
+"""
+
+import sys
+from os.path import abspath, dirname
+sys.path.insert(0, dirname(dirname(dirname(abspath(__file__)))))
+
+from backend.celery_app import WORKER_PROFILES, celery_app, worker_argv
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in WORKER_PROFILES:
+        print(f"Usage: {sys.argv[0]} <{'|'.join(WORKER_PROFILES)}> [celery worker options]")
+        sys.exit(1)
+
+    celery_app.worker_main(worker_argv(sys.argv[1]) + sys.argv[2:])
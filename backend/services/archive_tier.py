@@ -0,0 +1,530 @@
+# OP_CMS Archive Tier
+# Story 5.3: Operation Audit Log - partitioning and archival
+
+"""
+Monthly partitions and the archive tier of the settlement and log tables
+
+settlement_records and access_logs grow without bound. Rows older than a
+table's retention (whole months before the current month) are moved out of
+the live table:
+
+    settlements  closed (paid/cancelled/rejected) settlements, with their
+                 write-offs and reminders, go to the *_archive tables
+    access_logs  rows go to access_logs_archive or to Parquet files; on
+                 MySQL the table is partitioned by month on created_at, so
+                 archived months are dropped as whole partitions instead of
+                 being deleted row by row
+
+Rows are moved in chunks of ids locked with SELECT ... FOR UPDATE, one
+transaction per chunk, and keep their primary keys. ``ensure_partitions``
+adds the partitions of the coming months ahead of time; the monthly
+``archive_partitions_task`` runs both.
+
+Queries read the archive through ``route`` (column and aggregate SELECTs)
+and ``source`` (ORM entity reads); ``archive_statement`` runs a query on
+the archive tables alone, for per-key aggregates added up per tier.
+Given the earliest created_at a query selects, each live table it reads
+is replaced by a UNION ALL of its live
+and archived rows when that date lies before the retention cutoff or
+before the archive's newest row (its horizon, cached per process for
+ARCHIVE_HORIZON_TTL seconds; it only exceeds the cutoff after the
+retention was raised). Queries within the retention window never touch
+the archive. Rows archived to Parquet leave the database and are not
+routed.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, DateTime, Table, delete, func, insert, literal, select, text, union_all
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.util import ClauseAdapter, find_tables
+from sqlalchemy.sql.visitors import replacement_traverse
+
+from backend.models.archive_models import (
+    access_logs_archive,
+    reminder_records_archive,
+    settlement_records_archive,
+    settlement_writeoffs_archive
+)
+from backend.models.auth import AccessLog
+from backend.models.database_models import SettlementRecord
+from backend.models.payment_models import SettlementWriteoff
+from backend.models.reminder_models import ReminderRecord
+from backend.services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+# Whole months before the current month a closed settlement stays live
+SETTLEMENT_RETENTION_MONTHS = int(os.getenv('SETTLEMENT_RETENTION_MONTHS', '24'))
+
+# Whole months before the current month an access log row stays live
+ACCESS_LOG_RETENTION_MONTHS = int(os.getenv('ACCESS_LOG_RETENTION_MONTHS', '6'))
+
+# Settlement statuses that no longer change
+CLOSED_STATUSES = ('paid', 'cancelled', 'rejected')
+
+# Column rows are partitioned, archived and routed by
+ARCHIVE_DATE_COLUMN = 'created_at'
+
+# Rows moved per transaction
+DEFAULT_ARCHIVE_CHUNK_SIZE = 5000
+
+# Monthly partitions kept ahead of the current month
+PARTITIONS_AHEAD = 3
+
+# Catch-all partition after the last monthly partition
+FUTURE_PARTITION = 'p_future'
+
+# Seconds before the archive horizons are reloaded
+ARCHIVE_HORIZON_TTL = int(os.getenv('ARCHIVE_HORIZON_TTL', '3600'))
+
+# Directory of Parquet archives
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', './archives')
+
+# Archive targets: archive tables or Parquet files
+ARCHIVE_TARGETS = ('table', 'parquet')
+
+
+class ArchiveError(Exception):
+    """Custom exception for archival errors"""
+    pass
+
+
+# ==================== Months and partitions ====================
+
+def month_start(value: datetime) -> datetime:
+    """First instant of the month of a datetime"""
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """First instant of the month ``months`` after (negative: before) a month"""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    """Name of the partition holding a month's rows (pYYYYMM)"""
+    return f"p{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    """Month of a pYYYYMM partition (None for other partitions)"""
+    try:
+        return datetime.strptime(name, 'p%Y%m')
+    except ValueError:
+        return None
+
+
+def partition_definition(month: datetime) -> str:
+    """RANGE partition of one month's rows"""
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{add_months(month, 1):%Y-%m-%d}'))"
+
+
+# ==================== Registry ====================
+
+class ArchivedTable:
+    """A live table, its archive table and the rules for moving rows between them"""
+
+    def __init__(
+        self,
+        name: str,
+        model: Any,
+        archive: Table,
+        retention_months: int,
+        criteria: Sequence[Any] = (),
+        children: Sequence[Tuple[Any, Table, str]] = (),
+        partitioned: bool = False,
+        allow_files: bool = False,
+        tags: Sequence[str] = ()
+    ):
+        """
+        Args:
+            name: Name used by the task and script
+            model: SQLAlchemy model of the live table
+            archive: Archive table (see backend.models.archive_models)
+            retention_months: Whole months before the current month rows stay live
+            criteria: Further conditions a row must meet to be archived
+            children: (model, archive table, foreign key column) of rows that
+                reference the live rows; they are moved along with them
+            partitioned: The live table is partitioned by month on MySQL
+            allow_files: Rows may be archived to Parquet files, i.e. leave the database
+            tags: Response cache tags invalidated after rows are moved
+        """
+        self.name = name
+        self.model = model
+        self.table = model.__table__
+        self.archive = archive
+        self.retention_months = retention_months
+        self.criteria = tuple(criteria)
+        self.children = tuple(children)
+        self.partitioned = partitioned
+        self.allow_files = allow_files
+        self.tags = tuple(tags)
+
+    def cutoff(self, as_of: Optional[datetime] = None) -> datetime:
+        """Rows created before this instant are archived"""
+        return add_months(month_start(as_of or datetime.utcnow()), -self.retention_months)
+
+    def eligible(self, cutoff: datetime) -> List[Any]:
+        """WHERE clauses of the rows to archive"""
+        return [self.table.c[ARCHIVE_DATE_COLUMN] < cutoff, *self.criteria]
+
+    def tables(self) -> List[Tuple[Table, Table]]:
+        """(live, archive) pairs of the table and its children"""
+        return [(self.table, self.archive)] + [(model.__table__, archive) for model, archive, _ in self.children]
+
+
+# Registry of tables with an archive tier
+ARCHIVED_TABLES: Dict[str, ArchivedTable] = {}
+
+
+def register_archived_table(archived: ArchivedTable):
+    """Register a table with an archive tier"""
+    ARCHIVED_TABLES[archived.name] = archived
+
+
+def get_archived_table(name: str) -> ArchivedTable:
+    """Look up a table with an archive tier by name"""
+    archived = ARCHIVED_TABLES.get(name)
+    if archived is None:
+        raise ArchiveError(f"Unsupported archived table: {name}. Supported: {', '.join(sorted(ARCHIVED_TABLES))}")
+    return archived
+
+
+register_archived_table(ArchivedTable(
+    'settlements', SettlementRecord, settlement_records_archive, SETTLEMENT_RETENTION_MONTHS,
+    criteria=(SettlementRecord.status.in_(CLOSED_STATUSES),),
+    children=(
+        (SettlementWriteoff, settlement_writeoffs_archive, 'settlement_id'),
+        (ReminderRecord, reminder_records_archive, 'settlement_id'),
+    ),
+    tags=('settlements',)
+))
+register_archived_table(ArchivedTable(
+    'access_logs', AccessLog, access_logs_archive, ACCESS_LOG_RETENTION_MONTHS,
+    partitioned=True,
+    allow_files=True
+))
+
+
+# ==================== Partition maintenance ====================
+
+def _is_mysql(session) -> bool:
+    return session.get_bind().dialect.name == 'mysql'
+
+
+def list_partitions(session, table_name: str) -> List[str]:
+    """Partitions of a table in order (empty when not partitioned or not on MySQL)"""
+    if not _is_mysql(session):
+        return []
+    return list(session.execute(
+        text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ),
+        {'table': table_name}
+    ).scalars())
+
+
+def ensure_partitions(
+    session,
+    name: str,
+    as_of: Optional[datetime] = None,
+    ahead: int = PARTITIONS_AHEAD
+) -> List[str]:
+    """
+    Add monthly partitions up to ``ahead`` months after the current month
+
+    New months are split off the catch-all p_future partition, which is
+    empty unless rows are dated in the future, so the reorganization only
+    rewrites the partition definitions.
+
+    Returns:
+        Names of the partitions created
+    """
+    archived = get_archived_table(name)
+    partitions = list_partitions(session, archived.table.name) if archived.partitioned else []
+    if FUTURE_PARTITION not in partitions:
+        return []
+
+    current = month_start(as_of or datetime.utcnow())
+    months = [month for month in map(partition_month, partitions) if month is not None]
+    month = add_months(max(months), 1) if months else current
+    new_months = []
+    while month <= add_months(current, ahead):
+        new_months.append(month)
+        month = add_months(month, 1)
+    if not new_months:
+        return []
+
+    definitions = [partition_definition(month) for month in new_months]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    session.execute(text(
+        f"ALTER TABLE {archived.table.name} REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({', '.join(definitions)})"
+    ))
+    session.commit()
+    created = [partition_name(month) for month in new_months]
+    logger.info(f"Added partitions {', '.join(created)} to {archived.table.name}")
+    return created
+
+
+# ==================== Archival ====================
+
+def _copy(
+    session,
+    live: Table,
+    archive: Table,
+    column: str,
+    ids: Sequence[int],
+    target: str,
+    archive_dir: str,
+    archived_at: datetime,
+    files: List[str]
+) -> int:
+    """Copy the rows whose ``column`` is in ids to the archive table or a Parquet file"""
+    if target == 'parquet':
+        from backend.services.streaming_export import stream_to_file
+
+        directory = os.path.join(archive_dir, live.name)
+        os.makedirs(directory, exist_ok=True)
+        # Named by the chunk's ids, so a rerun after a failed commit overwrites the file
+        file_path = os.path.join(directory, f"{live.name}_{column}_{ids[0]}_{ids[-1]}.parquet")
+        statement = select(*live.c).where(live.c[column].in_(ids)).order_by(live.c.id)
+        copied = stream_to_file(
+            session, statement, [c.name for c in live.c], 'parquet', file_path,
+            column_types=[c.type for c in live.c]
+        )
+        if copied:
+            files.append(file_path)
+        else:
+            os.remove(file_path)
+        return copied
+
+    # Rows copied by an interrupted run (partitioned tables are copied before their partitions are dropped)
+    session.execute(delete(archive).where(archive.c[column].in_(ids)))
+    names = [c.name for c in live.c]
+    return session.execute(
+        insert(archive).from_select(
+            names + ['archived_at'],
+            select(*live.c, literal(archived_at, DateTime)).where(live.c[column].in_(ids))
+        )
+    ).rowcount
+
+
+def archive_rows(
+    session,
+    name: str,
+    as_of: Optional[datetime] = None,
+    target: str = 'table',
+    archive_dir: Optional[str] = None,
+    chunk_size: int = DEFAULT_ARCHIVE_CHUNK_SIZE,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Move the rows of a table older than its retention to the archive tier
+
+    Args:
+        session: Database session
+        name: Registered archived table (settlements, access_logs)
+        as_of: Reference time of the retention (default: now)
+        target: 'table' (archive table) or 'parquet' (files in archive_dir)
+        archive_dir: Directory of Parquet archives (default: ARCHIVE_DIR)
+        chunk_size: Rows moved per transaction
+        dry_run: Only count the rows that would be moved
+
+    Returns:
+        Report with the cutoff, rows moved (on a dry run: eligible), child
+        rows moved per table, files written and partitions dropped
+    """
+    archived = get_archived_table(name)
+    if target not in ARCHIVE_TARGETS:
+        raise ArchiveError(f"Unsupported archive target: {target}. Supported: {', '.join(ARCHIVE_TARGETS)}")
+    if target == 'parquet':
+        from backend.services.streaming_export import HAS_PYARROW
+
+        if not archived.allow_files:
+            raise ArchiveError(f"{name} rows are read through the archive tables and cannot be archived to files")
+        if not HAS_PYARROW:
+            raise ArchiveError("pyarrow is required for Parquet archives")
+
+    live = archived.table
+    cutoff = archived.cutoff(as_of)
+    eligible = archived.eligible(cutoff)
+    report: Dict[str, Any] = {
+        'table': name, 'cutoff': cutoff.isoformat(), 'target': target, 'dry_run': dry_run, 'rows': 0,
+        'children': {model.__tablename__: 0 for model, _, _ in archived.children},
+        'files': [], 'dropped_partitions': []
+    }
+    if dry_run:
+        report['rows'] = session.execute(select(func.count()).select_from(live).where(*eligible)).scalar_one()
+        session.rollback()
+        return report
+
+    # Partitions that hold only rows before the cutoff are dropped after their rows are copied
+    droppable = []
+    if archived.partitioned and not archived.criteria:
+        droppable = [
+            partition for partition in list_partitions(session, live.name)
+            if partition_month(partition) and add_months(partition_month(partition), 1) <= cutoff
+        ]
+
+    archive_dir = archive_dir or ARCHIVE_DIR
+    archived_at = datetime.utcnow()
+    last_id = 0
+    while True:
+        ids = list(session.execute(
+            select(live.c.id).where(*eligible, live.c.id > last_id)
+            .order_by(live.c.id).limit(chunk_size).with_for_update()
+        ).scalars())
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        for model, archive, column in archived.children:
+            report['children'][model.__tablename__] += _copy(
+                session, model.__table__, archive, column, ids, target, archive_dir, archived_at, report['files']
+            )
+            session.execute(delete(model.__table__).where(model.__table__.c[column].in_(ids)))
+        report['rows'] += _copy(
+            session, live, archived.archive, 'id', ids, target, archive_dir, archived_at, report['files']
+        )
+        if not droppable:
+            session.execute(delete(live).where(live.c.id.in_(ids)))
+        session.commit()
+
+    if droppable:
+        session.execute(text(f"ALTER TABLE {live.name} DROP PARTITION {', '.join(droppable)}"))
+        # Copied rows outside the dropped partitions
+        session.execute(delete(live).where(*eligible, live.c.id <= last_id))
+        session.commit()
+        report['dropped_partitions'] = droppable
+
+    invalidate_horizons()
+    if report['rows'] and archived.tags:
+        response_cache.invalidate(archived.tags)
+    logger.info(
+        f"Archived {report['rows']} {name} rows created before {report['cutoff']} to {target}"
+        + (f", dropped partitions {', '.join(droppable)}" if droppable else '')
+    )
+    return report
+
+
+# ==================== Query router ====================
+
+# Table name -> (monotonic load time, newest archived created_at)
+_horizons: Dict[str, Tuple[float, Optional[datetime]]] = {}
+
+
+def archive_horizon(session, name: str) -> Optional[datetime]:
+    """Newest created_at in a table's archive (None while empty), cached for ARCHIVE_HORIZON_TTL seconds"""
+    archived = get_archived_table(name)
+    cached = _horizons.get(name)
+    if cached is None or time.monotonic() - cached[0] > ARCHIVE_HORIZON_TTL:
+        horizon = session.execute(select(func.max(archived.archive.c[ARCHIVE_DATE_COLUMN]))).scalar()
+        cached = _horizons[name] = (time.monotonic(), horizon)
+    return cached[1]
+
+
+def invalidate_horizons():
+    """Reload the archive horizons on their next use"""
+    _horizons.clear()
+
+
+def _reaches_archive(session, archived: ArchivedTable, since: Optional[datetime]) -> bool:
+    if since is None or since < archived.cutoff():
+        return True
+    horizon = archive_horizon(session, archived.name)
+    return horizon is not None and since <= horizon
+
+
+def _union(live: Table, archive: Table):
+    return union_all(
+        select(*live.c),
+        select(*[archive.c[column.name] for column in live.c])
+    ).subquery(f'{live.name}_all')
+
+
+def route(session, statement, since: Optional[datetime] = None):
+    """
+    Include archived rows in a SELECT that reaches back into the archive
+
+    Each live table of the archive tier the statement reads is replaced by
+    a UNION ALL of its live and archived rows, unless ``since`` lies within
+    the retention window and after the newest archived row. For column and
+    aggregate SELECTs (add all criteria before routing); ORM entity reads
+    use ``source``.
+
+    Args:
+        session: Database session
+        statement: SELECT over live tables
+        since: Earliest created_at the statement selects (None: no lower bound)
+
+    Returns:
+        The statement, rewritten to read the archive too when needed
+    """
+    tables = set(find_tables(statement, check_columns=True, include_joins=True))
+    for archived in ARCHIVED_TABLES.values():
+        pairs = [(live, archive) for live, archive in archived.tables() if live in tables]
+        if not pairs or not _reaches_archive(session, archived, since):
+            continue
+        for live, archive in pairs:
+            statement = ClauseAdapter(_union(live, archive)).traverse(statement)
+    return statement
+
+
+def archive_statement(statement):
+    """
+    The statement over the archive tables instead of the live tables
+
+    For aggregates keyed by an indexed column (e.g. per customer) that are
+    cheaper to run on each tier and add up than over the UNION ALL of
+    ``route``. Rows of one settlement never span tiers, so joins between
+    archived tables stay correct.
+
+    Args:
+        statement: SELECT over live tables
+
+    Returns:
+        The rewritten statement, or None if it reads no archived table
+    """
+    tables = set(find_tables(statement, check_columns=True, include_joins=True))
+    archives = {
+        live: archive
+        for archived in ARCHIVED_TABLES.values()
+        for live, archive in archived.tables() if live in tables
+    }
+    if not archives:
+        return None
+
+    def replace(element):
+        if isinstance(element, Table):
+            return archives.get(element)
+        if isinstance(element, Column) and element.table in archives:
+            return archives[element.table].c[element.name]
+        return None
+
+    return replacement_traverse(statement, {}, replace)
+
+
+def source(session, model: Any, since: Optional[datetime] = None):
+    """
+    Entity to query a model through, including archived rows when ``since`` reaches the archive
+
+    Archived rows load as instances of the model; they are read-only.
+
+    Returns:
+        The model, or an alias of it over live and archived rows
+    """
+    for archived in ARCHIVED_TABLES.values():
+        for live, archive in archived.tables():
+            if live is model.__table__:
+                if _reaches_archive(session, archived, since):
+                    return aliased(model, _union(live, archive))
+                return model
+    return model
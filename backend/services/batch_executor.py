@@ -0,0 +1,270 @@
+# OP_CMS Batch Executor
+# Story 6.4: Batch Processing - parallel chunk execution
+
+"""
+Parallel batch executor
+
+Items are cut into chunks and processed concurrently in a thread pool or a
+process pool:
+
+    - Backpressure: chunks are pulled lazily from the item iterable and at
+      most ``max_pending_chunks`` are in flight, so a producer (generator,
+      cursor, file reader) can never run ahead of the workers.
+    - Retries: an item whose function raises is retried with exponential
+      backoff up to ``max_retries`` attempts in total. A falsy result is a
+      definitive failure and is not retried.
+    - Timeouts: ``timeout`` bounds the whole run; ``item_timeout`` bounds a
+      single call. Process workers interrupt an overrunning call with
+      SIGALRM; threads cannot be interrupted, so a late result from a thread
+      is recorded as a timeout failure instead.
+    - Cancellation: ``should_cancel`` is checked between chunks; queued
+      chunks are dropped and running chunks are allowed to finish.
+    - Progress: chunk results are aggregated by the coordinating thread only
+      and reported through ``on_progress`` after each chunk, so counters are
+      never written concurrently.
+
+In process mode ``process_func`` and the items must be picklable.
+"""
+
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Supported worker pool types
+EXECUTOR_MODES = ('thread', 'process')
+
+# Upper bound for a single backoff sleep (seconds)
+MAX_RETRY_BACKOFF = 30.0
+
+# Maximum number of error entries kept in a result
+MAX_ERRORS = 100
+
+
+class BatchExecutorError(Exception):
+    """Custom exception for batch executor errors"""
+    pass
+
+
+class ItemTimeoutError(Exception):
+    """Raised when processing a single item exceeds the item timeout"""
+    pass
+
+
+def _raise_item_timeout(signum, frame):
+    raise ItemTimeoutError()
+
+
+def _call_item(process_func: Callable, item: Any, item_timeout: Optional[float], hard_timeout: bool) -> Any:
+    """Call process_func for one item, enforcing the item timeout"""
+    if not item_timeout:
+        return process_func(item)
+
+    if hard_timeout:
+        previous = signal.signal(signal.SIGALRM, _raise_item_timeout)
+        signal.setitimer(signal.ITIMER_REAL, item_timeout)
+        try:
+            return process_func(item)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    started = time.monotonic()
+    result = process_func(item)
+    if time.monotonic() - started > item_timeout:
+        raise ItemTimeoutError()
+    return result
+
+
+def run_chunk(
+    process_func: Callable,
+    chunk: List[Any],
+    start_index: int,
+    max_retries: int = 1,
+    retry_backoff: float = 0.0,
+    item_timeout: Optional[float] = None,
+    hard_timeout: bool = False
+) -> Dict[str, Any]:
+    """
+    Process one chunk of items (runs inside a pool worker)
+
+    Args:
+        process_func: Function to process each item; a truthy result is a success
+        chunk: Items of this chunk
+        start_index: Index of the first chunk item in the whole batch
+        max_retries: Maximum number of attempts per item
+        retry_backoff: Base backoff in seconds, doubled after every attempt
+        item_timeout: Per-item timeout in seconds
+        hard_timeout: Interrupt overrunning calls with SIGALRM
+
+    Returns:
+        Chunk results: successful, failed, retries and errors
+    """
+    # SIGALRM can only be handled in the main thread of a process
+    hard_timeout = (
+        hard_timeout and hasattr(signal, 'setitimer')
+        and threading.current_thread() is threading.main_thread()
+    )
+    attempts = max(1, max_retries)
+    successful = 0
+    failed = 0
+    retries = 0
+    errors = []
+
+    for offset, item in enumerate(chunk):
+        error = None
+        for attempt in range(attempts):
+            if attempt:
+                retries += 1
+                time.sleep(min(retry_backoff * (2 ** (attempt - 1)), MAX_RETRY_BACKOFF))
+            try:
+                result = _call_item(process_func, item, item_timeout, hard_timeout)
+                error = None if result else 'Processing failed'
+                break
+            except ItemTimeoutError:
+                # A timed-out call is not retried: it would likely time out again
+                error = f'Timed out after {item_timeout}s'
+                break
+            except Exception as e:
+                error = str(e)
+
+        if error is None:
+            successful += 1
+        else:
+            failed += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({'index': start_index + offset, 'item': item, 'error': error})
+
+    return {'successful': successful, 'failed': failed, 'retries': retries, 'errors': errors}
+
+
+class BatchExecutor:
+    """Executes batches of items concurrently in chunks"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        mode: str = 'thread',
+        timeout: Optional[float] = None,
+        item_timeout: Optional[float] = None,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        max_pending_chunks: Optional[int] = None
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise BatchExecutorError(f"Invalid executor mode: {mode}. Must be one of {EXECUTOR_MODES}")
+        if max_workers < 1:
+            raise BatchExecutorError("max_workers must be at least 1")
+
+        self.max_workers = max_workers
+        self.mode = mode
+        self.timeout = timeout
+        self.item_timeout = item_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # Keep every worker busy with one chunk queued behind it
+        self.max_pending_chunks = max(max_pending_chunks or max_workers * 2, max_workers)
+
+    def _create_pool(self):
+        if self.mode == 'process':
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch-executor')
+
+    def run(
+        self,
+        items: Iterable[Any],
+        process_func: Callable,
+        chunk_size: int = 100,
+        on_progress: Optional[Callable[[int, int, int], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Process items in concurrent chunks
+
+        Args:
+            items: Items to process (any iterable; consumed lazily)
+            process_func: Function to process each item
+            chunk_size: Number of items per chunk
+            on_progress: Called as on_progress(processed, successful, failed) after each chunk
+            should_cancel: Called between chunks; returning True stops the run
+
+        Returns:
+            Processing results
+        """
+        if chunk_size < 1:
+            raise BatchExecutorError("chunk_size must be at least 1")
+
+        iterator = iter(items)
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        hard_timeout = self.mode == 'process'
+
+        submitted = 0
+        successful = 0
+        failed = 0
+        retries = 0
+        errors = []
+        cancelled = False
+        timed_out = False
+        exhausted = False
+        pending = set()
+
+        pool = self._create_pool()
+        try:
+            while True:
+                # Refill up to the in-flight limit (backpressure on the producer)
+                while not exhausted and not cancelled and len(pending) < self.max_pending_chunks:
+                    chunk = list(islice(iterator, chunk_size))
+                    if not chunk:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(
+                        run_chunk, process_func, chunk, submitted,
+                        self.max_retries, self.retry_backoff, self.item_timeout, hard_timeout
+                    ))
+                    submitted += len(chunk)
+
+                if not pending:
+                    break
+
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    timed_out = True
+                    break
+
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_result = future.result()
+                    successful += chunk_result['successful']
+                    failed += chunk_result['failed']
+                    retries += chunk_result['retries']
+                    errors.extend(chunk_result['errors'][:MAX_ERRORS - len(errors)])
+
+                if done and on_progress:
+                    on_progress(successful + failed, successful, failed)
+
+                if done and not cancelled and should_cancel and should_cancel():
+                    # Drop queued chunks; chunks already running finish normally
+                    cancelled = True
+                    pending = {future for future in pending if not future.cancel()}
+        finally:
+            # Never block on work abandoned after a timeout
+            pool.shutdown(wait=not timed_out, cancel_futures=True)
+
+        if timed_out:
+            logger.warning(f"Batch execution timed out after {self.timeout}s ({successful + failed} items processed)")
+
+        return {
+            'submitted': submitted,
+            'processed': successful + failed,
+            'successful': successful,
+            'failed': failed,
+            'retries': retries,
+            'errors': errors,
+            'cancelled': cancelled,
+            'timed_out': timed_out
+        }
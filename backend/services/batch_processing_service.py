@@ -1,12 +1,24 @@
 # OP_CMS Batch Processing Service
 # Story 6.4: Batch Processing
 
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Iterable
 from datetime import datetime
 import logging
+import os
+import time
 import uuid
 from sqlalchemy.orm import Session
 
+from backend.services.batch_executor import BatchExecutor
+from backend.services.progress_events import progress_publisher
+from backend.services.batch_task_store import (
+    ACTIVE_STATUSES,
+    TASK_FIELDS,
+    BatchTaskStore,
+    compute_progress,
+    create_task_store
+)
+
 # Optional pandas import for Excel operations
 try:
     import pandas as pd
@@ -17,6 +29,9 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between progress writes of one task to the task store
+PROGRESS_WRITE_INTERVAL = float(os.getenv('BATCH_PROGRESS_WRITE_INTERVAL', '0.5'))
+
 
 class BatchTaskStatus:
     """Task status constants"""
@@ -28,9 +43,14 @@ class BatchTaskStatus:
 
 
 class BatchTask:
-    """Batch task representation"""
+    """Batch task representation
+    
+    State changes are written through to the task store (when attached) so
+    that every API worker and Celery process sees the same task, and are
+    published as progress events for streaming subscribers.
+    """
     
-    def __init__(self, task_type: str, user_id: int, total_records: int = 0):
+    def __init__(self, task_type: str, user_id: int, total_records: int = 0, store: Optional[BatchTaskStore] = None):
         self.id = str(uuid.uuid4())
         self.task_type = task_type  # import, export
         self.user_id = user_id
@@ -46,6 +66,51 @@ class BatchTask:
         self.started_at = None
         self.completed_at = None
         self.cancelled = False
+        self._store = store
+        self._last_progress_write = 0.0
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], store: Optional[BatchTaskStore] = None) -> 'BatchTask':
+        """Rebuild a task from a store record"""
+        task = cls.__new__(cls)
+        task._store = store
+        task._last_progress_write = 0.0
+        task._apply(record)
+        return task
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Raw task state for the task store"""
+        return {field: getattr(self, field) for field in TASK_FIELDS}
+    
+    def _apply(self, record: Dict[str, Any]):
+        for field in TASK_FIELDS:
+            setattr(self, field, record[field])
+    
+    def _persist(self, fields: Dict[str, Any], expected_statuses=None) -> bool:
+        """Write changed fields to the store; False if a conditional update did not apply"""
+        if self._store is None:
+            return True
+        record = self._store.update(self.id, fields, expected_statuses=expected_statuses)
+        if record is None:
+            return False
+        self._apply(record)
+        return True
+    
+    def refresh(self) -> 'BatchTask':
+        """Reload state written by other processes"""
+        if self._store is not None:
+            record = self._store.get(self.id)
+            if record:
+                self._apply(record)
+        return self
+    
+    def publish_progress(self, final: bool = False) -> bool:
+        """Publish the current state to progress subscribers (coalesced unless final)"""
+        return progress_publisher.publish(self.id, self.to_dict, final=final)
+    
+    def is_cancelled(self) -> bool:
+        """Check whether the task was cancelled (possibly by another worker)"""
+        return self.refresh().cancelled
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -79,53 +144,136 @@ class BatchTask:
         return None
     
     def update_progress(self, processed: int, successful: int = None, failed: int = None):
-        """Update task progress"""
+        """
+        Update task progress
+        
+        Store writes are throttled to one per PROGRESS_WRITE_INTERVAL; the
+        last record is always written, and complete()/fail() write the final
+        counters.
+        """
         self.processed_records = processed
         if successful is not None:
             self.successful_records = successful
         if failed is not None:
             self.failed_records = failed
-        
-        if self.total_records > 0:
-            self.progress = int((self.processed_records / self.total_records) * 100)
-        else:
-            self.progress = min(100, self.progress)
+        self.progress = compute_progress(self.processed_records, self.total_records, self.progress)
+        
+        now = time.monotonic()
+        if self._store is not None and (
+            0 < self.total_records <= processed or now - self._last_progress_write >= PROGRESS_WRITE_INTERVAL
+        ):
+            self._last_progress_write = now
+            # Atomic in the store: progress is recomputed against the stored total
+            record = self._store.update_progress(self.id, processed, successful, failed)
+            if record:
+                self._apply(record)
+        self.publish_progress()
+    
+    def set_total_records(self, total: int):
+        """Set the total once it is known"""
+        self.total_records = total
+        self._persist({'total_records': total})
     
     def start(self):
         """Mark task as started"""
         self.status = BatchTaskStatus.PROCESSING
         self.started_at = datetime.utcnow()
+        self._persist({'status': self.status, 'started_at': self.started_at})
+        self.publish_progress()
+    
+    def complete(self, result_url: str = None) -> bool:
+        """
+        Mark task as completed
+        
+        Returns:
+            False if the task was no longer active (e.g. cancelled by another worker)
+        """
+        return self._finish({
+            'status': BatchTaskStatus.COMPLETED,
+            'progress': 100,
+            'completed_at': datetime.utcnow(),
+            'result_url': result_url
+        })
+    
+    def fail(self, error_message: str) -> bool:
+        """
+        Mark task as failed
+        
+        Returns:
+            False if the task was no longer active (e.g. cancelled by another worker)
+        """
+        return self._finish({
+            'status': BatchTaskStatus.FAILED,
+            'completed_at': datetime.utcnow(),
+            'error_message': error_message
+        })
     
-    def complete(self, result_url: str = None):
-        """Mark task as completed"""
-        self.status = BatchTaskStatus.COMPLETED
-        self.progress = 100
-        self.completed_at = datetime.utcnow()
-        self.result_url = result_url
-    
-    def fail(self, error_message: str):
-        """Mark task as failed"""
-        self.status = BatchTaskStatus.FAILED
-        self.completed_at = datetime.utcnow()
-        self.error_message = error_message
-    
-    def cancel(self):
-        """Mark task as cancelled"""
-        self.status = BatchTaskStatus.CANCELLED
-        self.cancelled = True
-        self.completed_at = datetime.utcnow()
+    def _finish(self, fields: Dict[str, Any]) -> bool:
+        """Apply terminal fields (and the latest counters) while the task is still active"""
+        fields = dict(
+            fields,
+            processed_records=self.processed_records,
+            successful_records=self.successful_records,
+            failed_records=self.failed_records
+        )
+        if self._store is not None:
+            if not self._persist(fields, expected_statuses=ACTIVE_STATUSES):
+                self.refresh()
+                return False
+        elif self.status not in ACTIVE_STATUSES:
+            return False
+        else:
+            for field, value in fields.items():
+                setattr(self, field, value)
+        self.publish_progress(final=True)
+        return True
+    
+    def cancel(self) -> bool:
+        """
+        Mark task as cancelled
+        
+        Returns:
+            False if the task had already finished (in the store)
+        """
+        fields = {'status': BatchTaskStatus.CANCELLED, 'cancelled': True, 'completed_at': datetime.utcnow()}
+        if self._store is not None:
+            # Only an active task can be cancelled; a worker finishing a task it
+            # saw cancelled finds it already in the cancelled state
+            if self._persist(fields, expected_statuses=ACTIVE_STATUSES):
+                self.publish_progress(final=True)
+                return True
+            self.refresh()
+            return self.status == BatchTaskStatus.CANCELLED
+        for field, value in fields.items():
+            setattr(self, field, value)
+        self.publish_progress(final=True)
+        return True
 
 
 class BatchProcessingService:
     """Service for batch processing operations"""
     
-    def __init__(self, batch_size: int = 1000, max_workers: int = 4, timeout: int = 300, max_retries: int = 3):
-        self.tasks: Dict[str, BatchTask] = {}
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        max_workers: int = 4,
+        timeout: int = 300,
+        max_retries: int = 3,
+        store: Optional[BatchTaskStore] = None,
+        executor_mode: str = 'thread',
+        item_timeout: Optional[float] = None,
+        retry_backoff: float = 0.5
+    ):
+        # Shared task store (backend from BATCH_TASK_STORE unless given)
+        self.store = store or create_task_store()
         self.batch_size = batch_size
         self.max_workers = max_workers
         self.timeout = timeout
         self.max_retries = max_retries
-        self.timeout = timeout
+        # Parallel execution settings used by process_batch
+        self.executor_mode = executor_mode
+        self.item_timeout = item_timeout
+        self.retry_backoff = retry_backoff
     
     def batch_create_customers(
         self,
@@ -626,7 +774,8 @@ class BatchProcessingService:
         errors = []
         
         for i, item in enumerate(items):
-            if task.cancelled:
+            # Cancellation may come from another worker; check once per batch
+            if i % batch_size == 0 and task.is_cancelled():
                 break
             
             try:
@@ -666,32 +815,24 @@ class BatchProcessingService:
     
     def create_task(self, task_type: str, user_id: int, total_records: int = 0) -> BatchTask:
         """Create a new batch task"""
-        task = BatchTask(task_type, user_id, total_records)
-        self.tasks[task.id] = task
+        task = BatchTask(task_type, user_id, total_records, store=self.store)
+        self.store.create(task.to_record())
         logger.info(f"Created batch task {task.id} for user {user_id}, type: {task_type}")
         return task
     
     def get_task(self, task_id: str) -> Optional[BatchTask]:
         """Get task by ID"""
-        return self.tasks.get(task_id)
+        record = self.store.get(task_id)
+        return BatchTask.from_record(record, self.store) if record else None
     
     def list_tasks(self, user_id: int = None, status: str = None, limit: int = 50) -> List[BatchTask]:
-        """List tasks with optional filtering"""
-        tasks = list(self.tasks.values())
-        
-        # Filter by user_id
-        if user_id:
-            tasks = [t for t in tasks if t.user_id == user_id]
-        
-        # Filter by status
-        if status:
-            tasks = [t for t in tasks if t.status == status]
-        
-        # Sort by created_at (newest first)
-        tasks.sort(key=lambda t: t.created_at, reverse=True)
-        
-        # Limit results
-        return tasks[:limit]
+        """List tasks with optional filtering (newest first)"""
+        records = self.store.list(user_id=user_id or None, status=status or None, limit=limit)
+        return [BatchTask.from_record(record, self.store) for record in records]
+    
+    def count_tasks_by_status(self, user_id: int = None) -> Dict[str, int]:
+        """Count tasks per status"""
+        return self.store.count_by_status(user_id=user_id or None)
     
     def cancel_task(self, task_id: str, user_id: int) -> bool:
         """Cancel a task"""
@@ -706,85 +847,104 @@ class BatchProcessingService:
         if task.status in [BatchTaskStatus.COMPLETED, BatchTaskStatus.FAILED, BatchTaskStatus.CANCELLED]:
             return False
         
-        task.cancel()
+        # Conditional update: loses cleanly against a worker finishing the task
+        record = self.store.update(
+            task_id,
+            {'status': BatchTaskStatus.CANCELLED, 'cancelled': True, 'completed_at': datetime.utcnow()},
+            expected_statuses=ACTIVE_STATUSES
+        )
+        if not record:
+            return False
+        
+        BatchTask.from_record(record, self.store).publish_progress(final=True)
         logger.info(f"Cancelled batch task {task_id}")
         return True
     
+    def cleanup_expired_tasks(self, max_age_seconds: int = None) -> int:
+        """
+        Remove finished tasks older than the store TTL
+        
+        Args:
+            max_age_seconds: Override the store TTL
+            
+        Returns:
+            Number of tasks removed
+        """
+        removed = self.store.cleanup(max_age_seconds)
+        logger.info(f"Removed {removed} expired batch tasks")
+        return removed
+    
     def process_batch(
         self,
         task: BatchTask,
-        items: List[Any],
+        items: Iterable[Any],
         process_func: Callable,
-        batch_size: int = 100
+        batch_size: int = 100,
+        executor_mode: str = None
     ) -> Dict[str, Any]:
         """
-        Process items in batches with progress tracking
+        Process items in parallel batches with progress tracking
+        
+        Batches run concurrently on ``max_workers`` threads or processes.
+        Failing items are retried up to ``max_retries`` times with backoff,
+        the whole task is bounded by ``timeout`` seconds and cancellation is
+        checked between batches.
         
         Args:
             task: BatchTask to update
-            items: List of items to process
+            items: Items to process (list or lazily consumed iterable)
             process_func: Function to process each item
             batch_size: Number of items per batch
+            executor_mode: 'thread' or 'process' (defaults to the service setting)
             
         Returns:
             Processing results
         """
         task.start()
         
-        total = len(items)
-        successful = 0
-        failed = 0
-        errors = []
+        executor = BatchExecutor(
+            max_workers=self.max_workers,
+            mode=executor_mode or self.executor_mode,
+            timeout=self.timeout,
+            item_timeout=self.item_timeout,
+            max_retries=self.max_retries,
+            retry_backoff=self.retry_backoff
+        )
+        
+        def on_progress(processed: int, successful: int, failed: int):
+            task.update_progress(processed, successful, failed)
+            logger.info(f"Batch task {task.id} progress: {task.progress}%")
         
         try:
-            for i in range(0, total, batch_size):
-                if task.cancelled:
-                    logger.info(f"Batch processing cancelled for task {task.id}")
-                    break
-                
-                batch = items[i:i + batch_size]
-                
-                # Process batch
-                for item in batch:
-                    try:
-                        result = process_func(item)
-                        if result:
-                            successful += 1
-                        else:
-                            failed += 1
-                            errors.append({
-                                'item': item,
-                                'error': 'Processing failed'
-                            })
-                    except Exception as e:
-                        failed += 1
-                        errors.append({
-                            'item': item,
-                            'error': str(e)
-                        })
-                
-                # Update progress
-                processed = min(i + batch_size, total)
-                task.update_progress(processed, successful, failed)
-                logger.info(f"Batch task {task.id} progress: {task.progress}%")
-            
-            # Complete task
-            if task.cancelled:
-                task.cancel()
-            else:
-                task.complete()
-            
-            return {
-                'total': total,
-                'successful': successful,
-                'failed': failed,
-                'errors': errors[:100]  # Limit errors
-            }
-            
+            result = executor.run(
+                items,
+                process_func,
+                chunk_size=batch_size,
+                on_progress=on_progress,
+                should_cancel=task.is_cancelled
+            )
         except Exception as e:
             logger.error(f"Batch processing failed: {str(e)}")
             task.fail(str(e))
             raise
+        
+        if result['cancelled']:
+            logger.info(f"Batch processing cancelled for task {task.id}")
+            task.cancel()
+        elif result['timed_out']:
+            task.fail(f"Batch processing timed out after {self.timeout}s")
+        else:
+            task.complete()
+        
+        return {
+            'total': len(items) if hasattr(items, '__len__') else result['submitted'],
+            'successful': result['successful'],
+            'failed': result['failed'],
+            'errors': result['errors'],
+            'retries': result['retries'],
+            'cancelled': result['cancelled'],
+            'timed_out': result['timed_out']
+        }
     
     def export_batch(
         self,
@@ -810,14 +970,14 @@ class BatchProcessingService:
         try:
             # Get total count
             total = query_func()
-            task.total_records = total
+            task.set_total_records(total)
             
             # Export in batches
             offset = 0
             exported = 0
             
             while offset < total:
-                if task.cancelled:
+                if task.is_cancelled():
                     break
                 
                 # Export batch
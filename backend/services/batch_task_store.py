@@ -0,0 +1,544 @@
+# OP_CMS Batch Task Store
+# Story 6.4: Batch Processing - durable, shared task state
+
+"""
+Batch task store
+
+Batch task state lives in a store shared by every Sanic worker and Celery
+process instead of a per-process dict. Three backends are provided:
+
+    - memory: single-process store (development, tests)
+    - redis:  one hash per task plus sorted-set indexes by user, status and
+              completion time; progress updates run as one Lua script
+    - sql:    the ``batch_tasks`` table (migration 006_batch_tasks)
+
+All backends keep indexed lookups by user and status, apply conditional
+status transitions atomically (e.g. cancel only while still active) and
+remove finished tasks after a TTL via ``cleanup``.
+
+Tasks are exchanged as plain records (dicts keyed by TASK_FIELDS).
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, cast, func, Integer, update, delete
+
+from backend.models.batch_task_models import BatchTaskRecord
+
+# Optional redis import for the shared Redis backend
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Store backends
+TASK_STORE_BACKENDS = ['memory', 'redis', 'sql']
+
+# Backend used when none is given explicitly
+DEFAULT_TASK_STORE = os.getenv('BATCH_TASK_STORE', 'memory')
+
+# Finished tasks are removed this long after completion
+DEFAULT_TASK_TTL = int(os.getenv('BATCH_TASK_TTL_SECONDS', str(7 * 24 * 3600)))
+
+# Redis connection for the redis backend
+REDIS_URL = os.getenv('BATCH_TASK_REDIS_URL', 'redis://localhost:6379/2')
+
+# Task record fields
+TASK_FIELDS = [
+    'id', 'task_type', 'user_id', 'status', 'progress', 'total_records',
+    'processed_records', 'successful_records', 'failed_records', 'result_url',
+    'error_message', 'cancelled', 'created_at', 'started_at', 'completed_at'
+]
+
+INT_FIELDS = {'user_id', 'progress', 'total_records', 'processed_records', 'successful_records', 'failed_records'}
+DATETIME_FIELDS = {'created_at', 'started_at', 'completed_at'}
+
+# Statuses (mirrors BatchTaskStatus)
+ACTIVE_STATUSES = ('pending', 'processing')
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class BatchTaskStoreError(Exception):
+    """Custom exception for batch task store errors"""
+    pass
+
+
+def compute_progress(processed: int, total: int, current: int = 0) -> int:
+    """Progress percentage (0-100); unchanged while the total is unknown"""
+    if total and total > 0:
+        return min(100, processed * 100 // total)
+    return min(100, current)
+
+
+class BatchTaskStore:
+    """Batch task store interface"""
+
+    def create(self, record: Dict[str, Any]):
+        """Persist a new task record"""
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task record by ID"""
+        raise NotImplementedError
+
+    def update(
+        self,
+        task_id: str,
+        fields: Dict[str, Any],
+        expected_statuses: Optional[Iterable[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically update task fields
+
+        Args:
+            task_id: Task ID
+            fields: Fields to set
+            expected_statuses: Only apply while the task is in one of these statuses
+
+        Returns:
+            Updated record, or None if the task is missing or the status did not match
+        """
+        raise NotImplementedError
+
+    def update_progress(
+        self,
+        task_id: str,
+        processed: int,
+        successful: Optional[int] = None,
+        failed: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically set counters and recompute progress against the stored total
+
+        Returns:
+            Updated record, or None if the task is missing
+        """
+        raise NotImplementedError
+
+    def list(self, user_id: Optional[int] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """List task records, newest first"""
+        raise NotImplementedError
+
+    def count_by_status(self, user_id: Optional[int] = None) -> Dict[str, int]:
+        """Count tasks per status"""
+        raise NotImplementedError
+
+    def cleanup(self, max_age_seconds: Optional[int] = None) -> int:
+        """
+        Remove finished tasks completed more than max_age_seconds ago
+
+        Returns:
+            Number of tasks removed
+        """
+        raise NotImplementedError
+
+
+# ==================== Memory Backend ====================
+
+class MemoryTaskStore(BatchTaskStore):
+    """In-process store with user and status indexes"""
+
+    def __init__(self, ttl: int = DEFAULT_TASK_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[int, List[str]] = {}  # creation order
+        self._by_status: Dict[str, set] = {}
+
+    def create(self, record: Dict[str, Any]):
+        with self._lock:
+            if record['id'] in self._tasks:
+                raise BatchTaskStoreError(f"Task {record['id']} already exists")
+            self._tasks[record['id']] = dict(record)
+            self._by_user.setdefault(record['user_id'], []).append(record['id'])
+            self._by_status.setdefault(record['status'], set()).add(record['id'])
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._tasks.get(task_id)
+            return dict(record) if record else None
+
+    def update(self, task_id, fields, expected_statuses=None):
+        with self._lock:
+            record = self._tasks.get(task_id)
+            if record is None or (expected_statuses is not None and record['status'] not in expected_statuses):
+                return None
+            old_status = record['status']
+            record.update(fields)
+            if record['status'] != old_status:
+                self._by_status[old_status].discard(task_id)
+                self._by_status.setdefault(record['status'], set()).add(task_id)
+            return dict(record)
+
+    def update_progress(self, task_id, processed, successful=None, failed=None):
+        with self._lock:
+            record = self._tasks.get(task_id)
+            if record is None:
+                return None
+            record['processed_records'] = processed
+            if successful is not None:
+                record['successful_records'] = successful
+            if failed is not None:
+                record['failed_records'] = failed
+            record['progress'] = compute_progress(processed, record['total_records'], record['progress'])
+            return dict(record)
+
+    def list(self, user_id=None, status=None, limit=50):
+        with self._lock:
+            if user_id is not None:
+                candidates = reversed(self._by_user.get(user_id, []))
+                status_ids = self._by_status.get(status, set()) if status else None
+                ids = []
+                for task_id in candidates:
+                    if status_ids is None or task_id in status_ids:
+                        ids.append(task_id)
+                        if len(ids) >= limit:
+                            break
+            else:
+                ids = list(self._by_status.get(status, ())) if status else list(self._tasks)
+                ids.sort(key=lambda task_id: self._tasks[task_id]['created_at'], reverse=True)
+                ids = ids[:limit]
+            return [dict(self._tasks[task_id]) for task_id in ids]
+
+    def count_by_status(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                return {status: len(ids) for status, ids in self._by_status.items() if ids}
+            counts: Dict[str, int] = {}
+            for task_id in self._by_user.get(user_id, []):
+                status = self._tasks[task_id]['status']
+                counts[status] = counts.get(status, 0) + 1
+            return counts
+
+    def cleanup(self, max_age_seconds=None):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl if max_age_seconds is None else max_age_seconds)
+        with self._lock:
+            expired = [
+                task_id for task_id, record in self._tasks.items()
+                if record['status'] in TERMINAL_STATUSES
+                and record['completed_at'] is not None and record['completed_at'] < cutoff
+            ]
+            for task_id in expired:
+                record = self._tasks.pop(task_id)
+                self._by_user[record['user_id']].remove(task_id)
+                if not self._by_user[record['user_id']]:
+                    del self._by_user[record['user_id']]
+                self._by_status[record['status']].discard(task_id)
+            return len(expired)
+
+
+# ==================== Redis Backend ====================
+
+# Set counters and recompute progress in one round trip
+_PROGRESS_SCRIPT = """
+local key = KEYS[1]
+if redis.call('EXISTS', key) == 0 then return 0 end
+local processed = tonumber(ARGV[1])
+redis.call('HSET', key, 'processed_records', ARGV[1])
+if ARGV[2] ~= '' then redis.call('HSET', key, 'successful_records', ARGV[2]) end
+if ARGV[3] ~= '' then redis.call('HSET', key, 'failed_records', ARGV[3]) end
+local total = tonumber(redis.call('HGET', key, 'total_records')) or 0
+if total > 0 then
+    redis.call('HSET', key, 'progress', math.min(100, math.floor(processed * 100 / total)))
+end
+return 1
+"""
+
+
+def _encode(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _decode(field: str, value: Optional[str]) -> Any:
+    if field == 'cancelled':
+        return value == '1'
+    if value is None or value == '':
+        return 0 if field in INT_FIELDS else None
+    if field in INT_FIELDS:
+        return int(value)
+    if field in DATETIME_FIELDS:
+        return datetime.fromisoformat(value)
+    return value
+
+
+class RedisTaskStore(BatchTaskStore):
+    """Redis store: task hashes plus sorted-set indexes"""
+
+    def __init__(self, client=None, ttl: int = DEFAULT_TASK_TTL, prefix: str = 'op_cms:batch_task'):
+        if client is None:
+            if not HAS_REDIS:
+                raise BatchTaskStoreError("redis is required for the redis task store")
+            client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._progress = client.register_script(_PROGRESS_SCRIPT)
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.prefix}:{task_id}"
+
+    def _index(self, name: str) -> str:
+        return f"{self.prefix}s:{name}"
+
+    def _read(self, values: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not values:
+            return None
+        return {field: _decode(field, values.get(field)) for field in TASK_FIELDS}
+
+    def create(self, record):
+        key = self._key(record['id'])
+        score = record['created_at'].timestamp()
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, mapping={field: _encode(record.get(field)) for field in TASK_FIELDS})
+        pipe.zadd(self._index('created'), {record['id']: score})
+        pipe.zadd(self._index(f"user:{record['user_id']}"), {record['id']: score})
+        pipe.zadd(self._index(f"status:{record['status']}"), {record['id']: score})
+        pipe.execute()
+
+    def get(self, task_id):
+        return self._read(self.client.hgetall(self._key(task_id)))
+
+    def update(self, task_id, fields, expected_statuses=None):
+        key = self._key(task_id)
+        applied = []
+
+        def apply(pipe):
+            old_status, created_at = pipe.hmget(key, 'status', 'created_at')
+            if old_status is None or (expected_statuses is not None and old_status not in expected_statuses):
+                return
+            new_status = fields.get('status', old_status)
+            pipe.multi()
+            pipe.hset(key, mapping={field: _encode(value) for field, value in fields.items()})
+            if new_status != old_status:
+                score = datetime.fromisoformat(created_at).timestamp()
+                pipe.zrem(self._index(f'status:{old_status}'), task_id)
+                pipe.zadd(self._index(f'status:{new_status}'), {task_id: score})
+            if new_status in TERMINAL_STATUSES and fields.get('completed_at'):
+                pipe.zadd(self._index('finished'), {task_id: fields['completed_at'].timestamp()})
+                # Safety net in case scheduled cleanup does not run
+                pipe.expire(key, self.ttl * 2)
+            applied.append(True)
+
+        self.client.transaction(apply, key)
+        return self.get(task_id) if applied else None
+
+    def update_progress(self, task_id, processed, successful=None, failed=None):
+        found = self._progress(keys=[self._key(task_id)], args=[processed, _encode(successful), _encode(failed)])
+        return self.get(task_id) if found else None
+
+    def _fetch(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(self._key(task_id))
+        return [self._read(values) for values in pipe.execute()]
+
+    def list(self, user_id=None, status=None, limit=50):
+        if user_id is not None:
+            index = self._index(f'user:{user_id}')
+        elif status:
+            index = self._index(f'status:{status}')
+        else:
+            index = self._index('created')
+
+        records = []
+        page = max(limit, 50)
+        start = 0
+        while len(records) < limit:
+            task_ids = self.client.zrevrange(index, start, start + page - 1)
+            if not task_ids:
+                break
+            for record in self._fetch(task_ids):
+                # Expired hashes may still be indexed until cleanup runs
+                if record and (not status or record['status'] == status):
+                    records.append(record)
+            start += page
+        return records[:limit]
+
+    def count_by_status(self, user_id=None):
+        if user_id is None:
+            statuses = ACTIVE_STATUSES + TERMINAL_STATUSES
+            pipe = self.client.pipeline(transaction=False)
+            for status in statuses:
+                pipe.zcard(self._index(f'status:{status}'))
+            return {status: count for status, count in zip(statuses, pipe.execute()) if count}
+
+        task_ids = self.client.zrange(self._index(f'user:{user_id}'), 0, -1)
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hget(self._key(task_id), 'status')
+        counts: Dict[str, int] = {}
+        for status in pipe.execute():
+            if status:
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def cleanup(self, max_age_seconds=None):
+        age = self.ttl if max_age_seconds is None else max_age_seconds
+        cutoff = (datetime.utcnow() - timedelta(seconds=age)).timestamp()
+        task_ids = self.client.zrangebyscore(self._index('finished'), '-inf', cutoff)
+        if not task_ids:
+            return 0
+
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hmget(self._key(task_id), 'user_id', 'status')
+        owners = pipe.execute()
+
+        pipe = self.client.pipeline(transaction=True)
+        for task_id, (user_id, status) in zip(task_ids, owners):
+            pipe.delete(self._key(task_id))
+            pipe.zrem(self._index('created'), task_id)
+            pipe.zrem(self._index('finished'), task_id)
+            if user_id:
+                pipe.zrem(self._index(f'user:{user_id}'), task_id)
+            if status:
+                pipe.zrem(self._index(f'status:{status}'), task_id)
+        pipe.execute()
+        return len(task_ids)
+
+
+# ==================== SQL Backend ====================
+
+def _default_session_factory():
+    from backend.dao.database_dao import DatabaseSessionFactory
+    return DatabaseSessionFactory().get_session()
+
+
+class SQLTaskStore(BatchTaskStore):
+    """Store backed by the batch_tasks table"""
+
+    def __init__(self, session_factory: Callable = None, ttl: int = DEFAULT_TASK_TTL):
+        self.session_factory = session_factory or _default_session_factory
+        self.ttl = ttl
+
+    @staticmethod
+    def _read(row: Optional[BatchTaskRecord]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        return {field: getattr(row, field) for field in TASK_FIELDS}
+
+    def _execute(self, statement, fetch_id: Optional[str] = None):
+        session = self.session_factory()
+        try:
+            result = session.execute(statement)
+            session.commit()
+            if fetch_id is None:
+                return result
+            return result.rowcount, self._read(session.get(BatchTaskRecord, fetch_id))
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def create(self, record):
+        session = self.session_factory()
+        try:
+            session.add(BatchTaskRecord(**{field: record.get(field) for field in TASK_FIELDS}))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def get(self, task_id):
+        session = self.session_factory()
+        try:
+            return self._read(session.get(BatchTaskRecord, task_id))
+        finally:
+            session.close()
+
+    def update(self, task_id, fields, expected_statuses=None):
+        statement = update(BatchTaskRecord).where(BatchTaskRecord.id == task_id).values(**fields)
+        if expected_statuses is not None:
+            statement = statement.where(BatchTaskRecord.status.in_(list(expected_statuses)))
+        rowcount, record = self._execute(statement.execution_options(synchronize_session=False), fetch_id=task_id)
+        return record if rowcount else None
+
+    def update_progress(self, task_id, processed, successful=None, failed=None):
+        total = BatchTaskRecord.total_records
+        scaled = processed * 100
+        values = {
+            'processed_records': processed,
+            # Exact integer division that behaves the same on MySQL, PostgreSQL and SQLite
+            'progress': case(
+                (total <= 0, BatchTaskRecord.progress),
+                (total <= processed, 100),
+                else_=cast((scaled - scaled % total) / total, Integer)
+            )
+        }
+        if successful is not None:
+            values['successful_records'] = successful
+        if failed is not None:
+            values['failed_records'] = failed
+        statement = update(BatchTaskRecord).where(BatchTaskRecord.id == task_id).values(**values)
+        rowcount, record = self._execute(statement.execution_options(synchronize_session=False), fetch_id=task_id)
+        return record if rowcount else None
+
+    def list(self, user_id=None, status=None, limit=50):
+        session = self.session_factory()
+        try:
+            query = session.query(BatchTaskRecord)
+            if user_id is not None:
+                query = query.filter(BatchTaskRecord.user_id == user_id)
+            if status:
+                query = query.filter(BatchTaskRecord.status == status)
+            rows = query.order_by(BatchTaskRecord.created_at.desc()).limit(limit).all()
+            return [self._read(row) for row in rows]
+        finally:
+            session.close()
+
+    def count_by_status(self, user_id=None):
+        session = self.session_factory()
+        try:
+            query = session.query(BatchTaskRecord.status, func.count(BatchTaskRecord.id))
+            if user_id is not None:
+                query = query.filter(BatchTaskRecord.user_id == user_id)
+            return {status: count for status, count in query.group_by(BatchTaskRecord.status).all()}
+        finally:
+            session.close()
+
+    def cleanup(self, max_age_seconds=None):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl if max_age_seconds is None else max_age_seconds)
+        statement = delete(BatchTaskRecord).where(
+            BatchTaskRecord.status.in_(TERMINAL_STATUSES),
+            BatchTaskRecord.completed_at < cutoff
+        ).execution_options(synchronize_session=False)
+        return self._execute(statement).rowcount
+
+
+def create_task_store(backend: Optional[str] = None, **kwargs) -> BatchTaskStore:
+    """
+    Create a task store
+
+    Args:
+        backend: memory, redis or sql (default: BATCH_TASK_STORE env, else memory)
+        **kwargs: Backend options (client, session_factory, ttl)
+
+    Returns:
+        Task store instance
+    """
+    backend = backend or DEFAULT_TASK_STORE
+    if backend not in TASK_STORE_BACKENDS:
+        raise BatchTaskStoreError(f"Invalid task store backend: {backend}")
+
+    if backend == 'redis':
+        return RedisTaskStore(**kwargs)
+    if backend == 'sql':
+        return SQLTaskStore(**kwargs)
+    return MemoryTaskStore(**kwargs)
@@ -0,0 +1,464 @@
+# OP_CMS Company Name Matcher
+# Story 6.1: Data Quality Validation & Duplicate Detection - near-duplicate name index
+
+"""
+Near-duplicate company name matching
+
+Names are normalized before matching:
+    - full-width characters folded to half-width (NFKC) and lower-cased
+    - punctuation, symbols and whitespace removed
+    - legal-form suffixes stripped (有限公司, 股份有限公司, 股份, Co., Ltd., ...)
+
+Candidates come from an inverted n-gram index (bigrams for names containing
+CJK characters, trigrams otherwise). A prefix filter only probes the rarest
+grams a candidate must share to reach ``min_score``, so the cost of a lookup
+depends on the posting lists touched rather than on the number of indexed
+names. Candidates are ranked by the Dice coefficient of their gram sets.
+
+The index is updated incrementally (add/update/remove) and can be saved to
+and loaded from disk for a fast warm start. A snapshot records the highest
+customer id and the time it was synced; ``catch_up`` indexes customers
+created or renamed since then by other workers or Celery imports.
+"""
+
+import logging
+import math
+import os
+import pickle
+import tempfile
+import threading
+import unicodedata
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.models.database_models import Customer
+
+logger = logging.getLogger(__name__)
+
+# Index file used for warm start
+INDEX_PATH = os.getenv('COMPANY_NAME_INDEX_PATH', './data/company_name_index.pkl')
+
+# Seconds between catch-up + save of the index in each API worker
+INDEX_SYNC_INTERVAL = int(os.getenv('COMPANY_NAME_INDEX_SYNC_INTERVAL', '300'))
+
+# Customers updated this long before the last sync are re-read on catch-up,
+# covering transactions that committed after the sync started
+CATCH_UP_OVERLAP = timedelta(minutes=5)
+
+# Default minimum Dice score for a near duplicate
+DEFAULT_MIN_SCORE = 0.8
+
+# Bump when the normalization or gram scheme changes; older files are rebuilt
+INDEX_FORMAT_VERSION = 1
+
+# Legal-form suffixes, longest first (matched after normalization)
+COMPANY_SUFFIXES = [
+    '股份有限公司', '有限责任公司', '集团有限公司', '有限公司', '股份公司', '集团公司',
+    '分公司', '集团', '股份', '公司',
+    'companylimited', 'corporation', 'incorporated', 'colimited', 'coltd',
+    'limited', 'company', 'group', 'corp', 'ltd', 'llc', 'inc'
+]
+
+
+def _is_cjk(char: str) -> bool:
+    return '一' <= char <= '鿿' or '㐀' <= char <= '䶿'
+
+
+def normalize_company_name(name: Optional[str]) -> str:
+    """
+    Normalize a company name for matching
+
+    Args:
+        name: Raw company name
+
+    Returns:
+        Normalized name ('' for empty input)
+    """
+    if not name:
+        return ''
+
+    text = unicodedata.normalize('NFKC', str(name)).lower()
+    text = ''.join(
+        char for char in text
+        if not unicodedata.category(char).startswith(('P', 'S', 'Z', 'C'))
+    )
+
+    stripped = True
+    while stripped and text not in COMPANY_SUFFIXES:
+        stripped = False
+        for suffix in COMPANY_SUFFIXES:
+            if text.endswith(suffix) and len(text) > len(suffix):
+                text = text[:-len(suffix)]
+                stripped = True
+                break
+
+    return text
+
+
+def name_grams(normalized: str) -> FrozenSet[str]:
+    """
+    Build the n-gram set of a normalized name
+
+    Bigrams are used when the name contains CJK characters (short names carry
+    most of their information per character), trigrams otherwise. The name is
+    padded so that short names still produce grams.
+    """
+    if not normalized:
+        return frozenset()
+
+    size = 2 if any(_is_cjk(char) for char in normalized) else 3
+    padded = f' {normalized} '
+    if len(padded) <= size:
+        return frozenset([padded])
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+def dice_score(grams_a: FrozenSet[str], grams_b: FrozenSet[str]) -> float:
+    """Dice coefficient of two gram sets"""
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def _score(normalized_a: str, normalized_b: str, grams_a: FrozenSet[str], grams_b: FrozenSet[str]) -> float:
+    """
+    Rounded Dice score; only equal normalized names score 1.0
+
+    Different names can have identical gram sets (e.g. reordered digit runs),
+    so those are capped just below an exact match to rank after it.
+    """
+    if normalized_a and normalized_a == normalized_b:
+        return 1.0
+    return min(round(dice_score(grams_a, grams_b), 4), 0.9999)
+
+
+def name_similarity(name_a: Optional[str], name_b: Optional[str]) -> float:
+    """Similarity of two raw company names (1.0 for equal normalized names)"""
+    normalized_a = normalize_company_name(name_a)
+    normalized_b = normalize_company_name(name_b)
+    return _score(normalized_a, normalized_b, name_grams(normalized_a), name_grams(normalized_b))
+
+
+class CompanyNameIndex:
+    """Incrementally updatable n-gram index of company names"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._names: Dict[Hashable, str] = {}  # key -> normalized name
+        self._grams: Dict[Hashable, FrozenSet[str]] = {}
+        self._postings: Dict[str, Set[Hashable]] = {}
+        self.synced_id = 0  # highest customer id read from the database
+        self.synced_at: Optional[datetime] = None  # start of the last build or catch-up
+        self.is_ready = False
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._names
+
+    # ==================== Updates ====================
+
+    def add(self, key: Hashable, name: Optional[str]):
+        """
+        Add or replace the name indexed under a key
+
+        Args:
+            key: Customer primary key (or any hashable identity)
+            name: Company name
+        """
+        normalized = normalize_company_name(name)
+        grams = name_grams(normalized)
+        with self._lock:
+            self._remove(key)
+            if not grams:
+                return
+            self._names[key] = normalized
+            self._grams[key] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+
+    def update(self, key: Hashable, name: Optional[str]):
+        """Re-index a renamed customer"""
+        self.add(key, name)
+
+    def remove(self, key: Hashable):
+        """Remove a key from the index"""
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: Hashable):
+        grams = self._grams.pop(key, None)
+        self._names.pop(key, None)
+        for gram in grams or ():
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._postings[gram]
+
+    def clear(self):
+        with self._lock:
+            self._names.clear()
+            self._grams.clear()
+            self._postings.clear()
+            self.synced_id = 0
+            self.synced_at = None
+            self.is_ready = False
+
+    # ==================== Lookups ====================
+
+    def search(
+        self,
+        name: Optional[str],
+        limit: int = 10,
+        min_score: float = DEFAULT_MIN_SCORE,
+        exclude: Optional[Iterable[Hashable]] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        Find indexed names similar to a name
+
+        Args:
+            name: Company name to match
+            limit: Maximum number of matches
+            min_score: Minimum Dice score
+            exclude: Keys to leave out
+
+        Returns:
+            (key, score) pairs, best first
+        """
+        normalized = normalize_company_name(name)
+        query = name_grams(normalized)
+        if not query:
+            return []
+
+        excluded = set(exclude or ())
+        with self._lock:
+            # A match needs overlap >= min_score * |query| / (2 - min_score), so it
+            # must share at least one of the (|query| - required + 1) rarest grams
+            required = max(1, math.ceil(min_score * len(query) / (2 - min_score) - 1e-9))
+            ordered = sorted(query, key=lambda gram: len(self._postings.get(gram, ())))
+            probe = ordered[:len(query) - required + 1]
+
+            candidates: Set[Hashable] = set()
+            for gram in probe:
+                candidates.update(self._postings.get(gram, ()))
+
+            matches = []
+            for key in candidates - excluded:
+                grams = self._grams[key]
+                if dice_score(query, grams) >= min_score:
+                    matches.append((key, _score(normalized, self._names[key], query, grams)))
+
+        matches.sort(key=lambda match: (-match[1], str(match[0])))
+        return matches[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size statistics"""
+        with self._lock:
+            posting_sizes = Counter(len(keys) for keys in self._postings.values())
+            return {
+                'names': len(self._names),
+                'grams': len(self._postings),
+                'max_posting_size': max(posting_sizes) if posting_sizes else 0,
+                'synced_id': self.synced_id,
+                'synced_at': self.synced_at.isoformat() if self.synced_at else None,
+                'is_ready': self.is_ready
+            }
+
+    # ==================== Build & Persistence ====================
+
+    def build_from_session(self, session: Session, batch_size: int = 5000):
+        """
+        Rebuild the index from the customers table
+
+        Args:
+            session: Database session
+            batch_size: Rows fetched per round trip
+        """
+        started = datetime.utcnow()
+        rebuilt = CompanyNameIndex()
+        synced_id = 0
+        query = session.query(Customer.id, Customer.company_name).yield_per(batch_size)
+        for customer_pk, company_name in query:
+            rebuilt.add(customer_pk, company_name)
+            synced_id = max(synced_id, customer_pk)
+
+        with self._lock:
+            self._names, self._grams, self._postings = rebuilt._names, rebuilt._grams, rebuilt._postings
+            self.synced_id = synced_id
+            self.synced_at = started
+            self.is_ready = True
+
+        logger.info(f"Company name index built with {len(self)} names")
+
+    def catch_up(self, session: Session, batch_size: int = 5000) -> int:
+        """
+        Index customers created or renamed since the last build or catch-up
+
+        Reads customers above ``synced_id`` and, when the sync time is known,
+        customers updated since shortly before it (ids of concurrent inserts
+        can become visible out of order). Deleted customers are only dropped
+        by a rebuild; lookups resolve keys against the database anyway.
+
+        Args:
+            session: Database session
+            batch_size: Rows fetched per round trip
+
+        Returns:
+            Number of customers (re-)indexed
+        """
+        started = datetime.utcnow()
+        with self._lock:
+            synced_id, synced_at = self.synced_id, self.synced_at
+
+        condition = Customer.id > synced_id
+        if synced_at is not None:
+            condition = or_(condition, Customer.updated_at >= synced_at - CATCH_UP_OVERLAP)
+
+        indexed = 0
+        query = session.query(Customer.id, Customer.company_name).filter(condition).yield_per(batch_size)
+        for customer_pk, company_name in query:
+            self.add(customer_pk, company_name)
+            synced_id = max(synced_id, customer_pk)
+            indexed += 1
+
+        with self._lock:
+            self.synced_id = max(self.synced_id, synced_id)
+            self.synced_at = started
+
+        if indexed:
+            logger.info(f"Company name index caught up with {indexed} customers")
+        return indexed
+
+    def sync(self, session_factory, path: Optional[str] = None) -> int:
+        """
+        Catch up from the database and save the snapshot
+
+        Args:
+            session_factory: Callable returning a database session
+            path: Index file path (default: INDEX_PATH)
+
+        Returns:
+            Number of customers (re-)indexed
+        """
+        session = session_factory()
+        try:
+            indexed = self.catch_up(session)
+        finally:
+            session.close()
+        self.save(path)
+        return indexed
+
+    def save(self, path: Optional[str] = None) -> str:
+        """
+        Persist the index to disk (written to a unique temp file, then renamed)
+
+        Args:
+            path: Index file path (default: INDEX_PATH)
+
+        Returns:
+            Path written
+        """
+        path = path or INDEX_PATH
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            payload = {
+                'version': INDEX_FORMAT_VERSION,
+                'names': self._names,
+                'postings': self._postings,
+                'synced_id': self.synced_id,
+                'synced_at': self.synced_at
+            }
+            # A temp file per writer, so concurrent saves never write into one file
+            fd, temp_path = tempfile.mkstemp(
+                dir=directory or None, prefix=f"{os.path.basename(path)}.", suffix='.tmp'
+            )
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        logger.info(f"Company name index saved to {path} ({len(self)} names)")
+        return path
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        Load a previously saved index
+
+        The file is trusted local state written by ``save``.
+
+        Args:
+            path: Index file path (default: INDEX_PATH)
+
+        Returns:
+            True if the index was loaded
+        """
+        path = path or INDEX_PATH
+        if not os.path.exists(path):
+            return False
+
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+
+        if payload.get('version') != INDEX_FORMAT_VERSION:
+            logger.warning(f"Ignoring company name index {path} with format {payload.get('version')}")
+            return False
+
+        grams: Dict[Hashable, Set[str]] = {}
+        for gram, keys in payload['postings'].items():
+            for key in keys:
+                grams.setdefault(key, set()).add(gram)
+
+        with self._lock:
+            self._names = payload['names']
+            self._postings = payload['postings']
+            self._grams = {key: frozenset(key_grams) for key, key_grams in grams.items()}
+            self.synced_id = payload.get('synced_id', 0)
+            self.synced_at = payload.get('synced_at')
+            self.is_ready = True
+
+        logger.info(f"Company name index loaded from {path} ({len(self)} names)")
+        return True
+
+    def warm_start(self, session_factory=None, path: Optional[str] = None) -> bool:
+        """
+        Load the index from disk and catch up, or build and save it when no
+        file exists
+
+        Args:
+            session_factory: Callable returning a database session
+            path: Index file path (default: INDEX_PATH)
+
+        Returns:
+            True if the index is ready
+        """
+        if self.load(path):
+            if session_factory is not None:
+                self.sync(session_factory, path)
+            return True
+        if session_factory is None:
+            return False
+
+        session = session_factory()
+        try:
+            self.build_from_session(session)
+        finally:
+            session.close()
+        self.save(path)
+        return True
+
+
+# Global index instance
+company_name_index = CompanyNameIndex()
@@ -0,0 +1,403 @@
+# OP_CMS Customer Bulk Writer
+# Story 6.2: Import/Export Enhancement - bulk insert/upsert for imports
+
+"""
+Batched customer writes for imports
+
+Rows are written with one multi-row statement per batch instead of one
+``session.add`` + flush/commit per row:
+
+    - inserts use ``INSERT ... ON DUPLICATE KEY UPDATE`` on MySQL and
+      ``INSERT ... ON CONFLICT`` on SQLite/PostgreSQL
+    - updates use an ORM bulk UPDATE by primary key
+
+Customer UUIDs are generated up front, so inserted rows are mapped back to
+their source row numbers with a single ``customer_id IN (...)`` query per
+batch. If a batch fails (e.g. a unique constraint in ``error`` mode) it is
+retried row by row inside savepoints so only the offending rows fail.
+
+Upserts report their inserted and updated rows to the dashboard counters
+(customer_stats.record_changes); in ``update`` mode the dimension values
+of the conflicting customers are read (and locked) before the batch.
+"""
+
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from backend.models.database_models import Customer
+from backend.services.customer_stats import DIMENSIONS, REPORTED_OPTION, record_changes
+
+logger = logging.getLogger(__name__)
+
+# Default rows per INSERT/UPDATE statement
+DEFAULT_BATCH_SIZE = 500
+
+# Conflict handling for inserts
+CONFLICT_MODES = ['error', 'ignore', 'update']
+
+# Customer columns that may be written from an import row
+CUSTOMER_IMPORT_FIELDS = [
+    'company_name', 'contact_name', 'contact_phone', 'credit_code', 'customer_type',
+    'province', 'city', 'address', 'email', 'website', 'industry',
+    'erp_system', 'erp_customer_code', 'status', 'level', 'source', 'remarks'
+]
+
+# Import fields with a unique key: the fields an insert can conflict on
+UNIQUE_IMPORT_FIELDS = [
+    column.name for column in Customer.__table__.columns
+    if column.unique and column.name in CUSTOMER_IMPORT_FIELDS
+]
+
+# Customer attributes the dashboard counters are kept by
+STAT_ATTRIBUTES = [attribute for attribute, _ in DIMENSIONS.values()]
+
+# Defaults applied to imported customers when the row leaves them empty
+IMPORT_DEFAULTS = {
+    'customer_type': 'enterprise',
+    'status': 'active',
+    'level': 'standard',
+    'source': 'direct'
+}
+
+
+class BulkWriteError(Exception):
+    """Custom exception for bulk write errors"""
+    pass
+
+
+def build_customer_values(row_data: Dict[str, Any], customer_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the column values of a new customer from an import row
+
+    Args:
+        row_data: Import row
+        customer_id: Pre-generated customer UUID (default: new UUID)
+
+    Returns:
+        Column name -> value mapping
+    """
+    now = datetime.utcnow()
+    values = {field: row_data.get(field) for field in CUSTOMER_IMPORT_FIELDS}
+    for field, default in IMPORT_DEFAULTS.items():
+        values[field] = values[field] or default
+    values['customer_id'] = customer_id or str(uuid.uuid4())
+    values['created_at'] = now
+    values['updated_at'] = now
+    return values
+
+
+def _batched(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CustomerBulkWriter:
+    """Batched insert/upsert/update of customers"""
+
+    def __init__(self, session: Session, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Initialize writer
+
+        Args:
+            session: Database session (the caller commits)
+            batch_size: Rows per statement
+        """
+        self.session = session
+        self.batch_size = max(1, batch_size)
+        self.statement_count = 0
+
+    @property
+    def dialect_name(self) -> str:
+        return self.session.get_bind().dialect.name
+
+    # ==================== Inserts ====================
+
+    def insert_rows(
+        self,
+        rows: List[Tuple[int, Dict[str, Any]]],
+        on_conflict: str = 'error'
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Insert new customers in batches
+
+        Args:
+            rows: (row_number, row_data) pairs
+            on_conflict: What to do when a row hits a unique key of an existing
+                customer: 'error' (row fails), 'ignore' (row skipped) or
+                'update' (existing customer updated with the row's non-empty values)
+
+        Returns:
+            Outcome per row number: {'row', 'action', 'customer_id'[, 'error']}
+            where action is imported, updated, skipped or failed; conflicting
+            rows (updated or skipped) also carry the unique 'match_fields'
+            they collided on
+        """
+        if on_conflict not in CONFLICT_MODES:
+            raise BulkWriteError(f"Invalid conflict mode: {on_conflict}")
+
+        outcomes = {}
+        if not rows:
+            return outcomes
+
+        statement = self._insert_statement(on_conflict)
+        reported = statement.get_execution_options().get(REPORTED_OPTION, False)
+        customer_ids = [str(uuid.uuid4()) for _ in rows]
+
+        for batch in _batched(list(zip(rows, customer_ids)), self.batch_size):
+            values = [build_customer_values(row_data, customer_id) for (_, row_data), customer_id in batch]
+            stored = self._stored_stat_values(values) if reported and on_conflict == 'update' else {}
+            try:
+                with self.session.begin_nested():
+                    self.statement_count += 1
+                    self.session.execute(statement, values)
+            except DBAPIError as e:
+                logger.warning(f"Bulk insert of {len(batch)} rows failed, retrying row by row: {str(e)}")
+                batch_outcomes = self._insert_row_by_row(statement, batch, values, on_conflict)
+            else:
+                batch_outcomes = self._map_inserted(batch, values, on_conflict)
+
+            if reported:
+                self._record_stat_changes(batch, values, batch_outcomes, stored)
+            outcomes.update(batch_outcomes)
+
+        return outcomes
+
+    def _insert_statement(self, on_conflict: str):
+        """Build the dialect specific INSERT for the conflict mode"""
+        table = Customer.__table__
+        dialect = self.dialect_name
+
+        if on_conflict == 'error':
+            return insert(table)
+
+        # Upserts: the counter deltas are recorded from the row outcomes
+        report = {REPORTED_OPTION: True}
+
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            statement = mysql_insert(table).execution_options(**report)
+            if on_conflict == 'ignore':
+                # No-op assignment: keeps the existing row without INSERT IGNORE's
+                # side effect of downgrading other errors to warnings
+                return statement.on_duplicate_key_update(id=table.c.id)
+            return statement.on_duplicate_key_update(self._upsert_assignments(statement.inserted))
+
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            statement = dialect_insert(table).execution_options(**report)
+            if on_conflict == 'ignore':
+                return statement.on_conflict_do_nothing()
+            return statement.on_conflict_do_update(
+                index_elements=[table.c.credit_code],
+                set_=self._upsert_assignments(statement.excluded)
+            )
+
+        # No native upsert: conflicting rows fail in the row-by-row retry
+        logger.warning(f"No upsert support for dialect {dialect}, using plain INSERT")
+        return insert(table)
+
+    @staticmethod
+    def _upsert_assignments(incoming) -> Dict[str, Any]:
+        """Overwrite existing columns only with non-empty incoming values"""
+        table = Customer.__table__
+        assignments = {
+            field: func.coalesce(incoming[field], table.c[field])
+            for field in CUSTOMER_IMPORT_FIELDS
+            if field != 'credit_code'
+        }
+        assignments['updated_at'] = incoming['updated_at']
+        return assignments
+
+    def _insert_row_by_row(
+        self,
+        statement,
+        batch: List[Tuple[Tuple[int, Dict[str, Any]], str]],
+        values: List[Dict[str, Any]],
+        on_conflict: str
+    ) -> Dict[int, Dict[str, Any]]:
+        """Retry a failed batch one row per savepoint"""
+        outcomes = {}
+        written_batch = []
+        written_values = []
+
+        for item, row_values in zip(batch, values):
+            (row_number, _), _ = item
+            try:
+                with self.session.begin_nested():
+                    self.statement_count += 1
+                    self.session.execute(statement, [row_values])
+                written_batch.append(item)
+                written_values.append(row_values)
+            except DBAPIError as e:
+                outcomes[row_number] = {
+                    'row': row_number,
+                    'action': 'failed',
+                    'customer_id': None,
+                    'error': str(e.orig) if e.orig is not None else str(e)
+                }
+
+        outcomes.update(self._map_inserted(written_batch, written_values, on_conflict))
+        return outcomes
+
+    def _map_inserted(
+        self,
+        batch: List[Tuple[Tuple[int, Dict[str, Any]], str]],
+        values: List[Dict[str, Any]],
+        on_conflict: str
+    ) -> Dict[int, Dict[str, Any]]:
+        """Map written rows back to customer ids via their pre-generated UUIDs"""
+        if not batch:
+            return {}
+
+        table = Customer.__table__
+        customer_ids = [customer_id for _, customer_id in batch]
+        inserted = dict(self.session.execute(
+            select(table.c.customer_id, table.c.id).where(table.c.customer_id.in_(customer_ids))
+        ).all())
+
+        # Rows absent by UUID collided with an existing customer on a unique field
+        missing = [
+            row_values for (_, customer_id), row_values in zip(batch, values)
+            if customer_id not in inserted
+        ]
+        existing_by_field = {}
+        for field in UNIQUE_IMPORT_FIELDS:
+            conflicting = list({row_values[field] for row_values in missing if row_values[field]})
+            existing_by_field[field] = dict(self.session.execute(
+                select(table.c[field], table.c.id).where(table.c[field].in_(conflicting))
+            ).all()) if conflicting else {}
+
+        outcomes = {}
+        for ((row_number, _), customer_id), row_values in zip(batch, values):
+            if customer_id in inserted:
+                outcomes[row_number] = {'row': row_number, 'action': 'imported', 'customer_id': inserted[customer_id]}
+                continue
+            matches = {
+                field: existing_by_field[field][row_values[field]]
+                for field in UNIQUE_IMPORT_FIELDS
+                if row_values[field] in existing_by_field[field]
+            }
+            outcomes[row_number] = {
+                'row': row_number,
+                'action': 'updated' if on_conflict == 'update' else 'skipped',
+                'customer_id': next(iter(matches.values()), None),
+                'match_fields': list(matches)
+            }
+        return outcomes
+
+    def _stored_stat_values(self, values: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Counter attributes of the existing customers a batch can conflict with, locked until commit"""
+        table = Customer.__table__
+        conditions = []
+        for field in UNIQUE_IMPORT_FIELDS:
+            keys = list({row_values[field] for row_values in values if row_values[field]})
+            if keys:
+                conditions.append(table.c[field].in_(keys))
+        if not conditions:
+            return {}
+        rows = self.session.execute(
+            select(table.c.id, *(table.c[attribute] for attribute in STAT_ATTRIBUTES))
+            .where(or_(*conditions))
+            .order_by(table.c.id)
+            .with_for_update()
+        ).all()
+        return {row[0]: dict(zip(STAT_ATTRIBUTES, row[1:])) for row in rows}
+
+    def _record_stat_changes(
+        self,
+        batch: List[Tuple[Tuple[int, Dict[str, Any]], str]],
+        values: List[Dict[str, Any]],
+        outcomes: Dict[int, Dict[str, Any]],
+        stored: Dict[int, Dict[str, Any]]
+    ):
+        """Pass an upserted batch's inserted and updated customers to the dashboard counters"""
+        added, changed = [], []
+        for ((row_number, _), _), row_values in zip(batch, values):
+            outcome = outcomes.get(row_number, {})
+            if outcome.get('action') == 'imported':
+                added.append(row_values)
+            elif outcome.get('action') == 'updated' and outcome['customer_id'] in stored:
+                # Mirrors _upsert_assignments; later rows of the batch see earlier ones
+                old = stored[outcome['customer_id']]
+                new = {
+                    attribute: row_values[attribute] if row_values[attribute] is not None else old[attribute]
+                    for attribute in STAT_ATTRIBUTES
+                }
+                stored[outcome['customer_id']] = new
+                changed.append((old, new))
+        if added or changed:
+            record_changes(self.session, added, changed)
+
+    # ==================== Updates ====================
+
+    def update_rows(self, rows: List[Tuple[int, int, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+        """
+        Update existing customers in batches
+
+        Only non-empty import fields are written. Several rows targeting the
+        same customer are merged in row order, so later rows win.
+
+        Args:
+            rows: (row_number, customer primary key, row_data) triples
+
+        Returns:
+            Outcome per row number: {'row', 'action', 'customer_id'[, 'error']}
+        """
+        outcomes = {}
+        if not rows:
+            return outcomes
+
+        merged: Dict[int, Dict[str, Any]] = {}
+        row_numbers: Dict[int, List[int]] = {}
+        now = datetime.utcnow()
+        for row_number, customer_pk, row_data in rows:
+            params = merged.setdefault(customer_pk, {'id': customer_pk, 'updated_at': now})
+            params.update({
+                field: value for field, value in row_data.items()
+                if field in CUSTOMER_IMPORT_FIELDS and value is not None
+            })
+            row_numbers.setdefault(customer_pk, []).append(row_number)
+
+        for batch in _batched(list(merged.values()), self.batch_size):
+            try:
+                with self.session.begin_nested():
+                    self.statement_count += 1
+                    self.session.execute(update(Customer), batch)
+                failed = {}
+            except DBAPIError as e:
+                logger.warning(f"Bulk update of {len(batch)} customers failed, retrying row by row: {str(e)}")
+                failed = self._update_row_by_row(batch)
+
+            for params in batch:
+                customer_pk = params['id']
+                for row_number in row_numbers[customer_pk]:
+                    if customer_pk in failed:
+                        outcomes[row_number] = {
+                            'row': row_number, 'action': 'failed', 'customer_id': customer_pk,
+                            'error': failed[customer_pk]
+                        }
+                    else:
+                        outcomes[row_number] = {'row': row_number, 'action': 'updated', 'customer_id': customer_pk}
+
+        return outcomes
+
+    def _update_row_by_row(self, batch: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Retry a failed update batch one customer per savepoint, returning errors by id"""
+        failed = {}
+        for params in batch:
+            try:
+                with self.session.begin_nested():
+                    self.statement_count += 1
+                    self.session.execute(update(Customer), [params])
+            except DBAPIError as e:
+                failed[params['id']] = str(e.orig) if e.orig is not None else str(e)
+        return failed
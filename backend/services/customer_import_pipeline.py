@@ -0,0 +1,737 @@
+# OP_CMS Customer Import Pipeline
+# Story 6.2: Import/Export Enhancement - streaming, chunked import
+
+"""
+Streaming customer import pipeline
+
+Stages:
+    1. Upload spooled to disk (multipart stream or legacy base64 payload)
+    2. Read-only row iterator over the spooled CSV/Excel file
+    3. Validation in chunks of N rows
+    4. Set-based duplicate lookup per chunk
+    5. Batched insert/upsert/update per chunk with one commit per chunk
+    6. Progress reporting after every committed chunk
+
+Only one chunk of rows is held in memory at a time, so memory stays flat
+regardless of the number of rows in the file.
+
+When given an import checkpoint, the pipeline records the last committed
+row in the same transaction as each chunk and skips already committed rows
+on the next run, so a retried or restarted import resumes where it stopped.
+"""
+
+import csv
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backend.models.import_checkpoint_models import ImportCheckpoint
+from backend.services.company_name_matcher import CompanyNameIndex, company_name_index
+from backend.services.customer_bulk_writer import CustomerBulkWriter
+from backend.services.data_validation_service import DataValidationService
+from backend.services.duplicate_resolver import BulkDuplicateResolver
+
+logger = logging.getLogger(__name__)
+
+# Spool directory for uploaded import files
+SPOOL_DIR = os.getenv('IMPORT_SPOOL_DIR', './spool/imports')
+
+# Default number of rows per chunk
+DEFAULT_CHUNK_SIZE = 1000
+
+# Largest chunk accepted from API clients
+MAX_CHUNK_SIZE = 10000
+
+# Valid import modes
+IMPORT_MODES = ['skip_duplicates', 'update_duplicates', 'create_all']
+
+# Bulk writer conflict handling for each import mode
+CONFLICT_MODES_BY_IMPORT_MODE = {
+    'skip_duplicates': 'ignore',
+    'update_duplicates': 'update',
+    'create_all': 'error'
+}
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xlsm')
+
+
+class ImportPipelineError(Exception):
+    """Custom exception for import pipeline errors"""
+    pass
+
+
+# ==================== Upload Spooling ====================
+
+def _spool_path(file_name: str, spool_dir: Optional[str] = None) -> str:
+    """Build a unique spool path that keeps the original file extension"""
+    spool_dir = spool_dir or SPOOL_DIR
+    os.makedirs(spool_dir, exist_ok=True)
+
+    extension = os.path.splitext(file_name or '')[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ImportPipelineError(
+            f"Unsupported file type: {extension or file_name}. Supported: {', '.join(SUPPORTED_EXTENSIONS)}"
+        )
+
+    return os.path.join(spool_dir, f"{uuid.uuid4()}{extension}")
+
+
+def spool_bytes(file_content: bytes, file_name: str, spool_dir: Optional[str] = None) -> str:
+    """
+    Write an in-memory upload to the spool directory
+
+    Args:
+        file_content: Raw file content
+        file_name: Original file name (used for the extension)
+        spool_dir: Override spool directory
+
+    Returns:
+        Path of the spooled file
+    """
+    path = _spool_path(file_name, spool_dir)
+    with open(path, 'wb') as f:
+        f.write(file_content)
+    return path
+
+
+class MultipartUploadSpooler:
+    """
+    Incremental multipart/form-data parser that writes the file part to disk
+
+    Feed raw body chunks as they arrive from the request stream; only the
+    current chunk is held in memory. Plain form fields are collected into
+    ``fields``.
+    """
+
+    def __init__(self, content_type: str, file_field: str = 'file', spool_dir: Optional[str] = None):
+        from multipart.multipart import MultipartParser, parse_options_header
+
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b'boundary')
+        if not boundary:
+            raise ImportPipelineError("Missing multipart boundary")
+
+        self.file_field = file_field
+        self.spool_dir = spool_dir
+        self.fields: Dict[str, str] = {}
+        self.file_path: Optional[str] = None
+        self.file_name: Optional[str] = None
+        self.bytes_written = 0
+
+        self._header_field = b''
+        self._header_value = b''
+        self._part_headers: Dict[bytes, bytes] = {}
+        self._part_name: Optional[str] = None
+        self._part_file = None
+        self._part_value = b''
+
+        self._parser = MultipartParser(boundary, callbacks={
+            'on_part_begin': self._on_part_begin,
+            'on_header_field': self._on_header_field,
+            'on_header_value': self._on_header_value,
+            'on_header_end': self._on_header_end,
+            'on_headers_finished': self._on_headers_finished,
+            'on_part_data': self._on_part_data,
+            'on_part_end': self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes):
+        """Feed a chunk of the request body"""
+        if chunk:
+            self._parser.write(chunk)
+
+    def finalize(self) -> str:
+        """Finish parsing and return the spooled file path"""
+        self._parser.finalize()
+        if not self.file_path:
+            raise ImportPipelineError(f"Missing file field: {self.file_field}")
+        return self.file_path
+
+    def _on_part_begin(self):
+        self._part_headers = {}
+        self._part_name = None
+        self._part_file = None
+        self._part_value = b''
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._part_headers[self._header_field.lower()] = self._header_value
+        self._header_field = b''
+        self._header_value = b''
+
+    def _on_headers_finished(self):
+        from multipart.multipart import parse_options_header
+
+        _, options = parse_options_header(self._part_headers.get(b'content-disposition', b''))
+        self._part_name = options.get(b'name', b'').decode('utf-8')
+        filename = options.get(b'filename')
+
+        if self._part_name == self.file_field and filename is not None:
+            self.file_name = filename.decode('utf-8')
+            self.file_path = _spool_path(self.file_name, self.spool_dir)
+            self._part_file = open(self.file_path, 'wb')
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._part_file is not None:
+            self._part_file.write(data[start:end])
+            self.bytes_written += end - start
+        else:
+            self._part_value += data[start:end]
+
+    def _on_part_end(self):
+        if self._part_file is not None:
+            self._part_file.close()
+            self._part_file = None
+        elif self._part_name:
+            self.fields[self._part_name] = self._part_value.decode('utf-8')
+
+
+def remove_spooled_file(path: Optional[str]):
+    """Remove a spooled upload, ignoring missing files"""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to remove spooled file {path}: {str(e)}")
+
+
+# ==================== Row Iteration ====================
+
+def _clean_value(value: Any) -> Any:
+    """Normalize a raw cell value (empty -> None, strip strings)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value if value else None
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    return value
+
+
+def _iter_csv_rows(file_path: str) -> Iterator[Tuple[List[str], List[Any]]]:
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        headers = None
+        for values in reader:
+            if headers is None:
+                headers = [h.strip() for h in values]
+                continue
+            yield headers, values
+
+
+def _iter_excel_rows(file_path: str) -> Iterator[Tuple[List[str], Tuple[Any, ...]]]:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        headers = None
+        for values in ws.iter_rows(values_only=True):
+            if headers is None:
+                headers = [str(h).strip() if h is not None else '' for h in values]
+                continue
+            yield headers, values
+    finally:
+        wb.close()
+
+
+def iter_file_rows(file_path: str, file_name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows from a spooled CSV/Excel file
+
+    Excel files are opened with openpyxl in read-only mode so rows are
+    streamed from the sheet XML instead of loading the whole workbook.
+    Completely empty rows are skipped.
+
+    Args:
+        file_path: Path to the spooled file
+        file_name: Original file name (defaults to file_path)
+
+    Yields:
+        Row dictionaries keyed by header
+    """
+    extension = os.path.splitext(file_name or file_path)[1].lower()
+    raw_rows = _iter_csv_rows(file_path) if extension == '.csv' else _iter_excel_rows(file_path)
+
+    for headers, values in raw_rows:
+        row = {}
+        for idx, header in enumerate(headers):
+            if not header:
+                continue
+            row[header] = _clean_value(values[idx]) if idx < len(values) else None
+
+        if any(value is not None for value in row.values()):
+            yield row
+
+
+def estimate_row_count(file_path: str, file_name: Optional[str] = None) -> int:
+    """
+    Cheaply estimate the number of data rows in a spooled file
+
+    Used for progress percentages only; the count may include trailing
+    blank rows.
+    """
+    extension = os.path.splitext(file_name or file_path)[1].lower()
+
+    try:
+        if extension == '.csv':
+            lines = 0
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    lines += block.count(b'\n')
+            return max(0, lines - 1)
+
+        import openpyxl
+        wb = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            max_row = wb.active.max_row or 0
+        finally:
+            wb.close()
+        return max(0, max_row - 1)
+    except Exception as e:
+        logger.warning(f"Failed to estimate row count for {file_path}: {str(e)}")
+        return 0
+
+
+def iter_chunks(
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int,
+    start_row: int = 1
+) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Group rows into chunks of (row_number, row_data) tuples
+
+    Args:
+        rows: Row iterator
+        chunk_size: Rows per chunk
+        start_row: Row number of the first row (1-based, data rows only)
+    """
+    chunk = []
+    for row_number, row in enumerate(rows, start_row):
+        chunk.append((row_number, row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ==================== Pipeline ====================
+
+class ImportProgress:
+    """Running counters for an import"""
+
+    def __init__(self, total_estimate: int = 0):
+        self.total_estimate = total_estimate
+        self.processed = 0
+        self.imported = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.chunks = 0
+        self.resumed_rows = 0
+        self.last_chunk_rows = 0
+        self.last_chunk_seconds = 0.0
+        self.started_at = datetime.utcnow()
+
+    def restore(self, checkpoint: ImportCheckpoint, start_row: int = 1):
+        """Continue the counters of a previous run from its checkpoint"""
+        self.processed = max(0, checkpoint.last_committed_row - (start_row - 1))
+        self.resumed_rows = self.processed
+        self.imported = checkpoint.imported
+        self.updated = checkpoint.updated
+        self.skipped = checkpoint.skipped
+        self.failed = checkpoint.failed
+        self.chunks = checkpoint.chunks
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = (datetime.utcnow() - self.started_at).total_seconds()
+        processed_this_run = self.processed - self.resumed_rows
+        return {
+            'processed': self.processed,
+            'total_estimate': self.total_estimate,
+            'imported': self.imported,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'chunks': self.chunks,
+            'resumed_rows': self.resumed_rows,
+            'rows_per_second': round(processed_this_run / elapsed, 2) if elapsed > 0 else None,
+            'chunk_rows': self.last_chunk_rows,
+            'chunk_seconds': round(self.last_chunk_seconds, 3),
+            'chunk_rows_per_second': (
+                round(self.last_chunk_rows / self.last_chunk_seconds, 2) if self.last_chunk_seconds > 0 else None
+            ),
+            'progress': min(100, int(self.processed / self.total_estimate * 100)) if self.total_estimate else None
+        }
+
+
+class CustomerImportPipeline:
+    """Chunked customer import pipeline"""
+
+    def __init__(
+        self,
+        session,
+        import_mode: str = 'skip_duplicates',
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        validation_service: Optional[DataValidationService] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        max_errors: int = 100,
+        name_index: Optional[CompanyNameIndex] = None,
+        checkpoint: Optional[ImportCheckpoint] = None
+    ):
+        """
+        Initialize pipeline
+
+        Args:
+            session: Database session
+            import_mode: skip_duplicates, update_duplicates or create_all
+            chunk_size: Rows validated and committed together
+            validation_service: Validation service (default: new instance)
+            progress_callback: Called with progress dict after every chunk
+            max_errors: Maximum number of row errors kept in the result
+            name_index: Company name index kept in sync with written rows
+                (default: the global index)
+            checkpoint: Checkpoint (attached to ``session``) to resume from
+                and to advance with every committed chunk
+        """
+        if import_mode not in IMPORT_MODES:
+            raise ImportPipelineError(
+                f"Invalid import mode: {import_mode}. Valid modes: {', '.join(IMPORT_MODES)}"
+            )
+
+        self.session = session
+        self.import_mode = import_mode
+        self.chunk_size = max(1, chunk_size)
+        self.validation_service = validation_service or DataValidationService()
+        self.progress_callback = progress_callback
+        self.max_errors = max_errors
+        self.errors: List[Dict[str, Any]] = []
+        self.name_index = name_index if name_index is not None else company_name_index
+        self.checkpoint = checkpoint
+
+    def run(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        total_estimate: int = 0,
+        start_row: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Import rows chunk by chunk
+
+        Args:
+            rows: Row iterator (e.g. from iter_file_rows)
+            total_estimate: Estimated row count for progress percentages
+            start_row: Row number of the first row
+
+        Returns:
+            Import result summary
+        """
+        progress = ImportProgress(total_estimate)
+
+        if self.checkpoint is not None and self.checkpoint.last_committed_row >= start_row:
+            # Resume after the last row committed by a previous run
+            progress.restore(self.checkpoint, start_row)
+            rows = islice(rows, progress.resumed_rows, None)
+            start_row = self.checkpoint.last_committed_row + 1
+            logger.info(f"Resuming import {self.checkpoint.import_id} at row {start_row}")
+
+        for chunk in iter_chunks(rows, self.chunk_size, start_row):
+            self.process_chunk(chunk, progress)
+            self._report_progress(progress)
+
+        if self.checkpoint is not None:
+            self.checkpoint.status = 'completed'
+            self.session.commit()
+
+        return {
+            'total_rows': progress.processed,
+            'imported': progress.imported,
+            'skipped': progress.skipped,
+            'updated': progress.updated,
+            'failed': progress.failed,
+            'errors': self.errors,
+            'import_mode': self.import_mode,
+            'chunks': progress.chunks,
+            'resumed_rows': progress.resumed_rows
+        }
+
+    def validate(self, rows: Iterable[Dict[str, Any]], total_estimate: int = 0) -> Dict[str, Any]:
+        """
+        Validate rows chunk by chunk without writing
+
+        Only the first ``max_errors`` non-importable rows are kept in
+        ``results`` and each chunk gets its own duplicate resolver, so memory
+        stays flat for large files. Importable rows are registered with the
+        chunk's resolver so later rows of the chunk repeating their keys are
+        reported as in-file duplicates; repeats in later chunks are caught at
+        import time, when the earlier chunk is already committed.
+        """
+        progress = ImportProgress(total_estimate)
+        valid_rows = 0
+        invalid_rows = 0
+        duplicate_rows = 0
+        results = []
+
+        for chunk in iter_chunks(rows, self.chunk_size):
+            validations = self._validate_chunk(chunk)
+            resolver = BulkDuplicateResolver(self.session, name_index=self.name_index)
+            resolver.prefetch(row for _, row in chunk)
+
+            for (row_number, row_data), validation in zip(chunk, validations):
+                row_duplicates = resolver.match(row_data)
+                is_importable = validation['is_valid'] and not row_duplicates
+                if is_importable:
+                    valid_rows += 1
+                    resolver.register_row(row_number, row_data)
+                    continue
+
+                invalid_rows += 1
+                if row_duplicates:
+                    duplicate_rows += 1
+                if len(results) < self.max_errors:
+                    results.append({
+                        'row_number': row_number,
+                        'validation': validation,
+                        'duplicates': row_duplicates,
+                        'is_importable': False
+                    })
+
+            progress.processed += len(chunk)
+            progress.chunks += 1
+            self._report_progress(progress)
+
+        total_rows = progress.processed
+        return {
+            'total_rows': total_rows,
+            'valid_rows': valid_rows,
+            'invalid_rows': invalid_rows,
+            'duplicate_rows': duplicate_rows,
+            'validation_rate': valid_rows / total_rows if total_rows > 0 else 0,
+            'results': results
+        }
+
+    def process_chunk(self, chunk: List[Tuple[int, Dict[str, Any]]], progress: ImportProgress):
+        """Validate, de-duplicate and write one chunk, then commit it (with the checkpoint)"""
+        started = time.perf_counter()
+        validations = self._validate_chunk(chunk)
+
+        try:
+            written_names = self._write_chunk(chunk, validations, progress)
+            progress.processed += len(chunk)
+            progress.chunks += 1
+            self._advance_checkpoint(chunk[-1][0], progress)
+            self.session.commit()
+        except Exception as e:
+            logger.error(f"Import chunk starting at row {chunk[0][0]} failed: {str(e)}")
+            self.session.rollback()
+            raise
+
+        for customer_pk, company_name in written_names:
+            self.name_index.add(customer_pk, company_name)
+
+        progress.last_chunk_rows = len(chunk)
+        progress.last_chunk_seconds = time.perf_counter() - started
+
+    def _advance_checkpoint(self, last_row: int, progress: ImportProgress):
+        """Record the chunk's last row in the checkpoint (same transaction as the chunk)"""
+        if self.checkpoint is None:
+            return
+        self.checkpoint.last_committed_row = last_row
+        self.checkpoint.imported = progress.imported
+        self.checkpoint.updated = progress.updated
+        self.checkpoint.skipped = progress.skipped
+        self.checkpoint.failed = progress.failed
+        self.checkpoint.chunks = progress.chunks
+
+    def _validate_chunk(self, chunk: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Run row validation for the whole chunk at once"""
+        results = self.validation_service.validate_rows([row for _, row in chunk])
+        return [result.to_dict() for result in results]
+
+    def _write_chunk(
+        self,
+        chunk: List[Tuple[int, Dict[str, Any]]],
+        validations: List[Dict[str, Any]],
+        progress: ImportProgress
+    ) -> List[Tuple[int, str]]:
+        """
+        Apply the chunk to the session
+
+        Existing customers matching any row of the chunk are fetched up front
+        by the bulk duplicate resolver and every row is planned as an insert,
+        an update or a skip. Rows repeating an earlier row of the same chunk
+        are folded into that row's insert in update_duplicates mode. The plan
+        is then written by the bulk writer with one statement per batch.
+
+        Returns:
+            (customer primary key, company name) of written customers, for
+            updating the company name index once the chunk is committed
+        """
+        resolver = BulkDuplicateResolver(self.session, name_index=self.name_index)
+        resolver.prefetch(row for (_, row), validation in zip(chunk, validations) if validation['is_valid'])
+
+        inserts = []
+        updates = []
+        pending_inserts: Dict[int, Dict[str, Any]] = {}
+        folded_rows: Dict[int, int] = {}
+        row_errors = []
+
+        for (row_number, row_data), validation in zip(chunk, validations):
+            if not validation['is_valid']:
+                progress.skipped += 1
+                row_errors.append({'row': row_number, 'errors': validation['errors'], 'action': 'skipped'})
+                continue
+
+            duplicates = resolver.match(row_data) if self.import_mode != 'create_all' else []
+
+            if duplicates and self.import_mode == 'skip_duplicates':
+                progress.skipped += 1
+                row_errors.append({'row': row_number, 'duplicates': duplicates, 'action': 'skipped'})
+                continue
+
+            if duplicates and self.import_mode == 'update_duplicates':
+                target = duplicates[0]
+                if target['customer_id'] is not None:
+                    updates.append((row_number, target['customer_id'], row_data))
+                    resolver.register_row(row_number, row_data, customer_id=target['customer_id'])
+                else:
+                    pending_row = pending_inserts[target['row_number']]
+                    pending_row.update({key: value for key, value in row_data.items() if value is not None})
+                    folded_rows[row_number] = target['row_number']
+                    resolver.register_row(target['row_number'], pending_row)
+                continue
+
+            pending_row = dict(row_data)
+            pending_inserts[row_number] = pending_row
+            inserts.append((row_number, pending_row))
+            resolver.register_row(row_number, pending_row)
+
+        writer = CustomerBulkWriter(self.session, batch_size=self.chunk_size)
+        outcomes = writer.insert_rows(inserts, on_conflict=CONFLICT_MODES_BY_IMPORT_MODE[self.import_mode])
+        outcomes.update(writer.update_rows(updates))
+        for row_number, target_row in folded_rows.items():
+            outcome = dict(outcomes[target_row], row=row_number)
+            if outcome['action'] == 'imported':
+                outcome['action'] = 'updated'
+            outcomes[row_number] = outcome
+
+        row_names = {row_number: row['company_name'] for row_number, row in inserts}
+        row_names.update({row_number: row.get('company_name') for row_number, _, row in updates})
+        written_names = []
+
+        for row_number in sorted(outcomes):
+            outcome = outcomes[row_number]
+            if outcome['action'] in ('imported', 'updated') and row_names.get(row_number):
+                written_names.append((outcome['customer_id'], row_names[row_number]))
+
+            if outcome['action'] == 'imported':
+                progress.imported += 1
+            elif outcome['action'] == 'updated':
+                progress.updated += 1
+            elif outcome['action'] == 'skipped':
+                progress.skipped += 1
+                row_errors.append({
+                    'row': row_number,
+                    'duplicates': [{
+                        'customer_id': outcome['customer_id'],
+                        'match_type': 'exact',
+                        'match_fields': outcome.get('match_fields', [])
+                    }],
+                    'action': 'skipped'
+                })
+            else:
+                progress.failed += 1
+                row_errors.append({'row': row_number, 'error': outcome['error'], 'action': 'failed'})
+
+        for error in sorted(row_errors, key=lambda e: e['row']):
+            self._add_error(error)
+
+        return written_names
+
+    def _add_error(self, error: Dict[str, Any]):
+        if len(self.errors) < self.max_errors:
+            self.errors.append(error)
+
+    def _report_progress(self, progress: ImportProgress):
+        if self.progress_callback:
+            try:
+                self.progress_callback(progress.to_dict())
+            except Exception as e:
+                logger.warning(f"Import progress callback failed: {str(e)}")
+
+
+# ==================== Checkpoints ====================
+
+def load_checkpoint(
+    session,
+    import_id: str,
+    file_name: Optional[str] = None,
+    import_mode: str = 'skip_duplicates',
+    total_estimate: int = 0
+) -> ImportCheckpoint:
+    """
+    Fetch the checkpoint of an import, creating it on the first run
+
+    Every call counts as one attempt and is committed immediately.
+
+    Args:
+        session: Database session
+        import_id: Batch task ID or Celery task ID of the import
+        file_name: Original upload file name
+        import_mode: Import mode
+        total_estimate: Estimated row count
+
+    Returns:
+        Checkpoint attached to ``session``
+    """
+    checkpoint = session.get(ImportCheckpoint, import_id)
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(
+            import_id=import_id,
+            file_name=file_name,
+            import_mode=import_mode,
+            status='processing',
+            last_committed_row=0,
+            total_estimate=0,
+            imported=0,
+            updated=0,
+            skipped=0,
+            failed=0,
+            chunks=0,
+            attempts=0
+        )
+        session.add(checkpoint)
+
+    checkpoint.attempts += 1
+    if total_estimate:
+        checkpoint.total_estimate = total_estimate
+    session.commit()
+    return checkpoint
+
+
+def purge_checkpoints(session, max_age_seconds: int) -> int:
+    """
+    Delete checkpoints of finished imports older than max_age_seconds
+
+    Returns:
+        Number of checkpoints deleted
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+    deleted = session.query(ImportCheckpoint).filter(
+        ImportCheckpoint.status != 'processing',
+        ImportCheckpoint.updated_at < cutoff
+    ).delete(synchronize_session=False)
+    session.commit()
+    return deleted
+
@@ -0,0 +1,448 @@
+# OP_CMS Customer Ledger
+# Story 3.4: Settlement Payment Writeoff - materialized customer balances
+
+"""
+Materialized customer balances
+
+``customer_balances`` holds one row per customer with the lifetime totals,
+the open amount, its aging buckets and the last activity dates, so readers
+(dashboard, risk engine) look a customer up by primary key instead of
+summing settlements, payments and write-offs.
+
+Rows are maintained transactionally: sessions registered with
+``track_balances`` collect the customers touched by settlement, payment and
+write-off writes (ORM flushes and ORM bulk INSERT/UPDATE/DELETE statements)
+and recompute those customers' rows just before the transaction commits,
+holding a lock on the customer rows. The recompute has to see writes
+committed while it waited for that lock, so MySQL sessions run at READ
+COMMITTED (DatabaseSessionFactory).
+
+Aging buckets depend on the clock, so they are correct as of ``aged_at``;
+``rebuild_balances`` re-ages every row nightly and reports rows whose
+amounts drifted from the source tables (writes that bypassed the session,
+e.g. raw SQL).
+
+Balances are summed across currencies; receivable totals in one currency
+come from ``fx_rates.receivable_totals``. Settlements moved to the archive
+tier (backend.services.archive_tier) keep counting towards the lifetime
+totals: the settlement and write-off queries also run on the archive
+tables (``archive_statement``, filtered to the customers computed and
+served by their customer_id/settlement_id indexes) and both tiers' rows
+are added up, so a commit never reads a UNION of the whole archive.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from sqlalchemy import and_, case, delete, func, insert, inspect, select
+
+from backend.models.customer_balance_models import CustomerBalance
+from backend.models.database_models import Customer, SettlementRecord
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.services.archive_tier import archive_statement
+from backend.services.reminder_dispatcher import PAYMENT_TERM_DAYS
+from backend.services.session_tracking import SessionTracker, changed_objects, written_model
+
+logger = logging.getLogger(__name__)
+
+# Settlement statuses that are still receivable
+OPEN_STATUSES = ('pending', 'approved')
+
+# Settlement statuses that are not billed
+VOID_STATUSES = ('cancelled', 'rejected')
+
+# Aging buckets: (column, first day past due, last day past due)
+AGING_BUCKETS = (
+    ('overdue_1_30', 1, 30),
+    ('overdue_31_60', 31, 60),
+    ('overdue_61_90', 61, 90),
+    ('overdue_90_plus', 91, None),
+)
+
+# Columns compared by the drift check (aging buckets move with the clock)
+DRIFT_FIELDS = (
+    'total_billed', 'total_paid', 'total_written_off', 'open_amount', 'open_settlements',
+    'unapplied_amount', 'oldest_open_at', 'last_settlement_at', 'last_payment_at', 'last_writeoff_at'
+)
+
+# Customers per IN (...) list
+DEFAULT_CHUNK_SIZE = 1000
+
+# Drifted customers listed in the rebuild report
+MAX_DRIFT_SAMPLES = 20
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+# Customers/settlements touched in the current transaction
+session_tracker = SessionTracker('customer_ledger', lambda: {'customers': set(), 'settlements': set()})
+
+
+def _money(value: Any) -> Decimal:
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _chunks(values: Sequence[int], size: int) -> Iterable[Sequence[int]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _combine(key: str, current: Any, value: Any) -> Any:
+    """Combine a balance column of the live and the archive tier"""
+    if value is None:
+        return current
+    if current is None:
+        return value
+    if key == 'oldest_open_at':
+        return min(current, value)
+    if key.startswith('last_'):
+        return max(current, value)
+    if isinstance(current, int) and isinstance(value, int):
+        return current + value
+    return Decimal(str(current)) + Decimal(str(value))
+
+
+def empty_balance() -> Dict[str, Any]:
+    """Balance of a customer without activity"""
+    balance: Dict[str, Any] = {
+        'total_billed': ZERO, 'total_paid': ZERO, 'total_written_off': ZERO,
+        'open_amount': ZERO, 'open_settlements': 0, 'unapplied_amount': ZERO,
+        'current_amount': ZERO, 'oldest_open_at': None,
+        'last_settlement_at': None, 'last_payment_at': None, 'last_writeoff_at': None
+    }
+    for column, _, _ in AGING_BUCKETS:
+        balance[column] = ZERO
+    return balance
+
+
+# ==================== Computation ====================
+
+def compute_balances(
+    session,
+    customer_ids: Optional[Sequence[int]] = None,
+    as_of: Optional[datetime] = None
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Compute balances from the source tables (three grouped queries)
+
+    Args:
+        session: Database session
+        customer_ids: Customers to compute (default: all)
+        as_of: Reference time of the aging buckets (default: now)
+
+    Returns:
+        Balance columns by customer ID, for customers with any activity
+    """
+    as_of = as_of or datetime.utcnow()
+    due_before = as_of - timedelta(days=PAYMENT_TERM_DAYS)
+
+    settled = (
+        select(SettlementWriteoff.settlement_id, func.sum(SettlementWriteoff.writeoff_amount).label('amount'))
+        .group_by(SettlementWriteoff.settlement_id)
+    )
+    if customer_ids is not None:
+        settled = settled.where(SettlementWriteoff.settlement_id.in_(
+            select(SettlementRecord.id).where(SettlementRecord.customer_id.in_(customer_ids))
+        ))
+    settled = settled.subquery()
+    outstanding = SettlementRecord.total_amount - func.coalesce(settled.c.amount, 0)
+    is_open = and_(SettlementRecord.status.in_(OPEN_STATUSES), outstanding > 0)
+
+    def open_sum(*conditions):
+        return func.sum(case((and_(is_open, *conditions), outstanding), else_=0))
+
+    created = SettlementRecord.created_at
+    bucket_columns = []
+    for column, first_day, last_day in AGING_BUCKETS:
+        conditions = [created < due_before - timedelta(days=first_day - 1)]
+        if last_day is not None:
+            conditions.append(created >= due_before - timedelta(days=last_day))
+        bucket_columns.append(open_sum(*conditions).label(column))
+
+    settlement_query = (
+        select(
+            SettlementRecord.customer_id,
+            func.sum(case((SettlementRecord.status.in_(VOID_STATUSES), 0), else_=SettlementRecord.total_amount))
+            .label('total_billed'),
+            open_sum().label('open_amount'),
+            func.sum(case((is_open, 1), else_=0)).label('open_settlements'),
+            open_sum(created >= due_before).label('current_amount'),
+            *bucket_columns,
+            func.min(case((is_open, created), else_=None)).label('oldest_open_at'),
+            func.max(created).label('last_settlement_at')
+        )
+        .outerjoin(settled, settled.c.settlement_id == SettlementRecord.id)
+        .group_by(SettlementRecord.customer_id)
+    )
+    payment_query = (
+        select(
+            PaymentRecord.customer_id,
+            func.sum(PaymentRecord.payment_amount).label('total_paid'),
+            func.max(PaymentRecord.payment_date).label('last_payment_at')
+        )
+        .group_by(PaymentRecord.customer_id)
+    )
+    writeoff_query = (
+        select(
+            SettlementRecord.customer_id,
+            func.sum(SettlementWriteoff.writeoff_amount).label('total_written_off'),
+            func.max(SettlementWriteoff.writeoff_date).label('last_writeoff_at')
+        )
+        .join(SettlementRecord, SettlementRecord.id == SettlementWriteoff.settlement_id)
+        .group_by(SettlementRecord.customer_id)
+    )
+    if customer_ids is not None:
+        settlement_query = settlement_query.where(SettlementRecord.customer_id.in_(customer_ids))
+        payment_query = payment_query.where(PaymentRecord.customer_id.in_(customer_ids))
+        writeoff_query = writeoff_query.where(SettlementRecord.customer_id.in_(customer_ids))
+
+    balances: Dict[int, Dict[str, Any]] = defaultdict(empty_balance)
+    for query in (settlement_query, payment_query, writeoff_query):
+        archived = archive_statement(query)
+        for statement in (query, archived) if archived is not None else (query,):
+            for row in session.execute(statement).mappings():
+                balance = balances[row['customer_id']]
+                for key, value in row.items():
+                    if key != 'customer_id':
+                        balance[key] = _combine(key, balance[key], value)
+
+    for balance in balances.values():
+        for key, value in balance.items():
+            if isinstance(value, (Decimal, float, int)) and key != 'open_settlements':
+                balance[key] = _money(value)
+        balance['open_settlements'] = int(balance['open_settlements'] or 0)
+        balance['unapplied_amount'] = balance['total_paid'] - balance['total_written_off']
+    return dict(balances)
+
+
+def apply_balances(
+    session,
+    customer_ids: Iterable[int],
+    as_of: Optional[datetime] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Recompute and store the balances of the given customers
+
+    Runs in the caller's transaction; rows of customers without activity
+    are removed. The customers' rows are locked (SELECT ... FOR UPDATE, in
+    id order) before their balances are computed, so two transactions
+    touching the same customer recompute one after the other and the later
+    one sees the earlier one's writes.
+
+    Returns:
+        Number of balance rows written
+    """
+    as_of = as_of or datetime.utcnow()
+    customer_ids = sorted(set(customer_ids))
+    written = 0
+    for chunk in _chunks(customer_ids, chunk_size):
+        session.execute(
+            select(Customer.id).where(Customer.id.in_(chunk)).order_by(Customer.id).with_for_update()
+        ).all()
+        computed = compute_balances(session, chunk, as_of)
+        session.execute(
+            delete(CustomerBalance).where(CustomerBalance.customer_id.in_(chunk)),
+            execution_options={'synchronize_session': False}
+        )
+        rows = [
+            dict(computed[customer_id], customer_id=customer_id, aged_at=as_of, updated_at=datetime.utcnow())
+            for customer_id in chunk if customer_id in computed
+        ]
+        if rows:
+            session.execute(insert(CustomerBalance), rows)
+        written += len(rows)
+    return written
+
+
+# ==================== Transactional maintenance ====================
+
+def mark_balances_dirty(session, customer_ids: Iterable[int] = (), settlement_ids: Iterable[int] = ()):
+    """Refresh these customers' balances when the session's transaction commits"""
+    pending = session_tracker.pending(session)
+    pending['customers'].update(customer_id for customer_id in customer_ids if customer_id is not None)
+    pending['settlements'].update(settlement_id for settlement_id in settlement_ids if settlement_id is not None)
+
+
+@session_tracker.listens_for('after_flush')
+def _after_flush(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state here
+    customer_ids, settlement_ids = set(), set()
+    for obj in changed_objects(session):
+        if isinstance(obj, (SettlementRecord, PaymentRecord)):
+            customer_ids.add(obj.customer_id)
+            # A record moved to another customer changes both balances
+            customer_ids.update(inspect(obj).attrs.customer_id.history.deleted or ())
+        elif isinstance(obj, SettlementWriteoff):
+            settlement_ids.add(obj.settlement_id)
+            settlement_ids.update(inspect(obj).attrs.settlement_id.history.deleted or ())
+    if customer_ids or settlement_ids:
+        mark_balances_dirty(session, customer_ids, settlement_ids)
+
+
+@session_tracker.listens_for('do_orm_execute')
+def _do_orm_execute(state):
+    model = written_model(state)
+    if model in (SettlementRecord, PaymentRecord):
+        key = model.customer_id
+    elif model is SettlementWriteoff:
+        key = SettlementWriteoff.settlement_id
+    else:
+        return
+
+    if state.is_insert:
+        parameters = state.parameters or {}
+        values = {row.get(key.key) for row in ([parameters] if isinstance(parameters, dict) else parameters)}
+    else:
+        # Rows matched by a bulk UPDATE/DELETE are looked up before it runs
+        query = select(key).distinct()
+        if state.statement.whereclause is not None:
+            query = query.where(state.statement.whereclause)
+        values = set(state.session.execute(query).scalars())
+
+    if model is SettlementWriteoff:
+        mark_balances_dirty(state.session, settlement_ids=values)
+    else:
+        mark_balances_dirty(state.session, customer_ids=values)
+
+
+@session_tracker.listens_for('before_commit')
+def _before_commit(session):
+    # Flushing here collects the writes still pending in the unit of work
+    session.flush()
+    pending = session_tracker.pop_pending(session)
+    if not pending:
+        return
+    customer_ids = set(pending['customers'])
+    settlement_ids = sorted(pending['settlements'])
+    for chunk in _chunks(settlement_ids, DEFAULT_CHUNK_SIZE):
+        customer_ids.update(session.execute(
+            select(SettlementRecord.customer_id).where(SettlementRecord.id.in_(chunk)).distinct()
+        ).scalars())
+    if customer_ids:
+        apply_balances(session, customer_ids)
+
+
+def track_balances(target) -> None:
+    """
+    Maintain customer balances for sessions of a sessionmaker (or Session class)
+
+    Settlement, payment and write-off writes made through these sessions
+    refresh the affected customers' balances in the same transaction.
+    """
+    session_tracker.track(target)
+
+
+def untrack_balances(target) -> None:
+    """Stop maintaining customer balances for a sessionmaker"""
+    session_tracker.untrack(target)
+
+
+# ==================== Rebuild ====================
+
+def rebuild_balances(
+    session,
+    as_of: Optional[datetime] = None,
+    repair: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress_callback: Optional[Callable[[int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Recompute every balance, report drift and re-age the buckets
+
+    Customers are processed in chunks of chunk_size, one transaction per
+    chunk, so the table is never locked as a whole.
+
+    Args:
+        session: Database session
+        as_of: Reference time of the aging buckets (default: now)
+        repair: Write the recomputed rows (False: check only)
+        chunk_size: Customers per chunk
+        progress_callback: Called with the number of customers checked after each chunk
+
+    Returns:
+        Report with counts of drifted, missing and orphaned rows and drift samples
+    """
+    as_of = as_of or datetime.utcnow()
+    report: Dict[str, Any] = {
+        'customers': 0, 'rows': 0, 'drifted': 0, 'missing': 0, 'orphaned': 0,
+        'repaired': repair, 'samples': []
+    }
+
+    last_id = 0
+    while True:
+        chunk = list(session.execute(
+            select(Customer.id).where(Customer.id > last_id).order_by(Customer.id).limit(chunk_size)
+        ).scalars())
+        if not chunk:
+            break
+        last_id = chunk[-1]
+
+        computed = compute_balances(session, chunk, as_of)
+        stored = {
+            row.customer_id: row
+            for row in session.execute(
+                select(CustomerBalance).where(CustomerBalance.customer_id.in_(chunk))
+            ).scalars()
+        }
+        for customer_id in chunk:
+            actual, row = computed.get(customer_id), stored.get(customer_id)
+            if actual is None and row is None:
+                continue
+            if row is None:
+                report['missing'] += 1
+                continue
+            if actual is None:
+                report['orphaned'] += 1
+                continue
+            fields = {
+                field: [str(getattr(row, field)), str(actual[field])]
+                for field in DRIFT_FIELDS
+                if getattr(row, field) != actual[field]
+            }
+            if fields:
+                report['drifted'] += 1
+                if len(report['samples']) < MAX_DRIFT_SAMPLES:
+                    report['samples'].append({'customer_id': customer_id, 'fields': fields})
+
+        report['customers'] += len(chunk)
+        report['rows'] += len(computed)
+        if repair:
+            apply_balances(session, chunk, as_of, chunk_size)
+            session.commit()
+        else:
+            session.rollback()
+        if progress_callback:
+            progress_callback(report['customers'])
+
+    if report['drifted'] or report['missing'] or report['orphaned']:
+        logger.warning(
+            f"Customer balance drift: {report['drifted']} drifted, {report['missing']} missing, "
+            f"{report['orphaned']} orphaned of {report['customers']} customers"
+        )
+    logger.info(f"Customer balances rebuilt: {report['rows']} rows as of {as_of.isoformat()}")
+    return report
+
+
+# ==================== Readers ====================
+
+def get_balance(session, customer_id: int) -> Optional[CustomerBalance]:
+    """Balance row of one customer (None when the customer has no activity)"""
+    return session.get(CustomerBalance, customer_id)
+
+
+def ledger_totals(session) -> Dict[str, Decimal]:
+    """Receivable totals across all customers (native amounts, summed across currencies)"""
+    overdue = sum(getattr(CustomerBalance, column) for column, _, _ in AGING_BUCKETS)
+    row = session.execute(
+        select(
+            func.coalesce(func.sum(CustomerBalance.open_amount), 0).label('open_amount'),
+            func.coalesce(func.sum(CustomerBalance.current_amount), 0).label('current_amount'),
+            func.coalesce(func.sum(overdue), 0).label('overdue_amount'),
+            func.coalesce(func.sum(CustomerBalance.unapplied_amount), 0).label('unapplied_amount')
+        )
+    ).mappings().one()
+    return {key: _money(value) for key, value in row.items()}
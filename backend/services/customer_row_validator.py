@@ -0,0 +1,271 @@
+# OP_CMS Customer Row Validator
+# Story 6.1: Data Quality Validation & Duplicate Detection - compiled, column-wise validation
+
+"""
+Compiled, column-wise row validation engine
+
+A rule set is compiled once (regular expressions, enum sets) and then run
+over a whole chunk of rows at a time: the chunk is pivoted into columns,
+each column is normalized once per normalizer, and every rule is evaluated
+as one pass of a compiled check over that column, producing a NumPy
+failure mask. Per-row work is limited to the rows that failed:
+``failures`` reports only those rows.
+
+String checks are one C-level ``map`` of the compiled str/regex method per
+cell. ``Series.str`` on object columns wraps every call in a Python lambda
+and measured 3-4x slower, so it is not used.
+
+The engine only reports which rule failed for which row; the callers
+(DataValidationService, CustomerExcelService) turn violations into their
+own error structures, so existing error formats are unchanged.
+"""
+
+import re
+from functools import partial
+from itertools import repeat
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Rule checks
+RULE_CHECKS = ['required', 'pattern', 'length', 'enum']
+
+# Value normalizations applied before pattern/length checks
+NORMALIZERS = ['strip', 'upper', 'digits', 'raw']
+
+# Separators removed by the 'digits' normalizer
+_PHONE_SEPARATORS = re.compile(r'[\+\-\(\)\s]')
+
+
+class FieldRule:
+    """One compiled check on one column"""
+
+    def __init__(
+        self,
+        name: str,
+        field: str,
+        check: str,
+        message: str,
+        pattern: Optional[Union[str, re.Pattern]] = None,
+        length: Optional[Tuple[int, int]] = None,
+        choices: Optional[Iterable[Any]] = None,
+        normalize: str = 'strip',
+        strings_only: bool = False,
+        unless: Optional[Union[str, Sequence[str]]] = None
+    ):
+        """
+        Initialize rule
+
+        Args:
+            name: Rule name (unique within a rule set)
+            field: Column the rule checks
+            check: required, pattern, length or enum
+            message: Error message reported by the caller
+            pattern: Regular expression that must match the whole value
+            length: Inclusive (min, max) length of the normalized value (max None: unbounded)
+            choices: Allowed values (enum)
+            normalize: strip, upper (strip + upper), digits (strip + drop
+                phone separators) or raw; applies to pattern/length checks
+            strings_only: Only check values that are already strings
+            unless: Skip the rule for rows where the named rule(s) already failed
+        """
+        if check not in RULE_CHECKS:
+            raise ValueError(f"Invalid rule check: {check}")
+        if normalize not in NORMALIZERS:
+            raise ValueError(f"Invalid normalizer: {normalize}")
+
+        self.name = name
+        self.field = field
+        self.check = check
+        self.message = message
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.length = length
+        self.choices = frozenset(choices) if choices is not None else None
+        self.normalize = normalize
+        self.strings_only = strings_only
+        self.unless = (unless,) if isinstance(unless, str) else tuple(unless or ())
+
+
+class RuleViolation:
+    """A failed rule for one row"""
+
+    __slots__ = ('rule', 'value', 'text')
+
+    def __init__(self, rule: FieldRule, value: Any, text: Optional[str]):
+        self.rule = rule
+        self.value = value
+        self.text = text
+
+    @property
+    def field(self) -> str:
+        return self.rule.field
+
+    @property
+    def message(self) -> str:
+        return self.rule.message
+
+
+class _Column:
+    """Per-chunk column data shared by all rules on the same field"""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        notna = ~pd.isna(values)
+        # Present: not null/NaN and truthy (mirrors ``if value and not pd.isna(value)``)
+        self.present = notna.copy()
+        self.present[notna] = _bool_array(map(bool, self.values[notna]), int(notna.sum()))
+        self._is_str: Optional[np.ndarray] = None
+        self._texts: Dict[str, np.ndarray] = {}
+        self._aligned: Dict[str, np.ndarray] = {}
+
+    @property
+    def is_str(self) -> np.ndarray:
+        """Mask of cells holding str values"""
+        if self._is_str is None:
+            self._is_str = _bool_array(map(isinstance, self.values, repeat(str)), len(self.values))
+        return self._is_str
+
+    def text(self, normalize: str) -> np.ndarray:
+        """Normalized string values of present cells (cached per normalizer)"""
+        if normalize not in self._texts:
+            if normalize == 'raw':
+                present = self.values[self.present]
+                # Skip the str() pass when the column already holds only strings
+                source = present if self.is_str[self.present].all() else map(str, present)
+            elif normalize == 'strip':
+                source = map(str.strip, self.text('raw'))
+            elif normalize == 'upper':
+                source = map(str.upper, self.text('strip'))
+            else:
+                source = map(partial(_PHONE_SEPARATORS.sub, ''), self.text('strip'))
+            self._texts[normalize] = source if isinstance(source, np.ndarray) else _object_array(source)
+        return self._texts[normalize]
+
+    def aligned_text(self, normalize: str) -> np.ndarray:
+        """Normalized text by row position (None for absent cells)"""
+        if normalize not in self._aligned:
+            aligned = np.full(len(self.values), None, dtype=object)
+            aligned[self.present] = self.text(normalize)
+            self._aligned[normalize] = aligned
+        return self._aligned[normalize]
+
+
+def _bool_array(flags: Iterable[Any], count: int) -> np.ndarray:
+    return np.fromiter(flags, dtype=bool, count=count)
+
+
+def _object_array(values: Iterable[Any]) -> np.ndarray:
+    return np.fromiter(values, dtype=object)
+
+
+class RowValidator:
+    """A compiled rule set evaluated column-wise over chunks of rows"""
+
+    def __init__(self, rules: Sequence[FieldRule]):
+        """
+        Initialize validator
+
+        Args:
+            rules: Rules in reporting order
+        """
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Rule names must be unique")
+        self.rules = list(rules)
+        self.fields = list(dict.fromkeys(rule.field for rule in rules))
+
+    def validate(self, rows: Sequence[Dict[str, Any]]) -> List[List[RuleViolation]]:
+        """
+        Validate a chunk of rows
+
+        Args:
+            rows: Row dictionaries
+
+        Returns:
+            Violations per row, in rule order
+        """
+        violations: List[List[RuleViolation]] = [[] for _ in range(len(rows))]
+        for index, row_violations in self.failures(rows).items():
+            violations[index] = row_violations
+        return violations
+
+    def failures(self, rows: Sequence[Dict[str, Any]]) -> Dict[int, List[RuleViolation]]:
+        """
+        Validate a chunk of rows, reporting only the rows that failed
+
+        Args:
+            rows: Row dictionaries
+
+        Returns:
+            Violations (in rule order) by row position, in row order
+        """
+        count = len(rows)
+        if not count:
+            return {}
+
+        columns = {
+            field: _Column(_object_array(map(dict.get, rows, repeat(field))))
+            for field in self.fields
+        }
+        failures: Dict[str, np.ndarray] = {}
+        violations: Dict[int, List[RuleViolation]] = {}
+
+        for rule in self.rules:
+            column = columns[rule.field]
+            failed = self._evaluate(rule, column)
+            for earlier in rule.unless:
+                failed &= ~failures[earlier]
+            failures[rule.name] = failed
+
+            if not failed.any():
+                continue
+            texts = column.aligned_text(rule.normalize) if rule.check in ('pattern', 'length') else None
+            for index in np.flatnonzero(failed).tolist():
+                text = texts[index] if texts is not None else None
+                violations.setdefault(index, []).append(RuleViolation(rule, column.values[index], text))
+
+        return dict(sorted(violations.items()))
+
+    def validate_one(self, row: Dict[str, Any]) -> List[RuleViolation]:
+        """Validate a single row"""
+        return self.failures([row]).get(0, [])
+
+    @staticmethod
+    def _evaluate(rule: FieldRule, column: _Column) -> np.ndarray:
+        """Boolean failure mask of one rule over one column"""
+        if rule.check == 'required':
+            # Present strings are non-empty, so blank means whitespace only
+            strings = column.present & column.is_str
+            blank = np.zeros(len(column.values), dtype=bool)
+            blank[strings] = _bool_array(map(str.isspace, column.values[strings]), int(strings.sum()))
+            return ~column.present | blank
+
+        applies = column.present & column.is_str if rule.strings_only else column.present.copy()
+        failed = np.zeros(len(column.values), dtype=bool)
+        count = int(applies.sum())
+        if not count:
+            return failed
+
+        if rule.check == 'enum':
+            failed[applies] = ~pd.Series(column.values[applies]).isin(rule.choices).to_numpy()
+            return failed
+
+        text = column.text(rule.normalize)[applies[column.present]]
+        if rule.check == 'pattern':
+            passed = _bool_array(map(bool, map(rule.pattern.fullmatch, text)), count)
+        else:
+            lengths = np.fromiter(map(len, text), dtype=np.int64, count=count)
+            passed = lengths >= rule.length[0]
+            if rule.length[1] is not None:
+                passed &= lengths <= rule.length[1]
+        failed[applies] = ~passed
+        return failed
+
+
+def enum_choices_text(choices: Sequence[str]) -> str:
+    """Format enum choices for messages, e.g. 'vip, standard 或 economy'"""
+    choices = list(choices)
+    if len(choices) == 1:
+        return choices[0]
+    return f"{', '.join(choices[:-1])} 或 {choices[-1]}"
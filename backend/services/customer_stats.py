@@ -0,0 +1,403 @@
+# OP_CMS Customer Stats
+# Story 4.1: Management Dashboard - customer distributions
+
+"""
+Customer distributions by industry, region and level
+
+The dashboard shows how many customers fall into each industry, province
+and level. Instead of counting over the customers table per request, the
+counts are kept in ``customer_stat_counters`` (one row per dimension
+value), so reading the distributions costs one small query regardless of
+the number of customers.
+
+Counters are maintained transactionally: sessions registered with
+``track_customer_stats`` collect +1/-1 deltas per (dimension, value) from
+customer creates, updates and deletes (ORM flushes, ORM and Core bulk
+INSERT, bulk UPDATE by primary key, DELETE) and apply them with
+``count = count + delta`` just before the transaction commits. Deltas are
+kept per savepoint, so rows of a rolled back savepoint (e.g. a failed
+import batch) are not counted. Upserts are counted by their caller: the
+statement carries the REPORTED_OPTION execution option and the caller
+passes the inserted and updated rows to ``record_changes`` (the bulk
+import writer does). Statements whose effect on single rows is unknown
+(unreported upserts, INSERT ... SELECT, UPDATE ... WHERE) make the commit
+recount all counters instead.
+
+``compute_distributions`` counts with one GROUP BY per dimension (MySQL
+has no GROUPING SETS); it seeds the counters (``rebuild_customer_stats``,
+backend/scripts/rebuild_customer_stats.py) and repairs writes that
+bypassed the session.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.dml import Insert
+
+from backend.models.customer_stats_models import CustomerStatCounter
+from backend.models.database_models import Customer
+from backend.services.session_tracking import SessionTracker, changed_objects
+
+logger = logging.getLogger(__name__)
+
+# Dimension -> (Customer attribute, label of customers without a value)
+DIMENSIONS = {
+    'industry': ('industry', '未分类'),
+    'region': ('province', '未分类'),
+    'level': ('level', 'standard'),
+}
+
+# Customers per IN (...) list when reading values before bulk statements
+DEFAULT_CHUNK_SIZE = 1000
+
+# Drifted counters included in a rebuild report
+DRIFT_SAMPLE_SIZE = 20
+
+# Execution option of customer statements whose deltas the caller passes to record_changes
+REPORTED_OPTION = 'customer_stats_reported'
+
+# Deltas (savepoint chain -> Counter, so writes of rolled back savepoints can
+# be dropped), rolled back savepoints and whether a recount is needed
+session_tracker = SessionTracker(
+    'customer_stats',
+    lambda: {'deltas': {}, 'rolled_back': set(), 'rebuild': False},
+    clear_on_rollback=False
+)
+
+
+class CustomerStatsError(Exception):
+    """Custom exception for customer stats errors"""
+    pass
+
+
+def _label(dimension: str, value: Any) -> str:
+    """Counter value of a customer attribute (missing values get the dimension's label)"""
+    return value if value else DIMENSIONS[dimension][1]
+
+
+def _chunks(values: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def compute_distributions(session) -> Dict[str, Dict[str, int]]:
+    """
+    Count customers per dimension value in the database
+
+    Returns:
+        Dictionary of dimension -> {value: count}
+    """
+    distributions = {}
+    for dimension, (attribute, label) in DIMENSIONS.items():
+        value = func.coalesce(func.nullif(getattr(Customer, attribute), ''), label)
+        rows = session.execute(select(value, func.count(Customer.id)).group_by(value)).all()
+        distributions[dimension] = {row[0]: row[1] for row in rows}
+    return distributions
+
+
+def get_distributions(session) -> Dict[str, Any]:
+    """
+    Customer distributions from the counters
+
+    Falls back to compute_distributions while the counters are empty
+    (counters not seeded yet).
+
+    Returns:
+        Dictionary with industry/region/level distributions
+        ([{'name', 'value'}], largest first) and total_customers
+    """
+    rows = session.execute(
+        select(CustomerStatCounter.dimension, CustomerStatCounter.value, CustomerStatCounter.count)
+        .where(CustomerStatCounter.count > 0)
+    ).all()
+    if rows:
+        distributions: Dict[str, Dict[str, int]] = {dimension: {} for dimension in DIMENSIONS}
+        for dimension, value, count in rows:
+            distributions.setdefault(dimension, {})[value] = count
+    else:
+        distributions = compute_distributions(session)
+
+    def ordered(counts: Dict[str, int]) -> List[Dict[str, Any]]:
+        return [{'name': name, 'value': count} for name, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))]
+
+    return {
+        'industry_distribution': ordered(distributions['industry']),
+        'region_distribution': ordered(distributions['region']),
+        'level_distribution': ordered(distributions['level']),
+        # Every customer is counted exactly once per dimension
+        'total_customers': sum(distributions['level'].values())
+    }
+
+
+def rebuild_customer_stats(session, repair: bool = True) -> Dict[str, Any]:
+    """
+    Recompute the counters from the customers table
+
+    Args:
+        session: Database session (committed when repairing)
+        repair: Replace the stored counters
+
+    Returns:
+        Report: counters, drifted (stored count differs), samples
+    """
+    computed = compute_distributions(session)
+    stored = {
+        (dimension, value): count
+        for dimension, value, count in session.execute(
+            select(CustomerStatCounter.dimension, CustomerStatCounter.value, CustomerStatCounter.count)
+        )
+    }
+    expected = {
+        (dimension, value): count for dimension, counts in computed.items() for value, count in counts.items()
+    }
+    drifted = sorted(
+        key for key in set(stored) | set(expected) if stored.get(key, 0) != expected.get(key, 0)
+    )
+    report = {
+        'counters': len(expected),
+        'drifted': len(drifted),
+        'samples': [
+            {'dimension': dimension, 'value': value, 'stored': stored.get((dimension, value), 0),
+             'actual': expected.get((dimension, value), 0)}
+            for dimension, value in drifted[:DRIFT_SAMPLE_SIZE]
+        ]
+    }
+
+    if repair:
+        session.execute(delete(CustomerStatCounter), execution_options={'synchronize_session': False})
+        now = datetime.utcnow()
+        if expected:
+            session.execute(insert(CustomerStatCounter), [
+                {'dimension': dimension, 'value': value, 'count': count, 'updated_at': now}
+                for (dimension, value), count in sorted(expected.items())
+            ])
+        session.commit()
+    if drifted:
+        logger.warning(f"Customer stat counters drifted: {len(drifted)} of {len(expected)}")
+    return report
+
+
+def apply_deltas(session, deltas: Dict[Tuple[str, str], int]) -> int:
+    """
+    Add deltas to the counters in the caller's transaction
+
+    Counters are updated in key order (consistent lock order across
+    transactions); missing counters are inserted.
+
+    Returns:
+        Number of counters changed
+    """
+    now = datetime.utcnow()
+    changed = 0
+    for (dimension, value), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        changed += 1
+        match = (CustomerStatCounter.dimension == dimension, CustomerStatCounter.value == value)
+        increment = update(CustomerStatCounter).where(*match).values(
+            count=CustomerStatCounter.count + delta, updated_at=now
+        ).execution_options(synchronize_session=False)
+        if session.execute(increment).rowcount:
+            continue
+        try:
+            with session.begin_nested():
+                session.execute(insert(CustomerStatCounter).values(
+                    dimension=dimension, value=value, count=delta, updated_at=now
+                ))
+        except IntegrityError:
+            # Inserted by a concurrent transaction
+            session.execute(increment)
+    return changed
+
+
+# ==================== Transactional maintenance ====================
+
+def _deltas(session) -> Counter:
+    """Delta counter of the session's innermost savepoint chain"""
+    scope = []
+    transaction = session.get_nested_transaction()
+    while transaction is not None:
+        if transaction.nested:
+            scope.append(transaction)
+        transaction = transaction.parent
+    return session_tracker.pending(session)['deltas'].setdefault(tuple(scope), Counter())
+
+
+def _count(deltas: Counter, values: Dict[str, Any], sign: int):
+    for dimension, (attribute, _) in DIMENSIONS.items():
+        deltas[(dimension, _label(dimension, values.get(attribute)))] += sign
+
+
+def record_changes(
+    session,
+    added: Iterable[Dict[str, Any]] = (),
+    changed: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]] = ()
+):
+    """
+    Count customer writes of statements executed with REPORTED_OPTION
+
+    Deltas belong to the session's current savepoint, so call this after
+    the statement's savepoint was released.
+
+    Args:
+        session: Database session
+        added: Attribute values of inserted customers
+        changed: (previous values, new values) of updated customers
+    """
+    deltas = _deltas(session)
+    for values in added:
+        _count(deltas, values, 1)
+    for old, new in changed:
+        _count(deltas, old, -1)
+        _count(deltas, new, 1)
+
+
+def _stored_values(session, customer_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Current dimension values of customers (read before they change)"""
+    attributes = [attribute for attribute, _ in DIMENSIONS.values()]
+    stored = {}
+    for chunk in _chunks(sorted(set(customer_ids)), DEFAULT_CHUNK_SIZE):
+        query = select(Customer.id, *(getattr(Customer, attribute) for attribute in attributes))
+        for row in session.execute(query.where(Customer.id.in_(chunk))):
+            stored[row[0]] = dict(zip(attributes, row[1:]))
+    return stored
+
+
+@session_tracker.listens_for('before_flush')
+def _before_flush(session, flush_context, instances):
+    # The database still holds the previous values here
+    attributes = [attribute for attribute, _ in DIMENSIONS.values()]
+    added, changed = [], []
+    for obj in changed_objects(session):
+        if not isinstance(obj, Customer):
+            continue
+        if obj in session.new:
+            added.append(obj)
+        elif obj in session.deleted or any(
+            inspect(obj).attrs[attribute].history.has_changes() for attribute in attributes
+        ):
+            changed.append(obj)
+    if not added and not changed:
+        return
+
+    deltas = _deltas(session)
+    for obj in added:
+        _count(deltas, {attribute: getattr(obj, attribute) for attribute in attributes}, 1)
+    stored = _stored_values(session, [obj.id for obj in changed]) if changed else {}
+    for obj in changed:
+        old = stored.get(obj.id)
+        if old is None:
+            continue
+        _count(deltas, old, -1)
+        if obj not in session.deleted:
+            _count(deltas, {attribute: getattr(obj, attribute) for attribute in attributes}, 1)
+
+
+@session_tracker.listens_for('do_orm_execute')
+def _do_orm_execute(state):
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    if state.execution_options.get(REPORTED_OPTION):
+        return
+    statement = state.statement
+    parameters = state.parameters
+    rows = [parameters] if isinstance(parameters, dict) else list(parameters or ())
+    if state.bind_mapper is None:
+        # Core statements on the customers table
+        if getattr(statement, 'table', None) is not Customer.__table__:
+            return
+        if state.is_insert and type(statement) is Insert and rows:
+            for row in rows:
+                _count(_deltas(state.session), row, 1)
+        else:
+            session_tracker.pending(state.session)['rebuild'] = True
+        return
+    if state.bind_mapper.class_ is not Customer:
+        return
+
+    if state.is_insert and type(statement) is Insert and rows:
+        for row in rows:
+            _count(_deltas(state.session), row, 1)
+        return
+
+    if state.is_update and statement.whereclause is None and rows and all('id' in row for row in rows):
+        # ORM bulk UPDATE by primary key
+        deltas = _deltas(state.session)
+        stored = _stored_values(state.session, [row['id'] for row in rows])
+        for row in rows:
+            old = stored.get(row['id'])
+            if old is None or not any(key in old for key in row):
+                continue
+            _count(deltas, old, -1)
+            _count(deltas, dict(old, **{key: value for key, value in row.items() if key in old}), 1)
+        return
+
+    if state.is_delete:
+        query = select(Customer.id)
+        if statement.whereclause is not None:
+            query = query.where(statement.whereclause)
+        ids = list(state.session.execute(query).scalars())
+        deltas = _deltas(state.session)
+        for old in _stored_values(state.session, ids).values():
+            _count(deltas, old, -1)
+        return
+
+    # Upserts, INSERT ... SELECT and UPDATE ... WHERE: affected values are not known per row
+    session_tracker.pending(state.session)['rebuild'] = True
+
+
+@session_tracker.listens_for('before_commit')
+def _before_commit(session):
+    # Flushing here collects the writes still pending in the unit of work
+    session.flush()
+    pending = session_tracker.pop_pending(session)
+    if not pending:
+        return
+    if pending['rebuild']:
+        distributions = compute_distributions(session)
+        session.execute(delete(CustomerStatCounter), execution_options={'synchronize_session': False})
+        now = datetime.utcnow()
+        rows = [
+            {'dimension': dimension, 'value': value, 'count': count, 'updated_at': now}
+            for dimension, counts in distributions.items() for value, count in counts.items()
+        ]
+        if rows:
+            session.execute(insert(CustomerStatCounter), rows)
+        logger.info("Recounted customer stat counters after a bulk customer statement")
+        return
+
+    deltas = Counter()
+    for scope, counter in pending['deltas'].items():
+        if not any(transaction in pending['rolled_back'] for transaction in scope):
+            deltas.update(counter)
+    if deltas:
+        apply_deltas(session, deltas)
+
+
+@session_tracker.listens_for('after_soft_rollback')
+def _after_soft_rollback(session, previous_transaction):
+    if previous_transaction.nested:
+        pending = session_tracker.peek_pending(session)
+        if pending is not None:
+            pending['rolled_back'].add(previous_transaction)
+    else:
+        session_tracker.pop_pending(session)
+
+
+def track_customer_stats(target) -> None:
+    """
+    Keep customer_stat_counters in step for sessions of a sessionmaker (or Session class)
+
+    Customer writes made through these sessions adjust the counters in the
+    same transaction.
+    """
+    session_tracker.track(target)
+
+
+def untrack_customer_stats(target) -> None:
+    """Stop maintaining customer_stat_counters for a sessionmaker (or Session class)"""
+    session_tracker.untrack(target)
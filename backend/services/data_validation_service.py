@@ -3,16 +3,24 @@
 
 from datetime import datetime
 from decimal import Decimal
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Tuple
 import re
 import logging
-from difflib import SequenceMatcher
 from sqlalchemy.orm import Session
 
 from backend.models.database_models import Customer
+from backend.services.company_name_matcher import company_name_index, name_similarity
+from backend.services.customer_row_validator import FieldRule, RowValidator, enum_choices_text
+from backend.services.duplicate_resolver import BulkDuplicateResolver
 
 logger = logging.getLogger(__name__)
 
+# Compiled format patterns shared by the scalar and column-wise validators
+PHONE_CHARS_PATTERN = re.compile(r'^[\d\s\-\+\(\)]+$')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+CREDIT_CODE_CHARS_PATTERN = re.compile(r'^[A-Z0-9]+$')
+
 
 class ValidationResult:
     """Validation result container"""
@@ -59,6 +67,7 @@ class DataValidationService:
         """
         self.batch_size = batch_size
         self.max_errors = max_errors
+        self._row_validator, self._data_validator = _compiled_validators(type(self))
     
     # Required fields for customer import
     REQUIRED_FIELDS = ['company_name', 'contact_name', 'contact_phone']
@@ -79,6 +88,20 @@ class DataValidationService:
         }
     }
     
+    # Allowed values for enum fields
+    ENUM_VALUES = {
+        'customer_type': ['enterprise', 'individual'],
+        'level': ['vip', 'standard', 'economy'],
+        'status': ['active', 'inactive', 'potential']
+    }
+    
+    # Enum field labels used in import error messages
+    ENUM_LABELS = {
+        'customer_type': '客户类型',
+        'level': '客户等级',
+        'status': '客户状态'
+    }
+    
     # Duplicate detection fields
     DUPLICATE_FIELDS = ['company_name', 'credit_code', 'erp_system', 'erp_customer_code']
     
@@ -94,48 +117,7 @@ class DataValidationService:
             - is_valid: True if data is valid, False otherwise
             - errors: List of error messages
         """
-        errors = []
-        
-        # Check required fields
-        for field in self.REQUIRED_FIELDS:
-            value = customer_data.get(field)
-            if not value or (isinstance(value, str) and not value.strip()):
-                errors.append(f'{field} 为必填字段')
-        
-        # Validate phone format
-        phone = customer_data.get('contact_phone')
-        if phone:
-            is_phone_valid, phone_error = self.validate_phone(str(phone))
-            if not is_phone_valid:
-                errors.append(f'contact_phone: {phone_error}')
-        
-        # Validate email format
-        email = customer_data.get('email')
-        if email:
-            is_email_valid, email_error = self.validate_email(str(email))
-            if not is_email_valid:
-                errors.append(f'email: {email_error}')
-        
-        # Validate credit code
-        credit_code = customer_data.get('credit_code')
-        if credit_code:
-            is_credit_valid, credit_error = self.validate_credit_code(str(credit_code))
-            if not is_credit_valid:
-                errors.append(f'credit_code: {credit_error}')
-        
-        # Validate enum values
-        customer_type = customer_data.get('customer_type')
-        if customer_type and customer_type not in ['enterprise', 'individual']:
-            errors.append('customer_type 必须为 enterprise 或 individual')
-        
-        level = customer_data.get('level')
-        if level and level not in ['vip', 'standard', 'economy']:
-            errors.append('level 必须为 vip, standard 或 economy')
-        
-        status = customer_data.get('status')
-        if status and status not in ['active', 'inactive', 'potential']:
-            errors.append('status 必须为 active, inactive 或 potential')
-        
+        errors = [violation.message for violation in self._data_validator.validate_one(customer_data)]
         return (len(errors) == 0, errors)
     
     def validate_phone(self, phone: str) -> tuple[bool, str]:
@@ -159,7 +141,7 @@ class DataValidationService:
             return (False, '联系电话长度必须为 8-15 位')
         
         # Check format (only digits, spaces, dashes, plus, parentheses)
-        if not re.match(r'^[\d\s\-\+\(\)]+$', phone):
+        if not PHONE_CHARS_PATTERN.match(phone):
             return (False, '联系电话格式不正确（只能包含数字、空格、破折号、加号和括号）')
         
         return (True, '')
@@ -179,10 +161,7 @@ class DataValidationService:
         
         email = email.strip()
         
-        # Basic email pattern
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        
-        if not re.match(pattern, email):
+        if not EMAIL_PATTERN.match(email):
             return (False, '邮箱格式不正确')
         
         return (True, '')
@@ -207,58 +186,11 @@ class DataValidationService:
             return (False, '统一社会信用代码必须为 18 位')
         
         # Check characters (only uppercase letters and digits)
-        if not re.match(r'^[A-Z0-9]+$', code):
+        if not CREDIT_CODE_CHARS_PATTERN.match(code):
             return (False, '统一社会信用代码只能包含字母和数字（alphanumeric characters）')
         
         return (True, '')
     
-    def validate_data_batch(self, batch_data: list[dict]) -> dict:
-        """
-        Validate batch data
-        
-        Args:
-            batch_data: List of customer data dictionaries
-            
-        Returns:
-            Dictionary with validation results
-        """
-        results = {
-            'total': len(batch_data),
-            'valid': 0,
-            'invalid': 0,
-            'errors': [],
-            'details': []
-        }
-        
-        errors_collected = 0
-        
-        for idx, data in enumerate(batch_data, 1):
-            # Stop if max_errors reached
-            if errors_collected >= self.max_errors:
-                break
-            
-            is_valid, errors = self.validate_customer_data(data)
-            
-            if is_valid:
-                results['valid'] += 1
-            else:
-                results['invalid'] += 1
-                errors_collected += len(errors)
-                results['errors'].append({
-                    'row': idx,
-                    'errors': errors
-                })
-            
-            results['details'].append({
-                'row': idx,
-                'is_valid': is_valid,
-                'errors': errors
-            })
-        
-        results['validation_rate'] = results['valid'] / results['total'] if results['total'] > 0 else 0
-        
-        return results
-    
     def generate_quality_report(self, validation_results: dict) -> dict:
         """
         Generate data quality report
@@ -363,8 +295,11 @@ class DataValidationService:
             'details': []
         }
         
-        for idx, data in enumerate(batch_data, 1):
-            is_valid, errors = self.validate_customer_data(data)
+        all_violations = self._data_validator.validate(batch_data)
+        
+        for idx, violations in enumerate(all_violations, 1):
+            errors = [violation.message for violation in violations]
+            is_valid = len(errors) == 0
             
             if is_valid:
                 results['valid'] += 1
@@ -395,77 +330,25 @@ class DataValidationService:
         Returns:
             ValidationResult with errors and warnings
         """
-        result = ValidationResult()
-        
-        # Check required fields
-        for field in self.REQUIRED_FIELDS:
-            value = row_data.get(field)
-            if not value or (isinstance(value, str) and not value.strip()):
-                result.add_error(
-                    field=field,
-                    message=f'{field} 为必填字段',
-                    value=value
-                )
-        
-        # Validate field formats
-        for field, rules in self.VALIDATION_RULES.items():
-            value = row_data.get(field)
-            if value and isinstance(value, str):
-                if not re.match(rules['pattern'], value.strip()):
-                    result.add_error(
-                        field=field,
-                        message=rules['message'],
-                        value=value
-                    )
-        
-        # Additional business logic validations
-        self._validate_business_rules(row_data, result)
-        
-        return result
+        return self.validate_rows([row_data])[0]
     
-    def _validate_business_rules(self, row_data: Dict[str, Any], result: ValidationResult):
+    def validate_rows(self, rows: List[Dict[str, Any]]) -> List[ValidationResult]:
         """
-        Validate business-specific rules
+        Validate a chunk of imported rows column-wise
         
         Args:
-            row_data: Row data dictionary
-            result: ValidationResult to add errors to
+            rows: List of row data dictionaries
+            
+        Returns:
+            ValidationResult per row, in row order
         """
-        # Check credit code length if provided
-        credit_code = row_data.get('credit_code')
-        if credit_code and len(str(credit_code).strip()) != 18:
-            result.add_error(
-                field='credit_code',
-                message='统一社会信用代码必须为 18 位',
-                value=credit_code
-            )
-        
-        # Check customer type if provided
-        customer_type = row_data.get('customer_type')
-        if customer_type and customer_type not in ['enterprise', 'individual']:
-            result.add_error(
-                field='customer_type',
-                message='客户类型必须为 enterprise 或 individual',
-                value=customer_type
-            )
-        
-        # Check level if provided
-        level = row_data.get('level')
-        if level and level not in ['vip', 'standard', 'economy']:
-            result.add_error(
-                field='level',
-                message='客户等级必须为 vip, standard 或 economy',
-                value=level
-            )
-        
-        # Check status if provided
-        status = row_data.get('status')
-        if status and status not in ['active', 'inactive', 'potential']:
-            result.add_error(
-                field='status',
-                message='客户状态必须为 active, inactive 或 potential',
-                value=status
-            )
+        results = []
+        for violations in self._row_validator.validate(rows):
+            result = ValidationResult()
+            for violation in violations:
+                result.add_error(field=violation.field, message=violation.message, value=violation.value)
+            results.append(result)
+        return results
     
     def check_duplicates(
         self,
@@ -525,19 +408,24 @@ class DataValidationService:
                 'match_fields': self._get_match_fields(customer, row_data)
             })
         
-        # Fuzzy match on company name (similarity > 0.8)
+        # Fuzzy match on company name, best match first
         if company_name:
-            fuzzy_matches = self._fuzzy_match_company_name(session, company_name, exclude_customer_id)
-            for customer in fuzzy_matches:
-                if customer.id not in [d['customer_id'] for d in duplicates]:
-                    duplicates.append({
-                        'customer_id': customer.id,
-                        'company_name': customer.company_name,
-                        'contact_name': customer.contact_name,
-                        'match_type': 'fuzzy',
-                        'similarity': self._calculate_similarity(customer.company_name, company_name),
-                        'match_fields': ['company_name']
-                    })
+            fuzzy_matches = self._fuzzy_match_company_name(session, company_name.strip(), exclude_customer_id)
+            exact_ids = {d['customer_id'] for d in duplicates}
+            fuzzy_duplicates = [
+                {
+                    'customer_id': customer.id,
+                    'company_name': customer.company_name,
+                    'contact_name': customer.contact_name,
+                    'match_type': 'fuzzy',
+                    'similarity': self._calculate_similarity(customer.company_name, company_name.strip()),
+                    'match_fields': ['company_name']
+                }
+                for customer in fuzzy_matches
+                if customer.id not in exact_ids
+            ]
+            fuzzy_duplicates.sort(key=lambda d: (-d['similarity'], d['customer_id']))
+            duplicates.extend(fuzzy_duplicates)
         
         return duplicates
     
@@ -563,7 +451,10 @@ class DataValidationService:
         exclude_customer_id: Optional[int] = None
     ) -> List[Customer]:
         """
-        Fuzzy match company name using SQL LIKE
+        Fuzzy match company name
+        
+        Uses the normalized n-gram company name index when it is loaded,
+        otherwise falls back to SQL LIKE.
         
         Args:
             session: Database session
@@ -573,8 +464,18 @@ class DataValidationService:
         Returns:
             List of potential fuzzy matches
         """
-        # Use LIKE for basic fuzzy matching
-        # In production, consider using full-text search or trigram similarity
+        if company_name_index.is_ready:
+            matches = company_name_index.search(
+                company_name,
+                limit=10,
+                exclude=[exclude_customer_id] if exclude_customer_id else None
+            )
+            if not matches:
+                return []
+            return session.query(Customer).filter(
+                Customer.id.in_([customer_pk for customer_pk, _ in matches])
+            ).all()
+        
         query = session.query(Customer).filter(
             Customer.company_name.like(f'%{company_name}%')
         )
@@ -585,8 +486,8 @@ class DataValidationService:
         return query.limit(10).all()
     
     def _calculate_similarity(self, str1: str, str2: str) -> float:
-        """Calculate string similarity using SequenceMatcher"""
-        return SequenceMatcher(None, str1, str2).ratio()
+        """Calculate company name similarity (n-gram Dice on normalized names)"""
+        return name_similarity(str1, str2)
     
     def validate_batch(
         self,
@@ -610,12 +511,21 @@ class DataValidationService:
         
         validation_results = []
         
+        # Duplicates are resolved with set-based lookups per batch; rows that
+        # would be imported are registered so later rows see them as in-file duplicates
+        resolver = BulkDuplicateResolver(session)
+        
         for idx, row_data in enumerate(rows, 1):
-            # Validate row
-            validation = self.validate_row(row_data)
+            if (idx - 1) % self.batch_size == 0:
+                batch = rows[idx - 1:idx - 1 + self.batch_size]
+                resolver.prefetch(batch)
+                # Validate the whole slice column-wise
+                batch_validations = self.validate_rows(batch)
+            
+            validation = batch_validations[(idx - 1) % self.batch_size]
             
             # Check duplicates
-            duplicates = self.check_duplicates(row_data, session)
+            duplicates = resolver.match(row_data)
             
             row_result = {
                 'row_number': idx,
@@ -628,6 +538,7 @@ class DataValidationService:
             
             if row_result['is_importable']:
                 valid_rows += 1
+                resolver.register_row(idx, row_data)
             else:
                 invalid_rows += 1
                 if duplicates:
@@ -709,3 +620,60 @@ class DataValidationService:
                 pass
         
         return duplicates
+
+
+@lru_cache(maxsize=None)
+def _compiled_validators(service_class) -> Tuple[RowValidator, RowValidator]:
+    """
+    Compile the import row rules and the customer data rules of a service class
+    
+    Compiled once per class from REQUIRED_FIELDS, VALIDATION_RULES and ENUM_VALUES.
+    
+    Returns:
+        (row validator used by validate_row/validate_rows,
+         data validator used by validate_customer_data/validate_data_batch)
+    """
+    required = [
+        FieldRule(f'required_{field}', field, 'required', f'{field} 为必填字段')
+        for field in service_class.REQUIRED_FIELDS
+    ]
+    
+    row_rules = list(required)
+    for field, rule in service_class.VALIDATION_RULES.items():
+        row_rules.append(FieldRule(
+            f'format_{field}', field, 'pattern', rule['message'],
+            pattern=rule['pattern'], strings_only=True
+        ))
+    row_rules.append(FieldRule(
+        'credit_code_length', 'credit_code', 'length', '统一社会信用代码必须为 18 位', length=(18, 18)
+    ))
+    for field, choices in service_class.ENUM_VALUES.items():
+        row_rules.append(FieldRule(
+            f'enum_{field}', field, 'enum',
+            f'{service_class.ENUM_LABELS[field]}必须为 {enum_choices_text(choices)}',
+            choices=choices
+        ))
+    
+    data_rules = list(required) + [
+        FieldRule('phone_length', 'contact_phone', 'length',
+                  'contact_phone: 联系电话长度必须为 8-15 位', length=(8, 15)),
+        FieldRule('phone_chars', 'contact_phone', 'pattern',
+                  'contact_phone: 联系电话格式不正确（只能包含数字、空格、破折号、加号和括号）',
+                  pattern=PHONE_CHARS_PATTERN, unless='phone_length'),
+        FieldRule('email_format', 'email', 'pattern', 'email: 邮箱格式不正确', pattern=EMAIL_PATTERN),
+        FieldRule('credit_code_blank', 'credit_code', 'length',
+                  'credit_code: 统一社会信用代码不能为空', length=(1, None)),
+        FieldRule('credit_code_length', 'credit_code', 'length',
+                  'credit_code: 统一社会信用代码必须为 18 位',
+                  length=(18, 18), normalize='upper', unless='credit_code_blank'),
+        FieldRule('credit_code_chars', 'credit_code', 'pattern',
+                  'credit_code: 统一社会信用代码只能包含字母和数字（alphanumeric characters）',
+                  pattern=CREDIT_CODE_CHARS_PATTERN, normalize='upper',
+                  unless=('credit_code_blank', 'credit_code_length')),
+    ]
+    for field, choices in service_class.ENUM_VALUES.items():
+        data_rules.append(FieldRule(
+            f'enum_{field}', field, 'enum', f'{field} 必须为 {enum_choices_text(choices)}', choices=choices
+        ))
+    
+    return RowValidator(row_rules), RowValidator(data_rules)
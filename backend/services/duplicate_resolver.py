@@ -0,0 +1,320 @@
+# OP_CMS Bulk Duplicate Resolver
+# Story 6.2: Import/Export Enhancement - set-based duplicate detection
+
+"""
+Set-based duplicate detection for customer imports
+
+``DataValidationService.check_duplicates`` issues one OR query (plus one
+fuzzy LIKE query) per row. The resolver instead collects the keys of a
+whole chunk, fetches existing customers with one ``IN (...)`` query per
+key type and one fuzzy query per chunk, and answers per-row lookups from
+in-memory hash maps.
+
+Fuzzy candidates come from the normalized company name index when it is
+loaded, otherwise from one OR-of-LIKE query per chunk.
+
+Rows of the same file are tracked too: rows registered with the resolver
+(rows already written, or rows that would be imported) are matched by
+later rows exactly like existing customers.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.models.database_models import Customer
+from backend.services.company_name_matcher import CompanyNameIndex, company_name_index, name_similarity
+
+logger = logging.getLogger(__name__)
+
+# Exact-match key columns, in the order check_duplicates reports them
+DUPLICATE_KEY_FIELDS = ['company_name', 'credit_code', 'erp_customer_code']
+
+# Maximum values per IN (...) / OR LIKE clause
+IN_CLAUSE_BATCH_SIZE = 500
+
+# Maximum fuzzy matches per row (same limit as check_duplicates)
+FUZZY_MATCH_LIMIT = 10
+
+
+def _key(value: Any) -> Optional[str]:
+    """Normalize a key value the way check_duplicates does"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _batched(values: List[str], size: int = IN_CLAUSE_BATCH_SIZE) -> Iterable[List[str]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class DuplicateEntry:
+    """A known customer (existing or from the current file) keyed for lookups"""
+
+    __slots__ = ('customer_id', 'row_number', 'company_name', 'contact_name', 'credit_code', 'erp_customer_code')
+
+    def __init__(
+        self,
+        customer_id: Optional[int],
+        company_name: Optional[str],
+        contact_name: Optional[str] = None,
+        credit_code: Optional[str] = None,
+        erp_customer_code: Optional[str] = None,
+        row_number: Optional[int] = None
+    ):
+        self.customer_id = customer_id
+        self.row_number = row_number
+        self.company_name = company_name
+        self.contact_name = contact_name
+        self.credit_code = credit_code
+        self.erp_customer_code = erp_customer_code
+
+    @classmethod
+    def from_customer(cls, customer: Customer) -> 'DuplicateEntry':
+        return cls(
+            customer_id=customer.id,
+            company_name=customer.company_name,
+            contact_name=customer.contact_name,
+            credit_code=customer.credit_code,
+            erp_customer_code=customer.erp_customer_code
+        )
+
+    @property
+    def identity(self):
+        """Stable identity used to de-duplicate matches"""
+        return ('customer', self.customer_id) if self.customer_id is not None else ('row', self.row_number)
+
+    @property
+    def sort_key(self):
+        """Existing customers first (by id, like the SQL result order), then file rows"""
+        if self.customer_id is not None:
+            return (0, self.customer_id)
+        return (1, self.row_number or 0)
+
+    def base_dict(self) -> Dict[str, Any]:
+        result = {
+            'customer_id': self.customer_id,
+            'company_name': self.company_name,
+            'contact_name': self.contact_name
+        }
+        if self.customer_id is None:
+            result['row_number'] = self.row_number
+        return result
+
+
+class BulkDuplicateResolver:
+    """
+    Chunk-level duplicate resolver
+
+    Usage:
+        resolver = BulkDuplicateResolver(session)
+        resolver.prefetch(rows_of_chunk)
+        for row in rows_of_chunk:
+            duplicates = resolver.match(row)
+            ...
+            resolver.register_customer(customer)  # after writing the row
+
+    ``match`` returns the same list-of-dicts shape as
+    ``DataValidationService.check_duplicates``. Matches against rows of the
+    same file that have no database id yet are reported with
+    ``match_type`` ``'in_file'`` and the ``row_number`` of the earlier row.
+    """
+
+    def __init__(self, session: Session, name_index: Optional[CompanyNameIndex] = None):
+        """
+        Initialize resolver
+
+        Args:
+            session: Database session
+            name_index: Company name index for fuzzy candidates
+                (default: the global index, used once it is loaded)
+        """
+        self.session = session
+        self.name_index = name_index if name_index is not None else company_name_index
+        self._existing: Dict[str, Dict[str, List[DuplicateEntry]]] = {}
+        self._fuzzy_candidates: List[DuplicateEntry] = []
+        self._fuzzy_by_name: Optional[Dict[str, List[DuplicateEntry]]] = None
+        self._registered: Dict[str, Dict[str, List[DuplicateEntry]]] = {
+            field: {} for field in DUPLICATE_KEY_FIELDS
+        }
+        self._registered_entries: Dict[Any, DuplicateEntry] = {}
+        self._registered_names = CompanyNameIndex()
+        self.query_count = 0
+
+    def prefetch(self, rows: Iterable[Dict[str, Any]]):
+        """
+        Load existing customers matching any key of the given rows
+
+        Replaces previously prefetched customers; registered file rows are kept.
+
+        Args:
+            rows: Row data dictionaries of the chunk
+        """
+        keys: Dict[str, set] = {field: set() for field in DUPLICATE_KEY_FIELDS}
+        for row_data in rows:
+            for field in DUPLICATE_KEY_FIELDS:
+                value = _key(row_data.get(field))
+                if value:
+                    keys[field].add(value)
+
+        self._existing = {field: {} for field in DUPLICATE_KEY_FIELDS}
+        self._fuzzy_candidates = []
+        self._fuzzy_by_name = None
+        seen: Dict[int, DuplicateEntry] = {}
+
+        # One IN (...) query per key type
+        for field in DUPLICATE_KEY_FIELDS:
+            column = getattr(Customer, field)
+            for values in _batched(sorted(keys[field])):
+                self.query_count += 1
+                for customer in self.session.query(Customer).filter(column.in_(values)).all():
+                    seen.setdefault(customer.id, DuplicateEntry.from_customer(customer))
+
+        for entry in seen.values():
+            self._index(self._existing, entry)
+
+        if self.name_index.is_ready:
+            self._prefetch_indexed_names(keys['company_name'], seen)
+            return
+
+        # One OR-of-LIKE query for fuzzy company name candidates
+        fuzzy: Dict[int, DuplicateEntry] = {}
+        for names in _batched(sorted(keys['company_name'])):
+            self.query_count += 1
+            query = self.session.query(Customer).filter(
+                or_(*[Customer.company_name.like(f'%{name}%') for name in names])
+            )
+            for customer in query.all():
+                fuzzy.setdefault(customer.id, seen.get(customer.id) or DuplicateEntry.from_customer(customer))
+
+        self._fuzzy_candidates = sorted(fuzzy.values(), key=lambda e: e.sort_key)
+
+    def _prefetch_indexed_names(self, names: Iterable[str], seen: Dict[int, DuplicateEntry]):
+        """Resolve fuzzy candidates from the name index, loading unseen customers with one IN query"""
+        matches = {name: self.name_index.search(name, limit=FUZZY_MATCH_LIMIT) for name in names}
+
+        missing = sorted({
+            customer_pk for name_matches in matches.values()
+            for customer_pk, _ in name_matches if customer_pk not in seen
+        })
+        loaded = dict(seen)
+        for ids in _batched(missing):
+            self.query_count += 1
+            for customer in self.session.query(Customer).filter(Customer.id.in_(ids)).all():
+                loaded[customer.id] = DuplicateEntry.from_customer(customer)
+
+        # Keys deleted since they were indexed are dropped here
+        self._fuzzy_by_name = {
+            name: [loaded[customer_pk] for customer_pk, _ in name_matches if customer_pk in loaded]
+            for name, name_matches in matches.items()
+        }
+
+    def register_customer(self, customer: Customer):
+        """Make a customer written during the import visible to later rows"""
+        self._register(DuplicateEntry.from_customer(customer))
+
+    def register_row(self, row_number: int, row_data: Dict[str, Any], customer_id: Optional[int] = None):
+        """
+        Make a not-yet-written file row visible to later rows
+
+        Args:
+            row_number: Source row number
+            row_data: Row data
+            customer_id: Existing customer the row will update, if any
+        """
+        self._register(DuplicateEntry(
+            customer_id=customer_id,
+            company_name=_key(row_data.get('company_name')),
+            contact_name=row_data.get('contact_name'),
+            credit_code=_key(row_data.get('credit_code')),
+            erp_customer_code=_key(row_data.get('erp_customer_code')),
+            row_number=row_number
+        ))
+
+    def match(self, row_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Find duplicates for one row from the prefetched and registered entries
+
+        Args:
+            row_data: Row data to check
+
+        Returns:
+            List of matching customers (check_duplicates format)
+        """
+        values = {field: _key(row_data.get(field)) for field in DUPLICATE_KEY_FIELDS}
+        if not any(values.values()):
+            return []
+
+        exact: Dict[Any, DuplicateEntry] = {}
+        for index in (self._existing, self._registered):
+            for field, value in values.items():
+                if value:
+                    for entry in index.get(field, {}).get(value, ()):
+                        exact.setdefault(entry.identity, entry)
+
+        duplicates = []
+        for entry in sorted(exact.values(), key=lambda e: e.sort_key):
+            duplicate = entry.base_dict()
+            duplicate['match_type'] = 'exact' if entry.customer_id is not None else 'in_file'
+            duplicate['match_fields'] = self._get_match_fields(entry, values)
+            duplicates.append(duplicate)
+
+        company_name = values['company_name']
+        if company_name:
+            candidates: Dict[Any, DuplicateEntry] = {}
+            for entry in self._existing_fuzzy_candidates(company_name):
+                candidates.setdefault(entry.identity, entry)
+            for identity, _ in self._registered_names.search(company_name, limit=FUZZY_MATCH_LIMIT):
+                candidates.setdefault(identity, self._registered_entries[identity])
+
+            fuzzy_duplicates = []
+            for entry in sorted(candidates.values(), key=lambda e: e.sort_key)[:FUZZY_MATCH_LIMIT]:
+                if entry.identity in exact:
+                    continue
+                duplicate = entry.base_dict()
+                duplicate['match_type'] = 'fuzzy'
+                duplicate['similarity'] = name_similarity(entry.company_name, company_name)
+                duplicate['match_fields'] = ['company_name']
+                fuzzy_duplicates.append(duplicate)
+
+            # Stable sort: equal scores keep existing-customers-first id order
+            fuzzy_duplicates.sort(key=lambda d: -d['similarity'])
+            duplicates.extend(fuzzy_duplicates)
+
+        return duplicates
+
+    def _existing_fuzzy_candidates(self, company_name: str) -> List[DuplicateEntry]:
+        """Existing customers that are fuzzy candidates for a name"""
+        if self._fuzzy_by_name is not None:
+            return self._fuzzy_by_name.get(company_name, [])
+
+        needle = company_name.lower()
+        return [
+            entry for entry in self._fuzzy_candidates
+            if entry.company_name and needle in entry.company_name.lower()
+        ]
+
+    def _register(self, entry: DuplicateEntry):
+        self._index(self._registered, entry)
+        if entry.company_name:
+            self._registered_entries[entry.identity] = entry
+            self._registered_names.add(entry.identity, entry.company_name)
+
+    @staticmethod
+    def _index(index: Dict[str, Dict[str, List[DuplicateEntry]]], entry: DuplicateEntry):
+        for field in DUPLICATE_KEY_FIELDS:
+            value = _key(getattr(entry, field))
+            if value:
+                index.setdefault(field, {}).setdefault(value, []).append(entry)
+
+    @staticmethod
+    def _get_match_fields(entry: DuplicateEntry, values: Dict[str, Optional[str]]) -> List[str]:
+        """Get fields that matched"""
+        return [
+            field for field in DUPLICATE_KEY_FIELDS
+            if values[field] and getattr(entry, field) == values[field]
+        ]
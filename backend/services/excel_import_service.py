@@ -5,11 +5,12 @@ import openpyxl
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from functools import lru_cache
 import uuid
-import re
 from decimal import Decimal
 
 from backend.models.database_models import CustomerCreate
+from backend.services.customer_row_validator import FieldRule, RowValidator
 
 
 class ExcelImportError(Exception):
@@ -19,6 +20,24 @@ class ExcelImportError(Exception):
         self.row = row
 
 
+@lru_cache(maxsize=None)
+def _excel_row_validator() -> RowValidator:
+    """Compiled rule set for template rows (keyed by Chinese column names)"""
+    rules = [
+        FieldRule(f'required_{column}', column, 'required', f'{column} 为必填字段')
+        for column in CustomerExcelService.REQUIRED_COLUMNS
+    ]
+    rules += [
+        FieldRule('phone_format', '联系电话', 'pattern', '联系电话格式不正确（应为 8-15 位数字）',
+                  pattern=r'\d{8,15}', normalize='digits'),
+        FieldRule('email_format', '邮箱', 'pattern', '邮箱格式不正确',
+                  pattern=r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'),
+        FieldRule('credit_code_format', '统一社会信用代码', 'pattern',
+                  '统一社会信用代码格式不正确（应为 18 位字母数字）', pattern=r'[^\W_]{18}'),
+    ]
+    return RowValidator(rules)
+
+
 class CustomerExcelService:
     """Service for handling Excel import/export operations"""
     
@@ -140,13 +159,13 @@ class CustomerExcelService:
             # Convert to list of dicts
             records = df.to_dict('records')
             
-            # Validate each row
+            # Validate the sheet column-wise (row 1 is the header)
             errors = []
             valid_records = []
             
-            for idx, record in enumerate(records, 2):  # Start from 2 (header is row 1)
-                row_errors = cls._validate_row(record, idx)
-                
+            failed_rows = cls._validation_errors(records, start_row=2)
+            for index, record in enumerate(records):
+                row_errors = failed_rows.get(index)
                 if row_errors:
                     errors.extend(row_errors)
                 else:
@@ -179,58 +198,49 @@ class CustomerExcelService:
         Returns:
             List of validation errors
         """
-        errors = []
-        
-        # Check required fields
-        for field in cls.REQUIRED_COLUMNS:
-            value = record.get(field)
-            if pd.isna(value) or (isinstance(value, str) and not value.strip()):
-                errors.append({
-                    'row': row_num,
-                    'field': field,
-                    'error': f'{field} 为必填字段',
-                    'value': None
-                })
-        
-        # Validate phone format
-        phone = record.get('联系电话')
-        if phone and not pd.isna(phone):
-            phone_str = str(phone).strip()
-            cleaned = re.sub(r'[\+\-\(\)\s]', '', phone_str)
-            if not cleaned.isdigit() or len(cleaned) < 8 or len(cleaned) > 15:
-                errors.append({
-                    'row': row_num,
-                    'field': '联系电话',
-                    'error': '联系电话格式不正确（应为 8-15 位数字）',
-                    'value': phone_str
-                })
-        
-        # Validate email format
-        email = record.get('邮箱')
-        if email and not pd.isna(email):
-            email_str = str(email).strip()
-            pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            if not re.match(pattern, email_str):
-                errors.append({
-                    'row': row_num,
-                    'field': '邮箱',
-                    'error': '邮箱格式不正确',
-                    'value': email_str
-                })
+        return cls._validate_records([record], start_row=row_num)[0]
+    
+    @classmethod
+    def _validate_records(cls, records: List[Dict[str, Any]], start_row: int = 2) -> List[List[Dict[str, Any]]]:
+        """
+        Validate all rows of a sheet column-wise
         
-        # Validate credit code
-        credit_code = record.get('统一社会信用代码')
-        if credit_code and not pd.isna(credit_code):
-            code_str = str(credit_code).strip()
-            if len(code_str) != 18 or not code_str.isalnum():
-                errors.append({
-                    'row': row_num,
-                    'field': '统一社会信用代码',
-                    'error': '统一社会信用代码格式不正确（应为 18 位字母数字）',
-                    'value': code_str
-                })
+        Args:
+            records: Row data dictionaries
+            start_row: Sheet row number of the first record
+            
+        Returns:
+            List of validation errors per record
+        """
+        all_errors = [[] for _ in records]
+        for index, row_errors in cls._validation_errors(records, start_row).items():
+            all_errors[index] = row_errors
+        return all_errors
+    
+    @classmethod
+    def _validation_errors(cls, records: List[Dict[str, Any]], start_row: int = 2) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Validate all rows of a sheet column-wise, reporting only failed rows
         
-        return errors
+        Args:
+            records: Row data dictionaries
+            start_row: Sheet row number of the first row
+            
+        Returns:
+            Validation errors by row position
+        """
+        return {
+            index: [
+                {
+                    'row': index + start_row,
+                    'field': violation.field,
+                    'error': violation.message,
+                    'value': None if violation.rule.check == 'required' else violation.text
+                }
+                for violation in violations
+            ]
+            for index, violations in _excel_row_validator().failures(records).items()
+        }
     
     @classmethod
     def _convert_record(cls, record: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,460 @@
+# OP_CMS FX Rates
+# Story 4.1: Management Dashboard - multi-currency totals
+
+"""
+Currency normalization of settlement totals
+
+Settlements keep the currency they were billed in (CNY/USD/EUR). Totals
+across settlements are reported both per native currency and converted
+to one base currency (FX_BASE_CURRENCY, default CNY):
+
+    1. the database sums total_amount per (group, currency, billing date)
+       in a single GROUP BY, so only a few rows reach Python
+    2. FxRateTable converts all of those rows at once: per currency, the
+       rate in effect on each billing date is found with np.searchsorted
+    3. converted amounts are summed per group with np.bincount
+
+A settlement is converted at the rate in effect on its period_end. The
+rate table is loaded once per process and reloaded after FX_TABLE_TTL
+seconds. Amounts in a currency without a rate on the billing date are
+not guessed at; they are reported under ``unconverted`` instead.
+
+Rates are written with ``save_rates`` (PUT /api/v1/fx-rates, or
+backend/scripts/load_fx_rates.py for a CSV of published rates). Sessions
+registered with ``track_fx_rates`` invalidate the process's table when a
+rate write commits; other processes pick it up within FX_TABLE_TTL. No
+rates ship with the schema: until USD/EUR rates are loaded, amounts in
+those currencies stay unconverted.
+"""
+
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import case, func, select, tuple_
+
+from backend.models.database_models import SettlementRecord
+from backend.models.fx_models import ExchangeRate
+from backend.models.payment_models import SettlementWriteoff
+from backend.services.archive_tier import route
+from backend.services.customer_ledger import OPEN_STATUSES
+from backend.services.reminder_dispatcher import PAYMENT_TERM_DAYS
+from backend.services.session_tracking import SessionTracker, changed_objects, written_model
+
+logger = logging.getLogger(__name__)
+
+# Currency all totals are converted to
+BASE_CURRENCY = os.getenv('FX_BASE_CURRENCY', 'CNY')
+
+# Seconds before the rate table is reloaded from the database
+FX_TABLE_TTL = int(os.getenv('FX_TABLE_TTL', '3600'))
+
+# Currency of settlements without one (SettlementRecord.currency default)
+DEFAULT_SETTLEMENT_CURRENCY = 'CNY'
+
+# Flag set when exchange rates were written in the current transaction
+session_tracker = SessionTracker('fx_rates', lambda: True)
+
+
+class FxRateError(Exception):
+    """Custom exception for FX rate errors"""
+    pass
+
+
+def _day(value: Any) -> int:
+    """Day ordinal of a date, datetime or ISO date string (DATE() on SQLite)"""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10]).toordinal()
+    raise FxRateError(f"Unsupported date value: {value!r}")
+
+
+class FxRateTable:
+    """In-memory dated rates of all currencies against the base currency"""
+
+    def __init__(self, base_currency: str = BASE_CURRENCY, ttl: float = FX_TABLE_TTL):
+        """
+        Args:
+            base_currency: Currency rates are expressed in
+            ttl: Seconds before the table is reloaded
+        """
+        self.base_currency = base_currency
+        self.ttl = ttl
+        # Currency -> sorted effective day ordinals / rates in the same order
+        self._days: Dict[str, np.ndarray] = {}
+        self._rates: Dict[str, np.ndarray] = {}
+        self._loaded_at: Optional[float] = None
+
+    def load(self, session) -> 'FxRateTable':
+        """
+        (Re)load all rates quoted against the base currency
+
+        Args:
+            session: Database session
+
+        Returns:
+            self
+        """
+        rows = session.execute(
+            select(ExchangeRate.currency, ExchangeRate.effective_date, ExchangeRate.rate)
+            .where(ExchangeRate.base_currency == self.base_currency)
+            .order_by(ExchangeRate.currency, ExchangeRate.effective_date)
+        ).all()
+
+        grouped: Dict[str, List[Any]] = {}
+        for currency, effective_date, rate in rows:
+            grouped.setdefault(currency, []).append((_day(effective_date), float(rate)))
+        days = {currency: np.array([day for day, _ in values], dtype=np.int64) for currency, values in grouped.items()}
+        rates = {currency: np.array([rate for _, rate in values]) for currency, values in grouped.items()}
+
+        # Swap in complete tables so concurrent readers never see a partial load
+        self._days, self._rates = days, rates
+        self._loaded_at = time.monotonic()
+        logger.info(f"Loaded FX rates: {len(rows)} rates for {len(days)} currencies against {self.base_currency}")
+        return self
+
+    def ensure_loaded(self, session) -> 'FxRateTable':
+        """Load the table if it was never loaded or has expired"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self.load(session)
+        return self
+
+    def invalidate(self):
+        """Reload on next use (call after committing rate changes)"""
+        self._loaded_at = None
+
+    @property
+    def currencies(self) -> List[str]:
+        return sorted(set(self._days) | {self.base_currency})
+
+    def rates(self, currency: str, days: np.ndarray) -> np.ndarray:
+        """
+        Rates of a currency in effect on many days
+
+        Args:
+            currency: Currency code
+            days: Day ordinals
+
+        Returns:
+            Rates in the order of days; NaN where no rate was in effect
+        """
+        days = np.asarray(days, dtype=np.int64)
+        if currency == self.base_currency:
+            return np.ones(len(days))
+        known = self._days.get(currency)
+        if known is None:
+            return np.full(len(days), np.nan)
+        position = np.searchsorted(known, days, side='right') - 1
+        return np.where(position >= 0, self._rates[currency][np.clip(position, 0, None)], np.nan)
+
+    def rate(self, currency: str, on: date) -> Optional[float]:
+        """Rate of a currency in effect on a day, or None"""
+        value = self.rates(currency, np.array([_day(on)]))[0]
+        return None if np.isnan(value) else float(value)
+
+    def convert(self, amounts: np.ndarray, currencies: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """
+        Convert many amounts to the base currency
+
+        Args:
+            amounts: Amounts in their native currency
+            currencies: Currency code of each amount
+            days: Day ordinal each amount is converted on
+
+        Returns:
+            Base currency amounts; NaN where no rate was in effect
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        currencies = np.asarray(currencies, dtype=object)
+        days = np.asarray(days, dtype=np.int64)
+        converted = np.empty(len(amounts))
+        for currency in set(currencies.tolist()):
+            mask = currencies == currency
+            converted[mask] = amounts[mask] * self.rates(currency, days[mask])
+        return converted
+
+
+def _empty_totals(base_currency: str) -> Dict[str, Any]:
+    return {
+        'base_currency': base_currency,
+        'base_total': 0.0,
+        'native': {},
+        'unconverted': {},
+        'settlements': 0
+    }
+
+
+def settlement_totals_by(
+    session,
+    group_by: Optional[Any],
+    *criteria,
+    table: Optional['FxRateTable'] = None,
+    since: Optional[datetime] = None
+) -> Dict[Any, Dict[str, Any]]:
+    """
+    Settlement totals per group, in native currencies and the base currency
+
+    Args:
+        session: Database session
+        group_by: Column to group by (None: one group keyed None)
+        *criteria: Filters on SettlementRecord
+        table: Rate table (default: the process-wide table)
+        since: Earliest created_at the criteria select; archived settlements
+            are included when it reaches the archive (None: no lower bound)
+
+    Returns:
+        Dictionary of group value -> {'base_currency', 'base_total',
+        'native' (currency -> amount), 'unconverted' (currency -> amount
+        without a rate), 'settlements'}
+    """
+    table = (table or fx_rates).ensure_loaded(session)
+    currency = func.coalesce(SettlementRecord.currency, DEFAULT_SETTLEMENT_CURRENCY)
+    billed_on = func.date(SettlementRecord.period_end)
+    columns = [currency, billed_on, func.sum(SettlementRecord.total_amount), func.count(SettlementRecord.id)]
+    group_columns = [currency, billed_on]
+    if group_by is not None:
+        columns.insert(0, group_by)
+        group_columns.insert(0, group_by)
+    statement = select(*columns).where(*criteria).group_by(*group_columns)
+    rows = session.execute(route(session, statement, since)).all()
+
+    if group_by is None:
+        rows = [(None,) + tuple(row) for row in rows]
+        results = {None: _empty_totals(table.base_currency)}
+    else:
+        results = {}
+    if not rows:
+        return results
+
+    groups: Dict[Any, int] = {}
+    positions = np.array([groups.setdefault(row[0], len(groups)) for row in rows], dtype=np.int64)
+    currencies = np.array([row[1] for row in rows], dtype=object)
+    amounts = np.array([float(row[3] or 0) for row in rows])
+    converted = table.convert(amounts, currencies, np.array([_day(row[2]) for row in rows], dtype=np.int64))
+    missing = np.isnan(converted)
+    base_totals = np.bincount(positions, weights=np.where(missing, 0, converted), minlength=len(groups))
+
+    for group, position in groups.items():
+        results[group] = _empty_totals(table.base_currency)
+        results[group]['base_total'] = round(float(base_totals[position]), 2)
+    for row, is_missing in zip(rows, missing):
+        totals = results[row[0]]
+        native_amount = Decimal(row[3] or 0)
+        totals['native'][row[1]] = totals['native'].get(row[1], Decimal('0')) + native_amount
+        if is_missing:
+            totals['unconverted'][row[1]] = totals['unconverted'].get(row[1], Decimal('0')) + native_amount
+        totals['settlements'] += row[4]
+
+    for totals in results.values():
+        totals['native'] = {code: float(amount) for code, amount in totals['native'].items()}
+        totals['unconverted'] = {code: float(amount) for code, amount in totals['unconverted'].items()}
+    if missing.any():
+        logger.warning(
+            f"No {table.base_currency} rate for {', '.join(sorted(set(currencies[missing].tolist())))} "
+            f"on some billing dates; those amounts are reported as unconverted"
+        )
+    return results
+
+
+def settlement_totals(
+    session,
+    *criteria,
+    table: Optional['FxRateTable'] = None,
+    since: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Settlement totals of all matching settlements (see settlement_totals_by)"""
+    return settlement_totals_by(session, None, *criteria, table=table, since=since)[None]
+
+
+def receivable_totals(
+    session,
+    table: Optional['FxRateTable'] = None,
+    as_of: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Open receivables in native currencies and the base currency
+
+    The outstanding amount of an open settlement (net of its write-offs) is
+    converted at the rate of its billing date, like settlement_totals.
+    Closed settlements are never archived, so only the live table is read.
+
+    Args:
+        session: Database session
+        table: Rate table (default: the process-wide table)
+        as_of: Reference time of the overdue split (default: now)
+
+    Returns:
+        Dictionary with 'base_currency', 'open_amount' and 'overdue_amount'
+        (past PAYMENT_TERM_DAYS) in the base currency, 'native' (currency ->
+        open amount) and 'unconverted' (currency -> open amount without a rate)
+    """
+    table = (table or fx_rates).ensure_loaded(session)
+    due_before = (as_of or datetime.utcnow()) - timedelta(days=PAYMENT_TERM_DAYS)
+    is_open = SettlementRecord.status.in_(OPEN_STATUSES)
+    settled = (
+        select(SettlementWriteoff.settlement_id, func.sum(SettlementWriteoff.writeoff_amount).label('amount'))
+        .where(SettlementWriteoff.settlement_id.in_(select(SettlementRecord.id).where(is_open)))
+        .group_by(SettlementWriteoff.settlement_id)
+        .subquery()
+    )
+    outstanding = SettlementRecord.total_amount - func.coalesce(settled.c.amount, 0)
+    currency = func.coalesce(SettlementRecord.currency, DEFAULT_SETTLEMENT_CURRENCY)
+    billed_on = func.date(SettlementRecord.period_end)
+    overdue = case((SettlementRecord.created_at < due_before, 1), else_=0)
+    rows = session.execute(
+        select(currency, billed_on, overdue, func.sum(outstanding))
+        .outerjoin(settled, settled.c.settlement_id == SettlementRecord.id)
+        .where(is_open, outstanding > 0)
+        .group_by(currency, billed_on, overdue)
+    ).all()
+
+    totals = {
+        'base_currency': table.base_currency,
+        'open_amount': 0.0,
+        'overdue_amount': 0.0,
+        'native': {},
+        'unconverted': {}
+    }
+    if not rows:
+        return totals
+
+    converted = table.convert(
+        np.array([float(row[3] or 0) for row in rows]),
+        np.array([row[0] for row in rows], dtype=object),
+        np.array([_day(row[1]) for row in rows], dtype=np.int64)
+    )
+    missing = np.isnan(converted)
+    converted = np.where(missing, 0, converted)
+    overdue_rows = np.array([bool(row[2]) for row in rows])
+    totals['open_amount'] = round(float(converted.sum()), 2)
+    totals['overdue_amount'] = round(float(converted[overdue_rows].sum()), 2)
+    for row, is_missing in zip(rows, missing):
+        native_amount = Decimal(row[3] or 0)
+        totals['native'][row[0]] = totals['native'].get(row[0], Decimal('0')) + native_amount
+        if is_missing:
+            totals['unconverted'][row[0]] = totals['unconverted'].get(row[0], Decimal('0')) + native_amount
+    totals['native'] = {code: float(amount) for code, amount in totals['native'].items()}
+    totals['unconverted'] = {code: float(amount) for code, amount in totals['unconverted'].items()}
+    if missing.any():
+        logger.warning(
+            f"No {table.base_currency} rate for {', '.join(sorted(totals['unconverted']))} "
+            f"on some billing dates; those receivables are reported as unconverted"
+        )
+    return totals
+
+
+# ==================== Rate management ====================
+
+def _rate_key(rate: Dict[str, Any]) -> tuple:
+    currency = str(rate.get('currency') or '').strip().upper()
+    if len(currency) != 3 or not currency.isalpha():
+        raise FxRateError(f"Invalid currency code: {rate.get('currency')!r}")
+    effective_date = rate.get('effective_date')
+    try:
+        if isinstance(effective_date, datetime):
+            effective_date = effective_date.date()
+        elif not isinstance(effective_date, date):
+            effective_date = date.fromisoformat(str(effective_date))
+    except ValueError:
+        raise FxRateError(f"Invalid effective_date for {currency}: {effective_date!r}")
+    return currency, effective_date
+
+
+def save_rates(
+    session,
+    rates: Iterable[Dict[str, Any]],
+    base_currency: str = BASE_CURRENCY,
+    source: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Add or replace dated rates against a base currency
+
+    Runs in the caller's transaction; a rate for a currency and date that
+    already exists is overwritten. Commit through a session registered
+    with ``track_fx_rates`` to reload the rate table.
+
+    Args:
+        session: Database session
+        rates: Dictionaries with currency, effective_date (date or ISO
+            string), rate and optionally source
+        base_currency: Currency the rates are expressed in
+        source: Default rate source, e.g. PBOC
+
+    Returns:
+        Dictionary with the number of rates created and updated
+    """
+    values: Dict[tuple, Dict[str, Any]] = {}
+    for rate in rates:
+        currency, effective_date = _rate_key(rate)
+        if currency == base_currency:
+            raise FxRateError(f"Cannot quote {currency} against itself")
+        try:
+            value = Decimal(str(rate.get('rate')))
+        except ArithmeticError:
+            raise FxRateError(f"Invalid rate for {currency} on {effective_date}: {rate.get('rate')!r}")
+        if not value.is_finite() or value <= 0:
+            raise FxRateError(f"Rate for {currency} on {effective_date} must be positive")
+        values[(currency, effective_date)] = {'rate': value, 'source': rate.get('source') or source}
+    if not values:
+        return {'created': 0, 'updated': 0}
+
+    existing = {
+        (row.currency, row.effective_date): row
+        for row in session.execute(
+            select(ExchangeRate).where(
+                ExchangeRate.base_currency == base_currency,
+                tuple_(ExchangeRate.currency, ExchangeRate.effective_date).in_(list(values))
+            )
+        ).scalars()
+    }
+    for (currency, effective_date), value in values.items():
+        row = existing.get((currency, effective_date))
+        if row is None:
+            session.add(ExchangeRate(
+                currency=currency, base_currency=base_currency, effective_date=effective_date, **value
+            ))
+        else:
+            row.rate, row.source = value['rate'], value['source']
+    session.flush()
+    return {'created': len(values) - len(existing), 'updated': len(existing)}
+
+
+@session_tracker.listens_for('after_flush')
+def _after_flush(session, flush_context):
+    if any(isinstance(obj, ExchangeRate) for obj in changed_objects(session)):
+        session_tracker.pending(session)
+
+
+@session_tracker.listens_for('do_orm_execute')
+def _do_orm_execute(state):
+    if written_model(state) is ExchangeRate:
+        session_tracker.pending(state.session)
+
+
+@session_tracker.listens_for('after_commit')
+def _after_commit(session):
+    if session_tracker.pop_pending(session):
+        fx_rates.invalidate()
+
+
+def track_fx_rates(target) -> None:
+    """
+    Reload the global rate table after rate writes commit, for sessions of a sessionmaker (or Session class)
+    """
+    session_tracker.track(target)
+
+
+def untrack_fx_rates(target) -> None:
+    """Stop reloading the rate table for a sessionmaker (or Session class)"""
+    session_tracker.untrack(target)
+
+
+# Global FX rate table
+fx_rates = FxRateTable()
@@ -0,0 +1,493 @@
+# OP_CMS Price Config Cache
+# Story 2.4: Price Config Version Control - cached price config lookups
+
+"""
+Price config cache
+
+Price configs are read on every settlement calculation, validation and
+pricing page load but change rarely. The cache keeps them in two levels:
+
+    - L1: in-process LRU of column snapshots with a TTL, keyed by config
+          id (``config:<id>``) and by customer (``customer:<id>`` -> the
+          id of the customer's active config, or none)
+    - L2: Redis (optional), shared by every Sanic worker and Celery
+          process, so a config is loaded from the database once per TTL
+
+Cached configs are returned as PriceConfig instances merged into the
+caller's session without a SELECT, so they behave like loaded rows.
+
+Invalidation:
+    - ORM writes to price_configs (pricing create/update/delete, including
+      ``current_version_number`` bumps) invalidate the affected configs and
+      customers when the transaction commits (``track_price_configs``)
+    - every invalidation increments a shared epoch in Redis; other
+      processes notice within COHERENCE_INTERVAL and drop their L1
+    - ``revalidate`` compares the cached ``current_version_number`` with
+      the database in one query and drops outdated entries, which catches
+      version bumps made outside the ORM (migrations, SQL scripts)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import DECIMAL, DateTime, inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from backend.models.database_models import PriceConfig
+from backend.services.session_tracking import SessionTracker, changed_objects, written_model
+
+# Optional redis import for the shared L2 cache
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds an entry is served from the cache
+PRICE_CACHE_TTL = int(os.getenv('PRICE_CONFIG_CACHE_TTL', '300'))
+
+# L1 entries per process
+PRICE_CACHE_MAX_ENTRIES = int(os.getenv('PRICE_CONFIG_CACHE_SIZE', '10000'))
+
+# Seconds between checks of the shared invalidation epoch
+COHERENCE_INTERVAL = 1.0
+
+# Redis connection for the L2 cache (unset: L1 only)
+REDIS_URL = os.getenv('PRICE_CONFIG_CACHE_REDIS_URL')
+
+# Configs per IN (...) list
+LOAD_CHUNK_SIZE = 1000
+
+# Cached columns
+COLUMNS = [column.key for column in PriceConfig.__table__.columns]
+DECIMAL_COLUMNS = {column.key for column in PriceConfig.__table__.columns if isinstance(column.type, DECIMAL)}
+DATETIME_COLUMNS = {column.key for column in PriceConfig.__table__.columns if isinstance(column.type, DateTime)}
+
+# (config ids, customer ids) changed in the current transaction
+session_tracker = SessionTracker('price_config_cache', lambda: (set(), set()))
+
+# Shared epoch not read yet
+_UNSEEN = object()
+
+
+class PriceConfigCacheError(Exception):
+    """Custom exception for price config cache errors"""
+    pass
+
+
+def _snapshot(config: PriceConfig) -> Dict[str, Any]:
+    return {key: getattr(config, key) for key in COLUMNS}
+
+
+def _encode(value: Any) -> str:
+    # Customer lookups cache a config id (or None), config entries a snapshot
+    if not isinstance(value, dict):
+        return json.dumps(value)
+    return json.dumps({
+        key: (str(item) if key in DECIMAL_COLUMNS else item.isoformat() if key in DATETIME_COLUMNS else item)
+        if item is not None else None
+        for key, item in value.items()
+    })
+
+
+def _decode(text: str) -> Any:
+    value = json.loads(text)
+    if not isinstance(value, dict):
+        return value
+    for key in DECIMAL_COLUMNS | DATETIME_COLUMNS:
+        if value.get(key) is not None:
+            value[key] = Decimal(value[key]) if key in DECIMAL_COLUMNS else datetime.fromisoformat(value[key])
+    return value
+
+
+class PriceConfigCache:
+    """Two-level price config cache (in-process LRU, optional Redis)"""
+
+    def __init__(
+        self,
+        ttl: int = PRICE_CACHE_TTL,
+        max_entries: int = PRICE_CACHE_MAX_ENTRIES,
+        client=None,
+        prefix: str = 'op_cms:price_config'
+    ):
+        """
+        Args:
+            ttl: Seconds an entry is served from the cache
+            max_entries: L1 entries per process (least recently used evicted)
+            client: Redis client for the L2 cache (default: from PRICE_CONFIG_CACHE_REDIS_URL)
+            prefix: Redis key prefix
+        """
+        if client is None and REDIS_URL and HAS_REDIS:
+            client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.client = client
+        self.prefix = prefix
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch: Any = _UNSEEN
+        self._epoch_checked_at = 0.0
+        self.reset_metrics()
+
+    # ==================== Lookups ====================
+
+    def get_config(self, session: Optional[Session], config_id: int) -> Optional[PriceConfig]:
+        """
+        Price config by id
+
+        Args:
+            session: Session to merge the config into (None: detached instance)
+            config_id: PriceConfig.id
+
+        Returns:
+            PriceConfig, or None if it does not exist
+        """
+        return self.get_configs(session, [config_id]).get(config_id)
+
+    def get_configs(self, session: Optional[Session], config_ids: Iterable[int]) -> Dict[int, PriceConfig]:
+        """
+        Price configs by id, loading the missing ones with one query per chunk
+
+        Configs the session already holds are returned as they are; while
+        the session has unflushed or uncommitted price config changes, the
+        cache is bypassed and every config is read through the session.
+
+        Args:
+            session: Session to merge the configs into (None: detached instances)
+            config_ids: PriceConfig ids
+
+        Returns:
+            Config id -> PriceConfig for the configs that exist
+        """
+        ids = sorted({int(config_id) for config_id in config_ids if config_id is not None})
+        bypass = session is not None and _has_pending(session)
+        snapshots = {} if bypass else self._lookup([self._key('config', config_id) for config_id in ids])
+        missing = [config_id for config_id in ids if self._key('config', config_id) not in snapshots]
+        if missing:
+            if session is None:
+                raise PriceConfigCacheError("A session is required to load uncached price configs")
+            loaded = {}
+            for start in range(0, len(missing), LOAD_CHUNK_SIZE):
+                chunk = missing[start:start + LOAD_CHUNK_SIZE]
+                for config in session.execute(select(PriceConfig).where(PriceConfig.id.in_(chunk))).scalars():
+                    loaded[self._key('config', config.id)] = _snapshot(config)
+            if not bypass:
+                self._store(loaded)
+            snapshots.update(loaded)
+
+        configs = {}
+        for config_id in ids:
+            snapshot = snapshots.get(self._key('config', config_id))
+            if snapshot is not None:
+                configs[config_id] = self._attach(session, snapshot)
+        return configs
+
+    def get_active_config(self, session: Session, customer_id: int) -> Optional[PriceConfig]:
+        """
+        The customer's active price config (lowest id if there are several)
+
+        Args:
+            session: Database session
+            customer_id: Customer.id
+
+        Returns:
+            PriceConfig, or None if the customer has no active config
+        """
+        key = self._key('customer', customer_id)
+        found = {} if _has_pending(session) else self._lookup([key])
+        if key in found:
+            config_id = found[key]
+        else:
+            config_id = session.execute(
+                select(PriceConfig.id)
+                .where(PriceConfig.customer_id == customer_id, PriceConfig.is_active == True)  # noqa: E712
+                .order_by(PriceConfig.id)
+                .limit(1)
+            ).scalar()
+            if not _has_pending(session):
+                self._store({key: config_id})
+        if config_id is None:
+            return None
+        return self.get_config(session, config_id)
+
+    # ==================== Invalidation ====================
+
+    def invalidate(self, config_ids: Iterable[int] = (), customer_ids: Iterable[int] = ()):
+        """
+        Drop configs and customer lookups in this process and in Redis
+
+        Args:
+            config_ids: PriceConfig ids
+            customer_ids: Customer ids whose active config lookup is dropped
+        """
+        keys = [self._key('config', config_id) for config_id in set(config_ids) if config_id is not None]
+        keys += [self._key('customer', customer_id) for customer_id in set(customer_ids) if customer_id is not None]
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._metrics['invalidations'] += len(keys)
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline()
+                pipe.delete(*[self._redis_key(key) for key in keys])
+                pipe.incr(self._redis_key('epoch'))
+                epoch = pipe.execute()[-1]
+                # Skip our own bump unless another process invalidated in between
+                if self._epoch == str(epoch - 1):
+                    self._epoch = str(epoch)
+            except Exception as e:
+                logger.warning(f"Failed to invalidate shared price config cache: {str(e)}")
+
+    def clear(self):
+        """Drop every entry of this process (Redis entries expire by TTL)"""
+        with self._lock:
+            self._entries.clear()
+
+    def revalidate(self, session: Session) -> int:
+        """
+        Drop cached configs whose current_version_number is outdated
+
+        Catches version bumps made outside the ORM with one query.
+
+        Args:
+            session: Database session
+
+        Returns:
+            Number of configs dropped
+        """
+        with self._lock:
+            cached = {
+                value['id']: value.get('current_version_number')
+                for key, (expires_at, value) in self._entries.items()
+                if key.startswith('config:') and value is not None
+            }
+        stale: Set[int] = set()
+        customers: Set[int] = set()
+        ids = sorted(cached)
+        for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+            chunk = ids[start:start + LOAD_CHUNK_SIZE]
+            current = {
+                config_id: (version, customer_id)
+                for config_id, version, customer_id in session.execute(
+                    select(PriceConfig.id, PriceConfig.current_version_number, PriceConfig.customer_id)
+                    .where(PriceConfig.id.in_(chunk))
+                )
+            }
+            for config_id in chunk:
+                if config_id not in current or current[config_id][0] != cached[config_id]:
+                    stale.add(config_id)
+                    if config_id in current:
+                        customers.add(current[config_id][1])
+        if stale:
+            # Customers whose config was deleted are found through their cached lookup
+            with self._lock:
+                customers.update(
+                    int(key.split(':', 1)[1]) for key, (expires_at, value) in self._entries.items()
+                    if key.startswith('customer:') and value in stale
+                )
+            self.invalidate(stale, customers)
+            with self._lock:
+                self._metrics['stale_versions'] += len(stale)
+        return len(stale)
+
+    # ==================== Metrics ====================
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit/miss counters and cache size"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['size'] = len(self._entries)
+        lookups = metrics['hits'] + metrics['redis_hits'] + metrics['misses']
+        metrics['hit_ratio'] = round((metrics['hits'] + metrics['redis_hits']) / lookups, 4) if lookups else None
+        metrics['ttl'] = self.ttl
+        metrics['max_entries'] = self.max_entries
+        metrics['shared'] = self.client is not None
+        return metrics
+
+    def reset_metrics(self):
+        """Reset the hit/miss counters"""
+        with self._lock:
+            self._metrics = {
+                'hits': 0, 'redis_hits': 0, 'misses': 0, 'evictions': 0,
+                'invalidations': 0, 'stale_versions': 0, 'redis_errors': 0
+            }
+
+    # ==================== Internals ====================
+
+    def _key(self, kind: str, ident: int) -> str:
+        return f"{kind}:{int(ident)}"
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, Any]:
+        """Cached values of the keys found in L1 or L2"""
+        self._check_epoch()
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+            self._metrics['hits'] += len(found)
+
+        remaining = [key for key in keys if key not in found]
+        if remaining and self.client is not None:
+            try:
+                values = self.client.mget([self._redis_key(key) for key in remaining])
+            except Exception as e:
+                logger.warning(f"Failed to read shared price config cache: {str(e)}")
+                values = [None] * len(remaining)
+                with self._lock:
+                    self._metrics['redis_errors'] += 1
+            shared = {key: _decode(text) for key, text in zip(remaining, values) if text is not None}
+            self._store(shared, shared=False)
+            found.update(shared)
+            with self._lock:
+                self._metrics['redis_hits'] += len(shared)
+
+        with self._lock:
+            self._metrics['misses'] += len(keys) - len(found)
+        return found
+
+    def _store(self, values: Dict[str, Any], shared: bool = True):
+        """Cache values in L1 (and L2 unless they came from there)"""
+        if not values:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics['evictions'] += 1
+        if shared and self.client is not None:
+            try:
+                pipe = self.client.pipeline()
+                for key, value in values.items():
+                    pipe.set(self._redis_key(key), _encode(value), ex=self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to write shared price config cache: {str(e)}")
+                with self._lock:
+                    self._metrics['redis_errors'] += 1
+
+    def _check_epoch(self):
+        """Drop L1 when another process invalidated configs"""
+        if self.client is None:
+            return
+        now = time.monotonic()
+        if now - self._epoch_checked_at < COHERENCE_INTERVAL:
+            return
+        self._epoch_checked_at = now
+        try:
+            epoch = self.client.get(self._redis_key('epoch'))
+        except Exception as e:
+            logger.warning(f"Failed to read shared price config cache epoch: {str(e)}")
+            with self._lock:
+                self._metrics['redis_errors'] += 1
+            return
+        if epoch != self._epoch:
+            if self._epoch is not _UNSEEN:
+                self.clear()
+            self._epoch = epoch
+
+    def _attach(self, session: Optional[Session], snapshot: Dict[str, Any]) -> PriceConfig:
+        """PriceConfig instance for a snapshot, merged into the session without a SELECT"""
+        if session is not None:
+            # merge() would copy the snapshot over the session's own (possibly changed) instance
+            existing = session.identity_map.get(session.identity_key(PriceConfig, snapshot['id']))
+            if existing is not None:
+                return existing
+        config = PriceConfig(**snapshot)
+        make_transient_to_detached(config)
+        if session is None:
+            return config
+        return session.merge(config, load=False)
+
+
+# ==================== Session Hooks ====================
+
+def _has_pending(session) -> bool:
+    """Whether the session's transaction changed price configs (not visible to others yet)"""
+    config_ids, customer_ids = session_tracker.peek_pending(session, ((), ()))
+    if config_ids or customer_ids:
+        return True
+    # Unflushed changes (autoflush off)
+    return any(isinstance(obj, PriceConfig) for obj in changed_objects(session))
+
+
+@session_tracker.listens_for('after_flush')
+def _after_flush(session, flush_context):
+    config_ids, customer_ids = session_tracker.pending(session)
+    for obj in changed_objects(session):
+        if not isinstance(obj, PriceConfig):
+            continue
+        config_ids.add(obj.id)
+        customer_ids.add(obj.customer_id)
+        # The customer a config was moved away from
+        customer_ids.update(inspect(obj).attrs.customer_id.history.deleted or ())
+
+
+@session_tracker.listens_for('do_orm_execute')
+def _do_orm_execute(state):
+    if written_model(state) is not PriceConfig:
+        return
+    config_ids, customer_ids = session_tracker.pending(state.session)
+    if state.is_insert:
+        parameters = state.parameters or {}
+        rows = [parameters] if isinstance(parameters, dict) else parameters
+        customer_ids.update(row.get('customer_id') for row in rows)
+        return
+    # Rows matched by a bulk UPDATE/DELETE are looked up before it runs
+    query = select(PriceConfig.id, PriceConfig.customer_id)
+    if state.statement.whereclause is not None:
+        query = query.where(state.statement.whereclause)
+    for config_id, customer_id in state.session.execute(query):
+        config_ids.add(config_id)
+        customer_ids.add(customer_id)
+
+
+@session_tracker.listens_for('after_commit')
+def _after_commit(session):
+    pending = session_tracker.pop_pending(session)
+    if pending and (pending[0] or pending[1]):
+        price_config_cache.invalidate(pending[0], pending[1])
+
+
+def track_price_configs(target) -> None:
+    """
+    Invalidate cached price configs on commit for sessions of a sessionmaker (or Session class)
+
+    Price config writes made through these sessions drop the affected
+    configs and customer lookups from the global cache once committed.
+    """
+    session_tracker.track(target)
+
+
+def untrack_price_configs(target) -> None:
+    """Stop invalidating cached price configs for a sessionmaker (or Session class)"""
+    session_tracker.untrack(target)
+
+
+# Global price config cache
+price_config_cache = PriceConfigCache()
@@ -0,0 +1,288 @@
+# OP_CMS Price Versioning
+# Story 2.4: Price Config Version Control - effective-dated pricing
+
+"""
+Effective-dated price configs
+
+Every create/update of a price config writes a PriceConfigVersion snapshot
+(``record_version``). A version applies from its ``effective_from`` until
+the ``effective_from`` of the config's next version, so the price of a
+back-dated period is the version in effect at the period start.
+
+PriceVersionIndex loads the versions of a whole run up front (one query
+per chunk of customers) and keeps, per config, the effective_from values
+in a sorted list next to the version snapshots. A lookup is a bisect on
+that list, so resolving prices for 100k customers needs no per-customer
+version queries.
+"""
+
+import bisect
+import logging
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from backend.models.database_models import PriceConfig
+from backend.models.price_version_models import PriceConfigVersion
+
+logger = logging.getLogger(__name__)
+
+# Customers per IN (...) list when loading an index
+LOAD_CHUNK_SIZE = 1000
+
+# Config fields snapshotted into a version
+VERSIONED_FIELDS = [
+    'name', 'description', 'price_model', 'device_series', 'currency', 'unit_price',
+    'pricing_rules', 'is_active'
+]
+
+
+class PriceVersionError(Exception):
+    """Custom exception for price versioning errors"""
+    pass
+
+
+def _json_value(value: Any) -> Any:
+    return str(value) if isinstance(value, Decimal) else value
+
+
+def record_version(
+    session,
+    config: PriceConfig,
+    changed_by: Optional[int] = None,
+    change_reason: Optional[str] = None,
+    effective_from: Optional[datetime] = None
+) -> PriceConfigVersion:
+    """
+    Snapshot a price config as its current_version_number
+
+    The config must be flushed (it needs an id). Fields that differ from
+    the config's previous version are recorded in changes_summary.
+
+    Args:
+        session: Database session
+        config: Created or updated price config
+        changed_by: User ID who made the change
+        change_reason: Reason for the change
+        effective_from: Time from which the version applies (default: now)
+
+    Returns:
+        Added PriceConfigVersion
+    """
+    if config.id is None:
+        raise PriceVersionError("Price config must be flushed before recording a version")
+
+    version_number = config.current_version_number or 1
+    previous = session.execute(
+        select(PriceConfigVersion)
+        .where(PriceConfigVersion.config_id == config.id)
+        .order_by(PriceConfigVersion.version_number.desc())
+        .limit(1)
+    ).scalar()
+    if previous is not None:
+        if version_number <= previous.version_number:
+            raise PriceVersionError(
+                f"Version {version_number} of config {config.id} is not newer than {previous.version_number}"
+            )
+        effective_from = effective_from or datetime.utcnow()
+        if effective_from < previous.effective_from:
+            raise PriceVersionError("effective_from must not precede the previous version")
+        changes = {
+            field: {'from': _json_value(getattr(previous, field)), 'to': _json_value(getattr(config, field))}
+            for field in VERSIONED_FIELDS
+            if getattr(previous, field) != getattr(config, field)
+        }
+    else:
+        changes = None
+
+    version = PriceConfigVersion(
+        version_id=str(uuid.uuid4()),
+        config_id=config.id,
+        version_number=version_number,
+        name=config.name,
+        description=config.description,
+        price_model=config.price_model,
+        device_series=config.device_series or 'X',
+        currency=config.currency or 'CNY',
+        unit_price=config.unit_price if config.unit_price is not None else Decimal('0'),
+        pricing_rules=config.pricing_rules,
+        is_active=bool(config.is_active) if config.is_active is not None else True,
+        changed_by=changed_by,
+        change_reason=change_reason,
+        changes_summary=changes,
+        effective_from=effective_from or config.created_at or datetime.utcnow()
+    )
+    session.add(version)
+    return version
+
+
+class EffectivePrice:
+    """Pricing of one config version, usable wherever calculate_settlement takes a config"""
+
+    __slots__ = (
+        'config_id', 'customer_id', 'version_number', 'effective_from', 'effective_to',
+        'name', 'price_model', 'device_series', 'currency', 'unit_price', 'pricing_rules', 'is_active'
+    )
+
+    def __init__(self, version: PriceConfigVersion, customer_id: int):
+        self.config_id = version.config_id
+        self.customer_id = customer_id
+        self.version_number = version.version_number
+        self.effective_from = version.effective_from
+        self.effective_to: Optional[datetime] = None
+        self.name = version.name
+        self.price_model = version.price_model
+        self.device_series = version.device_series
+        self.currency = version.currency
+        self.unit_price = version.unit_price
+        self.pricing_rules = version.pricing_rules
+        self.is_active = version.is_active
+
+    @property
+    def id(self) -> int:
+        """Config id (PriceConfig.id)"""
+        return self.config_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary"""
+        return {
+            'config_id': self.config_id,
+            'customer_id': self.customer_id,
+            'version_number': self.version_number,
+            'effective_from': self.effective_from.isoformat() if self.effective_from else None,
+            'effective_to': self.effective_to.isoformat() if self.effective_to else None,
+            'price_model': self.price_model,
+            'currency': self.currency,
+            'unit_price': float(self.unit_price) if self.unit_price is not None else None,
+            'is_active': self.is_active,
+        }
+
+
+class PriceVersionIndex:
+    """In-memory interval index of price config versions"""
+
+    def __init__(self):
+        # Config id -> sorted effective_from values / versions in the same order
+        self._starts: Dict[int, List[datetime]] = {}
+        self._versions: Dict[int, List[EffectivePrice]] = {}
+        # Customer id -> config ids in id order
+        self._customer_configs: Dict[int, List[int]] = {}
+
+    @classmethod
+    def load(cls, session, customer_ids: Optional[Iterable[int]] = None) -> 'PriceVersionIndex':
+        """
+        Load the versions of the customers' configs
+
+        Args:
+            session: Database session
+            customer_ids: Customers to load (default: all)
+
+        Returns:
+            PriceVersionIndex
+        """
+        index = cls()
+        query = (
+            select(PriceConfigVersion, PriceConfig.customer_id)
+            .join(PriceConfig, PriceConfig.id == PriceConfigVersion.config_id)
+            .order_by(
+                PriceConfigVersion.config_id, PriceConfigVersion.effective_from,
+                PriceConfigVersion.version_number
+            )
+        )
+        if customer_ids is None:
+            index.add_versions(session.execute(query.execution_options(yield_per=LOAD_CHUNK_SIZE)))
+        else:
+            ids = sorted(set(customer_ids))
+            for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+                chunk = ids[start:start + LOAD_CHUNK_SIZE]
+                index.add_versions(session.execute(query.where(PriceConfig.customer_id.in_(chunk))))
+        index.seal()
+        logger.info(f"Loaded price version index: {index.config_count} configs, {index.version_count} versions")
+        return index
+
+    def add_versions(self, rows: Iterable[Sequence[Any]]):
+        """
+        Add (PriceConfigVersion, customer_id) rows
+
+        Rows may come in any order; call seal() once all rows are added.
+        """
+        for version, customer_id in rows:
+            price = EffectivePrice(version, customer_id)
+            versions = self._versions.setdefault(price.config_id, [])
+            if not versions:
+                self._customer_configs.setdefault(customer_id, []).append(price.config_id)
+            versions.append(price)
+
+    def seal(self):
+        """Sort the versions by effective_from and link their effective_to"""
+        for config_id, versions in self._versions.items():
+            versions.sort(key=lambda price: (price.effective_from, price.version_number))
+            for current, following in zip(versions, versions[1:]):
+                current.effective_to = following.effective_from
+            self._starts[config_id] = [price.effective_from for price in versions]
+        for config_ids in self._customer_configs.values():
+            config_ids.sort()
+
+    @property
+    def config_count(self) -> int:
+        return len(self._versions)
+
+    @property
+    def version_count(self) -> int:
+        return sum(len(versions) for versions in self._versions.values())
+
+    def has_history(self, customer_id: int) -> bool:
+        """Whether any config of the customer has versions"""
+        return customer_id in self._customer_configs
+
+    def resolve(self, config_id: int, at: datetime) -> Optional[EffectivePrice]:
+        """
+        Version of a config in effect at a time
+
+        Args:
+            config_id: PriceConfig.id
+            at: Point in time
+
+        Returns:
+            EffectivePrice, or None if the config had no version yet
+        """
+        starts = self._starts.get(config_id)
+        if not starts:
+            return None
+        position = bisect.bisect_right(starts, at) - 1
+        if position < 0:
+            return None
+        return self._versions[config_id][position]
+
+    def resolve_customer(self, customer_id: int, at: datetime) -> Optional[EffectivePrice]:
+        """
+        The customer's active pricing at a time
+
+        Of the customer's configs whose version in effect at ``at`` is
+        active, the one with the lowest id is used (as for live lookups).
+        When no config had a version yet at ``at`` (configs created after
+        the period start), the earliest version of the first active config
+        is used instead.
+
+        Args:
+            customer_id: Customer.id
+            at: Point in time
+
+        Returns:
+            EffectivePrice, or None if no active version applies
+        """
+        config_ids = self._customer_configs.get(customer_id, ())
+        prices = [self.resolve(config_id, at) for config_id in config_ids]
+        for price in prices:
+            if price is not None and price.is_active:
+                return price
+        if any(price is not None for price in prices):
+            return None
+        for config_id in config_ids:
+            earliest = self._versions[config_id][0]
+            if earliest.is_active:
+                return earliest
+        return None
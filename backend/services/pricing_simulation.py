@@ -0,0 +1,346 @@
+# OP_CMS Pricing Simulation
+# Story 3.1: Automated Settlement Generation - re-rating / what-if pricing
+
+"""
+What-if pricing simulation
+
+Re-rates historical settlements under a candidate pricing (price model
+plus unit price or tier table) and compares the result with what was
+billed, without writing anything:
+
+    1. usage and billed totals of the selected settlements are read in
+       bulk (one query per chunk of customers)
+    2. the candidate is applied to all usage quantities at once with numpy
+       (``rate_usage``); large selections are split across a process pool
+    3. old and new totals are summed per customer and summarized as a
+       distribution (totals, percentiles, delta histogram)
+
+Every settlement is re-rated on its own usage, as tiers apply per period.
+Amounts are computed in float64 and rounded to cents per settlement, which
+is exact enough for analysis; billing itself stays on Decimal in
+SettlementService.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from backend.models.database_models import PriceConfig, SettlementRecord
+from backend.services.archive_tier import route
+from backend.services.customer_ledger import VOID_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Price models (as in SettlementService)
+PRICE_MODELS = ('single', 'multi', 'tiered')
+
+# Customers per IN (...) list when reading usage
+LOAD_CHUNK_SIZE = 1000
+
+# Settlements below which rating runs inline instead of in the process pool
+PARALLEL_THRESHOLD = 200000
+
+# Settlements per process pool task
+RATING_CHUNK_SIZE = 100000
+
+# Process pool size
+DEFAULT_SIMULATION_WORKERS = min(4, os.cpu_count() or 1)
+
+# Percentiles reported for per-customer deltas
+DELTA_PERCENTILES = [5, 25, 50, 75, 95]
+
+# Histogram edges of the per-customer delta (percent of the billed total)
+DELTA_PCT_BUCKETS = [-50, -20, -10, -5, 0, 5, 10, 20, 50]
+
+
+class PricingSimulationError(Exception):
+    """Custom exception for pricing simulation errors"""
+    pass
+
+
+class TierTable:
+    """Candidate pricing: price model with a unit price or tiers (picklable)"""
+
+    def __init__(self, price_model: str, unit_price: Optional[float] = None, tiers: Optional[Sequence[Dict[str, Any]]] = None):
+        """
+        Args:
+            price_model: single (usage x unit price), multi (all usage at the
+                price of the tier the usage falls in) or tiered (progressive,
+                each tier's share at its own price)
+            unit_price: Unit price of single pricing
+            tiers: [{'min_quantity', 'max_quantity' (None: open), 'unit_price'}] of multi/tiered pricing
+        """
+        if price_model not in PRICE_MODELS:
+            raise PricingSimulationError(f"Unsupported pricing model: {price_model}")
+        self.price_model = price_model
+
+        if price_model == 'single':
+            if unit_price is None or float(unit_price) < 0:
+                raise PricingSimulationError("single pricing requires a non-negative unit_price")
+            self.unit_price = float(unit_price)
+            self.mins = self.maxs = self.prices = None
+            return
+
+        if not tiers:
+            raise PricingSimulationError(f"{price_model} pricing requires tiers")
+        ordered = sorted(tiers, key=lambda tier: float(tier['min_quantity']))
+        self.mins = np.array([float(tier['min_quantity']) for tier in ordered])
+        self.maxs = np.array([
+            np.inf if tier.get('max_quantity') is None else float(tier['max_quantity']) for tier in ordered
+        ])
+        self.prices = np.array([float(tier['unit_price']) for tier in ordered])
+        if self.mins[0] != 0:
+            raise PricingSimulationError("The first tier must start at 0")
+        if np.any(self.maxs[:-1] != self.mins[1:]) or not np.isinf(self.maxs[-1]):
+            raise PricingSimulationError("Tiers must be contiguous and the last tier open-ended")
+        if np.any(self.prices < 0):
+            raise PricingSimulationError("Tier prices must not be negative")
+        self.unit_price = None
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> 'TierTable':
+        """Candidate from a request body ({'price_model', 'unit_price', 'tiers'})"""
+        if not spec or 'price_model' not in spec:
+            raise PricingSimulationError("price_model is required")
+        return cls(spec['price_model'], spec.get('unit_price'), spec.get('tiers'))
+
+    @classmethod
+    def from_config(cls, config: PriceConfig) -> 'TierTable':
+        """Candidate from a price config (tiers from pricing_rules['tiers'])"""
+        rules = config.pricing_rules or {}
+        return cls(config.price_model, config.unit_price, rules.get('tiers'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary"""
+        if self.price_model == 'single':
+            return {'price_model': 'single', 'unit_price': self.unit_price}
+        return {
+            'price_model': self.price_model,
+            'tiers': [
+                {
+                    'min_quantity': float(low),
+                    'max_quantity': None if np.isinf(high) else float(high),
+                    'unit_price': float(price)
+                }
+                for low, high, price in zip(self.mins, self.maxs, self.prices)
+            ]
+        }
+
+
+def rate_usage(usage: np.ndarray, table: TierTable) -> np.ndarray:
+    """
+    Amounts of many usage quantities under a candidate pricing
+
+    Args:
+        usage: Usage quantities (float64)
+        table: Candidate pricing
+
+    Returns:
+        Amounts rounded to cents, in the order of usage
+    """
+    usage = np.asarray(usage, dtype=np.float64)
+    if table.price_model == 'single':
+        amounts = usage * table.unit_price
+    elif table.price_model == 'multi':
+        # Tier whose [min, max) contains the usage
+        tier = np.searchsorted(table.mins, usage, side='right') - 1
+        amounts = usage * table.prices[np.clip(tier, 0, None)]
+    else:
+        # Quantity falling into each tier: (rows, tiers)
+        in_tier = np.clip(usage[:, None] - table.mins[None, :], 0, table.maxs - table.mins)
+        amounts = in_tier @ table.prices
+    return np.round(amounts, 2)
+
+
+def _rate_chunk(args: Tuple[np.ndarray, TierTable]) -> np.ndarray:
+    usage, table = args
+    return rate_usage(usage, table)
+
+
+class PricingSimulator:
+    """Re-rates historical settlements under a candidate pricing"""
+
+    def __init__(self, max_workers: int = DEFAULT_SIMULATION_WORKERS, parallel_threshold: int = PARALLEL_THRESHOLD):
+        """
+        Args:
+            max_workers: Process pool size
+            parallel_threshold: Settlements below which rating runs inline
+        """
+        self.max_workers = max(1, max_workers)
+        self.parallel_threshold = parallel_threshold
+
+    def load_usage(
+        self,
+        session,
+        period_start: datetime,
+        period_end: datetime,
+        customer_ids: Optional[Iterable[int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Usage and billed totals of the settlements within a period
+
+        Settlements whose period lies within [period_start, period_end] are
+        selected; cancelled/rejected settlements are ignored.
+
+        Returns:
+            (customer ids, usage quantities, billed totals) arrays
+        """
+        query = select(
+            SettlementRecord.customer_id, SettlementRecord.usage_quantity, SettlementRecord.total_amount
+        ).where(
+            SettlementRecord.period_start >= period_start,
+            SettlementRecord.period_end <= period_end,
+            SettlementRecord.status.notin_(VOID_STATUSES)
+        ).order_by(SettlementRecord.customer_id, SettlementRecord.id)
+
+        # Periods do not bound created_at, so archived settlements are always read
+        if customer_ids is None:
+            batches = [session.execute(route(session, query).execution_options(yield_per=LOAD_CHUNK_SIZE))]
+        else:
+            ids = sorted(set(customer_ids))
+            batches = (
+                session.execute(route(
+                    session, query.where(SettlementRecord.customer_id.in_(ids[start:start + LOAD_CHUNK_SIZE]))
+                ))
+                for start in range(0, len(ids), LOAD_CHUNK_SIZE)
+            )
+
+        customers: List[int] = []
+        usage: List[float] = []
+        billed: List[float] = []
+        for rows in batches:
+            for customer_id, quantity, total in rows:
+                customers.append(customer_id)
+                usage.append(float(quantity or 0))
+                billed.append(float(total or 0))
+        return (
+            np.array(customers, dtype=np.int64),
+            np.array(usage, dtype=np.float64),
+            np.array(billed, dtype=np.float64)
+        )
+
+    def rate(self, usage: np.ndarray, table: TierTable) -> np.ndarray:
+        """Rate usage inline or, for large inputs, in the process pool"""
+        if len(usage) < self.parallel_threshold or self.max_workers == 1:
+            return rate_usage(usage, table)
+        chunks = [(usage[start:start + RATING_CHUNK_SIZE], table) for start in range(0, len(usage), RATING_CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            return np.concatenate(list(pool.map(_rate_chunk, chunks)))
+
+    def simulate(
+        self,
+        session,
+        table: TierTable,
+        period_start: datetime,
+        period_end: datetime,
+        customer_ids: Optional[Iterable[int]] = None,
+        top: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Compare billed totals with the totals under a candidate pricing
+
+        Args:
+            session: Database session (read only)
+            table: Candidate pricing
+            period_start: Start of the re-rated period
+            period_end: End of the re-rated period
+            customer_ids: Customers to re-rate (default: all with settlements in the period)
+            top: Per-customer deltas to return, largest absolute delta first (default: all)
+
+        Returns:
+            Dictionary with candidate, summary (distribution) and customers
+            (per-customer old_total, new_total, delta, delta_pct)
+        """
+        if period_end < period_start:
+            raise PricingSimulationError("period_end must not precede period_start")
+
+        customers, usage, billed = self.load_usage(session, period_start, period_end, customer_ids)
+        rerated = self.rate(usage, table)
+
+        customer_ids_found, position = np.unique(customers, return_inverse=True)
+        old_totals = np.round(np.bincount(position, weights=billed, minlength=len(customer_ids_found)), 2)
+        new_totals = np.round(np.bincount(position, weights=rerated, minlength=len(customer_ids_found)), 2)
+        settlement_counts = np.bincount(position, minlength=len(customer_ids_found))
+        deltas = np.round(new_totals - old_totals, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_pct = np.where(old_totals > 0, deltas / old_totals * 100, np.nan)
+
+        order = np.argsort(-np.abs(deltas), kind='stable')
+        if top is not None:
+            order = order[:top]
+        per_customer = [
+            {
+                'customer_id': int(customer_ids_found[i]),
+                'settlements': int(settlement_counts[i]),
+                'old_total': float(old_totals[i]),
+                'new_total': float(new_totals[i]),
+                'delta': float(deltas[i]),
+                'delta_pct': None if np.isnan(delta_pct[i]) else round(float(delta_pct[i]), 2)
+            }
+            for i in order
+        ]
+
+        logger.info(
+            f"Simulated {table.price_model} pricing for {len(customer_ids_found)} customers "
+            f"({len(usage)} settlements)"
+        )
+        return {
+            'candidate': table.to_dict(),
+            'period_start': period_start.isoformat(),
+            'period_end': period_end.isoformat(),
+            'summary': summarize(old_totals, new_totals, deltas, delta_pct, len(usage)),
+            'customers': per_customer
+        }
+
+
+def summarize(
+    old_totals: np.ndarray,
+    new_totals: np.ndarray,
+    deltas: np.ndarray,
+    delta_pct: np.ndarray,
+    settlements: int
+) -> Dict[str, Any]:
+    """Distribution summary of per-customer totals and deltas"""
+    old_total = float(np.round(old_totals.sum(), 2))
+    new_total = float(np.round(new_totals.sum(), 2))
+    summary = {
+        'customers': int(len(deltas)),
+        'settlements': int(settlements),
+        'old_total': old_total,
+        'new_total': new_total,
+        'delta_total': round(new_total - old_total, 2),
+        'delta_pct_total': round((new_total - old_total) / old_total * 100, 2) if old_total else None,
+        'increased': int(np.count_nonzero(deltas > 0)),
+        'decreased': int(np.count_nonzero(deltas < 0)),
+        'unchanged': int(np.count_nonzero(deltas == 0)),
+        'delta_percentiles': {},
+        'delta_pct_percentiles': {},
+        'delta_pct_histogram': []
+    }
+    if len(deltas):
+        for p, value in zip(DELTA_PERCENTILES, np.percentile(deltas, DELTA_PERCENTILES)):
+            summary['delta_percentiles'][f'p{p}'] = round(float(value), 2)
+    known_pct = delta_pct[~np.isnan(delta_pct)]
+    if len(known_pct):
+        for p, value in zip(DELTA_PERCENTILES, np.percentile(known_pct, DELTA_PERCENTILES)):
+            summary['delta_pct_percentiles'][f'p{p}'] = round(float(value), 2)
+        edges = [-np.inf] + DELTA_PCT_BUCKETS + [np.inf]
+        counts, _ = np.histogram(known_pct, bins=edges)
+        summary['delta_pct_histogram'] = [
+            {
+                'from': None if np.isinf(low) else low,
+                'to': None if np.isinf(high) else high,
+                'customers': int(count)
+            }
+            for low, high, count in zip(edges[:-1], edges[1:], counts)
+        ]
+    return summary
+
+
+# Global simulator instance
+pricing_simulator = PricingSimulator()
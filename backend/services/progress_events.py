@@ -0,0 +1,354 @@
+# OP_CMS Progress Events
+# Story 6.4: Batch Processing - push-based progress streaming
+
+"""
+Progress event bus
+
+Batch tasks and Celery tasks publish progress events instead of clients
+polling for them:
+
+    publisher (BatchTask / Celery task)
+        -> ProgressPublisher (coalesces to one event per task per interval)
+        -> ProgressEventBus  (in-process broadcaster or Redis pub/sub)
+        -> subscriptions     (one per SSE client)
+
+Backends (PROGRESS_EVENT_BUS):
+    - memory: broadcasts to subscribers in the same process only
+    - redis: Redis pub/sub; events from Celery workers reach every API worker
+
+Intermediate progress events are coalesced: an event suppressed inside the
+interval is published when the interval ends (with the task's state at that
+time), so the last update before a pause is not lost. Final events
+(completed, failed, cancelled) are always published, so subscribers never
+miss the end state. Subscriber queues are bounded and drop the oldest event when full,
+so a slow client cannot make the publisher block or grow memory.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+# Optional Redis import for cross-process pub/sub
+try:
+    import redis
+    import redis.asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+    redis = None
+    aioredis = None
+
+from backend.services.batch_task_store import REDIS_URL as TASK_STORE_REDIS_URL, TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Supported event bus backends
+PROGRESS_BUS_BACKENDS = ['memory', 'redis']
+
+# Event bus backend
+DEFAULT_PROGRESS_BUS = os.getenv('PROGRESS_EVENT_BUS', 'memory')
+
+# Redis connection for pub/sub (shares the task store Redis by default)
+PROGRESS_REDIS_URL = os.getenv('PROGRESS_EVENT_REDIS_URL', TASK_STORE_REDIS_URL)
+
+# Minimum seconds between two progress events of the same task
+DEFAULT_MIN_INTERVAL = float(os.getenv('PROGRESS_EVENT_INTERVAL', '0.5'))
+
+# Tracked tasks above which publish times older than the interval are pruned
+PUBLISHER_PRUNE_THRESHOLD = 1024
+
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+CHANNEL_PREFIX = 'op_cms:progress:'
+
+# Celery states that end a task's event stream
+FINAL_CELERY_STATES = ('SUCCESS', 'FAILED', 'FAILURE', 'REVOKED')
+
+
+class ProgressEventError(Exception):
+    """Custom exception for progress event errors"""
+    pass
+
+
+def channel_name(key: str) -> str:
+    """Pub/sub channel for a task"""
+    return f"{CHANNEL_PREFIX}{key}"
+
+
+def is_final_event(event: Dict[str, Any]) -> bool:
+    """Whether an event (batch task or Celery) carries the task's end state"""
+    return event.get('status') in TERMINAL_STATUSES or event.get('state') in FINAL_CELERY_STATES
+
+
+def encode_event(event: Dict[str, Any]) -> str:
+    """Serialize an event (datetimes as ISO strings)"""
+    return json.dumps(event, default=lambda value: value.isoformat() if hasattr(value, 'isoformat') else str(value))
+
+
+# ==================== Subscriptions ====================
+
+class ProgressSubscription:
+    """Async stream of events for one task"""
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the next event
+
+        Args:
+            timeout: Seconds to wait
+
+        Returns:
+            The event, or None on timeout
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Stop receiving events"""
+        raise NotImplementedError
+
+    async def __aenter__(self) -> 'ProgressSubscription':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class MemorySubscription(ProgressSubscription):
+    """Subscription fed by the in-process broadcaster (thread-safe)"""
+
+    def __init__(self, bus: 'MemoryProgressBus', key: str):
+        self._bus = bus
+        self._key = key
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event: Dict[str, Any]):
+        """Hand an event over from any thread"""
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop already closed; the subscriber is gone
+            self._bus.unsubscribe(self._key, self)
+
+    def _put(self, event: Dict[str, Any]):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self._bus.unsubscribe(self._key, self)
+
+
+class RedisSubscription(ProgressSubscription):
+    """Subscription on a Redis pub/sub channel"""
+
+    def __init__(self, client, key: str):
+        self._client = client
+        self._channel = channel_name(key)
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+
+    async def open(self) -> 'RedisSubscription':
+        await self._pubsub.subscribe(self._channel)
+        return self
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message and message.get('type') == 'message':
+                return json.loads(message['data'])
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+
+    async def close(self):
+        await self._pubsub.unsubscribe(self._channel)
+        await self._pubsub.aclose()
+        await self._client.aclose()
+
+
+# ==================== Event Buses ====================
+
+class ProgressEventBus:
+    """Fan-out of task progress events to subscribers"""
+
+    def publish(self, key: str, event: Dict[str, Any]):
+        """Publish an event for a task (callable from any thread)"""
+        raise NotImplementedError
+
+    async def subscribe(self, key: str) -> ProgressSubscription:
+        """Subscribe to the events of a task"""
+        raise NotImplementedError
+
+
+class MemoryProgressBus(ProgressEventBus):
+    """In-process broadcaster"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[MemorySubscription]] = {}
+
+    def publish(self, key: str, event: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    async def subscribe(self, key: str) -> ProgressSubscription:
+        subscription = MemorySubscription(self, key)
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, key: str, subscription: MemorySubscription):
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def subscriber_count(self, key: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(key, ()))
+
+
+class RedisProgressBus(ProgressEventBus):
+    """Redis pub/sub broadcaster shared by API workers and Celery processes"""
+
+    def __init__(self, url: str = None, client=None):
+        if not HAS_REDIS:
+            raise ProgressEventError("redis is required for the Redis progress event bus")
+        self.url = url or PROGRESS_REDIS_URL
+        self.client = client or redis.Redis.from_url(self.url)
+
+    def publish(self, key: str, event: Dict[str, Any]):
+        try:
+            self.client.publish(channel_name(key), encode_event(event))
+        except redis.exceptions.RedisError as e:
+            # Progress streaming is best effort; never fail the task over it
+            logger.warning(f"Failed to publish progress event for {key}: {str(e)}")
+
+    async def subscribe(self, key: str) -> ProgressSubscription:
+        return await RedisSubscription(aioredis.Redis.from_url(self.url), key).open()
+
+
+def create_progress_bus(backend: str = None, **kwargs) -> ProgressEventBus:
+    """
+    Create a progress event bus
+
+    Args:
+        backend: memory or redis (defaults to PROGRESS_EVENT_BUS)
+        **kwargs: Backend options
+
+    Returns:
+        Event bus instance
+    """
+    backend = backend or DEFAULT_PROGRESS_BUS
+    if backend == 'memory':
+        return MemoryProgressBus()
+    if backend == 'redis':
+        return RedisProgressBus(**kwargs)
+    raise ProgressEventError(f"Invalid progress event bus: {backend}. Must be one of {PROGRESS_BUS_BACKENDS}")
+
+
+# ==================== Coalescing Publisher ====================
+
+class ProgressPublisher:
+    """Rate-limits progress events per task before they reach the bus"""
+
+    def __init__(self, bus: ProgressEventBus, min_interval: float = None):
+        self.bus = bus
+        self.min_interval = DEFAULT_MIN_INTERVAL if min_interval is None else min_interval
+        self._lock = threading.Lock()
+        self._last_published: Dict[str, float] = {}
+        # Suppressed event per task, published by a timer when its interval ends
+        self._trailing: Dict[str, Tuple[Callable[[], Dict[str, Any]], threading.Timer]] = {}
+
+    def publish(self, key: str, build_event: Callable[[], Dict[str, Any]], final: bool = False) -> bool:
+        """
+        Publish a task event unless one was published too recently
+
+        A suppressed event is published (built then) once the interval ends,
+        unless a newer or final event replaces it.
+
+        Args:
+            key: Task ID
+            build_event: Builds the event; only called when it is published
+            final: Final state of the task; always published
+
+        Returns:
+            True if the event was published now
+        """
+        now = time.monotonic()
+        with self._lock:
+            if final:
+                self._last_published.pop(key, None)
+                trailing = self._trailing.pop(key, None)
+                if trailing is not None:
+                    trailing[1].cancel()
+            else:
+                last = self._last_published.get(key)
+                if last is not None and now - last < self.min_interval:
+                    self._defer(key, build_event, self.min_interval - (now - last))
+                    return False
+                self._last_published[key] = now
+                if len(self._last_published) > PUBLISHER_PRUNE_THRESHOLD:
+                    self._prune(now)
+
+        return self._send(key, build_event)
+
+    def pending_count(self) -> int:
+        """Number of tasks with a suppressed event waiting for its interval to end"""
+        with self._lock:
+            return len(self._trailing)
+
+    def _defer(self, key: str, build_event: Callable[[], Dict[str, Any]], delay: float):
+        """Keep the newest suppressed event of a task and schedule its publication (lock held)"""
+        trailing = self._trailing.get(key)
+        if trailing is not None:
+            self._trailing[key] = (build_event, trailing[1])
+            return
+        timer = threading.Timer(delay, self._flush, args=(key,))
+        timer.daemon = True
+        self._trailing[key] = (build_event, timer)
+        timer.start()
+
+    def _flush(self, key: str):
+        """Publish a task's suppressed event at the end of its interval"""
+        with self._lock:
+            trailing = self._trailing.pop(key, None)
+            if trailing is None:
+                return
+            self._last_published[key] = time.monotonic()
+        self._send(key, trailing[0])
+
+    def _prune(self, now: float):
+        """Forget publish times that can no longer suppress an event (lock held)"""
+        for key in [key for key, last in self._last_published.items() if now - last >= self.min_interval]:
+            if key not in self._trailing:
+                del self._last_published[key]
+
+    def _send(self, key: str, build_event: Callable[[], Dict[str, Any]]) -> bool:
+        try:
+            self.bus.publish(key, build_event())
+        except Exception as e:
+            logger.warning(f"Failed to publish progress event for {key}: {str(e)}")
+            return False
+        return True
+
+
+# Global progress event bus and publisher
+progress_bus = create_progress_bus()
+progress_publisher = ProgressPublisher(progress_bus)
@@ -0,0 +1,548 @@
+# OP_CMS Reminder Dispatcher
+# Story 3.5: Overdue Reminder Functionality - bulk dispatch
+
+"""
+Overdue reminder dispatch
+
+A nightly run sends one e-mail per customer covering all of the customer's
+overdue settlements:
+
+    overdue query (one indexed query per page of customers)
+        -> grouped per customer
+        -> templates rendered for the whole page
+        -> transport (one reused connection, rate limited)
+        -> ReminderRecord rows (one bulk INSERT per page)
+
+A settlement is overdue when it is still pending/approved
+``payment_term_days`` after creation. It is reminded again at most every
+``interval_days`` and at most ``max_reminders`` times; failed sends do not
+count, so they are retried by the next run.
+
+Transports (REMINDER_TRANSPORT):
+    - smtp: SMTP with connection reuse (SMTP_HOST, SMTP_PORT, ...)
+    - log: log messages only (development)
+    - memory: keep messages in memory (tests)
+"""
+
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from itertools import groupby
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, exists, func, insert, select
+
+from backend.models.database_models import Customer, SettlementRecord
+from backend.models.reminder_models import ReminderRecord
+
+logger = logging.getLogger(__name__)
+
+# Days after creation a settlement must be paid (see ReminderRecord.get_overdue_days)
+PAYMENT_TERM_DAYS = 30
+
+# Settlement statuses that are still unpaid
+OVERDUE_STATUSES = ('pending', 'approved')
+
+# Minimum days between two reminders for the same settlement
+DEFAULT_REMINDER_INTERVAL_DAYS = 7
+
+# Reminders per settlement before escalation stops
+DEFAULT_MAX_REMINDERS = 3
+
+# Overdue settlement rows fetched per page
+DEFAULT_PAGE_SIZE = 2000
+
+# Transport settings
+DEFAULT_TRANSPORT = os.getenv('REMINDER_TRANSPORT', 'log')
+DEFAULT_RATE_LIMIT = float(os.getenv('REMINDER_RATE_LIMIT', '20'))  # messages per second
+SMTP_HOST = os.getenv('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_USERNAME = os.getenv('SMTP_USERNAME', '')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'true').lower() in ['true', '1', 'yes']
+SMTP_FROM = os.getenv('SMTP_FROM', 'billing@op-cms.com')
+
+# Messages sent before an SMTP connection is recycled (servers cap this)
+SMTP_MESSAGES_PER_CONNECTION = 100
+
+# Templates by reminder level
+REMINDER_TEMPLATES = {
+    'first': {
+        'subject': Template('付款提醒：$company_name 有 $settlement_count 笔结算单已逾期'),
+        'body': Template(
+            '尊敬的 $contact_name：\n\n'
+            '贵司（$company_name）以下结算单已超过付款期限：\n\n'
+            '$settlement_lines\n\n'
+            '逾期合计：$totals\n\n'
+            '请尽快安排付款。如已付款，请忽略本邮件。\n'
+        )
+    },
+    'second': {
+        'subject': Template('第二次付款提醒：$company_name 逾期结算单 $settlement_count 笔'),
+        'body': Template(
+            '尊敬的 $contact_name：\n\n'
+            '我们此前已就以下逾期结算单向贵司（$company_name）发送提醒，目前仍未收到付款：\n\n'
+            '$settlement_lines\n\n'
+            '逾期合计：$totals\n\n'
+            '请于 7 日内完成付款。\n'
+        )
+    },
+    'final': {
+        'subject': Template('最终付款通知：$company_name 逾期结算单 $settlement_count 笔'),
+        'body': Template(
+            '尊敬的 $contact_name：\n\n'
+            '这是关于以下逾期结算单的最终通知（$company_name）：\n\n'
+            '$settlement_lines\n\n'
+            '逾期合计：$totals\n\n'
+            '如仍未付款，我们将暂停相关服务。\n'
+        )
+    }
+}
+SETTLEMENT_LINE_TEMPLATE = Template('  - $record_id  $period  $currency $amount  逾期 $overdue_days 天')
+
+
+class ReminderDispatchError(Exception):
+    """Custom exception for reminder dispatch errors"""
+    pass
+
+
+class ReminderMessage:
+    """A rendered reminder for one customer"""
+
+    def __init__(self, customer_id: int, recipient: str, subject: str, body: str, level: str,
+                 settlements: List[Dict[str, Any]]):
+        self.customer_id = customer_id
+        self.recipient = recipient
+        self.subject = subject
+        self.body = body
+        self.level = level
+        self.settlements = settlements
+
+
+# ==================== Rate Limiting ====================
+
+class RateLimiter:
+    """Token bucket limiting sends per second (thread-safe)"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            rate: Sustained messages per second (0 disables the limit)
+            burst: Messages that may be sent back to back (default: one second's worth)
+        """
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a message may be sent"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self._sleep((1 - self._tokens) / self.rate)
+                self._tokens = 1.0
+                self._updated = self._clock()
+            self._tokens -= 1
+
+
+# ==================== Transports ====================
+
+class ReminderTransport:
+    """Delivers rendered messages; subclasses implement one channel"""
+
+    def open(self):
+        """Open the connection"""
+        pass
+
+    def send(self, message: ReminderMessage):
+        """Send a message; raises on failure"""
+        raise NotImplementedError
+
+    def close(self):
+        """Close the connection"""
+        pass
+
+    def __enter__(self) -> 'ReminderTransport':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SMTPTransport(ReminderTransport):
+    """SMTP with one connection reused across messages"""
+
+    def __init__(self, host: str = None, port: int = None, username: str = None, password: str = None,
+                 use_tls: bool = None, sender: str = None, timeout: float = 30,
+                 messages_per_connection: int = SMTP_MESSAGES_PER_CONNECTION, smtp_class=smtplib.SMTP):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.username = SMTP_USERNAME if username is None else username
+        self.password = SMTP_PASSWORD if password is None else password
+        self.use_tls = SMTP_USE_TLS if use_tls is None else use_tls
+        self.sender = sender or SMTP_FROM
+        self.timeout = timeout
+        self.messages_per_connection = messages_per_connection
+        self._smtp_class = smtp_class
+        self._connection = None
+        self._sent_on_connection = 0
+
+    def _connect(self):
+        connection = self._smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self._connection = connection
+        self._sent_on_connection = 0
+
+    def _disconnect(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except smtplib.SMTPException:
+                pass
+            self._connection = None
+
+    def send(self, message: ReminderMessage):
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = message.recipient
+        email['Subject'] = message.subject
+        email.set_content(message.body)
+
+        if self._connection is None or self._sent_on_connection >= self.messages_per_connection:
+            self._disconnect()
+            self._connect()
+        try:
+            self._connection.send_message(email)
+        except smtplib.SMTPServerDisconnected:
+            # Idle connection dropped by the server: reconnect once
+            self._connect()
+            self._connection.send_message(email)
+        self._sent_on_connection += 1
+
+    def close(self):
+        self._disconnect()
+
+
+class LogTransport(ReminderTransport):
+    """Logs messages instead of sending them"""
+
+    def send(self, message: ReminderMessage):
+        logger.info(f"Reminder to {message.recipient}: {message.subject}")
+
+
+class MemoryTransport(ReminderTransport):
+    """Keeps sent messages in memory (stub for tests)"""
+
+    def __init__(self, fail_recipients: Sequence[str] = ()):
+        self.sent: List[ReminderMessage] = []
+        self.fail_recipients = set(fail_recipients)
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+
+    def send(self, message: ReminderMessage):
+        if message.recipient in self.fail_recipients:
+            raise smtplib.SMTPRecipientsRefused({message.recipient: (550, b'Mailbox unavailable')})
+        self.sent.append(message)
+
+
+REMINDER_TRANSPORTS = {
+    'smtp': SMTPTransport,
+    'log': LogTransport,
+    'memory': MemoryTransport
+}
+
+
+def create_transport(name: str = None, **kwargs) -> ReminderTransport:
+    """
+    Create a reminder transport
+
+    Args:
+        name: smtp, log or memory (defaults to REMINDER_TRANSPORT)
+        **kwargs: Transport options
+
+    Returns:
+        Transport instance
+    """
+    name = name or DEFAULT_TRANSPORT
+    transport_class = REMINDER_TRANSPORTS.get(name)
+    if transport_class is None:
+        raise ReminderDispatchError(
+            f"Invalid reminder transport: {name}. Must be one of {list(REMINDER_TRANSPORTS)}"
+        )
+    return transport_class(**kwargs)
+
+
+# ==================== Query ====================
+
+def overdue_settlements_statement(
+    as_of: datetime,
+    payment_term_days: int = PAYMENT_TERM_DAYS,
+    interval_days: int = DEFAULT_REMINDER_INTERVAL_DAYS,
+    max_reminders: int = DEFAULT_MAX_REMINDERS
+):
+    """
+    Build the overdue settlement query, ordered by customer
+
+    Uses idx_settlement_status_created for the overdue range. Earlier
+    reminders are looked up per settlement (correlated on settlement_id,
+    through idx_reminder_settlement_created), so a page only reads the
+    reminders of its own settlements.
+    """
+    sent = and_(ReminderRecord.settlement_id == SettlementRecord.id, ReminderRecord.send_status != 'failed')
+    reminder_count = func.coalesce(
+        select(func.max(ReminderRecord.reminder_count)).where(sent).correlate(SettlementRecord).scalar_subquery(),
+        0
+    )
+    reminded_recently = exists().where(
+        sent, ReminderRecord.created_at >= as_of - timedelta(days=interval_days)
+    ).correlate(SettlementRecord)
+
+    return (
+        select(
+            SettlementRecord.id,
+            SettlementRecord.record_id,
+            SettlementRecord.customer_id,
+            SettlementRecord.period_start,
+            SettlementRecord.period_end,
+            SettlementRecord.total_amount,
+            SettlementRecord.currency,
+            SettlementRecord.created_at,
+            Customer.company_name,
+            Customer.contact_name,
+            Customer.email,
+            reminder_count.label('reminder_count')
+        )
+        .join(Customer, Customer.id == SettlementRecord.customer_id)
+        .where(
+            SettlementRecord.status.in_(OVERDUE_STATUSES),
+            SettlementRecord.created_at < as_of - timedelta(days=payment_term_days),
+            ~reminded_recently,
+            reminder_count < max_reminders
+        )
+        .order_by(SettlementRecord.customer_id, SettlementRecord.created_at)
+    )
+
+
+# ==================== Rendering ====================
+
+def reminder_level(reminder_count: int) -> str:
+    """Template level for a reminder following ``reminder_count`` earlier ones"""
+    if reminder_count <= 0:
+        return 'first'
+    if reminder_count == 1:
+        return 'second'
+    return 'final'
+
+
+def render_reminders(
+    groups: List[List[Any]],
+    as_of: datetime,
+    payment_term_days: int = PAYMENT_TERM_DAYS
+) -> List[ReminderMessage]:
+    """
+    Render one message per customer group
+
+    Args:
+        groups: Overdue settlement rows, one list per customer
+        as_of: Dispatch time (for overdue days)
+        payment_term_days: Payment term in days
+
+    Returns:
+        Messages (customers without an e-mail address are left out)
+    """
+    messages = []
+    for rows in groups:
+        first = rows[0]
+        if not first.email:
+            continue
+
+        level = reminder_level(max(row.reminder_count for row in rows))
+        totals: Dict[str, Any] = {}
+        lines = []
+        for row in rows:
+            currency = row.currency or 'CNY'
+            totals[currency] = totals.get(currency, 0) + row.total_amount
+            lines.append(SETTLEMENT_LINE_TEMPLATE.substitute(
+                record_id=row.record_id,
+                period=f"{row.period_start:%Y-%m-%d}~{row.period_end:%Y-%m-%d}",
+                currency=currency,
+                amount=f"{row.total_amount:,.2f}",
+                overdue_days=(as_of - row.created_at).days - payment_term_days
+            ))
+
+        values = {
+            'company_name': first.company_name,
+            'contact_name': first.contact_name or first.company_name,
+            'settlement_count': len(rows),
+            'settlement_lines': '\n'.join(lines),
+            'totals': '；'.join(f"{currency} {amount:,.2f}" for currency, amount in totals.items())
+        }
+        template = REMINDER_TEMPLATES[level]
+        messages.append(ReminderMessage(
+            customer_id=first.customer_id,
+            recipient=first.email,
+            subject=template['subject'].substitute(values),
+            body=template['body'].substitute(values),
+            level=level,
+            settlements=[{'id': row.id, 'reminder_count': row.reminder_count} for row in rows]
+        ))
+    return messages
+
+
+# ==================== Dispatcher ====================
+
+class ReminderDispatcher:
+    """Sends overdue reminders in pages of customers"""
+
+    def __init__(
+        self,
+        session,
+        transport: ReminderTransport = None,
+        rate_limiter: RateLimiter = None,
+        payment_term_days: int = PAYMENT_TERM_DAYS,
+        interval_days: int = DEFAULT_REMINDER_INTERVAL_DAYS,
+        max_reminders: int = DEFAULT_MAX_REMINDERS,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        created_by: Optional[int] = None
+    ):
+        self.session = session
+        self.transport = transport or create_transport()
+        self.rate_limiter = rate_limiter or RateLimiter(DEFAULT_RATE_LIMIT)
+        self.payment_term_days = payment_term_days
+        self.interval_days = interval_days
+        self.max_reminders = max_reminders
+        self.page_size = page_size
+        self.created_by = created_by
+
+    def iter_customer_pages(self, as_of: datetime):
+        """
+        Yield pages of overdue settlements grouped per customer
+
+        Pages are keyset paginated on customer_id; a customer is never
+        split across pages.
+        """
+        statement = overdue_settlements_statement(
+            as_of, self.payment_term_days, self.interval_days, self.max_reminders
+        )
+        after = 0
+        while True:
+            rows = self.session.execute(
+                statement.where(SettlementRecord.customer_id > after).limit(self.page_size)
+            ).all()
+            if not rows:
+                return
+
+            last_page = len(rows) < self.page_size
+            if not last_page:
+                # The last customer may continue on the next page: hold it back
+                last_customer = rows[-1].customer_id
+                complete = [row for row in rows if row.customer_id != last_customer]
+                if not complete:
+                    # One customer fills the whole page
+                    complete = self.session.execute(
+                        statement.where(SettlementRecord.customer_id == last_customer)
+                    ).all()
+                rows = complete
+
+            after = rows[-1].customer_id
+            yield [list(group) for _, group in groupby(rows, key=lambda row: row.customer_id)]
+            if last_page:
+                return
+
+    def dispatch(
+        self,
+        as_of: datetime = None,
+        dry_run: bool = False,
+        progress_callback: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> Dict[str, int]:
+        """
+        Send reminders for all overdue settlements
+
+        Args:
+            as_of: Dispatch time (default: now)
+            dry_run: Render only; nothing is sent or recorded
+            progress_callback: Called with the running totals after every page
+
+        Returns:
+            Totals: customers, settlements, sent, failed, skipped
+        """
+        as_of = as_of or datetime.utcnow()
+        totals = {'customers': 0, 'settlements': 0, 'sent': 0, 'failed': 0, 'skipped': 0}
+
+        with self.transport:
+            for groups in self.iter_customer_pages(as_of):
+                messages = render_reminders(groups, as_of, self.payment_term_days)
+                totals['customers'] += len(groups)
+                totals['settlements'] += sum(len(rows) for rows in groups)
+                totals['skipped'] += len(groups) - len(messages)
+
+                if not dry_run:
+                    records = [
+                        record
+                        for message in messages
+                        for record in self._records_for(message, self._send(message), as_of)
+                    ]
+                    if records:
+                        self.session.execute(insert(ReminderRecord), records)
+                    self.session.commit()
+                    totals['sent'] += sum(1 for record in records if record['send_status'] == 'sent')
+                    totals['failed'] += sum(1 for record in records if record['send_status'] == 'failed')
+
+                if progress_callback:
+                    progress_callback(dict(totals))
+
+        logger.info(
+            f"Reminder dispatch: {totals['customers']} customers, {totals['settlements']} settlements, "
+            f"{totals['sent']} sent, {totals['failed']} failed, {totals['skipped']} skipped"
+        )
+        return totals
+
+    def _send(self, message: ReminderMessage) -> bool:
+        self.rate_limiter.acquire()
+        try:
+            self.transport.send(message)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to send reminder to {message.recipient}: {str(e)}")
+            return False
+
+    def _records_for(self, message: ReminderMessage, sent: bool, as_of: datetime) -> List[Dict[str, Any]]:
+        """ReminderRecord rows (one per settlement) for a message"""
+        return [
+            {
+                'reminder_no': f"REM-{uuid.uuid4()}",
+                'settlement_id': settlement['id'],
+                'customer_id': message.customer_id,
+                'reminder_type': 'email',
+                'reminder_method': f"email_template:{message.level}",
+                'recipient': message.recipient,
+                'reminder_content': message.body,
+                'send_status': 'sent' if sent else 'failed',
+                'sent_at': datetime.utcnow() if sent else None,
+                'reminder_count': settlement['reminder_count'] + 1,
+                'created_by': self.created_by,
+                'created_at': as_of
+            }
+            for settlement in message.settlements
+        ]
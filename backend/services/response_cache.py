@@ -0,0 +1,550 @@
+# OP_CMS Response Cache
+# Story 4.1: Management Dashboard - cached analytics responses
+
+"""
+Response cache for read-heavy Sanic handlers
+
+Dashboard and customer analytics handlers aggregate over all settlements
+and customers and are requested on every dashboard tab refresh. The
+``cached_response`` decorator serves their responses from a cache:
+
+    - key: request path + normalized query arguments + the caller's role
+      + the generations of the data the handler depends on (its tags)
+    - L1: in-process LRU; L2: Redis (optional, RESPONSE_CACHE_REDIS_URL),
+      shared by every Sanic worker
+    - stale-while-revalidate: an entry older than its TTL but within the
+      stale window is served immediately while one background refresh
+      recomputes it
+    - request coalescing: concurrent misses of a key wait for a single
+      computation instead of each running the handler
+    - ETag / If-None-Match: unchanged responses are answered with 304
+
+Invalidation: committed ORM writes to settlements (and the payments,
+write-offs, balances and exchange rates derived totals depend on) or to
+customers bump the generation of the ``settlements`` / ``customers`` tag
+(``track_response_cache``). Keys of older generations are never looked
+up again, so writes are visible on the next request. With Redis the
+generations are shared, and other processes pick them up within
+COHERENCE_INTERVAL. Redis calls made while serving run in the default
+executor, so a slow Redis never blocks the event loop.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial, wraps
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+from sanic.response import HTTPResponse
+
+from backend.models.customer_balance_models import CustomerBalance
+from backend.models.database_models import Customer, SettlementRecord
+from backend.models.fx_models import ExchangeRate
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.services.session_tracking import SessionTracker, changed_objects, written_model
+
+# Optional redis import for the shared L2 cache
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds a response is fresh
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '60'))
+
+# Seconds after the TTL a stale response is still served while it is refreshed
+RESPONSE_CACHE_STALE_TTL = int(os.getenv('RESPONSE_CACHE_STALE_TTL', '300'))
+
+# L1 entries per process
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+
+# Redis connection for the L2 cache (unset: L1 only)
+REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL')
+
+# Seconds between reads of the shared tag generations
+COHERENCE_INTERVAL = 1.0
+
+# Models whose committed writes invalidate the responses of each tag
+TAG_MODELS = {
+    'settlements': (SettlementRecord, PaymentRecord, SettlementWriteoff, CustomerBalance, ExchangeRate),
+    'customers': (Customer,),
+}
+
+# Tags of handlers that do not declare any
+DEFAULT_TAGS = tuple(TAG_MODELS)
+
+# Query arguments that never change a response (client cache busters)
+IGNORED_ARGS = ('_', '_t')
+
+# Role of unauthenticated requests
+ANONYMOUS_ROLE = 'anonymous'
+
+# Tags written in the current transaction
+session_tracker = SessionTracker('response_cache', set)
+
+
+class ResponseCacheError(Exception):
+    """Custom exception for response cache errors"""
+    pass
+
+
+class CachedResponse:
+    """Body, status and validator of a handler response"""
+
+    __slots__ = ('body', 'status', 'content_type', 'etag', 'created_at', 'tags')
+
+    def __init__(
+        self,
+        body: bytes,
+        status: int,
+        content_type: Optional[str],
+        tags: Sequence[str] = (),
+        created_at: Optional[float] = None,
+        etag: Optional[str] = None
+    ):
+        self.body = body or b''
+        self.status = status
+        self.content_type = content_type
+        self.tags = tuple(tags)
+        self.created_at = created_at if created_at is not None else time.time()
+        self.etag = etag or f'"{hashlib.blake2b(self.body, digest_size=16).hexdigest()}"'
+
+    @classmethod
+    def from_response(cls, response: HTTPResponse, tags: Sequence[str] = ()) -> 'CachedResponse':
+        return cls(response.body, response.status, response.content_type, tags)
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now if now is not None else time.time()) - self.created_at
+
+    def encode(self) -> str:
+        return json.dumps({
+            'body': base64.b64encode(self.body).decode('ascii'),
+            'status': self.status,
+            'content_type': self.content_type,
+            'tags': list(self.tags),
+            'created_at': self.created_at,
+            'etag': self.etag
+        })
+
+    @classmethod
+    def decode(cls, text: str) -> 'CachedResponse':
+        value = json.loads(text)
+        return cls(
+            base64.b64decode(value['body']), value['status'], value['content_type'],
+            value['tags'], value['created_at'], value['etag']
+        )
+
+
+def _normalized_args(req) -> str:
+    """Query arguments sorted by name and value, without cache busters"""
+    return urlencode(
+        sorted((name, value) for name, values in req.args.items() if name not in IGNORED_ARGS for value in values)
+    )
+
+
+def _request_role(req) -> str:
+    """Role of the caller (from require_auth, else from a bearer token)"""
+    user = getattr(req, 'current_user', None)
+    if user:
+        return user.get('role') or ANONYMOUS_ROLE
+    auth_header = req.headers.get('Authorization')
+    if not auth_header or not auth_header.lower().startswith('bearer '):
+        return ANONYMOUS_ROLE
+    try:
+        from backend.utils.jwt import verify_token
+        payload = verify_token(auth_header.split(None, 1)[1])
+    except Exception:
+        payload = None
+    return (payload or {}).get('role') or ANONYMOUS_ROLE
+
+
+def _etag_matches(req, etag: str) -> bool:
+    header = req.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    return '*' in candidates or any(
+        (candidate[2:] if candidate.startswith('W/') else candidate) == etag for candidate in candidates
+    )
+
+
+class ResponseCache:
+    """Two-level response cache (in-process LRU, optional Redis)"""
+
+    def __init__(
+        self,
+        ttl: int = RESPONSE_CACHE_TTL,
+        stale_ttl: int = RESPONSE_CACHE_STALE_TTL,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        client=None,
+        prefix: str = 'op_cms:response'
+    ):
+        """
+        Args:
+            ttl: Seconds a response is fresh
+            stale_ttl: Seconds after the TTL a stale response is served while refreshed
+            max_entries: L1 entries per process (least recently used evicted)
+            client: Redis client for the L2 cache (default: from RESPONSE_CACHE_REDIS_URL)
+            prefix: Redis key prefix
+        """
+        if client is None and REDIS_URL and HAS_REDIS:
+            client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.client = client
+        self.prefix = prefix
+        self._entries: 'OrderedDict[str, CachedResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        self._generations_read_at = 0.0
+        # Key -> running computation (coalescing and background refreshes)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refresh_tasks = set()
+        self.reset_metrics()
+
+    # ==================== Serving ====================
+
+    async def serve(self, req, handler, args: tuple, kwargs: dict, tags: Sequence[str], ttl: Optional[int] = None,
+                    stale_ttl: Optional[int] = None) -> HTTPResponse:
+        """
+        Response of a handler, from the cache when possible
+
+        Args:
+            req: Sanic request
+            handler: Wrapped handler
+            args: Positional handler arguments after the request
+            kwargs: Keyword handler arguments (route parameters)
+            tags: Data the response depends on (see TAG_MODELS)
+            ttl: Fresh seconds (default: the cache's)
+            stale_ttl: Stale seconds (default: the cache's)
+
+        Returns:
+            HTTPResponse (304 if the client's ETag still matches)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        if self._claim_generations_read():
+            await self._offload(self._read_generations)
+        key = self._key(req, tags, self._local_generations(tags))
+
+        entry = self._lookup_local(key, ttl + stale_ttl)
+        if entry is None and self.client is not None:
+            entry = await self._offload(self._lookup_shared, key, ttl + stale_ttl)
+        if entry is not None and entry.age() < ttl:
+            self._count('hits')
+            return self._respond(req, entry, 'HIT')
+        if entry is not None:
+            self._count('stale_hits')
+            self._refresh(key, req, handler, args, kwargs, tags, ttl + stale_ttl)
+            return self._respond(req, entry, 'STALE')
+
+        if key in self._inflight:
+            self._count('coalesced')
+            entry = await asyncio.shield(self._inflight[key])
+            return self._respond(req, entry, 'HIT' if entry.status == 200 else 'MISS')
+        self._count('misses')
+        # Shielded so a disconnecting client does not cancel the computation others wait for
+        entry = await asyncio.shield(self._compute(key, req, handler, args, kwargs, tags, ttl + stale_ttl))
+        return self._respond(req, entry, 'MISS')
+
+    def key(self, req, tags: Sequence[str]) -> str:
+        """Cache key of a request: path, normalized args, role and tag generations"""
+        return self._key(req, tags, self._tag_generations(tags))
+
+    def _key(self, req, tags: Sequence[str], generations: Dict[str, int]) -> str:
+        raw = '|'.join([
+            req.path,
+            _normalized_args(req),
+            _request_role(req),
+            ','.join(f"{tag}:{generations.get(tag, 0)}" for tag in sorted(tags))
+        ])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _compute(self, key: str, req, handler, args, kwargs, tags, expire: int) -> asyncio.Future:
+        """Run the handler once for a key; concurrent callers share the result"""
+        async def run() -> CachedResponse:
+            try:
+                response = await handler(req, *args, **kwargs)
+                entry = CachedResponse.from_response(response, tags)
+                # Only successful responses are cached; errors are recomputed
+                if entry.status == 200:
+                    self._store_local(key, entry)
+                    if self.client is not None:
+                        await self._offload(self._store_shared, key, entry, expire)
+                return entry
+            finally:
+                self._inflight.pop(key, None)
+
+        future = asyncio.ensure_future(run())
+        self._inflight[key] = future
+        return future
+
+    def _refresh(self, key: str, req, handler, args, kwargs, tags, expire: int):
+        """Recompute a stale entry in the background (once per key)"""
+        if key in self._inflight:
+            return
+        self._count('refreshes')
+        task = self._compute(key, req, handler, args, kwargs, tags, expire)
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Future):
+        self._refresh_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Failed to refresh cached response: {str(task.exception())}")
+
+    def _respond(self, req, entry: CachedResponse, state: str) -> HTTPResponse:
+        headers = {'X-Cache': state}
+        if entry.status != 200:
+            return HTTPResponse(entry.body, status=entry.status, headers=headers, content_type=entry.content_type)
+        headers['ETag'] = entry.etag
+        headers['Cache-Control'] = 'private, no-cache'
+        if _etag_matches(req, entry.etag):
+            self._count('not_modified')
+            return HTTPResponse(status=304, headers=headers)
+        return HTTPResponse(entry.body, status=entry.status, headers=headers, content_type=entry.content_type)
+
+    # ==================== Invalidation ====================
+
+    def invalidate(self, tags: Iterable[str]):
+        """
+        Invalidate all responses depending on the tags
+
+        Args:
+            tags: Tags whose data changed (see TAG_MODELS)
+        """
+        tags = sorted(set(tags))
+        if not tags:
+            return
+        shared = None
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline()
+                for tag in tags:
+                    pipe.incr(self._redis_key(f'generation:{tag}'))
+                shared = pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to bump shared response cache generations: {str(e)}")
+                self._count('redis_errors')
+        with self._lock:
+            for index, tag in enumerate(tags):
+                self._generations[tag] = int(shared[index]) if shared else self._generations.get(tag, 0) + 1
+            for key in [key for key, entry in self._entries.items() if set(entry.tags) & set(tags)]:
+                del self._entries[key]
+            self._metrics['invalidations'] += 1
+        logger.debug(f"Invalidated cached responses: {', '.join(tags)}")
+
+    def clear(self):
+        """Drop all L1 entries"""
+        with self._lock:
+            self._entries.clear()
+
+    # ==================== Metrics ====================
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit/miss counters and cache size"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['size'] = len(self._entries)
+            metrics['generations'] = dict(self._generations)
+        lookups = metrics['hits'] + metrics['stale_hits'] + metrics['coalesced'] + metrics['misses']
+        metrics['hit_ratio'] = round((lookups - metrics['misses']) / lookups, 4) if lookups else None
+        metrics['inflight'] = len(self._inflight)
+        metrics['ttl'] = self.ttl
+        metrics['stale_ttl'] = self.stale_ttl
+        metrics['max_entries'] = self.max_entries
+        metrics['shared'] = self.client is not None
+        return metrics
+
+    def reset_metrics(self):
+        """Reset the hit/miss counters"""
+        with self._lock:
+            self._metrics = {
+                'hits': 0, 'stale_hits': 0, 'redis_hits': 0, 'coalesced': 0, 'misses': 0,
+                'refreshes': 0, 'not_modified': 0, 'evictions': 0, 'invalidations': 0, 'redis_errors': 0
+            }
+
+    # ==================== Internals ====================
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def _offload(self, func, *args):
+        """Run a blocking Redis call in the default executor"""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+    def _lookup_local(self, key: str, max_age: int) -> Optional[CachedResponse]:
+        """L1 entry of a key, unless older than max_age"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.age() < max_age:
+                    self._entries.move_to_end(key)
+                    return entry
+                del self._entries[key]
+        return None
+
+    def _lookup_shared(self, key: str, max_age: int) -> Optional[CachedResponse]:
+        """L2 entry of a key, unless older than max_age (copied into L1; blocking)"""
+        try:
+            text = self.client.get(self._redis_key(f'entry:{key}'))
+        except Exception as e:
+            logger.warning(f"Failed to read shared response cache: {str(e)}")
+            self._count('redis_errors')
+            return None
+        if text is None:
+            return None
+        entry = CachedResponse.decode(text)
+        if entry.age() >= max_age:
+            return None
+        self._store_local(key, entry)
+        self._count('redis_hits')
+        return entry
+
+    def _store_local(self, key: str, entry: CachedResponse):
+        """Cache an entry in L1"""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics['evictions'] += 1
+
+    def _store_shared(self, key: str, entry: CachedResponse, expire: int):
+        """Cache an entry in L2 (blocking)"""
+        try:
+            self.client.set(self._redis_key(f'entry:{key}'), entry.encode(), ex=max(1, int(expire)))
+        except Exception as e:
+            logger.warning(f"Failed to write shared response cache: {str(e)}")
+            self._count('redis_errors')
+
+    def _claim_generations_read(self) -> bool:
+        """Claim the re-read of the shared tag generations if one is due"""
+        now = time.monotonic()
+        if self.client is None or now - self._generations_read_at < COHERENCE_INTERVAL:
+            return False
+        self._generations_read_at = now
+        return True
+
+    def _read_generations(self):
+        """Merge the shared tag generations into the local ones (blocking)"""
+        names = sorted(TAG_MODELS)
+        try:
+            values = self.client.mget([self._redis_key(f'generation:{tag}') for tag in names])
+        except Exception as e:
+            logger.warning(f"Failed to read shared response cache generations: {str(e)}")
+            self._count('redis_errors')
+            return
+        with self._lock:
+            for tag, value in zip(names, values):
+                if value is not None:
+                    self._generations[tag] = max(self._generations.get(tag, 0), int(value))
+
+    def _tag_generations(self, tags: Sequence[str]) -> Dict[str, int]:
+        """Current generations of the tags (shared ones re-read every COHERENCE_INTERVAL)"""
+        if self._claim_generations_read():
+            self._read_generations()
+        return self._local_generations(tags)
+
+    def _local_generations(self, tags: Sequence[str]) -> Dict[str, int]:
+        with self._lock:
+            return {tag: self._generations.get(tag, 0) for tag in tags}
+
+
+def cached_response(
+    tags: Sequence[str] = DEFAULT_TAGS,
+    ttl: Optional[int] = None,
+    stale_ttl: Optional[int] = None,
+    cache: Optional[ResponseCache] = None
+):
+    """
+    Decorator serving a GET handler's responses from the response cache
+
+    Usage:
+        @dashboard_bp.route('/metrics', methods=['GET'])
+        @cached_response(tags=('settlements', 'customers'))
+        async def get_dashboard_metrics(req):
+            ...
+
+    Args:
+        tags: Data the response depends on (see TAG_MODELS)
+        ttl: Fresh seconds (default: RESPONSE_CACHE_TTL)
+        stale_ttl: Stale seconds (default: RESPONSE_CACHE_STALE_TTL)
+        cache: Cache to use (default: the global response_cache)
+    """
+    unknown = set(tags) - set(TAG_MODELS)
+    if unknown:
+        raise ResponseCacheError(f"Unknown response cache tags: {', '.join(sorted(unknown))}")
+
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await f(request, *args, **kwargs)
+            return await (cache or response_cache).serve(request, f, args, kwargs, tags, ttl, stale_ttl)
+
+        return decorated_function
+    return decorator
+
+
+# ==================== Session Hooks ====================
+
+def _tags_of(model) -> Tuple[str, ...]:
+    return tuple(tag for tag, models in TAG_MODELS.items() if model in models)
+
+
+@session_tracker.listens_for('after_flush')
+def _after_flush(session, flush_context):
+    for obj in changed_objects(session):
+        tags = _tags_of(type(obj))
+        if tags:
+            session_tracker.pending(session).update(tags)
+
+
+@session_tracker.listens_for('do_orm_execute')
+def _do_orm_execute(state):
+    tags = _tags_of(written_model(state))
+    if tags:
+        session_tracker.pending(state.session).update(tags)
+
+
+@session_tracker.listens_for('after_commit')
+def _after_commit(session):
+    tags = session_tracker.pop_pending(session)
+    if tags:
+        response_cache.invalidate(tags)
+
+
+def track_response_cache(target) -> None:
+    """
+    Invalidate cached responses on commit for sessions of a sessionmaker (or Session class)
+
+    Settlement and customer writes made through these sessions bump the
+    generation of the affected tags once committed.
+    """
+    session_tracker.track(target)
+
+
+def untrack_response_cache(target) -> None:
+    """Stop invalidating cached responses for a sessionmaker (or Session class)"""
+    session_tracker.untrack(target)
+
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,139 @@
+# OP_CMS Session Tracking
+# Shared session hooks of derived data (balances, counters, caches)
+
+"""
+Session-change tracking for data derived from committed writes
+
+Customer balances, customer stat counters and the price config, FX rate
+and response caches all follow committed ORM writes the same way:
+listeners on a sessionmaker collect what the current transaction changed
+in ``session.info`` (on flush and on ORM bulk statements), act on it when
+the transaction commits and forget it when it rolls back.
+
+Each of those modules owns a ``SessionTracker`` and registers its
+callbacks on it; the tracker keeps the per-transaction state, the
+listener list and the sessionmakers the listeners are registered on.
+``track_sessions`` registers every tracker in TRACKED_MODULES on a
+sessionmaker (DatabaseSessionFactory).
+"""
+
+import weakref
+from importlib import import_module
+from itertools import chain
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+# Modules whose trackers follow the application's sessions, in listener
+# order (the response cache comes last and sees the balance writes)
+TRACKED_MODULES = (
+    'backend.services.customer_ledger',
+    'backend.services.price_config_cache',
+    'backend.services.customer_stats',
+    'backend.services.fx_rates',
+    'backend.services.response_cache',
+)
+
+
+def written_model(state) -> Optional[type]:
+    """Mapped class written by an ORM INSERT/UPDATE/DELETE statement (do_orm_execute), else None"""
+    if not (state.is_insert or state.is_update or state.is_delete) or state.bind_mapper is None:
+        return None
+    return state.bind_mapper.class_
+
+
+def changed_objects(session) -> Iterable[Any]:
+    """New, dirty and deleted objects of a flush (still pre-flush in after_flush)"""
+    return chain(session.new, session.dirty, session.deleted)
+
+
+class SessionTracker:
+    """Session listeners and per-transaction state of one derived-data consumer"""
+
+    def __init__(
+        self,
+        name: str,
+        new_pending: Callable[[], Any],
+        clear_on_rollback: bool = True
+    ):
+        """
+        Args:
+            name: Consumer name (the session.info key is '<name>_pending')
+            new_pending: Creates the state collected per transaction
+            clear_on_rollback: Forget the state when the transaction rolls back
+                (consumers tracking savepoints register their own listener)
+        """
+        self.name = name
+        self.info_key = f'{name}_pending'
+        self._new_pending = new_pending
+        self._listeners: List[Tuple[str, Callable]] = []
+        # Targets carrying the listeners (event.contains is keyed by id() and can
+        # report a collected sessionmaker's listeners for a new one at the same address)
+        self._tracked = weakref.WeakSet()
+        if clear_on_rollback:
+            self.listens_for('after_rollback')(self.pop_pending)
+
+    def listens_for(self, identifier: str):
+        """
+        Decorator registering a session event listener
+
+        Usage:
+            @session_tracker.listens_for('after_commit')
+            def _after_commit(session):
+                ...
+        """
+        def decorator(listener):
+            self._listeners.append((identifier, listener))
+            for target in list(self._tracked):
+                event.listen(target, identifier, listener)
+            return listener
+        return decorator
+
+    # ==================== Pending changes ====================
+
+    def pending(self, session) -> Any:
+        """State collected in the session's transaction (created on first use)"""
+        if self.info_key not in session.info:
+            session.info[self.info_key] = self._new_pending()
+        return session.info[self.info_key]
+
+    def peek_pending(self, session, default: Any = None) -> Any:
+        """State collected in the session's transaction, without creating it"""
+        return session.info.get(self.info_key, default)
+
+    def pop_pending(self, session) -> Any:
+        """Remove and return the state collected in the session's transaction"""
+        return session.info.pop(self.info_key, None)
+
+    # ==================== Registration ====================
+
+    def track(self, target) -> None:
+        """Register the listeners on a sessionmaker (or Session class), once"""
+        if target in self._tracked:
+            return
+        for identifier, listener in self._listeners:
+            event.listen(target, identifier, listener)
+        self._tracked.add(target)
+
+    def untrack(self, target) -> None:
+        """Remove the listeners from a sessionmaker (or Session class)"""
+        if target not in self._tracked:
+            return
+        for identifier, listener in self._listeners:
+            event.remove(target, identifier, listener)
+        self._tracked.discard(target)
+
+    def is_tracking(self, target) -> bool:
+        return target in self._tracked
+
+
+def track_sessions(target) -> None:
+    """Register the trackers of all TRACKED_MODULES on a sessionmaker (or Session class)"""
+    for module_name in TRACKED_MODULES:
+        import_module(module_name).session_tracker.track(target)
+
+
+def untrack_sessions(target) -> None:
+    """Remove the trackers of all TRACKED_MODULES from a sessionmaker (or Session class)"""
+    for module_name in TRACKED_MODULES:
+        import_module(module_name).session_tracker.untrack(target)
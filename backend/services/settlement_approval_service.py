@@ -0,0 +1,277 @@
+# OP_CMS Settlement Approval Service
+# Story 3.2: Settlement Approval Workflow - bulk approval and rejection
+
+"""
+Bulk settlement approval and rejection
+
+Settlements are selected by id or by a filter (settlement period of a
+generation run, status, customers) and transitioned in chunks of
+DEFAULT_CHUNK_SIZE. Every chunk is one transaction:
+
+    1. SELECT id, status ... FOR UPDATE          (current statuses)
+    2. UPDATE ... WHERE id IN (...) AND status IN (allowed)
+    3. bulk INSERT of one access_logs audit entry per updated record
+    4. COMMIT
+
+The status guard in the UPDATE is the optimistic-concurrency check: a
+record whose status changed since it was selected is reported as a
+conflict instead of being overwritten. Customer balances follow through
+the ledger's bulk UPDATE hook.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import insert, select, update
+
+from backend.models.auth import AccessLog
+from backend.models.database_models import SettlementRecord
+
+logger = logging.getLogger(__name__)
+
+# Records per transaction
+DEFAULT_CHUNK_SIZE = 500
+
+# Action -> (statuses a record may be transitioned from, target status)
+TRANSITIONS = {
+    'approve': (('pending', 'rejected'), 'approved'),
+    'reject': (('pending', 'approved'), 'rejected'),
+}
+
+# Per-record outcomes
+UPDATED = 'updated'
+CONFLICT = 'conflict'
+NOT_FOUND = 'not_found'
+
+# access_logs.accessed_fields is a String(500)
+MAX_AUDIT_DETAIL_LENGTH = 500
+
+
+class SettlementApprovalError(Exception):
+    """Custom exception for settlement approval errors"""
+    pass
+
+
+class SettlementApprovalService:
+    """Service for approving and rejecting settlements in bulk"""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            chunk_size: Records per transaction
+        """
+        if chunk_size < 1:
+            raise SettlementApprovalError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+
+    def bulk_transition(
+        self,
+        session,
+        action: str,
+        actor_id: int,
+        settlement_ids: Optional[Sequence[int]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        from_statuses: Optional[Sequence[str]] = None,
+        remarks: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Approve or reject settlements selected by id or filter
+
+        Args:
+            session: Database session (committed once per chunk)
+            action: 'approve' or 'reject'
+            actor_id: User ID recorded in the audit entries
+            settlement_ids: Settlements to transition
+            filters: Alternative to settlement_ids, see select_ids
+            from_statuses: Narrow the statuses a record may be transitioned from
+            remarks: Approval remarks / rejection reason for the audit entries
+            ip_address: Client IP for the audit entries
+            progress_callback: Called with (processed, total) after every chunk
+
+        Returns:
+            Dictionary with total, updated, conflicts, not_found and
+            outcomes (one {'settlement_id', 'outcome', 'status'} per record,
+            where status is the record's status after the call)
+        """
+        if action not in TRANSITIONS:
+            raise SettlementApprovalError(f"Unknown action: {action}")
+        if not actor_id:
+            raise SettlementApprovalError("actor_id is required")
+        if (settlement_ids is None) == (filters is None):
+            raise SettlementApprovalError("Exactly one of settlement_ids and filters is required")
+
+        allowed, target = TRANSITIONS[action]
+        if from_statuses is not None:
+            unknown = set(from_statuses) - set(allowed)
+            if unknown:
+                raise SettlementApprovalError(
+                    f"Cannot {action} settlements in status: {', '.join(sorted(unknown))}"
+                )
+            allowed = tuple(status for status in allowed if status in from_statuses)
+
+        if settlement_ids is not None:
+            ids = list(dict.fromkeys(int(settlement_id) for settlement_id in settlement_ids))
+        else:
+            ids = self.select_ids(session, filters)
+
+        outcomes: List[Dict[str, Any]] = []
+        counts = {UPDATED: 0, CONFLICT: 0, NOT_FOUND: 0}
+        for start in range(0, len(ids), self.chunk_size):
+            chunk = ids[start:start + self.chunk_size]
+            try:
+                chunk_outcomes = self._transition_chunk(
+                    session, chunk, action, allowed, target, actor_id, remarks, ip_address
+                )
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            for outcome in chunk_outcomes:
+                counts[outcome['outcome']] += 1
+            outcomes.extend(chunk_outcomes)
+            if progress_callback:
+                progress_callback(len(outcomes), len(ids))
+
+        logger.info(
+            f"Bulk {action} by user {actor_id}: {counts[UPDATED]} updated, "
+            f"{counts[CONFLICT]} conflicts, {counts[NOT_FOUND]} not found"
+        )
+        return {
+            'action': action,
+            'total': len(ids),
+            'updated': counts[UPDATED],
+            'conflicts': counts[CONFLICT],
+            'not_found': counts[NOT_FOUND],
+            'outcomes': outcomes,
+        }
+
+    def select_ids(self, session, filters: Dict[str, Any]) -> List[int]:
+        """
+        Settlement IDs matching a filter, in id order
+
+        Args:
+            session: Database session
+            filters: Any of
+                - period_start / period_end: settlement period of a generation run
+                  (datetime or ISO date string)
+                - status: status or list of statuses
+                - customer_ids: list of customer IDs
+
+        Returns:
+            Matching settlement IDs
+        """
+        if not filters:
+            raise SettlementApprovalError("At least one filter is required")
+        unknown = set(filters) - {'period_start', 'period_end', 'status', 'customer_ids'}
+        if unknown:
+            raise SettlementApprovalError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+        query = select(SettlementRecord.id).order_by(SettlementRecord.id)
+        if filters.get('period_start') is not None:
+            query = query.where(SettlementRecord.period_start == _to_datetime(filters['period_start']))
+        if filters.get('period_end') is not None:
+            query = query.where(SettlementRecord.period_end == _to_datetime(filters['period_end']))
+        if filters.get('status') is not None:
+            statuses = filters['status']
+            query = query.where(SettlementRecord.status.in_(
+                [statuses] if isinstance(statuses, str) else list(statuses)
+            ))
+        if filters.get('customer_ids') is not None:
+            query = query.where(SettlementRecord.customer_id.in_(list(filters['customer_ids'])))
+        return list(session.execute(query).scalars())
+
+    def _transition_chunk(
+        self,
+        session,
+        chunk: List[int],
+        action: str,
+        allowed: Sequence[str],
+        target: str,
+        actor_id: int,
+        remarks: Optional[str],
+        ip_address: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Transition one chunk of settlements and write its audit entries"""
+        current = dict(session.execute(
+            select(SettlementRecord.id, SettlementRecord.status)
+            .where(SettlementRecord.id.in_(chunk))
+            .with_for_update()
+        ).all())
+        eligible = [settlement_id for settlement_id in chunk if current.get(settlement_id) in allowed]
+
+        now = datetime.utcnow()
+        updated = set()
+        if eligible:
+            values = {'status': target, 'updated_at': now}
+            if target == 'approved':
+                values['approved_at'] = now
+            result = session.execute(
+                update(SettlementRecord)
+                .where(SettlementRecord.id.in_(eligible), SettlementRecord.status.in_(allowed))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == len(eligible):
+                updated = set(eligible)
+            else:
+                # Rows were not locked (e.g. SQLite) and changed in between
+                after = session.execute(
+                    select(SettlementRecord.id, SettlementRecord.status, SettlementRecord.updated_at)
+                    .where(SettlementRecord.id.in_(eligible))
+                ).all()
+                for settlement_id, status, updated_at in after:
+                    if status == target and updated_at == now:
+                        updated.add(settlement_id)
+                    else:
+                        current[settlement_id] = status
+
+        if updated:
+            session.execute(insert(AccessLog), [
+                {
+                    'user_id': actor_id,
+                    'action': action,
+                    'resource_type': 'settlement',
+                    'resource_id': settlement_id,
+                    'accessed_fields': _audit_detail(current[settlement_id], target, remarks),
+                    'ip_address': ip_address,
+                    'status_code': 200,
+                    'created_at': now,
+                }
+                for settlement_id in chunk if settlement_id in updated
+            ])
+
+        outcomes = []
+        for settlement_id in chunk:
+            if settlement_id not in current:
+                outcomes.append({'settlement_id': settlement_id, 'outcome': NOT_FOUND, 'status': None})
+            elif settlement_id in updated:
+                outcomes.append({'settlement_id': settlement_id, 'outcome': UPDATED, 'status': target})
+            else:
+                outcomes.append({
+                    'settlement_id': settlement_id, 'outcome': CONFLICT, 'status': current[settlement_id]
+                })
+        return outcomes
+
+
+def _to_datetime(value: Any) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _audit_detail(from_status: str, to_status: str, remarks: Optional[str]) -> str:
+    detail = {'from': from_status, 'to': to_status}
+    if remarks:
+        detail['remarks'] = remarks
+    text = json.dumps(detail, ensure_ascii=False)
+    if len(text) > MAX_AUDIT_DETAIL_LENGTH:
+        overflow = len(text) - MAX_AUDIT_DETAIL_LENGTH
+        detail['remarks'] = remarks[:max(len(remarks) - overflow - 3, 0)] + '...'
+        text = json.dumps(detail, ensure_ascii=False)
+    return text
+
+
+# Global settlement approval service instance
+settlement_approval_service = SettlementApprovalService()
@@ -0,0 +1,458 @@
+# OP_CMS Settlement Rule Engine
+# Story 3.3: Settlement Validation and Sending - pluggable validation rules
+
+"""
+Settlement validation rule engine
+
+Rules are plain functions registered with metadata:
+
+    severity   fatal, error or warning; a failed fatal rule stops the
+               evaluation of the record (later stages are skipped)
+    cost       cheap (in-memory arithmetic, run inline) or expensive (run
+               concurrently with the other expensive rules of its stage)
+    requires   prefetched data the rule reads from the context, so callers
+               only load what the enabled rules need
+    depends_on rules that must have passed before this rule runs
+    parameters tunable values (SystemParameter key -> default)
+
+A rule is called as ``check(settlement, context, params)`` and returns
+``(messages, data)``: the messages are reported as errors or warnings
+according to the severity, ``data`` goes to the validation details. Rules
+never use the database session, which keeps them safe to run in threads.
+
+Rules run in stages: fatal rules first, then the remaining rules in
+dependency order. Results are reported in registration order, whatever
+order the rules ran in. An exception in a rule is reported as a validation
+error of that rule and counted in its metrics.
+
+Every rule call is timed into a per-rule latency histogram (``metrics``).
+Parameters are read from ``system_parameters`` and cached for
+PARAMETER_CACHE_TTL seconds so ops can tune them without a deploy.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rule severities, most severe first
+SEVERITIES = ['fatal', 'error', 'warning']
+
+# Rule cost classes
+COST_CLASSES = ['cheap', 'expensive']
+
+# Latency histogram bucket upper bounds (milliseconds)
+LATENCY_BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000]
+
+# Seconds rule parameters are cached before they are re-read
+PARAMETER_CACHE_TTL = 60
+
+# Threads for expensive rules
+DEFAULT_RULE_WORKERS = 4
+
+RuleCheck = Callable[[Any, Any, Dict[str, Any]], Tuple[List[str], Optional[Dict[str, Any]]]]
+
+
+class RuleEngineError(Exception):
+    """Custom exception for rule engine configuration errors"""
+    pass
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets (thread-safe)"""
+
+    def __init__(self, buckets_ms: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = list(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)  # last bucket: +Inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """Record one latency"""
+        milliseconds = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets_ms, milliseconds)] += 1
+            self.count += 1
+            self.total_ms += milliseconds
+            self.max_ms = max(self.max_ms, milliseconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty)"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets_ms + [self.max_ms], self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(bound, self.max_ms)
+            return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Histogram counts and summary in milliseconds"""
+        p50, p95, p99 = self.quantile(0.5), self.quantile(0.95), self.quantile(0.99)
+        with self._lock:
+            return {
+                'count': self.count,
+                'sum_ms': round(self.total_ms, 4),
+                'max_ms': round(self.max_ms, 4),
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+                'buckets': {
+                    **{f'le_{bound}': count for bound, count in zip(self.buckets_ms, self.counts)},
+                    'le_inf': self.counts[-1]
+                }
+            }
+
+
+class ValidationRule:
+    """A registered validation rule and its metadata"""
+
+    def __init__(
+        self,
+        name: str,
+        check: RuleCheck,
+        severity: str = 'error',
+        cost: str = 'cheap',
+        requires: Sequence[str] = (),
+        depends_on: Sequence[str] = (),
+        parameters: Optional[Dict[str, Any]] = None,
+        description: str = ''
+    ):
+        """
+        Initialize rule
+
+        Args:
+            name: Rule name (unique within an engine)
+            check: Called as check(settlement, context, params) -> (messages, data)
+            severity: fatal, error or warning
+            cost: cheap or expensive
+            requires: Prefetched context data the rule reads
+            depends_on: Rules that must pass before this rule runs
+            parameters: SystemParameter key -> default value
+            description: Human readable description
+        """
+        if severity not in SEVERITIES:
+            raise RuleEngineError(f"Invalid rule severity: {severity}")
+        if cost not in COST_CLASSES:
+            raise RuleEngineError(f"Invalid rule cost class: {cost}")
+
+        self.name = name
+        self.check = check
+        self.severity = severity
+        self.cost = cost
+        self.requires = tuple(requires)
+        self.depends_on = tuple(depends_on)
+        self.parameters = dict(parameters or {})
+        self.description = description or (check.__doc__ or '').strip()
+        self.enabled = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Rule metadata"""
+        return {
+            'name': self.name,
+            'severity': self.severity,
+            'cost': self.cost,
+            'requires': list(self.requires),
+            'depends_on': list(self.depends_on),
+            'parameters': {key: str(value) for key, value in self.parameters.items()},
+            'description': self.description,
+            'enabled': self.enabled
+        }
+
+
+class RuleOutcome:
+    """Result of one rule call"""
+
+    def __init__(self, messages: List[str], data: Optional[Dict[str, Any]], error: Optional[str] = None):
+        self.messages = messages
+        self.data = data
+        self.error = error
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.messages or self.error)
+
+
+class RuleEngine:
+    """Registry and evaluator of validation rules"""
+
+    def __init__(self, max_workers: int = DEFAULT_RULE_WORKERS, parameter_ttl: float = PARAMETER_CACHE_TTL):
+        """
+        Args:
+            max_workers: Threads for expensive rules (1: run everything inline)
+            parameter_ttl: Seconds rule parameters are cached
+        """
+        self.max_workers = max_workers
+        self.parameter_ttl = parameter_ttl
+        self._rules: Dict[str, ValidationRule] = {}
+        self._stages: Optional[List[List[ValidationRule]]] = None
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._parameters: Optional[Dict[str, Any]] = None
+        self._parameters_loaded_at = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    # ==================== Registration ====================
+
+    def register(self, rule: ValidationRule) -> ValidationRule:
+        """Register a rule (replacing a rule of the same name)"""
+        with self._lock:
+            self._rules[rule.name] = rule
+            self._histograms.setdefault(rule.name, LatencyHistogram())
+            self._counters.setdefault(rule.name, {'calls': 0, 'failures': 0, 'exceptions': 0})
+            self._stages = None
+        return rule
+
+    def rule(self, name: str, **metadata) -> Callable[[RuleCheck], RuleCheck]:
+        """Decorator registering a check function as a rule"""
+        def decorator(check: RuleCheck) -> RuleCheck:
+            self.register(ValidationRule(name, check, **metadata))
+            return check
+        return decorator
+
+    def set_enabled(self, name: str, enabled: bool):
+        """Enable or disable a rule"""
+        self.get_rule(name).enabled = enabled
+        self._stages = None
+
+    def get_rule(self, name: str) -> ValidationRule:
+        """Look up a rule by name"""
+        if name not in self._rules:
+            raise RuleEngineError(f"Unknown validation rule: {name}")
+        return self._rules[name]
+
+    @property
+    def rules(self) -> List[ValidationRule]:
+        """Enabled rules in registration order"""
+        return [rule for rule in self._rules.values() if rule.enabled]
+
+    def required_data(self) -> List[str]:
+        """Context data required by the enabled rules"""
+        required: List[str] = []
+        for rule in self.rules:
+            required.extend(key for key in rule.requires if key not in required)
+        return required
+
+    def stages(self) -> List[List[ValidationRule]]:
+        """
+        Group the enabled rules into stages of independent rules
+
+        Fatal rules without dependencies form the first stage; the other
+        rules follow in dependency order.
+
+        Raises:
+            RuleEngineError: Unknown or circular dependencies
+        """
+        if self._stages is not None:
+            return self._stages
+
+        rules = self.rules
+        names = {rule.name for rule in rules}
+        for rule in rules:
+            missing = [name for name in rule.depends_on if name not in names]
+            if missing:
+                raise RuleEngineError(f"Rule {rule.name} depends on unknown or disabled rules: {', '.join(missing)}")
+
+        stages: List[List[ValidationRule]] = []
+        placed: set = set()
+        first = [rule for rule in rules if rule.severity == 'fatal' and not rule.depends_on]
+        if first:
+            stages.append(first)
+            placed.update(rule.name for rule in first)
+        while len(placed) < len(rules):
+            stage = [
+                rule for rule in rules
+                if rule.name not in placed and all(name in placed for name in rule.depends_on)
+            ]
+            if not stage:
+                cycle = [rule.name for rule in rules if rule.name not in placed]
+                raise RuleEngineError(f"Circular rule dependencies: {', '.join(cycle)}")
+            stages.append(stage)
+            placed.update(rule.name for rule in stage)
+
+        self._stages = stages
+        return stages
+
+    # ==================== Parameters ====================
+
+    def parameter_defaults(self) -> Dict[str, Any]:
+        """Default values of every registered parameter"""
+        defaults: Dict[str, Any] = {}
+        for rule in self._rules.values():
+            defaults.update(rule.parameters)
+        return defaults
+
+    def parameters(self, session=None) -> Dict[str, Any]:
+        """
+        Rule parameters: SystemParameter values over the defaults
+
+        Values are cached for parameter_ttl seconds; without a session the
+        cached (or default) values are returned.
+        """
+        with self._lock:
+            fresh = self._parameters is not None and time.monotonic() - self._parameters_loaded_at < self.parameter_ttl
+            if fresh or session is None:
+                return dict(self._parameters if self._parameters is not None else self.parameter_defaults())
+
+        parameters = load_rule_parameters(session, self.parameter_defaults())
+        with self._lock:
+            self._parameters = parameters
+            self._parameters_loaded_at = time.monotonic()
+        return dict(parameters)
+
+    def invalidate_parameters(self):
+        """Re-read parameters on the next evaluation"""
+        with self._lock:
+            self._parameters = None
+
+    # ==================== Evaluation ====================
+
+    def evaluate(self, settlement, context, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the enabled rules on one settlement
+
+        Args:
+            settlement: Settlement record
+            context: Prefetched data (see ValidationRule.requires)
+            parameters: Rule parameters (see parameters())
+
+        Returns:
+            Dictionary with is_valid, errors, warnings, validation_details
+            (in registration order) and skipped_rules (after a fatal failure)
+        """
+        outcomes: Dict[str, RuleOutcome] = {}
+        for stage in self.stages():
+            runnable = [
+                rule for rule in stage
+                if all(name in outcomes and not outcomes[name].failed for name in rule.depends_on)
+            ]
+            parallel = [rule for rule in runnable if rule.cost == 'expensive'] if self.max_workers > 1 else []
+            if len(parallel) > 1:
+                executor = self._get_executor()
+                futures = [
+                    (rule, executor.submit(self._run, rule, settlement, context, parameters))
+                    for rule in parallel
+                ]
+            else:
+                parallel, futures = [], []
+            for rule in runnable:
+                if rule not in parallel:
+                    outcomes[rule.name] = self._run(rule, settlement, context, parameters)
+            for rule, future in futures:
+                outcomes[rule.name] = future.result()
+
+            # Short-circuit: a failed fatal rule ends the evaluation
+            if any(rule.severity == 'fatal' and outcomes[rule.name].failed for rule in runnable):
+                break
+
+        errors: List[str] = []
+        warnings: List[str] = []
+        details: List[Dict[str, Any]] = []
+        skipped: List[str] = []
+        for rule in self.rules:
+            outcome = outcomes.get(rule.name)
+            if outcome is None:
+                skipped.append(rule.name)
+                continue
+            if outcome.error:
+                errors.append(outcome.error)
+            elif rule.severity == 'warning':
+                warnings.extend(outcome.messages)
+            else:
+                errors.extend(outcome.messages)
+            details.append({'check': rule.name} if outcome.data is None else {'check': rule.name, 'data': outcome.data})
+
+        return {
+            'is_valid': len(errors) == 0,
+            'errors': errors,
+            'warnings': warnings,
+            'validation_details': details,
+            'skipped_rules': skipped
+        }
+
+    def _run(self, rule: ValidationRule, settlement, context, parameters: Dict[str, Any]) -> RuleOutcome:
+        started = time.perf_counter()
+        try:
+            messages, data = rule.check(settlement, context, parameters)
+            outcome = RuleOutcome(list(messages or []), data)
+        except Exception as e:
+            logger.exception(f"Validation rule {rule.name} failed on settlement {getattr(settlement, 'id', None)}")
+            outcome = RuleOutcome([], None, error=f"Validation error in {rule.name}: {str(e)}")
+        self._histograms[rule.name].observe(time.perf_counter() - started)
+
+        counters = self._counters[rule.name]
+        with self._lock:
+            counters['calls'] += 1
+            if outcome.error:
+                counters['exceptions'] += 1
+            elif outcome.messages:
+                counters['failures'] += 1
+        return outcome
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='rule-engine')
+            return self._executor
+
+    # ==================== Metrics ====================
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-rule call counters and latency histograms"""
+        return {
+            name: dict(rule.to_dict(), **self._counters[name], latency=self._histograms[name].snapshot())
+            for name, rule in self._rules.items()
+        }
+
+    def reset_metrics(self):
+        """Clear counters and histograms"""
+        with self._lock:
+            for name in self._rules:
+                self._histograms[name] = LatencyHistogram()
+                self._counters[name] = {'calls': 0, 'failures': 0, 'exceptions': 0}
+
+
+def load_rule_parameters(session, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Read rule parameters from system_parameters
+
+    Values are converted to the type of their default; unparsable values
+    keep the default.
+
+    Args:
+        session: Database session
+        defaults: Parameter key -> default value
+
+    Returns:
+        Parameter key -> value
+    """
+    from backend.models.system_parameters import SystemParameter
+
+    parameters = dict(defaults)
+    if not defaults:
+        return parameters
+
+    rows = session.query(SystemParameter).filter(SystemParameter.key.in_(list(defaults))).all()
+    for row in rows:
+        default = defaults[row.key]
+        try:
+            value = row.get_typed_value()
+            parameters[row.key] = Decimal(str(value)) if isinstance(default, Decimal) else type(default)(value)
+        except Exception:
+            logger.warning(f"Invalid value for rule parameter {row.key}: {row.value!r}, using {default}")
+    return parameters
+
+
+# Global engine holding the settlement validation rules
+settlement_rule_engine = RuleEngine()
@@ -3,282 +3,309 @@
 
 from decimal import Decimal
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 import logging
 
+from sqlalchemy import func, select
+
 from backend.models.database_models import SettlementRecord, PriceConfig
+from backend.services.price_config_cache import price_config_cache
+from backend.services.settlement_rule_engine import RuleEngine, settlement_rule_engine
 
 logger = logging.getLogger(__name__)
 
+# Customers per IN (...) list when prefetching
+PREFETCH_CHUNK_SIZE = 1000
+
+# Context data the rules can require
+PREVIOUS_USAGE = 'previous_usage'
+PRICE_CONFIGS = 'price_configs'
+
+# Rule parameters (SystemParameter keys, category settlement)
+USAGE_SPIKE_PERCENT = 'validation_usage_spike_percent'
+USAGE_DROP_PERCENT = 'validation_usage_drop_percent'
+PRICE_TOLERANCE_PERCENT = 'validation_price_tolerance_percent'
+AMOUNT_TOLERANCE = 'validation_amount_tolerance'
+
 
 class SettlementValidationError(Exception):
     """Custom exception for settlement validation errors"""
     pass
 
 
+class ValidationContext:
+    """Data read by the validation rules, prefetched for a batch of settlements"""
+
+    def __init__(
+        self,
+        latest_usage: Dict[int, List[Tuple[int, Decimal]]],
+        price_configs: Dict[int, PriceConfig]
+    ):
+        """
+        Args:
+            latest_usage: Customer ID -> (settlement ID, usage) of the customer's
+                two latest non-draft settlements by period end
+            price_configs: Price config ID -> PriceConfig
+        """
+        self.latest_usage = latest_usage
+        self.price_configs = price_configs
+
+    def previous_usage(self, settlement: SettlementRecord) -> Optional[Decimal]:
+        """Usage of the customer's latest other settlement"""
+        # id != NULL matches no row
+        if settlement.id is None:
+            return None
+        for settlement_id, usage in self.latest_usage.get(settlement.customer_id, ()):
+            if settlement_id != settlement.id:
+                return usage
+        return None
+
+    def price_config(self, settlement: SettlementRecord) -> Optional[PriceConfig]:
+        """Price config referenced by the settlement"""
+        return self.price_configs.get(settlement.config_id)
+
+
+# ==================== Rules ====================
+
+@settlement_rule_engine.rule(
+    'usage_spike',
+    severity='warning',
+    requires=(PREVIOUS_USAGE,),
+    parameters={USAGE_SPIKE_PERCENT: Decimal('50'), USAGE_DROP_PERCENT: Decimal('50')}
+)
+def check_usage_spike(settlement: SettlementRecord, context: ValidationContext, params: Dict[str, Any]):
+    """Usage quantity spike or drop against the previous period"""
+    warnings = []
+    details = {}
+
+    previous_usage = context.previous_usage(settlement)
+    if previous_usage and previous_usage > 0:
+        current_usage = settlement.usage_quantity
+        usage_change = (current_usage - previous_usage) / previous_usage * 100
+
+        details['usage_comparison'] = {
+            'current_usage': float(current_usage),
+            'previous_usage': float(previous_usage),
+            'change_percentage': float(usage_change)
+        }
+
+        if usage_change > params[USAGE_SPIKE_PERCENT]:
+            warnings.append(
+                f"用量突增警告：当前用量 {float(current_usage)} 比上期用量 {float(previous_usage)} 增长了 {usage_change:.2f}%"
+            )
+        elif usage_change < -params[USAGE_DROP_PERCENT]:
+            warnings.append(
+                f"用量骤降警告：当前用量 {float(current_usage)} 比上期用量 {float(previous_usage)} 下降了 {abs(usage_change):.2f}%"
+            )
+
+    return warnings, details
+
+
+@settlement_rule_engine.rule(
+    'unit_price_consistency',
+    severity='error',
+    requires=(PRICE_CONFIGS,),
+    parameters={PRICE_TOLERANCE_PERCENT: Decimal('1')}
+)
+def check_unit_price_consistency(settlement: SettlementRecord, context: ValidationContext, params: Dict[str, Any]):
+    """Unit price consistency with the price config"""
+    errors = []
+    details = {}
+
+    config = context.price_config(settlement)
+    if config:
+        expected_price = config.unit_price
+        actual_price = settlement.unit_price
+
+        details['price_comparison'] = {
+            'expected_price': float(expected_price) if expected_price else None,
+            'actual_price': float(actual_price) if actual_price else None
+        }
+
+        if expected_price and actual_price:
+            price_diff = abs(float(expected_price) - float(actual_price))
+
+            if price_diff > float(expected_price) * float(params[PRICE_TOLERANCE_PERCENT]) / 100:
+                errors.append(
+                    f"单价不一致：期望单价 ¥{float(expected_price)}，实际单价 ¥{float(actual_price)}，差异 {price_diff:.4f}"
+                )
+
+    return errors, details
+
+
+@settlement_rule_engine.rule(
+    'total_amount_calculation',
+    severity='error',
+    parameters={AMOUNT_TOLERANCE: Decimal('0.01')}
+)
+def check_total_amount_calculation(settlement: SettlementRecord, context: ValidationContext, params: Dict[str, Any]):
+    """Total amount equals usage times unit price"""
+    errors = []
+    details = {}
+
+    if settlement.usage_quantity and settlement.unit_price:
+        expected_total = settlement.usage_quantity * settlement.unit_price
+        actual_total = settlement.total_amount
+
+        details['amount_calculation'] = {
+            'expected_total': float(expected_total),
+            'actual_total': float(actual_total),
+            'difference': float(abs(expected_total - actual_total))
+        }
+
+        # Allow small rounding differences
+        if abs(float(expected_total) - float(actual_total)) > float(params[AMOUNT_TOLERANCE]):
+            errors.append(
+                f"总金额计算错误：期望总额 ¥{float(expected_total):.2f}，实际总额 ¥{float(actual_total):.2f}，差异 ¥{abs(float(expected_total) - float(actual_total)):.2f}"
+            )
+
+    return errors, details
+
+
+# Negative inputs make the other comparisons meaningless, so this rule is fatal
+@settlement_rule_engine.rule('negative_values', severity='fatal')
+def check_negative_values(settlement: SettlementRecord, context: ValidationContext, params: Dict[str, Any]):
+    """No negative usage, unit price or total"""
+    errors = []
+
+    if settlement.usage_quantity and settlement.usage_quantity < 0:
+        errors.append(f"用量不能为负数：{float(settlement.usage_quantity)}")
+
+    if settlement.unit_price and settlement.unit_price < 0:
+        errors.append(f"单价不能为负数：¥{float(settlement.unit_price)}")
+
+    if settlement.total_amount and settlement.total_amount < 0:
+        errors.append(f"总金额不能为负数：¥{float(settlement.total_amount)}")
+
+    return errors, None
+
+
+# ==================== Service ====================
+
 class SettlementValidationService:
     """Service for validating settlement data"""
-    
-    def __init__(self):
-        self.validation_rules = [
-            self._check_usage_spike,
-            self._check_unit_price_consistency,
-            self._check_total_amount_calculation,
-            self._check_negative_values
-        ]
-    
+
+    def __init__(self, engine: Optional[RuleEngine] = None):
+        """
+        Args:
+            engine: Rule engine (default: the global settlement rule engine)
+        """
+        self.engine = engine or settlement_rule_engine
+
+    @property
+    def validation_rules(self):
+        """Enabled validation rules"""
+        return self.engine.rules
+
     def validate_settlement(
         self,
         settlement: SettlementRecord,
-        session
+        session,
+        context: Optional[ValidationContext] = None,
+        parameters: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Validate settlement data for accuracy
-        
+
         Args:
             settlement: Settlement record to validate
             session: Database session
-            
+            context: Prefetched rule data (default: loaded for this settlement)
+            parameters: Rule parameters (default: from system parameters)
+
         Returns:
             Dictionary with validation results:
             - is_valid: bool
             - errors: List of validation errors
             - warnings: List of warnings
             - validation_details: Detailed validation info
+            - skipped_rules: Rules not run after a fatal error
         """
-        errors = []
-        warnings = []
-        validation_details = []
-        
-        # Run all validation rules
-        for rule in self.validation_rules:
-            try:
-                result = rule(settlement, session)
-                if result and not result.get('is_valid', True):
-                    if result.get('is_error', True):
-                        errors.extend(result.get('errors', []))
-                    else:
-                        warnings.extend(result.get('warnings', []))
-                
-                if result and 'details' in result:
-                    validation_details.append(result['details'])
-                    
-            except Exception as e:
-                logger.error(f"Validation rule failed: {str(e)}")
-                errors.append(f"Validation error: {str(e)}")
-        
-        return {
-            'is_valid': len(errors) == 0,
-            'errors': errors,
-            'warnings': warnings,
-            'validation_details': validation_details
-        }
-    
-    def _check_usage_spike(
-        self,
-        settlement: SettlementRecord,
-        session
-    ) -> Dict[str, Any]:
-        """
-        Check for usage quantity spike (>50% increase from previous period)
-        
-        Args:
-            settlement: Current settlement
-            session: Database session
-            
-        Returns:
-            Validation result with warnings for usage spikes
-        """
-        warnings = []
-        details = {}
-        
-        try:
-            # Get previous settlement for same customer
-            previous_settlement = session.query(SettlementRecord).filter(
-                SettlementRecord.customer_id == settlement.customer_id,
-                SettlementRecord.id != settlement.id,
-                SettlementRecord.status != 'draft'
-            ).order_by(
-                SettlementRecord.period_end.desc()
-            ).first()
-            
-            if previous_settlement and previous_settlement.usage_quantity:
-                current_usage = settlement.usage_quantity
-                previous_usage = previous_settlement.usage_quantity
-                
-                if previous_usage > 0:
-                    usage_change = (current_usage - previous_usage) / previous_usage * 100
-                    
-                    details['usage_comparison'] = {
-                        'current_usage': float(current_usage),
-                        'previous_usage': float(previous_usage),
-                        'change_percentage': float(usage_change)
-                    }
-                    
-                    if usage_change > 50:
-                        warnings.append(
-                            f"用量突增警告：当前用量 {float(current_usage)} 比上期用量 {float(previous_usage)} 增长了 {usage_change:.2f}%"
-                        )
-                    elif usage_change < -50:
-                        warnings.append(
-                            f"用量骤降警告：当前用量 {float(current_usage)} 比上期用量 {float(previous_usage)} 下降了 {abs(usage_change):.2f}%"
-                        )
-        
-        except Exception as e:
-            logger.error(f"Usage spike check failed: {str(e)}")
-        
-        return {
-            'is_valid': True,  # Usage spike is a warning, not an error
-            'is_error': False,
-            'warnings': warnings,
-            'details': {
-                'check': 'usage_spike',
-                'data': details
-            }
-        }
-    
-    def _check_unit_price_consistency(
-        self,
-        settlement: SettlementRecord,
-        session
-    ) -> Dict[str, Any]:
-        """
-        Check unit price consistency with price config
-        
-        Args:
-            settlement: Settlement to check
-            session: Database session
-            
-        Returns:
-            Validation result with errors for price inconsistencies
-        """
-        errors = []
-        details = {}
-        
-        try:
-            # Get price config
-            config = session.query(PriceConfig).filter(
-                PriceConfig.id == settlement.config_id
-            ).first()
-            
-            if config:
-                expected_price = config.unit_price
-                actual_price = settlement.unit_price
-                
-                details['price_comparison'] = {
-                    'expected_price': float(expected_price) if expected_price else None,
-                    'actual_price': float(actual_price) if actual_price else None
-                }
-                
-                if expected_price and actual_price:
-                    price_diff = abs(float(expected_price) - float(actual_price))
-                    
-                    # Allow 1% tolerance
-                    if price_diff > float(expected_price) * 0.01:
-                        errors.append(
-                            f"单价不一致：期望单价 ¥{float(expected_price)}，实际单价 ¥{float(actual_price)}，差异 {price_diff:.4f}"
-                        )
-        
-        except Exception as e:
-            logger.error(f"Price consistency check failed: {str(e)}")
-        
-        return {
-            'is_valid': len(errors) == 0,
-            'is_error': True,
-            'errors': errors,
-            'details': {
-                'check': 'unit_price_consistency',
-                'data': details
-            }
-        }
-    
-    def _check_total_amount_calculation(
+        if context is None:
+            context = self.prefetch_context([settlement], session)
+        if parameters is None:
+            parameters = self.engine.parameters(session)
+        return self.engine.evaluate(settlement, context, parameters)
+
+    def validate_many(
         self,
-        settlement: SettlementRecord,
+        settlements: Sequence[SettlementRecord],
         session
-    ) -> Dict[str, Any]:
+    ) -> List[Dict[str, Any]]:
         """
-        Check total amount calculation accuracy
-        
+        Validate a batch of settlements with prefetched rule data
+
+        Previous-period usage and price configs are loaded for the whole
+        batch (see prefetch_context) instead of two queries per settlement;
+        results are identical to validate_settlement.
+
         Args:
-            settlement: Settlement to check
+            settlements: Settlement records to validate
             session: Database session
-            
+
         Returns:
-            Validation result with errors for calculation errors
+            Validation results in the order of settlements
         """
-        errors = []
-        details = {}
-        
-        try:
-            if settlement.usage_quantity and settlement.unit_price:
-                expected_total = settlement.usage_quantity * settlement.unit_price
-                actual_total = settlement.total_amount
-                
-                details['amount_calculation'] = {
-                    'expected_total': float(expected_total),
-                    'actual_total': float(actual_total),
-                    'difference': float(abs(expected_total - actual_total))
-                }
-                
-                # Allow small floating point differences
-                if abs(float(expected_total) - float(actual_total)) > 0.01:
-                    errors.append(
-                        f"总金额计算错误：期望总额 ¥{float(expected_total):.2f}，实际总额 ¥{float(actual_total):.2f}，差异 ¥{abs(float(expected_total) - float(actual_total)):.2f}"
-                    )
-        
-        except Exception as e:
-            logger.error(f"Amount calculation check failed: {str(e)}")
-        
-        return {
-            'is_valid': len(errors) == 0,
-            'is_error': True,
-            'errors': errors,
-            'details': {
-                'check': 'total_amount_calculation',
-                'data': details
-            }
-        }
-    
-    def _check_negative_values(
+        context = self.prefetch_context(settlements, session)
+        parameters = self.engine.parameters(session)
+        return [
+            self.validate_settlement(settlement, session, context, parameters)
+            for settlement in settlements
+        ]
+
+    def prefetch_context(
         self,
-        settlement: SettlementRecord,
+        settlements: Sequence[SettlementRecord],
         session
-    ) -> Dict[str, Any]:
+    ) -> ValidationContext:
         """
-        Check for negative values in settlement data
-        
+        Load the rule data of a batch of settlements
+
+        Only the data required by the enabled rules is loaded: the two latest
+        non-draft settlements of every customer come from one ROW_NUMBER()
+        window query, the referenced price configs from the price config
+        cache (one IN query for the uncached ones).
+
         Args:
-            settlement: Settlement to check
+            settlements: Settlement records to validate
             session: Database session
-            
+
         Returns:
-            Validation result with errors for negative values
+            ValidationContext for validate_settlement
         """
-        errors = []
-        
-        try:
-            if settlement.usage_quantity and settlement.usage_quantity < 0:
-                errors.append(f"用量不能为负数：{float(settlement.usage_quantity)}")
-            
-            if settlement.unit_price and settlement.unit_price < 0:
-                errors.append(f"单价不能为负数：¥{float(settlement.unit_price)}")
-            
-            if settlement.total_amount and settlement.total_amount < 0:
-                errors.append(f"总金额不能为负数：¥{float(settlement.total_amount)}")
-        
-        except Exception as e:
-            logger.error(f"Negative value check failed: {str(e)}")
-        
-        return {
-            'is_valid': len(errors) == 0,
-            'is_error': True,
-            'errors': errors,
-            'details': {
-                'check': 'negative_values'
-            }
-        }
-    
+        required = self.engine.required_data()
+        latest_usage: Dict[int, List[Tuple[int, Decimal]]] = {}
+        price_configs: Dict[int, PriceConfig] = {}
+
+        if PREVIOUS_USAGE in required:
+            customer_ids = sorted({s.customer_id for s in settlements if s.customer_id is not None})
+            for start in range(0, len(customer_ids), PREFETCH_CHUNK_SIZE):
+                chunk = customer_ids[start:start + PREFETCH_CHUNK_SIZE]
+                ranked = select(
+                    SettlementRecord.id,
+                    SettlementRecord.customer_id,
+                    SettlementRecord.usage_quantity,
+                    func.row_number().over(
+                        partition_by=SettlementRecord.customer_id,
+                        order_by=(SettlementRecord.period_end.desc(), SettlementRecord.id.desc())
+                    ).label('period_rank')
+                ).where(
+                    SettlementRecord.customer_id.in_(chunk),
+                    SettlementRecord.status != 'draft'
+                ).subquery()
+                rows = session.execute(
+                    select(ranked.c.id, ranked.c.customer_id, ranked.c.usage_quantity)
+                    .where(ranked.c.period_rank <= 2)
+                    .order_by(ranked.c.customer_id, ranked.c.period_rank)
+                )
+                for settlement_id, customer_id, usage in rows:
+                    latest_usage.setdefault(customer_id, []).append((settlement_id, usage))
+
+        if PRICE_CONFIGS in required:
+            price_configs = price_config_cache.get_configs(session, (s.config_id for s in settlements))
+
+        return ValidationContext(latest_usage, price_configs)
+
     def mark_as_validated(
         self,
         settlement: SettlementRecord,
@@ -288,7 +315,7 @@ class SettlementValidationService:
     ):
         """
         Mark settlement as validated
-        
+
         Args:
             settlement: Settlement to mark
             session: Database session
@@ -0,0 +1,695 @@
+# OP_CMS Streaming Export
+# Story 6.2: Import/Export Enhancement - constant-memory export
+
+"""
+Streaming export engine
+
+Rows are read from the database through a server-side cursor
+(``stream_results``) in batches and handed to a format writer that appends
+them straight to the output file:
+
+    SELECT ... (server-side cursor)
+        -> partitions of ``batch_size`` rows
+        -> ExportWriter.write_rows (csv, xlsx, jsonl, parquet)
+        -> output file on disk
+
+Only one batch of rows is held in memory at a time, so peak memory does not
+depend on the number of exported records. Writers are plug-ins registered
+by format name with ``register_export_writer``; exportable tables are
+registered as datasets (customers, settlements, payments, audit_logs) with
+``register_export_dataset``.
+
+The columnar formats (parquet, arrow) use typed schemas derived from the
+model columns: DECIMAL columns become Arrow decimal128 with the column's
+precision and scale, DATETIME columns become UTC microsecond timestamps.
+Parquet row groups are flushed every ``row_group_size`` rows, so memory is
+bounded by one row group.
+"""
+
+import csv
+import json
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, func, select
+
+from backend.models.auth import AccessLog
+from backend.models.database_models import Customer, SettlementRecord
+from backend.models.payment_models import PaymentRecord
+from backend.services.archive_tier import ARCHIVE_DATE_COLUMN, route
+
+# Optional pyarrow import for Parquet export
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Directory for generated export files
+EXPORT_DIR = os.getenv('EXPORT_DIR', './exports')
+
+# Rows fetched from the cursor and written per batch
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+
+# Customer fields exported by default (in column order)
+CUSTOMER_EXPORT_FIELDS = [
+    'customer_id', 'company_name', 'contact_name', 'contact_phone', 'credit_code',
+    'customer_type', 'province', 'city', 'address', 'email', 'website', 'industry',
+    'erp_system', 'erp_customer_code', 'status', 'level', 'source', 'remarks',
+    'created_at', 'updated_at'
+]
+
+# Customer filters supported by exports (filter key -> column)
+CUSTOMER_EXPORT_FILTERS = ('status', 'level', 'customer_type', 'province', 'industry', 'source')
+
+# Parquet compression codecs
+PARQUET_COMPRESSIONS = ('snappy', 'zstd', 'gzip', 'brotli', 'lz4', 'none')
+DEFAULT_PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'zstd')
+
+# Rows per Parquet row group (bounds writer memory)
+DEFAULT_ROW_GROUP_SIZE = int(os.getenv('PARQUET_ROW_GROUP_SIZE', '65536'))
+
+# Arrow IPC compression codecs
+ARROW_COMPRESSIONS = ('lz4', 'zstd', 'none')
+
+
+class ExportError(Exception):
+    """Custom exception for export errors"""
+    pass
+
+
+# ==================== Writers ====================
+
+class ExportWriter:
+    """Appends rows to an export file; subclasses implement one format"""
+
+    extension = ''
+    content_type = 'application/octet-stream'
+
+    def __init__(self, file_path: str, columns: Sequence[str], column_types: Optional[Sequence[Any]] = None, **options):
+        """
+        Args:
+            file_path: Output file path
+            columns: Output column names
+            column_types: SQLAlchemy types of the columns (used by typed formats)
+            **options: Format specific options (e.g. compression)
+        """
+        self.file_path = file_path
+        self.columns = list(columns)
+        self.column_types = list(column_types) if column_types is not None else None
+        self.options = options
+        self.rows_written = 0
+
+    def open(self):
+        """Open the output file and write any header"""
+        raise NotImplementedError
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        """Append rows (value sequences in column order)"""
+        raise NotImplementedError
+
+    def close(self):
+        """Finish and close the output file"""
+        raise NotImplementedError
+
+    def __enter__(self) -> 'ExportWriter':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _text_value(value: Any) -> Any:
+    """Render values for text formats"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class CsvExportWriter(ExportWriter):
+    """CSV with a UTF-8 BOM so Excel detects the encoding"""
+
+    extension = 'csv'
+    content_type = 'text/csv'
+
+    def open(self):
+        self._file = open(self.file_path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        self._writer.writerows([_text_value(value) for value in row] for row in rows)
+        self.rows_written += len(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxExportWriter(ExportWriter):
+    """Excel workbook in openpyxl write-only mode (rows are streamed to disk)"""
+
+    extension = 'xlsx'
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    def open(self):
+        import openpyxl
+
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet('Export')
+        self._sheet.append(self.columns)
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        for row in rows:
+            self._sheet.append(list(row))
+        self.rows_written += len(rows)
+
+    def close(self):
+        self._workbook.save(self.file_path)
+        self._workbook.close()
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+class JsonLinesExportWriter(ExportWriter):
+    """One JSON object per line"""
+
+    extension = 'jsonl'
+    content_type = 'application/x-ndjson'
+
+    def open(self):
+        self._file = open(self.file_path, 'w', encoding='utf-8')
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        columns = self.columns
+        self._file.writelines(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + '\n'
+            for row in rows
+        )
+        self.rows_written += len(rows)
+
+    def close(self):
+        self._file.close()
+
+
+def arrow_type_spec(column_type: Any) -> Tuple:
+    """
+    Map a SQLAlchemy column type to an Arrow type spec
+
+    Returns:
+        ('bool',), ('int64',), ('float64',), ('decimal128', precision, scale),
+        ('timestamp',), ('date32',) or ('string',)
+    """
+    if isinstance(column_type, Boolean):
+        return ('bool',)
+    if isinstance(column_type, Integer):
+        return ('int64',)
+    if isinstance(column_type, Float):
+        return ('float64',)
+    if isinstance(column_type, Numeric):
+        return ('decimal128', column_type.precision or 38, column_type.scale or 0)
+    if isinstance(column_type, DateTime):
+        return ('timestamp',)
+    if isinstance(column_type, Date):
+        return ('date32',)
+    return ('string',)
+
+
+def arrow_schema(columns: Sequence[str], column_types: Optional[Sequence[Any]] = None):
+    """Build a typed Arrow schema (untyped columns become strings)"""
+    specs = [arrow_type_spec(t) for t in column_types] if column_types is not None else [('string',)] * len(columns)
+    arrow_types = {
+        'bool': pa.bool_,
+        'int64': pa.int64,
+        'float64': pa.float64,
+        'decimal128': pa.decimal128,
+        'timestamp': lambda: pa.timestamp('us', tz='UTC'),
+        'date32': pa.date32,
+        'string': pa.string
+    }
+    return pa.schema([(name, arrow_types[spec[0]](*spec[1:])) for name, spec in zip(columns, specs)])
+
+
+def _record_batch(schema, rows: Sequence[Sequence[Any]]):
+    """Convert a batch of DB rows to a typed Arrow record batch"""
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def _codec(compression: Optional[str], supported: Sequence[str], default: Optional[str]) -> Optional[str]:
+    compression = (compression or default or 'none').lower()
+    if compression not in supported:
+        raise ExportError(f"Unsupported compression: {compression}. Supported: {', '.join(supported)}")
+    return None if compression == 'none' else compression
+
+
+class ParquetExportWriter(ExportWriter):
+    """
+    Typed Parquet file (requires pyarrow)
+
+    Options:
+        compression: snappy, zstd, gzip, brotli, lz4 or none
+        compression_level: Codec specific level
+        row_group_size: Rows per row group
+    """
+
+    extension = 'parquet'
+    content_type = 'application/vnd.apache.parquet'
+
+    def open(self):
+        if not HAS_PYARROW:
+            raise ExportError("pyarrow is required for Parquet export")
+        compression = _codec(self.options.get('compression'), PARQUET_COMPRESSIONS, DEFAULT_PARQUET_COMPRESSION)
+        self.row_group_size = int(self.options.get('row_group_size') or DEFAULT_ROW_GROUP_SIZE)
+        self._schema = arrow_schema(self.columns, self.column_types)
+        self._writer = pq.ParquetWriter(
+            self.file_path,
+            self._schema,
+            compression=compression or 'none',
+            compression_level=self.options.get('compression_level')
+        )
+        self._pending = []
+        self._pending_rows = 0
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        if not rows:
+            return
+        self._pending.append(_record_batch(self._schema, rows))
+        self._pending_rows += len(rows)
+        self.rows_written += len(rows)
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            table = pa.Table.from_batches(self._pending, schema=self._schema)
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+            self._pending = []
+            self._pending_rows = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+class ArrowExportWriter(ExportWriter):
+    """
+    Typed Arrow IPC file (Feather v2, requires pyarrow)
+
+    Options:
+        compression: lz4, zstd or none
+    """
+
+    extension = 'arrow'
+    content_type = 'application/vnd.apache.arrow.file'
+
+    def open(self):
+        if not HAS_PYARROW:
+            raise ExportError("pyarrow is required for Arrow export")
+        compression = _codec(self.options.get('compression'), ARROW_COMPRESSIONS, 'none')
+        self._schema = arrow_schema(self.columns, self.column_types)
+        self._writer = pa.ipc.new_file(
+            self.file_path, self._schema, options=pa.ipc.IpcWriteOptions(compression=compression)
+        )
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        if not rows:
+            return
+        self._writer.write_batch(_record_batch(self._schema, rows))
+        self.rows_written += len(rows)
+
+    def close(self):
+        self._writer.close()
+
+
+EXPORT_WRITERS: Dict[str, Type[ExportWriter]] = {}
+
+
+def register_export_writer(export_format: str, writer_class: Type[ExportWriter]):
+    """Register a writer class for an export format name"""
+    EXPORT_WRITERS[export_format] = writer_class
+
+
+register_export_writer('csv', CsvExportWriter)
+register_export_writer('excel', XlsxExportWriter)
+register_export_writer('xlsx', XlsxExportWriter)
+register_export_writer('jsonl', JsonLinesExportWriter)
+register_export_writer('parquet', ParquetExportWriter)
+register_export_writer('arrow', ArrowExportWriter)
+
+
+def get_export_writer(export_format: str) -> Type[ExportWriter]:
+    """Look up the writer class of an export format"""
+    writer_class = EXPORT_WRITERS.get(export_format)
+    if writer_class is None:
+        raise ExportError(
+            f"Unsupported export format: {export_format}. Supported: {', '.join(sorted(EXPORT_WRITERS))}"
+        )
+    return writer_class
+
+
+# ==================== Datasets ====================
+
+class ExportDataset:
+    """An exportable table: its columns, supported filters and row order"""
+
+    def __init__(
+        self,
+        name: str,
+        model: Any,
+        fields: Sequence[str],
+        filters: Sequence[str] = (),
+        date_field: Optional[str] = None
+    ):
+        """
+        Args:
+            name: Dataset name used by the API and Celery tasks
+            model: SQLAlchemy model
+            fields: Exportable fields (default column order)
+            filters: Fields that support equality filters
+            date_field: DateTime field filtered by ``date_from`` / ``date_to``
+        """
+        self.name = name
+        self.model = model
+        self.fields = list(fields)
+        self.filters = tuple(filters)
+        self.date_field = date_field
+
+    def filter_clauses(self, filters: Optional[Dict[str, Any]]) -> List[Any]:
+        """Build WHERE clauses from export filters (unknown keys are ignored)"""
+        if not filters:
+            return []
+        clauses = [getattr(self.model, key) == filters[key] for key in self.filters if filters.get(key)]
+        if self.date_field:
+            column = getattr(self.model, self.date_field)
+            if filters.get('date_from'):
+                clauses.append(column >= _parse_datetime(filters['date_from']))
+            if filters.get('date_to'):
+                clauses.append(column <= _parse_datetime(filters['date_to']))
+        return clauses
+
+    def statement(self, filters: Optional[Dict[str, Any]] = None, fields: Optional[List[str]] = None):
+        """
+        Build the SELECT for an export
+
+        Args:
+            filters: Export filters
+            fields: Fields to export (default: all exportable fields)
+
+        Returns:
+            Tuple of (statement, columns)
+        """
+        columns = [field for field in (fields or self.fields) if field in self.fields]
+        if not columns:
+            raise ExportError("No exportable fields selected")
+
+        statement = (
+            select(*[getattr(self.model, column) for column in columns])
+            .where(*self.filter_clauses(filters))
+            .order_by(self.model.id)
+        )
+        return statement, columns
+
+    def archive_since(self, filters: Optional[Dict[str, Any]]) -> Optional[datetime]:
+        """Earliest created_at an export selects, for the archive router (None: unbounded)"""
+        if self.date_field == ARCHIVE_DATE_COLUMN and filters and filters.get('date_from'):
+            return _parse_datetime(filters['date_from'])
+        return None
+
+    def column_types(self, columns: Sequence[str]) -> List[Any]:
+        """SQLAlchemy types of the given fields"""
+        return [getattr(self.model, column).type for column in columns]
+
+    def count(self, session, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Count the rows an export will contain"""
+        statement = select(func.count(self.model.id)).where(*self.filter_clauses(filters))
+        return session.execute(route(session, statement, self.archive_since(filters))).scalar_one()
+
+
+def _parse_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ExportError(f"Invalid date filter: {value}")
+
+
+# Registry of exportable datasets
+EXPORT_DATASETS: Dict[str, ExportDataset] = {}
+
+
+def register_export_dataset(dataset: ExportDataset):
+    """Register an exportable dataset"""
+    EXPORT_DATASETS[dataset.name] = dataset
+
+
+def get_export_dataset(name: str) -> ExportDataset:
+    """Look up an export dataset by name"""
+    dataset = EXPORT_DATASETS.get(name)
+    if dataset is None:
+        raise ExportError(f"Unsupported export dataset: {name}. Supported: {', '.join(sorted(EXPORT_DATASETS))}")
+    return dataset
+
+
+register_export_dataset(ExportDataset(
+    'customers', Customer, CUSTOMER_EXPORT_FIELDS, CUSTOMER_EXPORT_FILTERS, date_field='created_at'
+))
+register_export_dataset(ExportDataset(
+    'settlements', SettlementRecord,
+    [
+        'record_id', 'customer_id', 'config_id', 'period_start', 'period_end', 'usage_quantity', 'unit',
+        'price_model', 'unit_price', 'total_amount', 'currency', 'status', 'created_at', 'approved_at', 'paid_at'
+    ],
+    ('customer_id', 'status', 'currency', 'price_model'),
+    date_field='period_start'
+))
+register_export_dataset(ExportDataset(
+    'payments', PaymentRecord,
+    [
+        'payment_no', 'customer_id', 'payment_amount', 'payment_method', 'payment_date',
+        'payment_account', 'created_by', 'created_at'
+    ],
+    ('customer_id', 'payment_method'),
+    date_field='payment_date'
+))
+register_export_dataset(ExportDataset(
+    'audit_logs', AccessLog,
+    [
+        'id', 'user_id', 'action', 'resource_type', 'resource_id', 'ip_address',
+        'status_code', 'error_message', 'created_at'
+    ],
+    ('user_id', 'action', 'resource_type'),
+    date_field='created_at'
+))
+
+
+# ==================== Engine ====================
+
+def stream_to_file(
+    session,
+    statement,
+    columns: Sequence[str],
+    export_format: str,
+    file_path: str,
+    batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    column_types: Optional[Sequence[Any]] = None,
+    writer_options: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Stream the rows of a SELECT into an export file
+
+    Args:
+        session: Database session
+        statement: SELECT returning ``columns`` in order
+        columns: Output column names
+        export_format: Registered export format
+        file_path: Output file path
+        batch_size: Rows fetched and written per batch
+        progress_callback: Called with the number of rows written after every batch
+        column_types: SQLAlchemy types of the columns (typed formats)
+        writer_options: Format specific writer options (compression, ...)
+
+    Returns:
+        Number of rows written
+    """
+    writer_class = get_export_writer(export_format)
+    result = session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+
+    try:
+        with writer_class(file_path, columns, column_types, **(writer_options or {})) as writer:
+            for rows in result.partitions(batch_size):
+                writer.write_rows(rows)
+                if progress_callback:
+                    progress_callback(writer.rows_written)
+    except Exception:
+        result.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    return writer.rows_written
+
+
+def export_dataset_to_file(
+    session,
+    dataset: str,
+    export_format: str = 'parquet',
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    export_dir: Optional[str] = None,
+    batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    writer_options: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Export a dataset to a file in the export directory
+
+    Args:
+        session: Database session
+        dataset: Registered dataset (customers, settlements, payments, audit_logs)
+        export_format: Registered export format (excel, csv, jsonl, parquet, arrow)
+        filters: Export filters
+        fields: Fields to export
+        export_dir: Output directory (default: EXPORT_DIR)
+        batch_size: Rows fetched and written per batch
+        progress_callback: Called with the number of rows written after every batch
+        writer_options: Format specific writer options (compression, ...)
+
+    Returns:
+        Export summary: file_path, file_name, file_type and total
+    """
+    export_dataset = get_export_dataset(dataset)
+    writer_class = get_export_writer(export_format)
+    statement, columns = export_dataset.statement(filters, fields)
+    statement = route(session, statement, export_dataset.archive_since(filters))
+
+    export_dir = export_dir or EXPORT_DIR
+    os.makedirs(export_dir, exist_ok=True)
+    file_name = f"{dataset}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}.{writer_class.extension}"
+    file_path = os.path.join(export_dir, file_name)
+
+    total = stream_to_file(
+        session, statement, columns, export_format, file_path, batch_size, progress_callback,
+        column_types=export_dataset.column_types(columns),
+        writer_options=writer_options
+    )
+    logger.info(f"Exported {total} {dataset} rows to {file_path}")
+
+    return {
+        'file_path': file_path,
+        'file_name': file_name,
+        'file_type': writer_class.content_type,
+        'total': total
+    }
+
+
+def get_export_file(file_name: str, export_dir: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """
+    Locate a generated export file
+
+    Args:
+        file_name: File name returned by export_dataset_to_file
+        export_dir: Export directory (default: EXPORT_DIR)
+
+    Returns:
+        (file_path, content_type), or None if the name is not a file in the export directory
+    """
+    if not file_name or os.path.basename(file_name) != file_name:
+        return None
+    file_path = os.path.join(export_dir or EXPORT_DIR, file_name)
+    if not os.path.isfile(file_path):
+        return None
+    extension = os.path.splitext(file_name)[1].lstrip('.')
+    content_type = next(
+        (writer.content_type for writer in EXPORT_WRITERS.values() if writer.extension == extension),
+        ExportWriter.content_type
+    )
+    return file_path, content_type
+
+
+def purge_export_files(max_age_seconds: int, export_dir: Optional[str] = None) -> int:
+    """
+    Delete generated export files older than max_age_seconds
+
+    Returns:
+        Number of files deleted
+    """
+    export_dir = export_dir or EXPORT_DIR
+    if not os.path.isdir(export_dir):
+        return 0
+    cutoff = datetime.utcnow().timestamp() - max_age_seconds
+    deleted = 0
+    for entry in os.scandir(export_dir):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+    return deleted
+
+
+def count_rows(session, dataset: str, filters: Optional[Dict[str, Any]] = None) -> int:
+    """Count the rows a dataset export will contain"""
+    return get_export_dataset(dataset).count(session, filters)
+
+
+def customer_export_statement(filters: Optional[Dict[str, Any]] = None, fields: Optional[List[str]] = None):
+    """
+    Build the SELECT for a customer export
+
+    Args:
+        filters: Column filters (status, level, customer_type, ...)
+        fields: Fields to export (default: CUSTOMER_EXPORT_FIELDS)
+
+    Returns:
+        Tuple of (statement, columns)
+    """
+    return EXPORT_DATASETS['customers'].statement(filters, fields)
+
+
+def count_customers(session, filters: Optional[Dict[str, Any]] = None) -> int:
+    """Count the customers an export will contain"""
+    return count_rows(session, 'customers', filters)
+
+
+def export_customers_to_file(
+    session,
+    export_format: str = 'excel',
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    export_dir: Optional[str] = None,
+    batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+    progress_callback: Optional[Callable[[int], None]] = None,
+    writer_options: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Export customers to a file in the export directory
+
+    See ``export_dataset_to_file``.
+    """
+    return export_dataset_to_file(
+        session, 'customers', export_format, filters, fields, export_dir, batch_size,
+        progress_callback, writer_options
+    )
@@ -0,0 +1,434 @@
+# OP_CMS Write-off Matcher
+# Story 3.4: Settlement Payment Writeoff - automatic matching
+
+"""
+Automatic payment-to-settlement write-off
+
+For every customer, open settlements (pending/approved with an outstanding
+amount) are matched against payments with an unallocated remainder. Amounts
+are handled in integer cents. Matching runs in three passes, oldest items
+first:
+
+    1. exact: a payment equal to one settlement's outstanding amount
+       (hash lookup by amount)                                -> full
+    2. merged: a payment equal to the sum of several settlements
+       (bounded subset-sum search)                            -> merged
+    3. allocation: remaining payment amounts are allocated to the oldest
+       open settlements                                       -> full/partial
+
+Pass 2 runs before pass 3 because allocation consumes every remaining
+payment. Write-offs are inserted with one bulk INSERT per customer and
+fully covered settlements are marked paid in the same transaction.
+
+Customers are processed in parallel by the batch executor, each with its
+own session; a customer is only ever handled by one worker. Concurrent runs
+(the nightly task and a manual one) are serialized per customer: the
+customer's payments and open settlements are locked (SELECT ... FOR UPDATE)
+before their remaining amounts are read.
+"""
+
+import logging
+import threading
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, select, union_all, update
+
+from backend.models.database_models import SettlementRecord
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.services.archive_tier import archive_statement
+from backend.services.batch_executor import BatchExecutor
+
+logger = logging.getLogger(__name__)
+
+# Settlement statuses that can still be written off
+OPEN_STATUSES = ('pending', 'approved')
+
+# Bounds of the subset-sum search for merged payments
+MAX_SUBSET_CANDIDATES = 20
+MAX_SUBSET_SIZE = 6
+MAX_SEARCH_NODES = 20000
+
+# Parallel customers
+DEFAULT_WORKERS = 4
+
+# Matcher input: (id, open amount in cents, date); output: (payment_id, settlement_id, cents, type)
+OpenItem = Tuple[int, int, datetime]
+Allocation = Tuple[int, int, int, str]
+
+
+def to_cents(amount: Any) -> int:
+    """Convert a money amount to integer cents"""
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def from_cents(cents: int) -> Decimal:
+    """Convert integer cents to a 2-place Decimal"""
+    return (Decimal(cents) / 100).quantize(Decimal('0.01'))
+
+
+# ==================== Matching ====================
+
+def find_subset(
+    candidates: Sequence[Tuple[int, int]],
+    target: int,
+    max_size: int = MAX_SUBSET_SIZE,
+    max_nodes: int = MAX_SEARCH_NODES
+) -> Optional[List[int]]:
+    """
+    Find candidates whose amounts sum exactly to target (bounded DFS)
+
+    Candidates are tried in the given order, so older items are preferred.
+
+    Args:
+        candidates: (index, cents) pairs, all positive
+        target: Target in cents
+        max_size: Maximum number of items in the subset
+        max_nodes: Search budget; the search gives up when exhausted
+
+    Returns:
+        Indexes of the subset, or None
+    """
+    amounts = [amount for _, amount in candidates]
+    # suffix[i] = sum of amounts[i:], to prune branches that cannot reach the target
+    suffix = [0] * (len(amounts) + 1)
+    for i in range(len(amounts) - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + amounts[i]
+
+    nodes = 0
+    chosen: List[int] = []
+
+    def search(start: int, remaining: int) -> bool:
+        nonlocal nodes
+        if remaining == 0:
+            return True
+        if len(chosen) >= max_size or suffix[start] < remaining:
+            return False
+        for i in range(start, len(amounts)):
+            nodes += 1
+            if nodes > max_nodes:
+                return False
+            if amounts[i] > remaining:
+                continue
+            chosen.append(i)
+            if search(i + 1, remaining - amounts[i]):
+                return True
+            chosen.pop()
+        return False
+
+    if target <= 0 or not search(0, target):
+        return None
+    return [candidates[i][0] for i in chosen]
+
+
+def match_customer(
+    settlements: Sequence[OpenItem],
+    payments: Sequence[OpenItem],
+    allow_partial: bool = True,
+    max_subset_candidates: int = MAX_SUBSET_CANDIDATES
+) -> List[Allocation]:
+    """
+    Match one customer's payments to open settlements
+
+    Args:
+        settlements: Open settlements (id, outstanding cents, created_at)
+        payments: Payments (id, unallocated cents, payment_date)
+        allow_partial: Run the oldest-first allocation pass
+        max_subset_candidates: Oldest open settlements considered for merged payments
+
+    Returns:
+        Allocations (payment_id, settlement_id, cents, writeoff_type)
+    """
+    settlements = sorted(settlements, key=lambda item: (item[2], item[0]))
+    payments = sorted(payments, key=lambda item: (item[2], item[0]))
+    outstanding = {item[0]: item[1] for item in settlements if item[1] > 0}
+    remaining = {item[0]: item[1] for item in payments if item[1] > 0}
+    allocations: List[Allocation] = []
+
+    # Pass 1: exact amount, oldest settlement first
+    by_amount: Dict[int, deque] = defaultdict(deque)
+    for settlement_id, cents, _ in settlements:
+        if cents > 0:
+            by_amount[cents].append(settlement_id)
+    for payment_id, cents, _ in payments:
+        candidates = by_amount.get(cents)
+        if cents > 0 and candidates:
+            settlement_id = candidates.popleft()
+            allocations.append((payment_id, settlement_id, cents, 'full'))
+            del outstanding[settlement_id]
+            del remaining[payment_id]
+
+    # Pass 2: one payment covering several settlements
+    for payment_id, _, _ in payments:
+        cents = remaining.get(payment_id)
+        if not cents:
+            continue
+        open_items = [
+            (settlement_id, outstanding[settlement_id])
+            for settlement_id, _, _ in settlements
+            if settlement_id in outstanding and outstanding[settlement_id] <= cents
+        ][:max_subset_candidates]
+        subset = find_subset(open_items, cents)
+        if subset and len(subset) > 1:
+            for settlement_id in subset:
+                allocations.append((payment_id, settlement_id, outstanding.pop(settlement_id), 'merged'))
+            del remaining[payment_id]
+
+    # Pass 3: allocate what is left to the oldest open settlements
+    if allow_partial:
+        open_queue = deque(settlement_id for settlement_id, _, _ in settlements if settlement_id in outstanding)
+        initial = dict(outstanding)
+        for payment_id, _, _ in payments:
+            cents = remaining.get(payment_id, 0)
+            while cents > 0 and open_queue:
+                settlement_id = open_queue[0]
+                amount = min(cents, outstanding[settlement_id])
+                writeoff_type = 'full' if amount == initial[settlement_id] else 'partial'
+                allocations.append((payment_id, settlement_id, amount, writeoff_type))
+                cents -= amount
+                outstanding[settlement_id] -= amount
+                if outstanding[settlement_id] == 0:
+                    open_queue.popleft()
+            remaining[payment_id] = cents
+
+    return allocations
+
+
+# ==================== Persistence ====================
+
+def load_open_items(session, customer_id: int) -> Tuple[List[OpenItem], List[OpenItem]]:
+    """
+    Lock and load a customer's open settlements and unallocated payments
+
+    The payments and open settlements are locked first, so a concurrent run
+    for the same customer waits here and then reads the committed write-offs.
+    Existing write-offs are aggregated for this customer's items only; a
+    payment's write-offs include those archived with their settlements.
+
+    Returns:
+        Tuple of (settlements, payments) with amounts net of existing write-offs
+    """
+    customer_payments = select(PaymentRecord.id).where(PaymentRecord.customer_id == customer_id)
+    open_settlements = select(SettlementRecord.id).where(
+        SettlementRecord.customer_id == customer_id, SettlementRecord.status.in_(OPEN_STATUSES)
+    )
+    session.execute(customer_payments.order_by(PaymentRecord.id).with_for_update()).all()
+    session.execute(open_settlements.order_by(SettlementRecord.id).with_for_update()).all()
+
+    settled = (
+        select(SettlementWriteoff.settlement_id, func.sum(SettlementWriteoff.writeoff_amount).label('amount'))
+        .where(SettlementWriteoff.settlement_id.in_(open_settlements))
+        .group_by(SettlementWriteoff.settlement_id)
+        .subquery()
+    )
+    # Payments stay live when their settlements are archived: count both tiers' write-offs
+    payment_writeoffs = select(SettlementWriteoff.payment_id, SettlementWriteoff.writeoff_amount).where(
+        SettlementWriteoff.payment_id.in_(customer_payments)
+    )
+    payment_writeoffs = union_all(payment_writeoffs, archive_statement(payment_writeoffs)).subquery()
+    allocated = (
+        select(payment_writeoffs.c.payment_id, func.sum(payment_writeoffs.c.writeoff_amount).label('amount'))
+        .group_by(payment_writeoffs.c.payment_id)
+        .subquery()
+    )
+
+    settlement_rows = session.execute(
+        select(
+            SettlementRecord.id,
+            SettlementRecord.total_amount - func.coalesce(settled.c.amount, 0),
+            SettlementRecord.created_at
+        )
+        .outerjoin(settled, settled.c.settlement_id == SettlementRecord.id)
+        .where(SettlementRecord.customer_id == customer_id, SettlementRecord.status.in_(OPEN_STATUSES))
+    ).all()
+    payment_rows = session.execute(
+        select(
+            PaymentRecord.id,
+            PaymentRecord.payment_amount - func.coalesce(allocated.c.amount, 0),
+            PaymentRecord.payment_date
+        )
+        .outerjoin(allocated, allocated.c.payment_id == PaymentRecord.id)
+        .where(PaymentRecord.customer_id == customer_id)
+    ).all()
+
+    settlements = [(row[0], to_cents(row[1]), row[2]) for row in settlement_rows]
+    payments = [(row[0], to_cents(row[1]), row[2]) for row in payment_rows if to_cents(row[1]) > 0]
+    return [item for item in settlements if item[1] > 0], payments
+
+
+def write_allocations(
+    session,
+    allocations: Sequence[Allocation],
+    settlements: Sequence[OpenItem],
+    created_by: Optional[int] = None
+) -> List[int]:
+    """
+    Insert write-offs in bulk and mark fully covered settlements paid
+
+    Returns:
+        IDs of the settlements marked paid
+    """
+    if not allocations:
+        return []
+
+    now = datetime.utcnow()
+    session.execute(insert(SettlementWriteoff), [
+        {
+            'writeoff_no': f"WOF-{uuid.uuid4()}",
+            'payment_id': payment_id,
+            'settlement_id': settlement_id,
+            'writeoff_amount': from_cents(cents),
+            'writeoff_type': writeoff_type,
+            'writeoff_date': now,
+            'created_by': created_by
+        }
+        for payment_id, settlement_id, cents, writeoff_type in allocations
+    ])
+
+    covered: Dict[int, int] = defaultdict(int)
+    for _, settlement_id, cents, _ in allocations:
+        covered[settlement_id] += cents
+    paid_ids = [settlement_id for settlement_id, cents, _ in settlements if covered.get(settlement_id) == cents]
+    if paid_ids:
+        session.execute(
+            update(SettlementRecord)
+            .where(SettlementRecord.id.in_(paid_ids))
+            .values(status='paid', paid_at=now, updated_at=now)
+        )
+    return paid_ids
+
+
+# ==================== Service ====================
+
+class WriteoffMatcher:
+    """Runs automatic write-off across customers in parallel"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        max_workers: int = DEFAULT_WORKERS,
+        allow_partial: bool = True,
+        created_by: Optional[int] = None
+    ):
+        """
+        Args:
+            session_factory: Returns a new session (one per customer)
+            max_workers: Customers matched concurrently
+            allow_partial: Allocate remaining amounts oldest-first (pass 3)
+            created_by: User recorded on the write-offs
+        """
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self.allow_partial = allow_partial
+        self.created_by = created_by
+        self._lock = threading.Lock()
+
+    def candidate_customers(self, session) -> List[int]:
+        """Customers with open settlements and at least one payment"""
+        has_payment = select(PaymentRecord.id).where(PaymentRecord.customer_id == SettlementRecord.customer_id)
+        return list(session.execute(
+            select(SettlementRecord.customer_id)
+            .where(SettlementRecord.status.in_(OPEN_STATUSES), has_payment.exists())
+            .distinct()
+            .order_by(SettlementRecord.customer_id)
+        ).scalars())
+
+    def match_one(self, customer_id: int) -> Dict[str, Any]:
+        """
+        Match and write off one customer in a single transaction
+
+        Returns:
+            Customer totals
+        """
+        session = self.session_factory()
+        try:
+            settlements, payments = load_open_items(session, customer_id)
+            allocations = match_customer(settlements, payments, self.allow_partial)
+            paid_ids = write_allocations(session, allocations, settlements, self.created_by)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        matched = {settlement_id for _, settlement_id, _, _ in allocations}
+        allocated_payments = {payment_id for payment_id, _, _, _ in allocations}
+        by_type: Dict[str, int] = defaultdict(int)
+        for allocation in allocations:
+            by_type[allocation[3]] += 1
+        return {
+            'open_settlements': len(settlements),
+            'open_cents': sum(item[1] for item in settlements),
+            'matched_settlements': len(matched),
+            'paid_settlements': len(paid_ids),
+            'matched_cents': sum(allocation[2] for allocation in allocations),
+            'writeoffs': len(allocations),
+            'by_type': dict(by_type),
+            'unmatched_payments': sum(1 for item in payments if item[0] not in allocated_payments)
+        }
+
+    def run(
+        self,
+        customer_ids: Optional[Sequence[int]] = None,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run automatic write-off
+
+        Args:
+            customer_ids: Customers to match (default: all candidates)
+            progress_callback: Called as (processed, successful, failed) after each chunk
+
+        Returns:
+            Totals with match_rate (settlements) and amount_match_rate
+        """
+        if customer_ids is None:
+            session = self.session_factory()
+            try:
+                customer_ids = self.candidate_customers(session)
+            finally:
+                session.close()
+
+        totals = {
+            'customers': 0, 'open_settlements': 0, 'matched_settlements': 0, 'paid_settlements': 0,
+            'writeoffs': 0, 'unmatched_payments': 0, 'open_cents': 0, 'matched_cents': 0,
+            'by_type': {'full': 0, 'merged': 0, 'partial': 0}
+        }
+
+        def process(customer_id: int) -> bool:
+            result = self.match_one(customer_id)
+            with self._lock:
+                totals['customers'] += 1
+                for key in ('open_settlements', 'matched_settlements', 'paid_settlements',
+                            'writeoffs', 'unmatched_payments', 'open_cents', 'matched_cents'):
+                    totals[key] += result[key]
+                for writeoff_type, count in result['by_type'].items():
+                    totals['by_type'][writeoff_type] += count
+            return True
+
+        # Retrying a customer is safe: its transaction was rolled back
+        execution = BatchExecutor(max_workers=self.max_workers, max_retries=2, retry_backoff=0.5).run(
+            customer_ids, process, chunk_size=1, on_progress=progress_callback
+        )
+
+        open_cents = totals.pop('open_cents')
+        matched_cents = totals.pop('matched_cents')
+        totals.update({
+            'open_amount': float(from_cents(open_cents)),
+            'matched_amount': float(from_cents(matched_cents)),
+            # Share of open settlements fully cleared by this run
+            'match_rate': round(totals['paid_settlements'] / totals['open_settlements'], 4)
+            if totals['open_settlements'] else 0.0,
+            'amount_match_rate': round(matched_cents / open_cents, 4) if open_cents else 0.0,
+            'failed_customers': execution['failed'],
+            'errors': execution['errors']
+        })
+        logger.info(
+            f"Auto write-off: {totals['customers']} customers, {totals['writeoffs']} write-offs, "
+            f"match rate {totals['match_rate']:.2%}, amount match rate {totals['amount_match_rate']:.2%}"
+        )
+        return totals
@@ -2,222 +2,350 @@
 # Story 7.5: Celery Async Tasks
 
 from celery import current_task
-from datetime import datetime
+from sqlalchemy.exc import OperationalError
 import logging
-import os
 
 from backend.celery_app import celery_app
+from backend.services.archive_tier import ARCHIVED_TABLES, archive_rows, ensure_partitions
 from backend.services.backup_service import backup_service
+from backend.services.batch_processing_service import batch_service
+from backend.services.batch_task_store import DEFAULT_TASK_TTL
+from backend.services.customer_import_pipeline import (
+    DEFAULT_CHUNK_SIZE, CustomerImportPipeline, estimate_row_count, iter_file_rows,
+    load_checkpoint, purge_checkpoints, remove_spooled_file
+)
+from backend.services.customer_ledger import rebuild_balances
 from backend.services.data_validation_service import DataValidationService
-from backend.models.database_models import Customer, SettlementRecord
+from backend.services.progress_events import progress_publisher
+from backend.services.reminder_dispatcher import ReminderDispatcher, ReminderMessage, create_transport
+from backend.services.writeoff_matcher import WriteoffMatcher
+from backend.services.streaming_export import (
+    DEFAULT_EXPORT_BATCH_SIZE, count_rows, export_dataset_to_file, purge_export_files
+)
+from backend.models.database_models import SettlementRecord
+from backend.models.import_checkpoint_models import ImportCheckpoint
 from backend.dao.database_dao import DatabaseSessionFactory
 
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task(bind=True)
-def import_customers_task(self, file_data: str, import_mode: str = 'skip_duplicates'):
+def report_progress(task, state: str, meta: dict, batch_task_id: str = None, final: bool = False):
+    """
+    Record Celery task state and push it to progress subscribers
+    
+    Events are published under the batch task the Celery task runs for (when
+    given) so API clients can stream them; intermediate events are coalesced.
+    
+    Args:
+        task: Bound Celery task
+        state: Celery state (PROGRESS, SUCCESS, FAILED)
+        meta: State metadata
+        batch_task_id: Batch task ID the events belong to
+        final: Last event of the task
+    """
+    # Celery records SUCCESS itself from the task's return value
+    if state != 'SUCCESS':
+        task.update_state(state=state, meta=meta)
+    
+    celery_task_id = task.request.id
+    key = batch_task_id or celery_task_id
+    progress_publisher.publish(
+        key,
+        lambda: {'task_id': key, 'celery_task_id': celery_task_id, 'state': state, **meta},
+        final=final
+    )
+
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=5)
+def import_customers_task(
+    self,
+    file_path: str,
+    file_name: str = None,
+    import_mode: str = 'skip_duplicates',
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_task_id: str = None
+):
     """
     Async task for importing customers
     
+    The upload is spooled by the API (IMPORT_SPOOL_DIR must be shared with
+    the workers) and only its path travels through the broker. Rows are
+    streamed from the file, validated and bulk-written chunk by chunk. The
+    last committed row is checkpointed with every chunk, so a retried or
+    redelivered task (acks_late) resumes after it instead of restarting.
+    
     Args:
         self: Task instance
-        file_data: Base64 encoded file data
+        file_path: Path of the spooled upload
+        file_name: Original file name (decides CSV vs Excel parsing)
         import_mode: Import mode (skip_duplicates, update_duplicates, create_all)
+        chunk_size: Rows validated and committed together
+        batch_task_id: Batch task tracking this import
     
     Returns:
         Import result summary
     """
+    import_id = batch_task_id or self.request.id
+    batch_task = batch_service.get_task(batch_task_id) if batch_task_id else None
+    session = None
+    
     try:
-        task_id = self.request.id
-        
-        # Update task state
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 0,
-                'total': 0,
-                'status': 'Starting import...',
-                'import_mode': import_mode
-            }
-        )
+        if batch_task and batch_task.status == 'pending':
+            batch_task.start()
         
-        # Decode file
-        import base64
-        file_content = base64.b64decode(file_data)
+        total_estimate = estimate_row_count(file_path, file_name)
+        if batch_task:
+            batch_task.set_total_records(total_estimate)
         
-        # Parse file (simplified - in production, use proper parsing)
-        rows = []  # Parse file content
+        session = DatabaseSessionFactory().get_session()
+        checkpoint = load_checkpoint(session, import_id, file_name, import_mode, total_estimate)
         
-        total_rows = len(rows)
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 0,
-                'total': total_rows,
-                'status': f'Processing {total_rows} rows...'
+        def on_progress(progress: dict):
+            logger.info(
+                f"Import {import_id}: chunk {progress['chunks']} wrote {progress['chunk_rows']} rows "
+                f"in {progress['chunk_seconds']}s ({progress['chunk_rows_per_second']} rows/s), "
+                f"{progress['processed']}/{total_estimate} rows done"
+            )
+            meta = {
+                'current': progress['processed'],
+                'total': total_estimate,
+                'status': f"Imported {progress['processed']}/{total_estimate} rows",
+                **progress
             }
-        )
+            if batch_task:
+                # The batch task publishes progress events itself
+                batch_task.update_progress(
+                    progress['processed'], progress['imported'] + progress['updated'], progress['failed']
+                )
+                self.update_state(state='PROGRESS', meta=meta)
+            else:
+                report_progress(self, 'PROGRESS', meta)
         
-        # Process rows in batches
-        batch_size = 100
-        successful = 0
-        failed = 0
+        if checkpoint.status == 'completed':
+            # Redelivered after the import already finished
+            result = {'status': 'completed', **checkpoint.to_dict()}
+        else:
+            pipeline = CustomerImportPipeline(
+                session=session,
+                import_mode=import_mode,
+                chunk_size=chunk_size,
+                progress_callback=on_progress,
+                checkpoint=checkpoint
+            )
+            result = {'status': 'completed', **pipeline.run(iter_file_rows(file_path, file_name), total_estimate)}
         
-        for i in range(0, total_rows, batch_size):
-            batch = rows[i:i + batch_size]
-            
-            # Process batch
-            for row in batch:
-                try:
-                    # Validate and import
-                    # (simplified - in production, use full validation)
-                    successful += 1
-                except Exception as e:
-                    logger.error(f"Failed to import row: {str(e)}")
-                    failed += 1
-            
-            # Update progress
-            current = min(i + batch_size, total_rows)
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': current,
-                    'total': total_rows,
-                    'status': f'Imported {current}/{total_rows} rows',
-                    'successful': successful,
-                    'failed': failed
-                }
+        remove_spooled_file(file_path)
+        if batch_task:
+            batch_task.complete()
+        else:
+            report_progress(self, 'SUCCESS', result, final=True)
+        return result
+        
+    except OperationalError as e:
+        # Transient database error: retry and resume from the checkpoint
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Import task {import_id} hit a database error, retrying: {str(e)}")
+            raise self.retry(exc=e, countdown=min(300, 10 * 2 ** self.request.retries))
+        _fail_import(self, session, import_id, file_path, batch_task, e)
+        raise
+    except Exception as e:
+        _fail_import(self, session, import_id, file_path, batch_task, e)
+        raise
+    finally:
+        if session is not None:
+            session.close()
+
+
+def _fail_import(task, session, import_id: str, file_path: str, batch_task, error: Exception):
+    """Mark an import as permanently failed and remove its spooled file"""
+    logger.error(f"Import task {import_id} failed: {str(error)}")
+    
+    if session is not None:
+        try:
+            session.rollback()
+            checkpoint = session.get(ImportCheckpoint, import_id)
+            if checkpoint is not None:
+                checkpoint.status = 'failed'
+                session.commit()
+        except Exception as e:
+            logger.warning(f"Failed to mark import checkpoint {import_id} as failed: {str(e)}")
+    
+    remove_spooled_file(file_path)
+    if batch_task:
+        batch_task.fail(str(error))
+        task.update_state(state='FAILED', meta={'error': str(error)})
+    else:
+        report_progress(task, 'FAILED', {'error': str(error)}, final=True)
+
+
+def _run_export(
+    task,
+    dataset: str,
+    filters: dict,
+    export_format: str,
+    fields: list,
+    batch_size: int,
+    writer_options: dict,
+    batch_task_id: str
+) -> dict:
+    """
+    Stream a dataset export to a file, reporting progress per batch
+    
+    An export run for a batch task drives the task to completed (with the
+    download URL of the file) or failed, which also ends its event stream.
+    """
+    batch_task = batch_service.get_task(batch_task_id) if batch_task_id else None
+    session = None
+    try:
+        if batch_task:
+            if batch_task.status == 'pending':
+                batch_task.start()
+        else:
+            report_progress(
+                task,
+                'PROGRESS',
+                {
+                    'current': 0,
+                    'total': 0,
+                    'status': 'Starting export...'
+                },
+                batch_task_id=batch_task_id
             )
         
-        return {
+        # Get database session
+        session = DatabaseSessionFactory().get_session()
+        total = count_rows(session, dataset, filters)
+        if batch_task:
+            batch_task.set_total_records(total)
+        
+        def on_progress(written: int):
+            meta = {
+                'current': written,
+                'total': total,
+                'status': f'Exported {written}/{total} {dataset}'
+            }
+            if batch_task:
+                # The batch task publishes progress events itself
+                batch_task.update_progress(written, written, 0)
+                task.update_state(state='PROGRESS', meta=meta)
+            else:
+                report_progress(task, 'PROGRESS', meta, batch_task_id=batch_task_id)
+        
+        export = export_dataset_to_file(
+            session,
+            dataset,
+            export_format=export_format,
+            filters=filters,
+            fields=fields,
+            batch_size=batch_size,
+            progress_callback=on_progress,
+            writer_options=writer_options
+        )
+        
+        # Files stay in EXPORT_DIR until cleanup_old_tasks (in production, upload to S3/OSS)
+        result = {
             'status': 'completed',
-            'total': total_rows,
-            'successful': successful,
-            'failed': failed,
-            'import_mode': import_mode
+            'dataset': dataset,
+            'total': export['total'],
+            'file_name': export['file_name'],
+            'file_type': export['file_type'],
+            'file_url': None
         }
+        if batch_task:
+            # Served to the task's owner by the batch tasks API
+            result['file_url'] = f"/batch-tasks/{batch_task.id}/download/{export['file_name']}"
+            if not batch_task.complete(result_url=result['file_url']):
+                # Cancelled while exporting: the file will never be downloaded
+                remove_spooled_file(export['file_path'])
+                result.update(status=batch_task.status, file_url=None)
+        else:
+            report_progress(task, 'SUCCESS', result, batch_task_id=batch_task_id, final=True)
+        return result
         
     except Exception as e:
-        logger.error(f"Import task failed: {str(e)}")
-        self.update_state(
-            state='FAILED',
-            meta={'error': str(e)}
-        )
+        logger.error(f"Export task failed: {str(e)}")
+        if batch_task:
+            batch_task.fail(str(e))
+            task.update_state(state='FAILED', meta={'error': str(e)})
+        else:
+            report_progress(
+                task,
+                'FAILED',
+                {'error': str(e)},
+                batch_task_id=batch_task_id,
+                final=True
+            )
         raise
+    finally:
+        if session is not None:
+            session.close()
 
 
 @celery_app.task(bind=True)
-def export_customers_task(self, filters: dict = None, export_format: str = 'excel'):
+def export_customers_task(
+    self,
+    filters: dict = None,
+    export_format: str = 'excel',
+    fields: list = None,
+    batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+    batch_task_id: str = None,
+    compression: str = None
+):
     """
     Async task for exporting customers
     
+    Rows are streamed from a server-side cursor straight into the output
+    file, so memory stays flat regardless of the number of customers.
+    
     Args:
         self: Task instance
         filters: Export filters
-        export_format: Export format (excel, csv)
+        export_format: Export format (excel, csv, jsonl, parquet, arrow)
+        fields: Fields to export (default: all)
+        batch_size: Rows fetched and written per batch (progress is reported per batch)
+        batch_task_id: Batch task to publish progress events for
+        compression: Compression codec for parquet/arrow
     
     Returns:
         Export result with file URL
     """
-    try:
-        task_id = self.request.id
-        
-        # Update task state
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 0,
-                'total': 0,
-                'status': 'Starting export...'
-            }
-        )
-        
-        # Get database session
-        session_factory = DatabaseSessionFactory()
-        session = session_factory.get_session()
-        
-        try:
-            # Query customers
-            query = session.query(Customer)
-            
-            if filters:
-                if filters.get('status'):
-                    query = query.filter(Customer.status == filters['status'])
-                if filters.get('level'):
-                    query = query.filter(Customer.level == filters['level'])
-            
-            customers = query.all()
-            total = len(customers)
-            
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': 0,
-                    'total': total,
-                    'status': f'Exporting {total} customers...'
-                }
-            )
-            
-            # Export in batches
-            import pandas as pd
-            import io
-            import base64
-            
-            # Convert to DataFrame
-            customer_data = [c.to_dict() for c in customers]
-            df = pd.DataFrame(customer_data)
-            
-            # Export to file
-            output = io.BytesIO()
-            if export_format == 'csv':
-                df.to_csv(output, index=False)
-                file_ext = 'csv'
-                file_type = 'text/csv'
-            else:  # excel
-                df.to_excel(output, index=False, engine='openpyxl')
-                file_ext = 'xlsx'
-                file_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            
-            output.seek(0)
-            file_content = output.getvalue()
-            
-            # Save file (in production, save to S3/OSS)
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            filename = f'customers_{timestamp}.{file_ext}'
-            filepath = os.path.join('./exports', filename)
-            os.makedirs('./exports', exist_ok=True)
-            
-            with open(filepath, 'wb') as f:
-                f.write(file_content)
-            
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': total,
-                    'total': total,
-                    'status': 'Export completed',
-                    'file_url': f'/exports/{filename}'
-                }
-            )
-            
-            return {
-                'status': 'completed',
-                'total': total,
-                'file_url': f'/exports/{filename}',
-                'file_type': file_type
-            }
-            
-        finally:
-            session.close()
-            
-    except Exception as e:
-        logger.error(f"Export task failed: {str(e)}")
-        self.update_state(
-            state='FAILED',
-            meta={'error': str(e)}
-        )
-        raise
+    writer_options = {'compression': compression} if compression else None
+    return _run_export(
+        self, 'customers', filters, export_format, fields, batch_size, writer_options, batch_task_id
+    )
+
+
+@celery_app.task(bind=True)
+def export_dataset_task(
+    self,
+    dataset: str,
+    filters: dict = None,
+    export_format: str = 'parquet',
+    fields: list = None,
+    compression: str = None,
+    batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+    batch_task_id: str = None
+):
+    """
+    Async task for exporting a dataset (customers, settlements, payments, audit_logs)
+    
+    Args:
+        self: Task instance
+        dataset: Registered export dataset
+        filters: Export filters (equality filters plus date_from / date_to)
+        export_format: Export format (parquet, arrow, csv, jsonl, excel)
+        fields: Fields to export (default: all)
+        compression: Compression codec for parquet/arrow
+        batch_size: Rows fetched and written per batch
+        batch_task_id: Batch task to publish progress events for
+    
+    Returns:
+        Export result with file URL
+    """
+    writer_options = {'compression': compression} if compression else None
+    return _run_export(
+        self, dataset, filters, export_format, fields, batch_size, writer_options, batch_task_id
+    )
 
 
 @celery_app.task(bind=True)
@@ -262,12 +390,25 @@ def cleanup_old_tasks():
     try:
         logger.info("Cleaning up old task results")
         
-        # In production, clean up old task results from Redis/database
-        # This is a placeholder
+        # Remove finished batch tasks past the store TTL
+        removed = batch_service.cleanup_expired_tasks()
+        
+        # Remove checkpoints of finished imports past the same TTL
+        session = DatabaseSessionFactory().get_session()
+        try:
+            removed_checkpoints = purge_checkpoints(session, DEFAULT_TASK_TTL)
+        finally:
+            session.close()
+        
+        # Remove export files whose batch tasks (and download links) have expired
+        removed_exports = purge_export_files(DEFAULT_TASK_TTL)
         
         return {
             'status': 'completed',
-            'message': 'Old task results cleaned up'
+            'message': 'Old task results cleaned up',
+            'removed_tasks': removed,
+            'removed_import_checkpoints': removed_checkpoints,
+            'removed_export_files': removed_exports
         }
         
     except Exception as e:
@@ -287,12 +428,10 @@ def send_email_notification(self, recipient: str, subject: str, body: str):
         body: Email body
     """
     try:
-        # In production, use email service (SendGrid, AWS SES, etc.)
         logger.info(f"Sending email to {recipient}: {subject}")
         
-        # Simulate email sending
-        import time
-        time.sleep(1)  # Simulate API call
+        with create_transport() as transport:
+            transport.send(ReminderMessage(None, recipient, subject, body, level='notification', settlements=[]))
         
         return {
             'status': 'sent',
@@ -303,3 +442,142 @@ def send_email_notification(self, recipient: str, subject: str, body: str):
     except Exception as e:
         logger.error(f"Email notification failed: {str(e)}")
         raise
+
+
+# Rate-limited sends of a full night's reminders outlast the global 1 hour limit
+@celery_app.task(bind=True, time_limit=6 * 3600, soft_time_limit=6 * 3600 - 300)
+def dispatch_overdue_reminders_task(self, dry_run: bool = False):
+    """
+    Send reminders for overdue settlements
+    
+    Scheduled to run nightly. One message is sent per customer; every
+    reminded settlement gets a ReminderRecord.
+    
+    Args:
+        self: Task instance
+        dry_run: Render only; nothing is sent or recorded
+    
+    Returns:
+        Dispatch totals
+    """
+    try:
+        session = DatabaseSessionFactory().get_session()
+        try:
+            def on_progress(totals: dict):
+                report_progress(self, 'PROGRESS', dict(totals, status=f"Reminded {totals['customers']} customers"))
+            
+            totals = ReminderDispatcher(session).dispatch(dry_run=dry_run, progress_callback=on_progress)
+        finally:
+            session.close()
+        
+        return dict(totals, status='completed')
+        
+    except Exception as e:
+        logger.error(f"Reminder dispatch failed: {str(e)}")
+        raise
+
+
+@celery_app.task(bind=True)
+def auto_writeoff_task(self, customer_ids: list = None, allow_partial: bool = True, user_id: int = None):
+    """
+    Match payments to open settlements and write them off
+    
+    Scheduled to run nightly before the overdue reminders, so settlements
+    cleared by payments are not reminded.
+    
+    Args:
+        self: Task instance
+        customer_ids: Customers to match (default: all with open settlements and payments)
+        allow_partial: Allocate remaining payment amounts to the oldest settlements
+        user_id: User recorded on the write-offs
+    
+    Returns:
+        Matching totals including the match rate
+    """
+    try:
+        session_factory = DatabaseSessionFactory()
+        
+        def on_progress(processed: int, successful: int, failed: int):
+            report_progress(self, 'PROGRESS', {
+                'current': processed,
+                'status': f'Matched {processed} customers'
+            })
+        
+        result = WriteoffMatcher(
+            session_factory.get_session, allow_partial=allow_partial, created_by=user_id
+        ).run(customer_ids, progress_callback=on_progress)
+        
+        return dict(result, status='completed')
+        
+    except Exception as e:
+        logger.error(f"Auto write-off failed: {str(e)}")
+        raise
+
+
+@celery_app.task(bind=True)
+def rebuild_customer_balances_task(self, repair: bool = True):
+    """
+    Recompute customer balances, report drift and re-age overdue buckets
+    
+    Scheduled after the nightly write-off so the risk engine and dashboard
+    read freshly aged balances.
+    
+    Args:
+        self: Task instance
+        repair: Rewrite the balance rows (False: check drift only)
+    
+    Returns:
+        Drift report
+    """
+    try:
+        session = DatabaseSessionFactory().get_session()
+        try:
+            def on_progress(checked: int):
+                report_progress(self, 'PROGRESS', {
+                    'current': checked,
+                    'status': f'Checked {checked} customers'
+                })
+            
+            report = rebuild_balances(session, repair=repair, progress_callback=on_progress)
+            return dict(report, status='completed')
+        finally:
+            session.close()
+        
+    except Exception as e:
+        logger.error(f"Customer balance rebuild failed: {str(e)}")
+        raise
+
+
+# Moving years of rows out of a table on the first run outlasts the global 1 hour limit
+@celery_app.task(bind=True, time_limit=6 * 3600, soft_time_limit=6 * 3600 - 300)
+def archive_partitions_task(self, targets: dict = None, dry_run: bool = False):
+    """
+    Add upcoming monthly partitions and archive rows past their retention
+    
+    Scheduled monthly. Every table with an archive tier (settlements,
+    access_logs) is processed in turn.
+    
+    Args:
+        self: Task instance
+        targets: Archive target per table name ('table' or 'parquet', default 'table')
+        dry_run: Count the rows to archive without moving them
+    
+    Returns:
+        Archive report per table
+    """
+    try:
+        session = DatabaseSessionFactory().get_session()
+        try:
+            reports = {}
+            for name in ARCHIVED_TABLES:
+                report_progress(self, 'PROGRESS', {'status': f'Archiving {name}'})
+                created = [] if dry_run else ensure_partitions(session, name)
+                report = archive_rows(session, name, target=(targets or {}).get(name, 'table'), dry_run=dry_run)
+                reports[name] = dict(report, created_partitions=created)
+            return {'status': 'completed', 'tables': reports}
+        finally:
+            session.close()
+        
+    except Exception as e:
+        logger.error(f"Archival failed: {str(e)}")
+        raise
@@ -11,9 +11,41 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 
+def pytest_addoption(parser):
+    parser.addoption('--run-benchmarks', action='store_true', default=False,
+                     help='Run wall-clock benchmark tests (marked benchmark)')
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip benchmark tests unless --run-benchmarks is given (timings are noisy on shared runners)"""
+    if config.getoption('--run-benchmarks'):
+        return
+    skip_benchmark = pytest.mark.skip(reason='benchmark: run with --run-benchmarks')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
 # Simple fixture for mock session
 @pytest.fixture
 def mock_session():
     """Mock database session for unit tests"""
     from unittest.mock import Mock
     return Mock()
+
+
+@pytest.fixture
+def sqlite_session():
+    """In-memory SQLite session with the customer table created"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from backend.models.database_models import Base, Customer
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[Customer.__table__])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    yield session
+
+    session.close()
+    engine.dispose()
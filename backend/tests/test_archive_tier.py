@@ -0,0 +1,283 @@
+"""
+Tests for Archive Tier - Story 5.3
+Tests for monthly partitions, archival of settlements and access logs, and the query router
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models.archive_models import (
+    access_logs_archive,
+    reminder_records_archive,
+    settlement_records_archive,
+    settlement_writeoffs_archive
+)
+from backend.models.auth import AccessLog, User
+from backend.models.customer_balance_models import CustomerBalance
+from backend.models.database_models import Base, Customer, SettlementRecord
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.models.reminder_models import ReminderRecord
+from backend.services import archive_tier
+from backend.services.archive_tier import (
+    ArchiveError,
+    add_months,
+    archive_rows,
+    ensure_partitions,
+    invalidate_horizons,
+    partition_definition,
+    partition_month,
+    route,
+    source
+)
+from backend.services.customer_ledger import rebuild_balances, track_balances
+from backend.services.fx_rates import FxRateTable, settlement_totals
+from backend.services.writeoff_matcher import WriteoffMatcher
+
+# Retention of settlements is 24 months: cutoff 2024-10-01
+NOW = datetime(2026, 10, 19, 12, 0)
+OLD = datetime(2023, 5, 10)
+RECENT = datetime(2026, 9, 1)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    """Balance-tracking session factory with the live and archive tables"""
+    monkeypatch.setattr(archive_tier, 'datetime', _FrozenDatetime)
+    invalidate_horizons()
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    track_balances(factory)
+    yield factory
+    invalidate_horizons()
+    engine.dispose()
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return NOW
+
+
+def _settlement(session, customer_id, created_at, amount, status):
+    settlement = SettlementRecord(
+        record_id=f'SET-{customer_id}-{created_at:%Y%m%d}-{status}', customer_id=customer_id, config_id=1,
+        period_start=created_at, period_end=created_at, usage_quantity=Decimal('2'), unit='GB',
+        price_model='fixed', unit_price=Decimal(amount), total_amount=Decimal(amount), currency='CNY',
+        status=status, created_at=created_at
+    )
+    session.add(settlement)
+    session.flush()
+    return settlement
+
+
+def _seed(session):
+    """One customer: old paid (written off, reminded), old open, old cancelled and recent paid settlements"""
+    user = User(username='ops', email='ops@example.com', password_hash='x')
+    customer = Customer(customer_id='cust-1', company_name='Company 1', contact_name='Contact', contact_phone='13800138000')
+    session.add_all([user, customer])
+    session.flush()
+    old_paid = _settlement(session, customer.id, OLD, '100.00', 'paid')
+    old_open = _settlement(session, customer.id, OLD + timedelta(days=1), '40.00', 'approved')
+    _settlement(session, customer.id, OLD + timedelta(days=2), '30.00', 'cancelled')
+    _settlement(session, customer.id, RECENT, '70.00', 'paid')
+    payment = PaymentRecord(
+        payment_no='PAY-1', customer_id=customer.id, payment_amount=Decimal('200.00'),
+        payment_method='bank_transfer', payment_date=OLD
+    )
+    session.add(payment)
+    session.flush()
+    session.add(SettlementWriteoff(
+        writeoff_no='WOF-1', payment_id=payment.id, settlement_id=old_paid.id,
+        writeoff_amount=Decimal('100.00'), writeoff_type='full', writeoff_date=OLD
+    ))
+    session.add(ReminderRecord(
+        reminder_no='REM-1', settlement_id=old_paid.id, customer_id=customer.id, reminder_type='email',
+        recipient='finance@example.com', created_at=OLD
+    ))
+    session.add_all([
+        AccessLog(user_id=user.id, action='view', created_at=datetime(2026, 2, 3)),
+        AccessLog(user_id=user.id, action='export', created_at=datetime(2026, 3, 15)),
+        AccessLog(user_id=user.id, action='login', created_at=RECENT),
+    ])
+    session.commit()
+    return customer.id, old_paid.id, old_open.id
+
+
+def _count(session, table):
+    return session.execute(select(func.count()).select_from(table)).scalar_one()
+
+
+class TestPartitions:
+    """Tests for month arithmetic and partition maintenance"""
+
+    def test_months_and_definitions(self):
+        """Test partitions are named by month and bounded by the next month"""
+        assert add_months(datetime(2026, 11, 1), 2) == datetime(2027, 1, 1)
+        assert add_months(datetime(2026, 1, 1), -13) == datetime(2024, 12, 1)
+        assert partition_month('p202612') == datetime(2026, 12, 1)
+        assert partition_month('p_future') is None
+        assert partition_definition(datetime(2026, 12, 1)) == (
+            "PARTITION p202612 VALUES LESS THAN (TO_DAYS('2027-01-01'))"
+        )
+
+    def test_upcoming_months_are_split_off_the_future_partition(self, monkeypatch):
+        """Test ensure_partitions adds the missing months up to the look-ahead"""
+        statements = []
+
+        class RecordingSession:
+            def execute(self, statement, *args):
+                statements.append(str(statement))
+
+            def commit(self):
+                pass
+
+        monkeypatch.setattr(archive_tier, 'list_partitions', lambda session, table: ['p202609', 'p202610', 'p_future'])
+
+        created = ensure_partitions(RecordingSession(), 'access_logs', as_of=NOW, ahead=2)
+
+        assert created == ['p202611', 'p202612']
+        assert statements == [
+            "ALTER TABLE access_logs REORGANIZE PARTITION p_future INTO ("
+            "PARTITION p202611 VALUES LESS THAN (TO_DAYS('2026-12-01')), "
+            "PARTITION p202612 VALUES LESS THAN (TO_DAYS('2027-01-01')), "
+            "PARTITION p_future VALUES LESS THAN MAXVALUE)"
+        ]
+        assert ensure_partitions(RecordingSession(), 'settlements') == []
+
+
+class TestArchiveRows:
+    """Tests for moving rows to the archive tier"""
+
+    def test_closed_settlements_move_with_their_children(self, session_factory):
+        """Test old closed settlements, their write-offs and reminders are archived; balances are unchanged"""
+        session = session_factory()
+        customer_id, old_paid_id, old_open_id = _seed(session)
+        before = session.get(CustomerBalance, customer_id).to_dict()
+
+        dry_run = archive_rows(session, 'settlements', dry_run=True)
+        report = archive_rows(session, 'settlements', chunk_size=1)
+
+        assert dry_run['rows'] == 2 and _count(session, settlement_records_archive) == 2
+        assert report['rows'] == 2
+        assert report['cutoff'] == '2024-10-01T00:00:00'
+        assert report['children'] == {'settlement_writeoffs': 1, 'reminder_records': 1}
+        assert session.get(SettlementRecord, old_paid_id) is None
+        assert session.get(SettlementRecord, old_open_id) is not None
+        assert _count(session, SettlementWriteoff.__table__) == 0
+        assert _count(session, settlement_writeoffs_archive) == 1
+        assert _count(session, reminder_records_archive) == 1
+
+        # Lifetime totals read the archive too
+        assert rebuild_balances(session, repair=False)['drifted'] == 0
+        after = session.get(CustomerBalance, customer_id).to_dict()
+        assert after['total_billed'] == before['total_billed'] == 210.0
+        assert after['total_written_off'] == before['total_written_off'] == 100.0
+        assert archive_rows(session, 'settlements')['rows'] == 0
+        session.close()
+
+    def test_archived_writeoffs_still_allocate_their_payment(self, session_factory):
+        """Test a payment whose write-offs were archived is not written off again"""
+        session = session_factory()
+        customer_id, _, _ = _seed(session)
+        archive_rows(session, 'settlements')
+        _settlement(session, customer_id, RECENT + timedelta(days=1), '150.00', 'pending')
+        session.commit()
+        session.close()
+
+        WriteoffMatcher(session_factory, max_workers=1).run([customer_id])
+
+        session = session_factory()
+        live = session.execute(select(func.sum(SettlementWriteoff.writeoff_amount))).scalar()
+        archived = session.execute(select(func.sum(settlement_writeoffs_archive.c.writeoff_amount))).scalar()
+        assert (live, archived) == (Decimal('100.00'), Decimal('100.00'))
+        balance = session.get(CustomerBalance, customer_id)
+        assert (balance.total_written_off, balance.unapplied_amount) == (Decimal('200.00'), Decimal('0.00'))
+        assert rebuild_balances(session, repair=False)['drifted'] == 0
+        session.close()
+
+    def test_access_logs_and_targets(self, session_factory):
+        """Test access logs past six months are archived; files are refused for settlements"""
+        session = session_factory()
+        _seed(session)
+
+        report = archive_rows(session, 'access_logs')
+
+        assert report['rows'] == 2 and report['dropped_partitions'] == []
+        assert _count(session, AccessLog.__table__) == 1
+        assert session.execute(select(access_logs_archive.c.action).order_by(access_logs_archive.c.id)).scalars().all() == [
+            'view', 'export'
+        ]
+        with pytest.raises(ArchiveError):
+            archive_rows(session, 'settlements', target='parquet')
+        with pytest.raises(ArchiveError):
+            archive_rows(session, 'access_logs', target='glacier')
+        with pytest.raises(ArchiveError):
+            archive_rows(session, 'invoices')
+        session.close()
+
+    def test_parquet_target_requires_pyarrow(self, session_factory, monkeypatch):
+        """Test a Parquet archive fails with an ArchiveError before moving rows without pyarrow"""
+        monkeypatch.setattr('backend.services.streaming_export.HAS_PYARROW', False)
+        session = session_factory()
+        _seed(session)
+
+        with pytest.raises(ArchiveError, match='pyarrow is required'):
+            archive_rows(session, 'access_logs', target='parquet')
+
+        assert _count(session, AccessLog.__table__) == 3
+        assert _count(session, access_logs_archive) == 0
+        session.close()
+
+
+class TestRouter:
+    """Tests for reading the archive only when a query reaches back that far"""
+
+    def test_route_by_lower_bound(self, session_factory):
+        """Test totals include archived settlements only for ranges reaching the archive"""
+        session = session_factory()
+        _seed(session)
+        archive_rows(session, 'settlements')
+        table = FxRateTable(base_currency='CNY').load(session)
+        recent = select(SettlementRecord.id).where(SettlementRecord.created_at >= RECENT)
+
+        assert settlement_totals(session, SettlementRecord.status == 'paid', table=table)['base_total'] == 170.0
+        assert settlement_totals(
+            session, SettlementRecord.status == 'paid', SettlementRecord.created_at >= datetime(2023, 1, 1),
+            table=table, since=datetime(2023, 1, 1)
+        )['base_total'] == 170.0
+        assert route(session, recent, since=RECENT) is recent
+        assert 'settlement_records_archive' in str(route(session, recent, since=datetime(2023, 1, 1)))
+        session.close()
+
+    def test_source_loads_archived_entities(self, session_factory):
+        """Test entity reads through source return live and archived settlements"""
+        session = session_factory()
+        _seed(session)
+        archive_rows(session, 'settlements')
+
+        settlements = source(session, SettlementRecord, since=datetime(2023, 1, 1))
+        statuses = [
+            row.status for row in session.query(settlements).order_by(settlements.created_at).all()
+        ]
+
+        assert statuses == ['paid', 'approved', 'cancelled', 'paid']
+        assert source(session, SettlementRecord, since=RECENT) is SettlementRecord
+        session.close()
+
+    def test_rows_archived_under_a_shorter_retention_are_routed(self, session_factory, monkeypatch):
+        """Test the archive horizon covers rows newer than the current cutoff"""
+        session = session_factory()
+        _seed(session)
+        archive_rows(session, 'access_logs')
+        monkeypatch.setattr(archive_tier.ARCHIVED_TABLES['access_logs'], 'retention_months', 12)
+        statement = select(func.count(AccessLog.id)).where(AccessLog.created_at >= datetime(2026, 1, 1))
+
+        assert session.execute(route(session, statement, since=datetime(2026, 1, 1))).scalar_one() == 3
+        assert route(session, statement, since=datetime(2026, 5, 1)) is statement
+        session.close()
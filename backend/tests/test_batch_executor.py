@@ -0,0 +1,217 @@
+"""
+Tests for Batch Executor - Story 6.4
+Tests for parallel chunk execution, retries, timeouts, cancellation and backpressure
+"""
+
+import threading
+import time
+
+import pytest
+
+from backend.services.batch_executor import BatchExecutor, BatchExecutorError, run_chunk
+from backend.services.batch_processing_service import BatchProcessingService, BatchTaskStatus
+from backend.services.batch_task_store import MemoryTaskStore
+
+
+def _is_even(item):
+    return item % 2 == 0
+
+
+def _sleep_on_negative(item):
+    if item < 0:
+        time.sleep(5)
+    return True
+
+
+class TestRunChunk:
+    """Tests for single chunk processing"""
+
+    def test_retries_exceptions_with_backoff(self):
+        """Test raising items are retried and falsy results are not"""
+        calls = {'flaky': 0, 'falsy': 0}
+
+        def process(item):
+            calls[item] += 1
+            if item == 'flaky' and calls[item] < 3:
+                raise ConnectionError('transient')
+            return item == 'flaky'
+
+        result = run_chunk(process, ['flaky', 'falsy'], start_index=10, max_retries=3)
+
+        assert result['successful'] == 1
+        assert result['failed'] == 1
+        assert result['retries'] == 2
+        assert calls == {'flaky': 3, 'falsy': 1}
+        assert result['errors'] == [{'index': 11, 'item': 'falsy', 'error': 'Processing failed'}]
+
+    def test_soft_item_timeout(self):
+        """Test a late result from a thread is recorded as a timeout"""
+        def slow(item):
+            time.sleep(0.05)
+            return True
+
+        result = run_chunk(slow, [1], start_index=0, max_retries=3, item_timeout=0.01)
+
+        assert result['failed'] == 1
+        assert result['retries'] == 0
+        assert 'Timed out' in result['errors'][0]['error']
+
+
+class TestBatchExecutor:
+    """Tests for BatchExecutor"""
+
+    def test_invalid_mode(self):
+        """Test unknown pool types are rejected"""
+        with pytest.raises(BatchExecutorError):
+            BatchExecutor(mode='greenlet')
+
+    def test_runs_chunks_concurrently(self):
+        """Test chunks are processed by several workers at once"""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def process(item):
+            with lock:
+                active.append(item)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.remove(item)
+            return True
+
+        result = BatchExecutor(max_workers=4).run(range(40), process, chunk_size=5)
+
+        assert result['successful'] == 40
+        assert result['submitted'] == 40
+        assert max(peak) > 1
+
+    def test_progress_is_aggregated(self):
+        """Test progress callbacks see monotonic, consistent totals"""
+        updates = []
+
+        result = BatchExecutor(max_workers=3).run(
+            range(100), _is_even, chunk_size=10,
+            on_progress=lambda processed, ok, failed: updates.append((processed, ok, failed))
+        )
+
+        # Chunks finishing together are reported in a single update
+        assert 1 <= len(updates) <= 10
+        assert [u[0] for u in updates] == sorted(u[0] for u in updates)
+        assert updates[-1] == (100, 50, 50)
+        assert result['failed'] == 50
+
+    def test_backpressure_limits_items_in_flight(self):
+        """Test a generator is never consumed far ahead of processing"""
+        produced = []
+        processed = []
+        lead = []
+
+        def producer():
+            for i in range(200):
+                produced.append(i)
+                yield i
+
+        def process(item):
+            lead.append(len(produced) - len(processed))
+            processed.append(item)
+            return True
+
+        BatchExecutor(max_workers=2, max_pending_chunks=2).run(producer(), process, chunk_size=10)
+
+        # At most two chunks of 10 are pulled but not yet processed
+        assert max(lead) <= 20
+
+    def test_cancellation_between_chunks(self):
+        """Test queued chunks are dropped after cancellation"""
+        processed = []
+
+        def process(item):
+            processed.append(item)
+            return True
+
+        result = BatchExecutor(max_workers=1).run(
+            range(1000), process, chunk_size=10,
+            should_cancel=lambda: len(processed) >= 30
+        )
+
+        assert result['cancelled'] is True
+        assert result['processed'] < 1000
+        assert len(processed) < 1000
+
+    def test_task_timeout(self):
+        """Test the run stops waiting at the task deadline"""
+        def process(item):
+            time.sleep(0.2)
+            return True
+
+        started = time.monotonic()
+        result = BatchExecutor(max_workers=1, timeout=0.1).run(range(50), process, chunk_size=5)
+
+        assert result['timed_out'] is True
+        assert result['processed'] < 50
+        assert time.monotonic() - started < 1
+
+    def test_process_pool_with_hard_item_timeout(self):
+        """Test process workers interrupt overrunning items"""
+        executor = BatchExecutor(max_workers=2, mode='process', item_timeout=0.2, max_retries=1)
+
+        started = time.monotonic()
+        result = executor.run([1, -1, 2, 3], _sleep_on_negative, chunk_size=2)
+
+        assert result['successful'] == 3
+        assert result['errors'][0]['index'] == 1
+        assert 'Timed out' in result['errors'][0]['error']
+        assert time.monotonic() - started < 5
+
+
+class TestProcessBatchWithExecutor:
+    """Tests for BatchProcessingService.process_batch"""
+
+    def test_process_batch_honours_service_settings(self):
+        """Test process_batch runs in parallel, retries and completes the task"""
+        service = BatchProcessingService(max_workers=4, max_retries=2, retry_backoff=0, store=MemoryTaskStore())
+        task = service.create_task('process', 1, total_records=60)
+        attempts = {}
+        lock = threading.Lock()
+
+        def process(item):
+            with lock:
+                attempts[item] = attempts.get(item, 0) + 1
+                first_attempt = attempts[item] == 1
+            if item % 10 == 0 and first_attempt:
+                raise RuntimeError('transient')
+            return True
+
+        result = service.process_batch(task, list(range(60)), process, batch_size=7)
+
+        assert result['successful'] == 60
+        assert result['retries'] == 6
+        assert task.status == BatchTaskStatus.COMPLETED
+        assert service.get_task(task.id).processed_records == 60
+
+    def test_process_batch_cancelled_by_other_worker(self):
+        """Test a cancellation written to the store stops processing"""
+        service = BatchProcessingService(max_workers=1, store=MemoryTaskStore())
+        task = service.create_task('process', 1, total_records=500)
+
+        def process(item):
+            if item == 20:
+                service.cancel_task(task.id, user_id=1)
+            return True
+
+        result = service.process_batch(task, list(range(500)), process, batch_size=10)
+
+        assert result['cancelled'] is True
+        assert result['successful'] < 500
+        assert service.get_task(task.id).status == BatchTaskStatus.CANCELLED
+
+    def test_process_batch_timeout_fails_task(self):
+        """Test the service timeout fails the task"""
+        service = BatchProcessingService(max_workers=1, timeout=0.1, store=MemoryTaskStore())
+        task = service.create_task('process', 1, total_records=20)
+
+        result = service.process_batch(task, range(20), lambda item: time.sleep(0.1) or True, batch_size=2)
+
+        assert result['timed_out'] is True
+        assert service.get_task(task.id).status == BatchTaskStatus.FAILED
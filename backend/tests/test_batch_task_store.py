@@ -0,0 +1,241 @@
+"""
+Tests for Batch Task Store - Story 6.4
+Tests for the shared, durable batch task store backends
+"""
+
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.services.batch_processing_service import BatchProcessingService, BatchTask, BatchTaskStatus
+from backend.services.batch_task_store import (
+    BatchTaskStoreError,
+    MemoryTaskStore,
+    RedisTaskStore,
+    SQLTaskStore,
+    compute_progress,
+    create_task_store
+)
+
+
+def _sql_store():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from backend.models.database_models import Base
+    from backend.models.batch_task_models import BatchTaskRecord
+
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[BatchTaskRecord.__table__])
+    return SQLTaskStore(session_factory=sessionmaker(bind=engine))
+
+
+def _redis_store():
+    import redis
+    client = redis.Redis.from_url('redis://localhost:6379/15', decode_responses=True)
+    try:
+        client.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip('Redis server not available')
+    client.flushdb()
+    return RedisTaskStore(client=client, prefix=f'test:{uuid.uuid4().hex}')
+
+
+@pytest.fixture(params=['memory', 'sql', 'redis'])
+def store(request):
+    if request.param == 'memory':
+        return MemoryTaskStore()
+    if request.param == 'sql':
+        return _sql_store()
+    return _redis_store()
+
+
+def _task(store, user_id=1, total=0, created_at=None):
+    task = BatchTask('import', user_id, total, store=store)
+    if created_at:
+        task.created_at = created_at
+    store.create(task.to_record())
+    return task
+
+
+class TestTaskStoreBackends:
+    """Behaviour shared by all store backends"""
+
+    def test_create_and_get(self, store):
+        """Test a created task round-trips through the store"""
+        task = _task(store, user_id=7, total=10)
+
+        record = store.get(task.id)
+
+        assert record['user_id'] == 7
+        assert record['status'] == 'pending'
+        assert record['cancelled'] is False
+        assert record['created_at'].replace(microsecond=0) == task.created_at.replace(microsecond=0)
+        assert store.get('missing') is None
+
+    def test_update_progress_is_computed_from_stored_total(self, store):
+        """Test progress is recomputed against the stored total"""
+        task = _task(store, total=3)
+
+        record = store.update_progress(task.id, 1, successful=1)
+
+        assert record['progress'] == 33
+        assert record['processed_records'] == 1
+        assert record['successful_records'] == 1
+        assert store.update_progress(task.id, 5)['progress'] == 100
+        assert store.update_progress('missing', 1) is None
+
+    def test_conditional_update(self, store):
+        """Test status transitions only apply from the expected statuses"""
+        task = _task(store)
+        done = {'status': 'completed', 'completed_at': datetime.utcnow()}
+
+        assert store.update(task.id, done, expected_statuses=('pending', 'processing'))['status'] == 'completed'
+        assert store.update(task.id, {'status': 'cancelled'}, expected_statuses=('pending', 'processing')) is None
+        assert store.get(task.id)['status'] == 'completed'
+
+    def test_list_by_user_and_status(self, store):
+        """Test indexed listing, newest first"""
+        now = datetime.utcnow()
+        first = _task(store, user_id=1, created_at=now - timedelta(minutes=2))
+        second = _task(store, user_id=1, created_at=now - timedelta(minutes=1))
+        other = _task(store, user_id=2, created_at=now)
+        store.update(second.id, {'status': 'processing'})
+
+        assert [r['id'] for r in store.list(user_id=1)] == [second.id, first.id]
+        assert [r['id'] for r in store.list(user_id=1, status='pending')] == [first.id]
+        assert [r['id'] for r in store.list(status='pending')] == [other.id, first.id]
+        assert [r['id'] for r in store.list(limit=1)] == [other.id]
+        assert store.count_by_status(user_id=1) == {'pending': 1, 'processing': 1}
+
+    def test_cleanup_removes_only_expired_finished_tasks(self, store):
+        """Test TTL cleanup keeps active and recently finished tasks"""
+        old = _task(store)
+        recent = _task(store)
+        active = _task(store)
+        store.update(old.id, {'status': 'completed', 'completed_at': datetime.utcnow() - timedelta(days=10)})
+        store.update(recent.id, {'status': 'failed', 'completed_at': datetime.utcnow()})
+
+        assert store.cleanup(max_age_seconds=7 * 24 * 3600) == 1
+        assert store.get(old.id) is None
+        assert store.get(recent.id) is not None
+        assert store.get(active.id) is not None
+        assert [r['id'] for r in store.list(status='completed')] == []
+
+
+class TestMemoryTaskStore:
+    """Memory backend specifics"""
+
+    def test_duplicate_ids_rejected(self):
+        """Test creating the same task twice fails"""
+        store = MemoryTaskStore()
+        task = _task(store)
+
+        with pytest.raises(BatchTaskStoreError):
+            store.create(task.to_record())
+
+    def test_concurrent_progress_updates(self):
+        """Test concurrent updates leave consistent counters"""
+        store = MemoryTaskStore()
+        task = _task(store, total=800)
+
+        def worker(offset):
+            for i in range(100):
+                store.update_progress(task.id, offset + i + 1)
+
+        threads = [threading.Thread(target=worker, args=(n * 100,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        record = store.get(task.id)
+        assert record['progress'] == compute_progress(record['processed_records'], 800)
+
+
+class TestTaskStoreFactory:
+    """Tests for create_task_store"""
+
+    def test_backends(self):
+        """Test backend selection"""
+        assert isinstance(create_task_store('memory'), MemoryTaskStore)
+        assert isinstance(create_task_store('sql', session_factory=lambda: None), SQLTaskStore)
+        with pytest.raises(BatchTaskStoreError):
+            create_task_store('mongo')
+
+
+class TestServiceWithSharedStore:
+    """Two service instances (workers) sharing one store"""
+
+    def test_tasks_visible_across_workers(self):
+        """Test a task created by one worker is listed, updated and cancelled by another"""
+        store = _sql_store()
+        api_worker = BatchProcessingService(store=store)
+        celery_worker = BatchProcessingService(store=store)
+
+        task = celery_worker.create_task('import', 5, total_records=4)
+        task.start()
+        task.update_progress(2, successful=2)
+
+        listed = api_worker.list_tasks(user_id=5)
+        assert [t.id for t in listed] == [task.id]
+        assert listed[0].progress == 50
+        assert listed[0].status == BatchTaskStatus.PROCESSING
+
+        assert api_worker.cancel_task(task.id, user_id=5)
+        assert task.is_cancelled()
+        assert not api_worker.cancel_task(task.id, user_id=5)
+        assert api_worker.count_tasks_by_status(user_id=5) == {'cancelled': 1}
+
+    def test_cancel_loses_against_completion(self):
+        """Test a task completed by a worker cannot be cancelled afterwards"""
+        service = BatchProcessingService(store=MemoryTaskStore())
+        task = service.create_task('export', 1)
+        stale = service.get_task(task.id)
+
+        task.complete('/downloads/x.xlsx')
+
+        assert not stale.cancel()
+        assert stale.status == BatchTaskStatus.COMPLETED
+
+    def test_completion_loses_against_cancel(self):
+        """Test a worker finishing a task cancelled elsewhere keeps it cancelled"""
+        store = MemoryTaskStore()
+        service = BatchProcessingService(store=store)
+        task = service.create_task('import', 1, total_records=2)
+        task.start()
+
+        assert service.cancel_task(task.id, user_id=1)
+
+        assert not task.complete()
+        assert not task.fail('boom')
+        assert task.status == BatchTaskStatus.CANCELLED
+        assert store.get(task.id)['error_message'] is None
+
+    def test_progress_writes_are_throttled(self):
+        """Test per-item progress reaches the store at most once per interval, plus the last item"""
+        store = MemoryTaskStore()
+        writes = []
+        update_progress = store.update_progress
+        store.update_progress = lambda *args: writes.append(args) or update_progress(*args)
+        task = BatchProcessingService(store=store).create_task('import', 1, total_records=1000)
+        task.start()
+
+        for processed in range(1, 1001):
+            task.update_progress(processed, successful=processed)
+
+        assert 2 <= len(writes) < 10
+        assert writes[-1][1] == 1000
+        assert task.complete()
+        assert store.get(task.id)['processed_records'] == 1000
+
+    def test_cleanup_expired_tasks(self):
+        """Test the service cleans up through the store"""
+        service = BatchProcessingService(store=MemoryTaskStore(ttl=0))
+        service.create_task('import', 1).complete()
+        service.create_task('import', 1)
+
+        assert service.cleanup_expired_tasks() == 1
+        assert len(service.list_tasks(user_id=1)) == 1
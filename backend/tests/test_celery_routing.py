@@ -0,0 +1,80 @@
+"""
+Tests for Celery Routing - Story 7.5
+Tests for the queue topology, routing consistency check and worker profiles
+"""
+
+import pytest
+from celery import Celery
+
+import backend.tasks  # noqa: F401  (registers the tasks)
+from backend.celery_app import (
+    PRIORITY_HIGH,
+    QUEUES,
+    WORKER_PROFILES,
+    CeleryConfigError,
+    celery_app,
+    check_task_routes,
+    route_for,
+    worker_argv
+)
+
+
+class TestTaskRoutes:
+    """Tests for the routing table"""
+
+    def test_every_registered_task_is_routed(self):
+        """Test the consistency check passes for the real application"""
+        check_task_routes(celery_app)
+
+    def test_router_sends_tasks_to_their_queues(self):
+        """Test Celery's router resolves the configured queues and priorities"""
+        router = celery_app.amqp.router
+
+        notification = router.route({}, 'backend.tasks.send_email_notification')
+        export = router.route({}, 'backend.tasks.export_dataset_task')
+
+        assert notification['queue'].name == 'notifications'
+        assert notification['priority'] == PRIORITY_HIGH
+        assert export['queue'].name == 'exports'
+
+    def test_pattern_routes(self):
+        """Test future settlement tasks are routed by pattern"""
+        assert route_for('backend.tasks.run_monthly_settlement_task')['queue'] == 'settlements'
+        assert route_for('backend.tasks.unknown') == {}
+
+    def test_unrouted_task_and_stale_beat_entry_are_reported(self):
+        """Test the check lists every routing problem"""
+        app = Celery('routing-test')
+        app.conf.beat_schedule = {'nightly': {'task': 'backend.tasks.missing', 'schedule': 60}}
+
+        @app.task(name='backend.tasks.orphan_task')
+        def orphan_task():
+            pass
+
+        with pytest.raises(CeleryConfigError) as exc_info:
+            check_task_routes(app)
+
+        assert 'backend.tasks.orphan_task has no route' in str(exc_info.value)
+        assert 'beat entry nightly' in str(exc_info.value)
+
+
+class TestWorkerProfiles:
+    """Tests for worker profiles"""
+
+    def test_profiles_consume_known_queues(self):
+        """Test every queue is consumed by a dedicated profile"""
+        for settings in WORKER_PROFILES.values():
+            assert set(settings['queues']) <= set(QUEUES)
+        dedicated = {queue for name, s in WORKER_PROFILES.items() if name != 'all' for queue in s['queues']}
+        assert dedicated == set(QUEUES)
+
+    def test_worker_argv(self):
+        """Test profile settings become worker options"""
+        argv = worker_argv('exports')
+
+        assert '--queues=exports' in argv
+        assert '--prefetch-multiplier=1' in argv
+        assert '--autoscale=2,1' in argv
+        assert '--concurrency=1' in worker_argv('maintenance')
+        with pytest.raises(CeleryConfigError):
+            worker_argv('gpu')
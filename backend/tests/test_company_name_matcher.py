@@ -0,0 +1,237 @@
+"""
+Tests for Company Name Matcher - Story 6.1
+Tests for normalized n-gram company name index
+"""
+
+import threading
+import time
+
+import pytest
+from unittest.mock import patch
+
+from backend.models.database_models import Customer
+from backend.services.company_name_matcher import (
+    CompanyNameIndex,
+    name_similarity,
+    normalize_company_name
+)
+from backend.services.data_validation_service import DataValidationService
+from backend.services.duplicate_resolver import BulkDuplicateResolver
+
+
+def _customer(customer_id, company_name):
+    return Customer(customer_id=customer_id, company_name=company_name,
+                    contact_name='Contact', contact_phone='13800138000')
+
+
+class TestNormalizeCompanyName:
+    """Tests for normalize_company_name"""
+
+    @pytest.mark.parametrize('raw, expected', [
+        ('华为技术有限公司', '华为技术'),
+        ('华为技术股份有限公司', '华为技术'),
+        ('阿里巴巴（中国）网络技术有限公司', '阿里巴巴中国网络技术'),
+        ('ＡＢＣ科技　股份', 'abc科技'),
+        ('Acme Trading Co., Ltd.', 'acmetrading'),
+        ('ACME TRADING LIMITED', 'acmetrading'),
+        ('有限公司', '有限公司'),
+        ('', ''),
+        (None, ''),
+    ])
+    def test_normalize(self, raw, expected):
+        """Test suffixes, width and punctuation are normalized"""
+        assert normalize_company_name(raw) == expected
+
+    def test_similarity(self):
+        """Test equal normalized names score 1.0 and unrelated names score low"""
+        assert name_similarity('华为技术有限公司', '华为技术股份有限公司') == 1.0
+        assert name_similarity('Acme Trading Co., Ltd.', 'Acme Tradng Ltd') > 0.7
+        assert name_similarity('Acme Trading', '腾讯科技') == 0.0
+
+
+class TestCompanyNameIndex:
+    """Tests for CompanyNameIndex"""
+
+    def test_search_ranks_near_duplicates(self):
+        """Test the closest names are returned first"""
+        index = CompanyNameIndex()
+        index.add(1, '北京华为技术有限公司')
+        index.add(2, '华为技术有限公司')
+        index.add(3, '腾讯科技有限公司')
+
+        matches = index.search('华为技术股份有限公司', min_score=0.6)
+
+        assert [key for key, _ in matches] == [2, 1]
+        assert matches[0][1] == 1.0
+
+    def test_incremental_update_and_remove(self):
+        """Test renamed and removed customers are re-indexed"""
+        index = CompanyNameIndex()
+        index.add(1, 'Acme Trading Ltd')
+        index.update(1, 'Globex Corporation')
+
+        assert index.search('Acme Trading') == []
+        assert index.search('Globex Corp')[0][0] == 1
+
+        index.remove(1)
+        assert len(index) == 0
+        assert index.search('Globex') == []
+        assert index.stats()['grams'] == 0
+
+    def test_exclude_keys(self):
+        """Test excluded keys are not returned"""
+        index = CompanyNameIndex()
+        index.add(1, 'Acme Trading')
+        index.add(2, 'Acme Trading Ltd')
+
+        assert [key for key, _ in index.search('Acme Trading', exclude=[1])] == [2]
+
+    def test_save_and_load(self, tmp_path):
+        """Test the index round-trips through disk"""
+        index = CompanyNameIndex()
+        index.add(1, '华为技术有限公司')
+        index.add(2, 'Acme Trading Ltd')
+        path = index.save(str(tmp_path / 'index' / 'names.pkl'))
+
+        loaded = CompanyNameIndex()
+        assert loaded.load(path)
+        assert loaded.is_ready
+        assert len(loaded) == 2
+        assert loaded.search('华为技术')[0][0] == 1
+        loaded.remove(2)
+        assert loaded.search('Acme Trading') == []
+
+    def test_concurrent_saves_publish_a_whole_index(self, tmp_path):
+        """Test writers saving the same path use their own temp files"""
+        path = str(tmp_path / 'names.pkl')
+        indexes = []
+        for size in (200, 300):
+            index = CompanyNameIndex()
+            for key in range(size):
+                index.add(key, f'Company {key} Trading')
+            indexes.append(index)
+
+        errors = []
+
+        def save(index):
+            try:
+                index.save(path)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save, args=(index,)) for index in indexes * 5]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        loaded = CompanyNameIndex()
+        assert loaded.load(path)
+        assert len(loaded) in (200, 300)
+        assert [entry.name for entry in tmp_path.iterdir()] == ['names.pkl']
+
+    def test_load_missing_file(self, tmp_path):
+        """Test loading a missing snapshot leaves the index not ready"""
+        index = CompanyNameIndex()
+
+        assert not index.load(str(tmp_path / 'missing.pkl'))
+        assert not index.is_ready
+
+    def test_warm_start_builds_and_saves(self, sqlite_session, tmp_path):
+        """Test warm start builds from the database when no snapshot exists"""
+        sqlite_session.add_all([_customer('c1', 'Acme Trading Ltd'), _customer('c2', '华为技术有限公司')])
+        sqlite_session.commit()
+        path = str(tmp_path / 'names.pkl')
+
+        index = CompanyNameIndex()
+        assert index.warm_start(lambda: sqlite_session, path)
+
+        assert len(index) == 2
+        assert CompanyNameIndex().load(path)
+
+    def test_warm_start_catches_up_with_snapshot(self, sqlite_session, tmp_path):
+        """Test customers created or renamed after the snapshot are indexed on load"""
+        sqlite_session.add_all([_customer('c1', 'Acme Trading Ltd'), _customer('c2', '华为技术有限公司')])
+        sqlite_session.commit()
+        path = str(tmp_path / 'names.pkl')
+        CompanyNameIndex().warm_start(lambda: sqlite_session, path)
+
+        # Written by another worker after the snapshot was saved
+        created = _customer('c3', '腾讯科技有限公司')
+        sqlite_session.add(created)
+        renamed = sqlite_session.query(Customer).filter_by(customer_id='c1').one()
+        renamed.company_name = 'Globex Industries Ltd'
+        sqlite_session.commit()
+        created_pk, renamed_pk = created.id, renamed.id
+
+        index = CompanyNameIndex()
+        assert index.warm_start(lambda: sqlite_session, path)
+
+        assert index.synced_id == created_pk
+        assert index.search('腾讯科技')[0][0] == created_pk
+        assert index.search('Globex Industries')[0][0] == renamed_pk
+        assert index.search('Acme Trading') == []
+        reloaded = CompanyNameIndex()
+        assert reloaded.load(path) and reloaded.synced_id == created_pk
+
+
+class TestIndexedDuplicateDetection:
+    """Tests for duplicate detection backed by the index"""
+
+    @pytest.fixture
+    def indexed_session(self, sqlite_session):
+        sqlite_session.add_all([
+            _customer('c1', 'Acme Trading Co., Ltd.'),
+            _customer('c2', '华为技术有限公司'),
+            _customer('c3', 'Acme Logistics'),
+        ])
+        sqlite_session.commit()
+        index = CompanyNameIndex()
+        index.build_from_session(sqlite_session)
+        return sqlite_session, index
+
+    def test_resolver_uses_index(self, indexed_session):
+        """Test fuzzy candidates come from the index when it is ready"""
+        session, index = indexed_session
+        resolver = BulkDuplicateResolver(session, name_index=index)
+        rows = [{'company_name': 'ACME Trading Limited'}, {'company_name': '华为技术股份有限公司'}]
+        resolver.prefetch(rows)
+
+        acme = resolver.match(rows[0])
+        huawei = resolver.match(rows[1])
+
+        assert [d['company_name'] for d in acme] == ['Acme Trading Co., Ltd.']
+        assert acme[0]['match_type'] == 'fuzzy'
+        assert acme[0]['similarity'] == 1.0
+        assert [d['company_name'] for d in huawei] == ['华为技术有限公司']
+
+    def test_check_duplicates_uses_index(self, indexed_session):
+        """Test check_duplicates and the resolver agree when the index is ready"""
+        session, index = indexed_session
+        row = {'company_name': 'Acme Trading Ltd'}
+        resolver = BulkDuplicateResolver(session, name_index=index)
+        resolver.prefetch([row])
+
+        with patch('backend.services.data_validation_service.company_name_index', index):
+            expected = DataValidationService().check_duplicates(dict(row), session)
+
+        assert resolver.match(row) == expected
+
+
+@pytest.mark.slow
+class TestCompanyNameIndexScale:
+    """Lookup latency on a larger index"""
+
+    def test_search_latency(self):
+        """Test lookups stay fast with many indexed names"""
+        index = CompanyNameIndex()
+        for i in range(50000):
+            index.add(i, f'Company {i:06d} Trading Co., Ltd.')
+
+        started = time.perf_counter()
+        for i in range(0, 50000, 500):
+            assert index.search(f'Company {i:06d} Trading')[0][0] == i
+        elapsed = time.perf_counter() - started
+
+        assert elapsed / 100 < 0.05
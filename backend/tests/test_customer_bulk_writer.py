@@ -0,0 +1,197 @@
+"""
+Tests for Customer Bulk Writer - Story 6.2
+Tests for batched customer insert/upsert/update
+"""
+
+import time
+import uuid
+
+import pytest
+
+from backend.models.database_models import Customer
+from backend.services.customer_bulk_writer import (
+    BulkWriteError,
+    CustomerBulkWriter,
+    build_customer_values
+)
+from backend.services.customer_import_pipeline import CustomerImportPipeline
+
+
+def _row(i, **overrides):
+    row = {
+        'company_name': f'Company {i}',
+        'contact_name': f'Contact {i}',
+        'contact_phone': '13800138000'
+    }
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture
+def existing_customer(sqlite_session):
+    customer = Customer(customer_id='existing', company_name='Existing Co', contact_name='Old',
+                        contact_phone='13800138000', credit_code='91110000AAAAAAAAAA', city='Beijing')
+    sqlite_session.add(customer)
+    sqlite_session.commit()
+    return customer
+
+
+class TestBuildCustomerValues:
+    """Tests for build_customer_values"""
+
+    def test_applies_defaults_and_uuid(self):
+        """Test import defaults and pre-generated UUIDs"""
+        values = build_customer_values(_row(1), customer_id='abc')
+
+        assert values['customer_id'] == 'abc'
+        assert values['customer_type'] == 'enterprise'
+        assert values['status'] == 'active'
+        assert values['level'] == 'standard'
+        assert values['source'] == 'direct'
+        assert values['created_at'] == values['updated_at']
+
+
+class TestCustomerBulkWriter:
+    """Tests for CustomerBulkWriter"""
+
+    def test_insert_maps_rows_to_ids(self, sqlite_session):
+        """Test inserted rows are mapped back to their source row numbers"""
+        writer = CustomerBulkWriter(sqlite_session, batch_size=2)
+
+        outcomes = writer.insert_rows([(i, _row(i)) for i in range(10, 15)])
+        sqlite_session.commit()
+
+        assert writer.statement_count == 3
+        assert {o['action'] for o in outcomes.values()} == {'imported'}
+        for row_number, outcome in outcomes.items():
+            assert sqlite_session.get(Customer, outcome['customer_id']).company_name == f'Company {row_number}'
+
+    def test_invalid_conflict_mode(self, sqlite_session):
+        """Test unknown conflict modes are rejected"""
+        with pytest.raises(BulkWriteError):
+            CustomerBulkWriter(sqlite_session).insert_rows([(1, _row(1))], on_conflict='merge')
+
+    def test_insert_ignore_conflict(self, sqlite_session, existing_customer):
+        """Test conflicting rows are skipped in ignore mode"""
+        outcomes = CustomerBulkWriter(sqlite_session).insert_rows(
+            [(1, _row(1, credit_code='91110000AAAAAAAAAA')), (2, _row(2))],
+            on_conflict='ignore'
+        )
+
+        assert outcomes[1] == {
+            'row': 1, 'action': 'skipped', 'customer_id': existing_customer.id, 'match_fields': ['credit_code']
+        }
+        assert outcomes[2]['action'] == 'imported'
+        assert sqlite_session.query(Customer).count() == 2
+
+    def test_insert_update_conflict_keeps_existing_values(self, sqlite_session, existing_customer):
+        """Test upsert overwrites only non-empty incoming values"""
+        outcomes = CustomerBulkWriter(sqlite_session).insert_rows(
+            [(1, _row(1, credit_code='91110000AAAAAAAAAA'))],
+            on_conflict='update'
+        )
+        sqlite_session.commit()
+        sqlite_session.refresh(existing_customer)
+
+        assert outcomes[1]['action'] == 'updated'
+        assert outcomes[1]['match_fields'] == ['credit_code']
+        assert existing_customer.contact_name == 'Contact 1'
+        assert existing_customer.city == 'Beijing'
+        assert existing_customer.customer_id == 'existing'
+
+    def test_insert_error_mode_fails_only_conflicting_rows(self, sqlite_session, existing_customer):
+        """Test a failing batch is retried row by row"""
+        writer = CustomerBulkWriter(sqlite_session)
+
+        outcomes = writer.insert_rows(
+            [(1, _row(1)), (2, _row(2, credit_code='91110000AAAAAAAAAA')), (3, _row(3))],
+            on_conflict='error'
+        )
+
+        assert outcomes[1]['action'] == 'imported'
+        assert outcomes[2]['action'] == 'failed'
+        assert 'UNIQUE' in outcomes[2]['error']
+        assert outcomes[3]['action'] == 'imported'
+        assert sqlite_session.query(Customer).count() == 3
+
+    def test_update_rows_merges_in_row_order(self, sqlite_session, existing_customer):
+        """Test several rows updating one customer are merged, later rows win"""
+        outcomes = CustomerBulkWriter(sqlite_session).update_rows([
+            (1, existing_customer.id, {'contact_name': 'First', 'province': 'Hebei', 'city': None}),
+            (2, existing_customer.id, {'contact_name': 'Second', 'unknown_column': 'x'}),
+        ])
+        sqlite_session.commit()
+        sqlite_session.refresh(existing_customer)
+
+        assert [o['action'] for o in outcomes.values()] == ['updated', 'updated']
+        assert existing_customer.contact_name == 'Second'
+        assert existing_customer.province == 'Hebei'
+        assert existing_customer.city == 'Beijing'
+
+
+class TestPipelineBulkWrites:
+    """Tests for import modes on top of the bulk writer"""
+
+    def test_update_mode_folds_in_file_duplicates(self, sqlite_session):
+        """Test a repeated row updates the customer created earlier in the chunk"""
+        rows = [_row(1, city='Shanghai'), _row(1, contact_name='Later', city=None)]
+
+        result = CustomerImportPipeline(sqlite_session, import_mode='update_duplicates').run(iter(rows))
+
+        customer = sqlite_session.query(Customer).one()
+        assert result['imported'] == 1
+        assert result['updated'] == 1
+        assert customer.contact_name == 'Later'
+        assert customer.city == 'Shanghai'
+
+    def test_create_all_reports_unique_violations(self, sqlite_session, existing_customer):
+        """Test create_all inserts duplicates by name but fails on unique keys"""
+        rows = [_row(1, company_name='Existing Co'), _row(2, credit_code='91110000AAAAAAAAAA')]
+
+        result = CustomerImportPipeline(sqlite_session, import_mode='create_all').run(iter(rows))
+
+        assert result['imported'] == 1
+        assert result['failed'] == 1 and result['skipped'] == 0
+        assert result['errors'][0]['row'] == 2
+        assert result['errors'][0]['action'] == 'failed'
+
+
+@pytest.mark.slow
+class TestBulkWriterThroughput:
+    """Throughput comparison against the per-row commit loop"""
+
+    ROWS = 2000
+
+    def _legacy_loop(self, session, rows):
+        """Per-row add + commit, as the original import endpoint did"""
+        for row in rows:
+            session.add(Customer(**build_customer_values(row)))
+            session.commit()
+
+    def test_bulk_insert_is_faster_than_row_loop(self, tmp_path):
+        """Test bulk insert throughput against per-row commits on a file database"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from backend.models.database_models import Base
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'bench.db'}")
+        Base.metadata.create_all(engine, tables=[Customer.__table__])
+        session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+        try:
+            legacy_rows = [_row(i, credit_code=uuid.uuid4().hex[:18].upper()) for i in range(self.ROWS)]
+            started = time.perf_counter()
+            self._legacy_loop(session, legacy_rows)
+            legacy_seconds = time.perf_counter() - started
+
+            bulk_rows = [(i, _row(i, credit_code=uuid.uuid4().hex[:18].upper())) for i in range(self.ROWS)]
+            started = time.perf_counter()
+            outcomes = CustomerBulkWriter(session).insert_rows(bulk_rows, on_conflict='ignore')
+            session.commit()
+            bulk_seconds = time.perf_counter() - started
+
+            assert sum(1 for o in outcomes.values() if o['action'] == 'imported') == self.ROWS
+            assert legacy_seconds / bulk_seconds > 10
+        finally:
+            session.close()
+            engine.dispose()
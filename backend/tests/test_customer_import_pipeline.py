@@ -0,0 +1,333 @@
+"""
+Tests for Customer Import Pipeline - Story 6.2
+Tests for streaming, chunked customer import
+"""
+
+import os
+import pytest
+from unittest.mock import Mock, patch
+
+from backend.models.database_models import Customer
+from backend.models.import_checkpoint_models import ImportCheckpoint
+from backend.services.customer_import_pipeline import (
+    CustomerImportPipeline,
+    ImportPipelineError,
+    MultipartUploadSpooler,
+    estimate_row_count,
+    iter_chunks,
+    iter_file_rows,
+    load_checkpoint,
+    purge_checkpoints,
+    spool_bytes
+)
+from backend.services.duplicate_resolver import BulkDuplicateResolver
+
+
+HEADER = 'company_name,contact_name,contact_phone,credit_code,level\n'
+
+
+def _row(i, **overrides):
+    row = {
+        'company_name': f'Company {i}',
+        'contact_name': f'Contact {i}',
+        'contact_phone': '13800138000'
+    }
+    row.update(overrides)
+    return row
+
+
+class TestRowIteration:
+    """Tests for spooling and row iteration"""
+
+    def test_spool_and_iterate_csv(self, tmp_path):
+        """Test CSV rows are streamed and cleaned"""
+        content = (HEADER + 'Acme , Zhang,13800138000,,vip\n,,,,\nBeta,Li,13900139000,,\n').encode('utf-8')
+        path = spool_bytes(content, 'customers.csv', spool_dir=str(tmp_path))
+
+        rows = list(iter_file_rows(path))
+
+        assert len(rows) == 2  # Blank row skipped
+        assert rows[0]['company_name'] == 'Acme'
+        assert rows[0]['credit_code'] is None
+        assert rows[1]['level'] is None
+        assert estimate_row_count(path) == 3
+
+    def test_iterate_excel_read_only(self, tmp_path):
+        """Test Excel rows are streamed from a read-only workbook"""
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['company_name', 'contact_name', 'contact_phone'])
+        ws.append(['Acme', 'Zhang', '13800138000'])
+        ws.append(['Beta', 'Li', '13900139000'])
+        path = str(tmp_path / 'customers.xlsx')
+        wb.save(path)
+
+        rows = list(iter_file_rows(path))
+
+        assert [r['company_name'] for r in rows] == ['Acme', 'Beta']
+        assert estimate_row_count(path) == 2
+
+    def test_spool_rejects_unsupported_extension(self, tmp_path):
+        """Test unsupported file types are rejected"""
+        with pytest.raises(ImportPipelineError):
+            spool_bytes(b'data', 'customers.pdf', spool_dir=str(tmp_path))
+
+    def test_multipart_spooler_streams_file_part(self, tmp_path):
+        """Test multipart upload is written to disk chunk by chunk"""
+        boundary = 'XBOUNDARYX'
+        body = (
+            f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="import_mode"\r\n\r\n'
+            'update_duplicates\r\n'
+            f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="file"; filename="c.csv"\r\n'
+            'Content-Type: text/csv\r\n\r\n'
+            + HEADER + 'Acme,Zhang,13800138000,,\r\n'
+            f'--{boundary}--\r\n'
+        ).encode('utf-8')
+
+        spooler = MultipartUploadSpooler(f'multipart/form-data; boundary={boundary}', spool_dir=str(tmp_path))
+        for i in range(0, len(body), 7):
+            spooler.feed(body[i:i + 7])
+        path = spooler.finalize()
+
+        assert spooler.fields == {'import_mode': 'update_duplicates'}
+        assert spooler.file_name == 'c.csv'
+        assert os.path.exists(path)
+        assert [r['company_name'] for r in iter_file_rows(path, spooler.file_name)] == ['Acme']
+
+    def test_iter_chunks(self):
+        """Test chunking keeps 1-based row numbers"""
+        chunks = list(iter_chunks(iter([{'a': i} for i in range(5)]), 2))
+
+        assert [len(c) for c in chunks] == [2, 2, 1]
+        assert chunks[2][0][0] == 5
+
+
+class TestCustomerImportPipeline:
+    """Tests for CustomerImportPipeline"""
+
+    def test_invalid_import_mode(self, mock_session):
+        """Test invalid import mode is rejected"""
+        with pytest.raises(ImportPipelineError):
+            CustomerImportPipeline(mock_session, import_mode='bogus')
+
+    def test_run_imports_in_chunks(self, sqlite_session):
+        """Test rows are committed chunk by chunk with progress reports"""
+        progress_reports = []
+        pipeline = CustomerImportPipeline(sqlite_session, chunk_size=2, progress_callback=progress_reports.append)
+
+        result = pipeline.run(iter([_row(i) for i in range(5)]), total_estimate=5)
+
+        assert result['imported'] == 5
+        assert result['chunks'] == 3
+        assert sqlite_session.query(Customer).count() == 5
+        assert [p['processed'] for p in progress_reports] == [2, 4, 5]
+        assert progress_reports[-1]['progress'] == 100
+
+    def test_run_skips_invalid_and_duplicate_rows(self, sqlite_session):
+        """Test invalid rows and duplicates are skipped in skip_duplicates mode"""
+        sqlite_session.add(Customer(customer_id='existing', company_name='Company 0',
+                                    contact_name='Old', contact_phone='13800138000'))
+        sqlite_session.commit()
+
+        rows = [_row(0), _row(1, contact_phone=None), _row(2), _row(2)]
+        result = CustomerImportPipeline(sqlite_session, chunk_size=10).run(iter(rows))
+
+        assert result['total_rows'] == 4
+        assert result['imported'] == 1
+        assert result['skipped'] == 3
+        assert {e['row'] for e in result['errors']} == {1, 2, 4}
+        assert sqlite_session.query(Customer).count() == 2
+
+    def test_run_update_duplicates(self, sqlite_session):
+        """Test duplicates update the existing customer"""
+        sqlite_session.add(Customer(customer_id='existing', company_name='Company 0',
+                                    contact_name='Old', contact_phone='13800138000'))
+        sqlite_session.commit()
+
+        result = CustomerImportPipeline(sqlite_session, import_mode='update_duplicates').run(
+            iter([_row(0, contact_name='New')])
+        )
+
+        assert result['updated'] == 1
+        assert sqlite_session.query(Customer).one().contact_name == 'New'
+
+    def test_validate_only_keeps_bounded_results(self, sqlite_session):
+        """Test validation mode reports counts and caps detailed results"""
+        rows = [_row(i, contact_phone=None) for i in range(5)] + [_row(99)]
+        pipeline = CustomerImportPipeline(sqlite_session, chunk_size=2, max_errors=3)
+
+        report = pipeline.validate(iter(rows))
+
+        assert report['total_rows'] == 6
+        assert report['valid_rows'] == 1
+        assert report['invalid_rows'] == 5
+        assert len(report['results']) == 3
+        assert sqlite_session.query(Customer).count() == 0
+
+    def test_validate_resolves_duplicates_per_chunk(self, sqlite_session):
+        """Test validation keeps one duplicate resolver per chunk and still flags repeats within it"""
+        rows = [_row(0), _row(0), _row(1), _row(2), _row(3)]
+        pipeline = CustomerImportPipeline(sqlite_session, chunk_size=2)
+
+        with patch(
+            'backend.services.customer_import_pipeline.BulkDuplicateResolver', wraps=BulkDuplicateResolver
+        ) as resolver_class:
+            report = pipeline.validate(iter(rows))
+
+        assert resolver_class.call_count == 3
+        assert report['valid_rows'] == 4
+        assert report['duplicate_rows'] == 1
+        assert report['results'][0]['row_number'] == 2
+
+    def test_chunk_failure_rolls_back(self):
+        """Test a failing commit rolls the chunk back"""
+        session = Mock()
+        session.commit.side_effect = Exception('DB down')
+        validation_service = Mock()
+        validation_service.validate_rows.return_value = [
+            Mock(to_dict=Mock(return_value={'is_valid': False, 'errors': []}))
+        ]
+
+        pipeline = CustomerImportPipeline(session, validation_service=validation_service)
+
+        with pytest.raises(Exception):
+            pipeline.run(iter([_row(1)]))
+        session.rollback.assert_called_once()
+
+
+@pytest.fixture
+def checkpoint_session():
+    """In-memory SQLite session with the customer and import checkpoint tables"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from backend.models.database_models import Base
+    from backend.models.import_checkpoint_models import ImportCheckpoint
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[Customer.__table__, ImportCheckpoint.__table__])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+
+
+class TestImportCheckpoints:
+    """Tests for resumable imports"""
+
+    def test_checkpoint_advances_with_each_chunk(self, checkpoint_session):
+        """Test the checkpoint records the last committed row and completes"""
+        checkpoint = load_checkpoint(checkpoint_session, 'import-1', 'customers.csv', total_estimate=5)
+        pipeline = CustomerImportPipeline(checkpoint_session, chunk_size=2, checkpoint=checkpoint)
+
+        result = pipeline.run(iter([_row(i) for i in range(5)]), total_estimate=5)
+
+        assert result['imported'] == 5
+        assert result['resumed_rows'] == 0
+        assert checkpoint.last_committed_row == 5
+        assert checkpoint.status == 'completed'
+        assert checkpoint.attempts == 1
+
+    def test_interrupted_import_resumes_after_last_committed_row(self, checkpoint_session):
+        """Test a restarted import skips committed rows and continues the counters"""
+        rows = [_row(i) for i in range(7)]
+
+        def crash_after_second_chunk(progress):
+            if progress.chunks == 2:
+                raise SystemExit('worker killed')
+
+        first = CustomerImportPipeline(
+            checkpoint_session, chunk_size=2, checkpoint=load_checkpoint(checkpoint_session, 'import-2')
+        )
+        # Simulate the worker dying right after the second chunk was committed
+        first._report_progress = crash_after_second_chunk
+        with pytest.raises(SystemExit):
+            first.run(iter(rows))
+        assert checkpoint_session.query(Customer).count() == 4
+
+        checkpoint = load_checkpoint(checkpoint_session, 'import-2')
+        progress_reports = []
+        result = CustomerImportPipeline(
+            checkpoint_session, chunk_size=2, checkpoint=checkpoint,
+            progress_callback=progress_reports.append
+        ).run(iter(rows), total_estimate=7)
+
+        assert result['resumed_rows'] == 4
+        assert result['total_rows'] == 7
+        assert result['imported'] == 7
+        assert result['chunks'] == 4
+        assert checkpoint.attempts == 2
+        assert [p['processed'] for p in progress_reports] == [6, 7]
+        assert progress_reports[-1]['chunk_rows'] == 1
+        assert checkpoint_session.query(Customer).count() == 7
+
+    def test_failed_chunk_does_not_advance_checkpoint(self, checkpoint_session):
+        """Test the checkpoint is rolled back with a failing chunk"""
+        checkpoint = load_checkpoint(checkpoint_session, 'import-3')
+        pipeline = CustomerImportPipeline(checkpoint_session, chunk_size=2, checkpoint=checkpoint)
+        original_write = pipeline._write_chunk
+        calls = []
+
+        def failing_write(chunk, validations, progress):
+            calls.append(chunk)
+            if len(calls) == 2:
+                raise RuntimeError('constraint violated')
+            return original_write(chunk, validations, progress)
+
+        pipeline._write_chunk = failing_write
+        with pytest.raises(RuntimeError):
+            pipeline.run(iter([_row(i) for i in range(4)]))
+
+        checkpoint_session.expire_all()
+        assert checkpoint.last_committed_row == 2
+        assert checkpoint.status == 'processing'
+
+    def test_purge_checkpoints(self, checkpoint_session):
+        """Test only finished checkpoints past the age limit are purged"""
+        from datetime import datetime, timedelta
+
+        done = load_checkpoint(checkpoint_session, 'done')
+        done.status = 'completed'
+        running = load_checkpoint(checkpoint_session, 'running')
+        checkpoint_session.commit()
+        checkpoint_session.query(ImportCheckpoint).update(
+            {'updated_at': datetime.utcnow() - timedelta(days=30)}, synchronize_session=False
+        )
+        checkpoint_session.commit()
+
+        assert purge_checkpoints(checkpoint_session, 7 * 24 * 3600) == 1
+        assert [c.import_id for c in checkpoint_session.query(ImportCheckpoint)] == ['running']
+
+
+class TestImportCustomersTask:
+    """Tests for the Celery import task"""
+
+    def test_task_imports_spooled_file(self, checkpoint_session, tmp_path):
+        """Test the task streams the spooled file, checkpoints and removes it"""
+        from unittest.mock import patch
+        from backend.tasks import import_customers_task
+
+        path = spool_bytes(
+            (HEADER + ''.join(f'Company {i},Contact {i},13800138000,,standard\n' for i in range(5))).encode(),
+            'customers.csv', spool_dir=str(tmp_path)
+        )
+        factory = Mock()
+        factory.return_value.get_session.return_value = checkpoint_session
+
+        with patch('backend.tasks.DatabaseSessionFactory', factory), \
+                patch('backend.tasks.report_progress') as report:
+            result = import_customers_task.apply(
+                args=(path, 'customers.csv'), kwargs={'chunk_size': 2}, task_id='celery-import-1'
+            ).get()
+
+        assert result['imported'] == 5
+        assert not os.path.exists(path)
+        assert checkpoint_session.get(ImportCheckpoint, 'celery-import-1').status == 'completed'
+        states = [call.args[1] for call in report.call_args_list]
+        assert states == ['PROGRESS', 'PROGRESS', 'PROGRESS', 'SUCCESS']
+        assert report.call_args_list[0].args[2]['chunk_rows_per_second'] is not None
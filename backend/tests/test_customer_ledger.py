@@ -0,0 +1,300 @@
+"""
+Tests for Customer Ledger - Story 3.4
+Tests for balance computation, transactional maintenance and the drift rebuild
+"""
+
+import gc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.api.customer_analytics import check_churn_risk, check_overdue_risk
+from backend.models.archive_models import settlement_records_archive, settlement_writeoffs_archive
+from backend.models.auth import User
+from backend.models.customer_balance_models import CustomerBalance
+from backend.models.database_models import Base, Customer, SettlementRecord
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.services.customer_ledger import (
+    apply_balances,
+    compute_balances,
+    ledger_totals,
+    mark_balances_dirty,
+    rebuild_balances,
+    track_balances
+)
+from backend.services.writeoff_matcher import WriteoffMatcher
+
+NOW = datetime.utcnow()
+
+
+@pytest.fixture
+def session_factory():
+    """Balance-tracking session factory on a shared in-memory SQLite database"""
+    engine = create_engine(
+        'sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(
+        engine, tables=[
+            User.__table__, Customer.__table__, SettlementRecord.__table__, PaymentRecord.__table__,
+            SettlementWriteoff.__table__, CustomerBalance.__table__,
+            settlement_records_archive, settlement_writeoffs_archive
+        ]
+    )
+    factory = sessionmaker(bind=engine)
+    track_balances(factory)
+    yield factory
+    engine.dispose()
+
+
+def _customer(session, index):
+    customer = Customer(
+        customer_id=f'cust-{index}', company_name=f'Company {index}',
+        contact_name='Contact', contact_phone='13800138000'
+    )
+    session.add(customer)
+    session.flush()
+    return customer
+
+
+def _settlement(session, customer, age_days, amount, status='pending'):
+    settlement = SettlementRecord(
+        record_id=f'SET-{customer.id}-{age_days}-{status}', customer_id=customer.id, config_id=1,
+        period_start=NOW, period_end=NOW, usage_quantity=Decimal('1'), unit='GB', price_model='fixed',
+        unit_price=Decimal(amount), total_amount=Decimal(amount), status=status,
+        created_at=NOW - timedelta(days=age_days)
+    )
+    session.add(settlement)
+    return settlement
+
+
+def _payment(session, customer, amount, age_days=0):
+    payment = PaymentRecord(
+        payment_no=f'PAY-{customer.id}-{amount}-{age_days}', customer_id=customer.id,
+        payment_amount=Decimal(amount), payment_method='bank_transfer',
+        payment_date=NOW - timedelta(days=age_days)
+    )
+    session.add(payment)
+    return payment
+
+
+class TestComputeBalances:
+    """Tests for computing balances from the source tables"""
+
+    def test_totals_aging_and_last_activity(self, session_factory):
+        """Test open amounts net of write-offs are split into aging buckets"""
+        session = session_factory()
+        customer = _customer(session, 1)
+        _settlement(session, customer, 10, '100.00')            # current
+        _settlement(session, customer, 45, '200.00')            # 15 days past due
+        partly_paid = _settlement(session, customer, 75, '300.00')  # 45 days past due
+        _settlement(session, customer, 200, '400.00')           # 170 days past due
+        _settlement(session, customer, 60, '50.00', status='paid')
+        _settlement(session, customer, 60, '70.00', status='cancelled')
+        payment = _payment(session, customer, '150.00')
+        session.flush()
+        session.add(SettlementWriteoff(
+            writeoff_no='WOF-1', payment_id=payment.id, settlement_id=partly_paid.id,
+            writeoff_amount=Decimal('120.00'), writeoff_type='partial', writeoff_date=NOW
+        ))
+        session.flush()
+
+        balance = compute_balances(session, as_of=NOW)[customer.id]
+
+        assert balance['total_billed'] == Decimal('1050.00')
+        assert balance['total_paid'] == Decimal('150.00')
+        assert balance['total_written_off'] == Decimal('120.00')
+        assert balance['unapplied_amount'] == Decimal('30.00')
+        assert balance['open_amount'] == Decimal('880.00')
+        assert balance['open_settlements'] == 4
+        assert balance['current_amount'] == Decimal('100.00')
+        assert balance['overdue_1_30'] == Decimal('200.00')
+        assert balance['overdue_31_60'] == Decimal('180.00')
+        assert balance['overdue_61_90'] == Decimal('0.00')
+        assert balance['overdue_90_plus'] == Decimal('400.00')
+        assert balance['oldest_open_at'] == NOW - timedelta(days=200)
+        assert balance['last_settlement_at'] == NOW - timedelta(days=10)
+        assert balance['last_writeoff_at'] == NOW
+        session.close()
+
+    def test_archive_tier_is_read_per_customer(self, session_factory):
+        """Test archived totals come from customer-filtered archive queries, not a UNION of the archive"""
+        session = session_factory()
+        customer = _customer(session, 1)
+        _settlement(session, customer, 10, '100.00')
+        session.flush()
+        session.execute(settlement_records_archive.insert().values(
+            id=999, record_id='SET-ARCHIVED', customer_id=customer.id, config_id=1, period_start=NOW,
+            period_end=NOW, usage_quantity=Decimal('1'), unit='GB', price_model='fixed',
+            unit_price=Decimal('40.00'), total_amount=Decimal('40.00'), status='paid',
+            created_at=NOW - timedelta(days=900)
+        ))
+        statements = []
+        execute = session.execute
+
+        def recording_execute(statement, *args, **kwargs):
+            statements.append(str(statement.compile(dialect=mysql.dialect())))
+            return execute(statement, *args, **kwargs)
+
+        session.execute = recording_execute
+        balance = compute_balances(session, [customer.id], as_of=NOW)[customer.id]
+
+        assert balance['total_billed'] == Decimal('140.00')
+        assert balance['open_amount'] == Decimal('100.00')
+        assert balance['last_settlement_at'] == NOW - timedelta(days=10)
+        assert not any('_all' in statement for statement in statements)
+        archived = [statement for statement in statements if '_archive' in statement]
+        assert len(archived) == 2
+        assert all('WHERE settlement_records_archive.customer_id IN' in statement for statement in archived)
+        session.close()
+
+
+class TestTransactionalMaintenance:
+    """Tests for balances maintained at commit"""
+
+    def test_orm_writes_refresh_balance_on_commit(self, session_factory):
+        """Test settlement and payment writes update the balance row in the same commit"""
+        session = session_factory()
+        customer = _customer(session, 1)
+        settlement = _settlement(session, customer, 45, '500.00')
+        _payment(session, customer, '100.00')
+        session.commit()
+
+        balance = session.get(CustomerBalance, customer.id)
+        assert balance.open_amount == Decimal('500.00')
+        assert balance.overdue_amount == Decimal('500.00')
+        assert balance.unapplied_amount == Decimal('100.00')
+
+        settlement.status = 'cancelled'
+        session.commit()
+
+        balance = session.get(CustomerBalance, customer.id)
+        assert balance.open_amount == Decimal('0.00')
+        assert balance.total_billed == Decimal('0.00')
+        session.close()
+
+    def test_rollback_discards_pending_refresh(self, session_factory):
+        """Test rolled back writes leave no balance behind"""
+        session = session_factory()
+        customer = _customer(session, 1)
+        session.commit()
+        _settlement(session, customer, 5, '100.00')
+        session.flush()
+        session.rollback()
+        session.commit()
+
+        assert session.execute(select(CustomerBalance)).first() is None
+        session.close()
+
+    def test_bulk_writeoff_keeps_balances_in_step(self, session_factory):
+        """Test the write-off matcher's bulk INSERT/UPDATE refresh balances"""
+        session = session_factory()
+        customer = _customer(session, 1)
+        _settlement(session, customer, 40, '100.00')
+        _settlement(session, customer, 35, '250.00')
+        _payment(session, customer, '300.00')
+        session.commit()
+        customer_id = customer.id
+        session.close()
+
+        WriteoffMatcher(session_factory, max_workers=1).run()
+
+        session = session_factory()
+        balance = session.get(CustomerBalance, customer_id)
+        assert balance.total_written_off == Decimal('300.00')
+        assert balance.open_amount == Decimal('50.00')
+        assert balance.open_settlements == 1
+        assert balance.unapplied_amount == Decimal('0.00')
+        assert rebuild_balances(session, repair=False)['drifted'] == 0
+        session.close()
+
+    def test_refresh_locks_customers_before_computing(self, session_factory):
+        """Test the recompute locks the customer rows first and sums only their write-offs"""
+        session = session_factory()
+        customer = _customer(session, 1)
+        other = _customer(session, 2)
+        _settlement(session, customer, 5, '100.00')
+        _settlement(session, other, 5, '200.00')
+        session.commit()
+        customer_id = customer.id
+        statements = []
+        execute = session.execute
+
+        def recording_execute(statement, *args, **kwargs):
+            statements.append(str(statement.compile(dialect=mysql.dialect())))
+            return execute(statement, *args, **kwargs)
+
+        session.execute = recording_execute
+        assert apply_balances(session, [customer_id]) == 1
+
+        assert statements[0].startswith('SELECT customers.id') and statements[0].endswith('FOR UPDATE')
+        assert 'settlement_id IN (SELECT settlement_records' in statements[1]
+        assert session.get(CustomerBalance, customer_id).open_amount == Decimal('100.00')
+        session.close()
+
+    def test_new_sessionmakers_are_tracked_after_old_ones_are_collected(self):
+        """Test tracking a sessionmaker is not skipped when it reuses a collected one's address"""
+        for _ in range(20):
+            factory = sessionmaker()
+            track_balances(factory)
+            session = factory()
+            mark_balances_dirty(session)
+            session.commit()
+
+            assert 'customer_ledger_pending' not in session.info
+            session.close()
+            del factory, session
+            gc.collect()
+
+
+class TestRebuild:
+    """Tests for the drift check and rebuild"""
+
+    def test_rebuild_reports_and_repairs_drift(self, session_factory):
+        """Test rows changed behind the session's back are reported and fixed"""
+        session = session_factory()
+        first, second = _customer(session, 1), _customer(session, 2)
+        _settlement(session, first, 45, '100.00')
+        _settlement(session, second, 10, '200.00')
+        session.commit()
+        # Writes bypassing the ORM session are not tracked
+        session.connection().execute(text("UPDATE settlement_records SET total_amount = 150 WHERE customer_id = :id"), {'id': first.id})
+        session.connection().execute(text("DELETE FROM customer_balances WHERE customer_id = :id"), {'id': second.id})
+        session.commit()
+
+        check = rebuild_balances(session, repair=False, chunk_size=1)
+        repaired = rebuild_balances(session, chunk_size=1)
+        after = rebuild_balances(session, repair=False)
+
+        assert check['drifted'] == 1 and check['missing'] == 1
+        assert check['samples'][0]['fields']['open_amount'] == ['100.00', '150.00']
+        assert repaired['customers'] == 2 and repaired['rows'] == 2
+        assert after['drifted'] == 0 and after['missing'] == 0
+        assert ledger_totals(session)['open_amount'] == Decimal('350.00')
+        session.close()
+
+
+class TestRiskChecks:
+    """Tests for the risk engine reading balances"""
+
+    def test_overdue_and_churn_risk_from_balance(self, session_factory):
+        """Test overdue and churn checks use the customer's balance row"""
+        session = session_factory()
+        customer = _customer(session, 1)
+        idle = _customer(session, 2)
+        _settlement(session, customer, 100, '300.00')
+        _settlement(session, customer, 95, '200.00', status='paid')
+        session.commit()
+
+        overdue = check_overdue_risk(customer, session)
+        churn = check_churn_risk(customer, session)
+
+        assert overdue == {'has_overdue': True, 'overdue_amount': 300.0, 'overdue_days': 100}
+        assert churn == {'is_churn_risk': True, 'inactive_days': 95}
+        assert check_overdue_risk(idle, session)['has_overdue'] is False
+        assert check_churn_risk(idle, session)['inactive_days'] == 999
+        session.close()
@@ -0,0 +1,201 @@
+"""
+Tests for Customer Stats - Story 4.1
+Tests for GROUP BY distributions and transactionally maintained counters
+"""
+
+import uuid
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, delete, event, insert, update
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.customer_stats_models import CustomerStatCounter
+from backend.models.database_models import Base, Customer
+from backend.services.customer_bulk_writer import CustomerBulkWriter
+from backend.services.customer_stats import (
+    compute_distributions,
+    get_distributions,
+    rebuild_customer_stats,
+    track_customer_stats,
+    untrack_customer_stats
+)
+
+
+@pytest.fixture
+def session_factory():
+    """Counter-maintaining session factory"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    track_customer_stats(factory)
+    yield factory
+    untrack_customer_stats(factory)
+    engine.dispose()
+
+
+def _values(industry=None, province=None, level='standard'):
+    return {
+        'customer_id': str(uuid.uuid4()), 'company_name': f'Company {uuid.uuid4().hex[:8]}',
+        'contact_name': 'Contact', 'contact_phone': '13800138000',
+        'industry': industry, 'province': province, 'level': level
+    }
+
+
+def _counters(session):
+    return {
+        (counter.dimension, counter.value): counter.count
+        for counter in session.query(CustomerStatCounter).all() if counter.count
+    }
+
+
+def _expected(session):
+    return {
+        (dimension, value): count
+        for dimension, counts in compute_distributions(session).items() for value, count in counts.items()
+    }
+
+
+class TestDistributions:
+    """Tests for counting and reading distributions"""
+
+    def test_group_by_with_labels(self, session_factory):
+        """Test missing values are counted under the dimension's label"""
+        session = session_factory()
+        session.add_all([
+            Customer(**_values('制造业', '广东', 'vip')),
+            Customer(**_values('', None, None)),
+            Customer(**_values('制造业', '广东')),
+        ])
+        session.commit()
+
+        distributions = compute_distributions(session)
+
+        assert distributions['industry'] == {'制造业': 2, '未分类': 1}
+        assert distributions['region'] == {'广东': 2, '未分类': 1}
+        assert distributions['level'] == {'standard': 2, 'vip': 1}
+        session.close()
+
+    def test_read_from_counters_in_one_query(self, session_factory):
+        """Test the endpoint data comes from the counters, largest value first"""
+        session = session_factory()
+        session.add_all([Customer(**_values('IT', '北京', 'vip')), Customer(**_values('IT', '上海'))])
+        session.commit()
+        statements = []
+        event.listen(
+            session.get_bind(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+
+        stats = get_distributions(session)
+
+        assert len(statements) == 1
+        assert stats['total_customers'] == 2
+        assert stats['industry_distribution'] == [{'name': 'IT', 'value': 2}]
+        assert stats['level_distribution'] == [{'name': 'standard', 'value': 1}, {'name': 'vip', 'value': 1}]
+        session.close()
+
+
+class TestMaintenance:
+    """Tests for counters kept in step with customer writes"""
+
+    def test_create_update_delete(self, session_factory):
+        """Test ORM writes adjust the counters on commit"""
+        session = session_factory()
+        first, second = Customer(**_values('IT', '北京')), Customer(**_values('IT', '上海', 'vip'))
+        session.add_all([first, second])
+        session.commit()
+
+        first.level = 'vip'
+        first.province = None
+        session.commit()
+        session.delete(second)
+        session.commit()
+
+        assert _counters(session) == _expected(session) == {
+            ('industry', 'IT'): 1, ('region', '未分类'): 1, ('level', 'vip'): 1
+        }
+        session.close()
+
+    def test_rolled_back_writes_are_not_counted(self, session_factory):
+        """Test rolled back transactions and savepoints leave the counters alone"""
+        session = session_factory()
+        session.add(Customer(**_values('IT')))
+        session.flush()
+        session.rollback()
+
+        session.add(Customer(**_values('金融')))
+        try:
+            with session.begin_nested():
+                session.add(Customer(**_values('IT')))
+                session.flush()
+                raise ValueError('batch failed')
+        except ValueError:
+            pass
+        session.commit()
+
+        assert _counters(session) == _expected(session)
+        assert _counters(session)[('industry', '金融')] == 1
+        assert ('industry', 'IT') not in _counters(session)
+        session.close()
+
+    def test_bulk_statements(self, session_factory):
+        """Test ORM bulk inserts/updates apply deltas and other statements recount"""
+        session = session_factory()
+        session.execute(insert(Customer), [_values('IT'), _values('IT', level='vip'), _values('金融')])
+        session.commit()
+        ids = [customer.id for customer in session.query(Customer).order_by(Customer.id)]
+        session.execute(update(Customer), [{'id': ids[0], 'industry': '金融'}, {'id': ids[1], 'remarks': 'x'}])
+        session.commit()
+        assert _counters(session) == _expected(session)
+        assert _counters(session)[('industry', '金融')] == 2
+
+        session.execute(insert(Customer.__table__), [_values('教育')])
+        session.execute(update(Customer).where(Customer.industry == 'IT').values(level='economy'))
+        session.commit()
+        session.execute(delete(Customer).where(Customer.id == ids[2]))
+        session.commit()
+
+        assert _counters(session) == _expected(session)
+        assert _counters(session)[('level', 'economy')] == 1
+        session.close()
+
+    def test_core_insert_and_import_upserts_apply_deltas(self, session_factory):
+        """Test Core INSERTs and reported import upserts are counted without a recount"""
+        session = session_factory()
+        session.add(Customer(**_values('IT', '北京'), credit_code='CC-1'))
+        session.commit()
+        rows = [
+            (1, {'company_name': 'A', 'contact_name': 'C', 'contact_phone': '13800138000',
+                 'credit_code': 'CC-1', 'industry': '金融', 'province': None, 'level': 'vip'}),
+            (2, {'company_name': 'B', 'contact_name': 'C', 'contact_phone': '13800138000',
+                 'credit_code': 'CC-2', 'industry': '教育', 'province': '上海'}),
+            (3, {'company_name': 'A2', 'contact_name': 'C', 'contact_phone': '13800138000',
+                 'credit_code': 'CC-1', 'industry': None, 'province': '广东'}),
+        ]
+
+        with patch('backend.services.customer_stats.compute_distributions', side_effect=AssertionError('recount')):
+            session.execute(insert(Customer.__table__), [_values('制造业')])
+            outcomes = CustomerBulkWriter(session).insert_rows(rows, on_conflict='update')
+            CustomerBulkWriter(session).insert_rows([(4, dict(rows[1][1], industry='IT'))], on_conflict='ignore')
+            session.commit()
+
+        assert [outcomes[row]['action'] for row in (1, 2, 3)] == ['updated', 'imported', 'updated']
+        assert _counters(session) == _expected(session)
+        assert _counters(session)[('region', '广东')] == 1
+        session.close()
+
+    def test_rebuild_reports_drift(self, session_factory):
+        """Test a rebuild repairs counters changed outside the session hooks"""
+        session = session_factory()
+        session.add(Customer(**_values('IT')))
+        session.commit()
+        session.execute(update(CustomerStatCounter).values(count=5))
+        session.commit()
+
+        report = rebuild_customer_stats(session)
+
+        assert report['drifted'] == 3
+        assert rebuild_customer_stats(session, repair=False)['drifted'] == 0
+        assert _counters(session) == _expected(session)
+        session.close()
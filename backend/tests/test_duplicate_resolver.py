@@ -0,0 +1,106 @@
+"""
+Tests for Bulk Duplicate Resolver - Story 6.2
+Tests for set-based duplicate detection
+"""
+
+import pytest
+
+from backend.models.database_models import Customer
+from backend.services.data_validation_service import DataValidationService
+from backend.services.duplicate_resolver import BulkDuplicateResolver
+
+
+@pytest.fixture
+def seeded_session(sqlite_session):
+    """SQLite session with a few existing customers"""
+    sqlite_session.add_all([
+        Customer(customer_id='c1', company_name='Acme Trading', contact_name='Zhang', contact_phone='13800138000',
+                 credit_code='91110000AAAAAAAAAA', erp_customer_code='ERP-1'),
+        Customer(customer_id='c2', company_name='Acme', contact_name='Li', contact_phone='13800138000'),
+        Customer(customer_id='c3', company_name='Beta Industries', contact_name='Wang', contact_phone='13800138000',
+                 credit_code='91110000BBBBBBBBBB'),
+        Customer(customer_id='c4', company_name='Gamma', contact_name='Zhao', contact_phone='13800138000',
+                 erp_customer_code='ERP-4'),
+    ])
+    sqlite_session.commit()
+    return sqlite_session
+
+
+ROWS = [
+    {'company_name': 'Acme'},
+    {'company_name': 'New Co', 'credit_code': '91110000BBBBBBBBBB'},
+    {'company_name': 'Other', 'erp_customer_code': 'ERP-4'},
+    {'company_name': 'Gamma', 'erp_customer_code': 'ERP-1'},
+    {'company_name': 'Unknown'},
+    {'contact_name': 'No keys'},
+]
+
+
+class TestBulkDuplicateResolver:
+    """Tests for BulkDuplicateResolver"""
+
+    @pytest.mark.parametrize('row', ROWS)
+    def test_matches_per_row_check(self, seeded_session, row):
+        """Test bulk results equal check_duplicates results"""
+        resolver = BulkDuplicateResolver(seeded_session)
+        resolver.prefetch(ROWS)
+
+        expected = DataValidationService().check_duplicates(dict(row), seeded_session)
+
+        assert resolver.match(row) == expected
+
+    def test_query_count_independent_of_rows(self, seeded_session):
+        """Test one query per present key type plus one fuzzy query per chunk"""
+        resolver = BulkDuplicateResolver(seeded_session)
+        resolver.prefetch([{'company_name': f'Company {i}', 'credit_code': f'CODE{i}'} for i in range(200)])
+
+        # company_name IN, credit_code IN, fuzzy LIKE (no ERP codes in the chunk)
+        assert resolver.query_count == 3
+
+    def test_in_file_duplicates(self, sqlite_session):
+        """Test registered file rows are reported as in-file duplicates"""
+        rows = [
+            {'company_name': 'Delta', 'credit_code': '91110000DDDDDDDDDD'},
+            {'company_name': 'Delta Two', 'credit_code': '91110000DDDDDDDDDD'},
+        ]
+        resolver = BulkDuplicateResolver(sqlite_session)
+        resolver.prefetch(rows)
+
+        assert resolver.match(rows[0]) == []
+        resolver.register_row(1, rows[0])
+
+        duplicates = resolver.match(rows[1])
+        assert duplicates == [{
+            'customer_id': None,
+            'company_name': 'Delta',
+            'contact_name': None,
+            'row_number': 1,
+            'match_type': 'in_file',
+            'match_fields': ['credit_code']
+        }]
+
+    def test_registered_customer_matches_like_existing(self, sqlite_session):
+        """Test customers written during the import are matched by id"""
+        resolver = BulkDuplicateResolver(sqlite_session)
+        resolver.prefetch([{'company_name': 'Epsilon Holdings Ltd'}])
+
+        customer = Customer(customer_id='e1', company_name='Epsilon Holdings Co., Ltd.',
+                            contact_name='Sun', contact_phone='13800138000')
+        sqlite_session.add(customer)
+        sqlite_session.flush()
+        resolver.register_customer(customer)
+
+        duplicates = resolver.match({'company_name': 'Epsilon Holdings Ltd'})
+        assert len(duplicates) == 1
+        assert duplicates[0]['customer_id'] == customer.id
+        assert duplicates[0]['match_type'] == 'fuzzy'
+
+    def test_validate_batch_flags_in_file_duplicates(self, sqlite_session):
+        """Test validate_batch reports repeated rows of the same file"""
+        row = {'company_name': 'Zeta', 'contact_name': 'Qian', 'contact_phone': '13800138000'}
+
+        report = DataValidationService().validate_batch([dict(row), dict(row)], sqlite_session)
+
+        assert report['valid_rows'] == 1
+        assert report['duplicate_rows'] == 1
+        assert report['results'][1]['duplicates'][0]['row_number'] == 1
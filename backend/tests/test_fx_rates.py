@@ -0,0 +1,220 @@
+"""
+Tests for FX Rates - Story 4.1
+Tests for dated rate lookups and multi-currency settlement totals
+"""
+
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.archive_models import settlement_records_archive
+from backend.models.database_models import Base, Customer, PriceConfig, SettlementRecord
+from backend.models.fx_models import ExchangeRate
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.services.fx_rates import (
+    FxRateError,
+    FxRateTable,
+    receivable_totals,
+    save_rates,
+    settlement_totals,
+    settlement_totals_by,
+    track_fx_rates
+)
+
+
+@pytest.fixture
+def fx_session():
+    """SQLite session with USD/EUR rates against CNY and one customer"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine, tables=[
+        Customer.__table__, PriceConfig.__table__, SettlementRecord.__table__, ExchangeRate.__table__,
+        PaymentRecord.__table__, SettlementWriteoff.__table__, settlement_records_archive
+    ])
+    session = sessionmaker(bind=engine)()
+    session.add(Customer(
+        customer_id='cust-1', company_name='Company 1', contact_name='Contact', contact_phone='13800138000'
+    ))
+    session.add(PriceConfig(
+        config_id=str(uuid.uuid4()), customer_id=1, name='Standard', price_model='single',
+        unit_price=Decimal('1.0000')
+    ))
+    for currency, effective_date, rate in [
+        ('USD', date(2026, 1, 1), '7.00000000'),
+        ('USD', date(2026, 2, 1), '7.20000000'),
+        ('EUR', date(2026, 2, 1), '7.80000000'),
+    ]:
+        session.add(ExchangeRate(
+            currency=currency, base_currency='CNY', rate=Decimal(rate), effective_date=effective_date
+        ))
+    session.flush()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _settlement(session, total, currency, period_end, status='paid'):
+    settlement = SettlementRecord(
+        record_id=str(uuid.uuid4()), customer_id=1, config_id=1,
+        period_start=period_end.replace(day=1), period_end=period_end,
+        usage_quantity=Decimal('1'), unit='GB', price_model='single', unit_price=Decimal('1'),
+        total_amount=Decimal(total), currency=currency, status=status
+    )
+    session.add(settlement)
+    return settlement
+
+
+class TestFxRateTable:
+    """Tests for dated rate lookups"""
+
+    def test_rate_in_effect(self, fx_session):
+        """Test the latest rate on or before the day applies"""
+        table = FxRateTable(base_currency='CNY').load(fx_session)
+
+        assert table.rate('USD', date(2025, 12, 31)) is None
+        assert table.rate('USD', date(2026, 1, 31)) == 7.0
+        assert table.rate('USD', date(2026, 2, 1)) == 7.2
+        assert table.rate('CNY', date(2020, 1, 1)) == 1.0
+        assert table.rate('GBP', date(2026, 2, 1)) is None
+        assert table.currencies == ['CNY', 'EUR', 'USD']
+
+    def test_vectorized_conversion(self, fx_session):
+        """Test mixed currencies convert in one call, NaN where no rate applies"""
+        table = FxRateTable(base_currency='CNY').load(fx_session)
+        days = np.array([date(2026, 1, 15).toordinal(), date(2026, 3, 1).toordinal(), date(2026, 1, 15).toordinal()])
+
+        converted = table.convert(np.array([100.0, 100.0, 100.0]), np.array(['USD', 'USD', 'EUR']), days)
+
+        assert converted[:2].tolist() == [700.0, 720.0]
+        assert np.isnan(converted[2])
+
+    def test_loaded_once_until_expired(self, fx_session):
+        """Test the table is only reloaded after its TTL or an invalidate"""
+        statements = []
+        event.listen(
+            fx_session.get_bind(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+        table = FxRateTable(base_currency='CNY')
+
+        table.ensure_loaded(fx_session)
+        table.ensure_loaded(fx_session)
+        assert len(statements) == 1
+        table.invalidate()
+        table.ensure_loaded(fx_session)
+        assert len(statements) == 2
+
+
+class TestSettlementTotals:
+    """Tests for multi-currency settlement totals"""
+
+    def test_native_and_base_totals(self, fx_session):
+        """Test amounts are converted at the rate of their billing date"""
+        _settlement(fx_session, '1000.00', 'CNY', datetime(2026, 1, 31))
+        _settlement(fx_session, '100.00', 'USD', datetime(2026, 1, 31))
+        _settlement(fx_session, '100.00', 'USD', datetime(2026, 2, 28))
+        _settlement(fx_session, '50.00', 'EUR', datetime(2026, 1, 31))
+        _settlement(fx_session, '999.00', 'USD', datetime(2026, 1, 31), status='cancelled')
+        fx_session.flush()
+
+        totals = settlement_totals(
+            fx_session, SettlementRecord.status == 'paid', table=FxRateTable(base_currency='CNY')
+        )
+
+        # 1000 + 100 * 7.0 + 100 * 7.2; EUR had no rate before February
+        assert totals['base_total'] == 2420.0
+        assert totals['native'] == {'CNY': 1000.0, 'USD': 200.0, 'EUR': 50.0}
+        assert totals['unconverted'] == {'EUR': 50.0}
+        assert totals['settlements'] == 4
+
+    def test_grouped_totals_in_one_query(self, fx_session):
+        """Test per-group totals are computed from a single GROUP BY"""
+        _settlement(fx_session, '100.00', 'USD', datetime(2026, 2, 28))
+        _settlement(fx_session, '10.00', 'EUR', datetime(2026, 2, 28), status='pending')
+        _settlement(fx_session, '5.00', 'CNY', datetime(2026, 2, 28), status='pending')
+        fx_session.flush()
+        table = FxRateTable(base_currency='CNY').load(fx_session)
+        statements = []
+        event.listen(
+            fx_session.get_bind(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+
+        totals = settlement_totals_by(fx_session, SettlementRecord.status, table=table)
+
+        assert len(statements) == 1
+        assert totals['paid']['base_total'] == 720.0
+        assert totals['pending']['base_total'] == 83.0
+        assert totals['pending']['native'] == {'EUR': 10.0, 'CNY': 5.0}
+        assert settlement_totals(fx_session, SettlementRecord.status == 'approved', table=table)['base_total'] == 0.0
+
+    def test_receivables_in_base_currency(self, fx_session):
+        """Test open amounts net of write-offs are converted per currency, never summed across them"""
+        _settlement(fx_session, '100.00', 'USD', datetime(2026, 1, 31), status='pending')
+        partly_paid = _settlement(fx_session, '200.00', 'CNY', datetime(2026, 1, 31), status='approved')
+        _settlement(fx_session, '10.00', 'EUR', datetime(2026, 1, 31), status='pending')
+        _settlement(fx_session, '999.00', 'USD', datetime(2026, 1, 31))
+        payment = PaymentRecord(
+            payment_no='PAY-1', customer_id=1, payment_amount=Decimal('50.00'),
+            payment_method='bank_transfer', payment_date=datetime(2026, 2, 1)
+        )
+        fx_session.add(payment)
+        fx_session.flush()
+        fx_session.add(SettlementWriteoff(
+            writeoff_no='WOF-1', payment_id=payment.id, settlement_id=partly_paid.id,
+            writeoff_amount=Decimal('50.00'), writeoff_type='partial', writeoff_date=datetime(2026, 2, 1)
+        ))
+        fx_session.flush()
+        table = FxRateTable(base_currency='CNY')
+
+        current = receivable_totals(fx_session, table=table)
+        later = receivable_totals(fx_session, table=table, as_of=datetime.utcnow() + timedelta(days=90))
+
+        # 100 * 7.0 + (200 - 50); EUR had no rate before February
+        assert (current['open_amount'], current['overdue_amount']) == (850.0, 0.0)
+        assert current['native'] == {'USD': 100.0, 'CNY': 150.0, 'EUR': 10.0}
+        assert current['unconverted'] == {'EUR': 10.0}
+        assert (later['open_amount'], later['overdue_amount']) == (850.0, 850.0)
+
+
+class TestRateManagement:
+    """Tests for writing rates"""
+
+    def test_save_rates_upserts_and_reloads_on_commit(self, fx_session):
+        """Test new and existing dates are written and the tracked table reloads after commit"""
+        table = FxRateTable(base_currency='CNY').load(fx_session)
+        fx_session.commit()
+        factory = sessionmaker(bind=fx_session.get_bind())
+        track_fx_rates(factory)
+        session = factory()
+
+        with patch('backend.services.fx_rates.fx_rates', table):
+            result = save_rates(session, [
+                {'currency': 'usd', 'effective_date': '2026-02-01', 'rate': '7.25'},
+                {'currency': 'EUR', 'effective_date': date(2026, 3, 1), 'rate': 7.9},
+            ], base_currency='CNY', source='PBOC')
+            assert table.rate('USD', date(2026, 2, 1)) == 7.2
+            session.commit()
+            table.ensure_loaded(session)
+
+        assert result == {'created': 1, 'updated': 1}
+        assert table.rate('USD', date(2026, 2, 1)) == 7.25
+        assert table.rate('EUR', date(2026, 3, 1)) == 7.9
+        session.close()
+
+    @pytest.mark.parametrize('rate', [
+        {'currency': 'US', 'effective_date': '2026-01-01', 'rate': 7},
+        {'currency': 'USD', 'effective_date': '01/01/2026', 'rate': 7},
+        {'currency': 'USD', 'effective_date': '2026-01-01', 'rate': 0},
+        {'currency': 'USD', 'effective_date': '2026-01-01', 'rate': 'n/a'},
+        {'currency': 'CNY', 'effective_date': '2026-01-01', 'rate': 1},
+    ])
+    def test_invalid_rates(self, fx_session, rate):
+        """Test malformed codes, dates and non-positive rates are rejected"""
+        with pytest.raises(FxRateError):
+            save_rates(fx_session, [rate], base_currency='CNY')
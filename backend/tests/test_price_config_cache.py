@@ -0,0 +1,261 @@
+"""
+Tests for Price Config Cache - Story 2.4
+Tests for cached lookups, LRU/TTL eviction, commit-time and version invalidation
+"""
+
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models.database_models import Base, Customer, PriceConfig
+from backend.services import price_config_cache as cache_module
+from backend.services.price_config_cache import (
+    PriceConfigCache,
+    _decode,
+    _encode,
+    _snapshot,
+    price_config_cache,
+    track_price_configs,
+    untrack_price_configs
+)
+
+
+@pytest.fixture
+def session_factory():
+    """Price-config-tracking session factory with two customers"""
+    engine = create_engine(
+        'sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine, tables=[Customer.__table__, PriceConfig.__table__])
+    factory = sessionmaker(bind=engine)
+    track_price_configs(factory)
+    price_config_cache.clear()
+    price_config_cache.reset_metrics()
+    session = factory()
+    for index in (1, 2):
+        session.add(Customer(
+            customer_id=f'cust-{index}', company_name=f'Company {index}',
+            contact_name='Contact', contact_phone='13800138000'
+        ))
+    session.commit()
+    session.close()
+    yield factory
+    untrack_price_configs(factory)
+    price_config_cache.clear()
+    engine.dispose()
+
+
+def _config(session, customer_id, unit_price='2.0000', is_active=True):
+    config = PriceConfig(
+        config_id=str(uuid.uuid4()), customer_id=customer_id, name='Standard',
+        price_model='single', unit_price=Decimal(unit_price), is_active=is_active
+    )
+    session.add(config)
+    session.commit()
+    return config.id
+
+
+def _count_statements(session):
+    statements = []
+    event.listen(
+        session.get_bind(), 'before_cursor_execute',
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    return statements
+
+
+class TestLookups:
+    """Tests for cached lookups"""
+
+    def test_second_lookup_served_without_query(self, session_factory):
+        """Test a cached config is merged into a new session without a SELECT"""
+        session = session_factory()
+        config_id = _config(session, 1)
+        session.close()
+
+        first = session_factory()
+        assert price_config_cache.get_config(first, config_id).unit_price == Decimal('2.0000')
+        first.close()
+
+        second = session_factory()
+        statements = _count_statements(second)
+        config = price_config_cache.get_config(second, config_id)
+
+        assert statements == []
+        assert config in second
+        assert config.unit_price == Decimal('2.0000')
+        assert price_config_cache.metrics()['hits'] == 1
+        assert price_config_cache.metrics()['misses'] == 1
+        second.close()
+
+    def test_active_config_by_customer(self, session_factory):
+        """Test the customer lookup caches the active config, including none"""
+        session = session_factory()
+        _config(session, 1, is_active=False)
+        active_id = _config(session, 1, unit_price='3.0000')
+
+        assert price_config_cache.get_active_config(session, 1).id == active_id
+        assert price_config_cache.get_active_config(session, 2) is None
+        statements = _count_statements(session)
+        assert price_config_cache.get_active_config(session, 2) is None
+        assert statements == []
+        session.close()
+
+    def test_bulk_lookup_loads_missing_in_one_query(self, session_factory):
+        """Test get_configs only queries the uncached ids"""
+        session = session_factory()
+        ids = [_config(session, 1), _config(session, 2), _config(session, 2)]
+        price_config_cache.get_config(session, ids[0])
+        statements = _count_statements(session)
+
+        configs = price_config_cache.get_configs(session, ids + [999])
+
+        assert sorted(configs) == ids
+        assert len(statements) == 1
+        session.close()
+
+
+class TestInvalidation:
+    """Tests for commit-time and version invalidation"""
+
+    def test_commit_invalidates_config_and_customer(self, session_factory):
+        """Test updates and new configs are visible after commit"""
+        session = session_factory()
+        config_id = _config(session, 1)
+        assert price_config_cache.get_active_config(session, 2) is None
+        config = price_config_cache.get_config(session, config_id)
+
+        config.unit_price = Decimal('5.0000')
+        config.current_version_number = 2
+        session.commit()
+        new_id = _config(session, 2)
+
+        other = session_factory()
+        assert price_config_cache.get_config(other, config_id).unit_price == Decimal('5.0000')
+        assert price_config_cache.get_active_config(other, 2).id == new_id
+        other.close()
+        session.close()
+
+    def test_uncommitted_changes_are_not_cached(self, session_factory):
+        """Test a rolled back change never reaches the cache"""
+        session = session_factory()
+        config_id = _config(session, 1)
+        session.close()
+
+        session = session_factory()
+        config = session.get(PriceConfig, config_id)
+        config.unit_price = Decimal('9.0000')
+        assert price_config_cache.get_config(session, config_id).unit_price == Decimal('9.0000')
+        session.rollback()
+        session.close()
+
+        other = session_factory()
+        assert price_config_cache.get_config(other, config_id).unit_price == Decimal('2.0000')
+        other.close()
+
+    def test_lookup_keeps_unflushed_changes(self, session_factory):
+        """Test a repeated lookup returns the session's changed instance and the change is committed"""
+        session = session_factory()
+        config_id = _config(session, 1)
+        # Cached by an earlier request
+        price_config_cache.get_config(session, config_id)
+        session.close()
+
+        session = session_factory(autoflush=False)
+        config = price_config_cache.get_config(session, config_id)
+        config.unit_price = Decimal('5.0000')
+        again = price_config_cache.get_config(session, config_id)
+        active = price_config_cache.get_active_config(session, 1)
+
+        assert again is config and active is config
+        assert again.unit_price == Decimal('5.0000')
+        session.commit()
+        session.close()
+        other = session_factory()
+        assert price_config_cache.get_config(other, config_id).unit_price == Decimal('5.0000')
+        other.close()
+
+    def test_revalidate_drops_out_of_band_version_bumps(self, session_factory):
+        """Test a version bump made with plain SQL is caught by revalidate"""
+        session = session_factory()
+        bumped, unchanged = _config(session, 1), _config(session, 2)
+        price_config_cache.get_configs(session, [bumped, unchanged])
+        price_config_cache.get_active_config(session, 1)
+        session.execute(text(
+            "UPDATE price_configs SET unit_price = 7, current_version_number = 2 WHERE id = :id"
+        ), {'id': bumped})
+        session.commit()
+
+        assert price_config_cache.revalidate(session) == 1
+        assert price_config_cache.get_config(session, bumped).unit_price == Decimal('7.0000')
+        assert price_config_cache.metrics()['stale_versions'] == 1
+        session.close()
+
+
+class TestEviction:
+    """Tests for the LRU bound and TTL"""
+
+    def test_lru_and_ttl(self, session_factory):
+        """Test the least recently used entry is evicted and expired entries reload"""
+        session = session_factory()
+        ids = [_config(session, 1), _config(session, 1), _config(session, 2)]
+        cache = PriceConfigCache(max_entries=2)
+        cache.get_configs(session, ids[:2])
+        cache.get_config(session, ids[0])
+        cache.get_config(session, ids[2])
+
+        statements = _count_statements(session)
+        cache.get_config(session, ids[0])
+        assert statements == []
+        cache.get_config(session, ids[1])
+        assert len(statements) == 1
+        assert cache.metrics()['evictions'] == 2
+
+        expiring = PriceConfigCache(ttl=0)
+        expiring.get_config(session, ids[0])
+        expiring.get_config(session, ids[0])
+        assert expiring.metrics()['misses'] == 2
+        session.close()
+
+    def test_snapshot_round_trip(self, session_factory):
+        """Test snapshots survive the Redis encoding"""
+        session = session_factory()
+        config = session.get(PriceConfig, _config(session, 1))
+
+        snapshot = _snapshot(config)
+
+        assert _decode(_encode(snapshot)) == snapshot
+        assert _decode(_encode(None)) is None
+        session.close()
+
+
+class TestSharedCache:
+    """Tests for cross-process coherence through Redis"""
+
+    def test_invalidation_reaches_other_processes(self, session_factory, monkeypatch):
+        """Test an invalidation in one process drops the other process's L1"""
+        import redis
+        client = redis.Redis.from_url('redis://localhost:6379/15', decode_responses=True)
+        try:
+            client.ping()
+        except redis.exceptions.ConnectionError:
+            pytest.skip('Redis server not available')
+        monkeypatch.setattr(cache_module, 'COHERENCE_INTERVAL', 0)
+        prefix = f'test:{uuid.uuid4().hex}'
+        api, worker = PriceConfigCache(client=client, prefix=prefix), PriceConfigCache(client=client, prefix=prefix)
+        session = session_factory()
+        config_id = _config(session, 1)
+
+        api.get_config(session, config_id)
+        worker.get_config(session, config_id)
+        session.execute(text("UPDATE price_configs SET unit_price = 4 WHERE id = :id"), {'id': config_id})
+        session.commit()
+        api.invalidate([config_id])
+
+        assert worker.get_config(session, config_id).unit_price == Decimal('4.0000')
+        assert worker.metrics()['redis_hits'] == 1
+        session.close()
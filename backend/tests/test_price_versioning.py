@@ -0,0 +1,154 @@
+"""
+Tests for Price Versioning - Story 2.4
+Tests for version snapshots and point-in-time price resolution
+"""
+
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.database_models import Base, Customer, PriceConfig
+from backend.models.price_version_models import PriceConfigVersion
+from backend.services.price_versioning import (
+    PriceVersionError,
+    PriceVersionIndex,
+    record_version
+)
+from backend.services.settlement_service import SettlementService
+
+JAN = datetime(2026, 1, 1)
+APR = datetime(2026, 4, 1)
+JUL = datetime(2026, 7, 1)
+
+
+@pytest.fixture
+def versioning_session():
+    """SQLite session with price configs and their versions"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(
+        engine, tables=[Customer.__table__, PriceConfig.__table__, PriceConfigVersion.__table__]
+    )
+    session = sessionmaker(bind=engine)()
+    for index in (1, 2, 3):
+        session.add(Customer(
+            customer_id=f'cust-{index}', company_name=f'Company {index}',
+            contact_name='Contact', contact_phone='13800138000'
+        ))
+    session.flush()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _config(session, customer_id, unit_price, effective_from, is_active=True):
+    config = PriceConfig(
+        config_id=str(uuid.uuid4()), customer_id=customer_id, name='Standard', price_model='single',
+        unit_price=Decimal(unit_price), is_active=is_active
+    )
+    session.add(config)
+    session.flush()
+    record_version(session, config, effective_from=effective_from)
+    session.flush()
+    return config
+
+
+def _change(session, config, effective_from, **fields):
+    for field, value in fields.items():
+        setattr(config, field, value)
+    config.current_version_number += 1
+    version = record_version(session, config, change_reason='Price change', effective_from=effective_from)
+    session.flush()
+    return version
+
+
+class TestRecordVersion:
+    """Tests for writing version snapshots"""
+
+    def test_changes_summary_against_previous_version(self, versioning_session):
+        """Test an update records the changed fields only"""
+        config = _config(versioning_session, 1, '2.0000', JAN)
+
+        version = _change(versioning_session, config, APR, unit_price=Decimal('1.5000'))
+
+        assert version.version_number == 2
+        assert version.changes_summary == {'unit_price': {'from': '2.0000', 'to': '1.5000'}}
+
+    def test_versions_must_move_forward(self, versioning_session):
+        """Test versions cannot reuse a number or take effect before their predecessor"""
+        config = _config(versioning_session, 1, '2.0000', APR)
+
+        with pytest.raises(PriceVersionError):
+            record_version(versioning_session, config, effective_from=JUL)
+        config.current_version_number = 2
+        with pytest.raises(PriceVersionError):
+            record_version(versioning_session, config, effective_from=JAN)
+
+
+class TestPriceVersionIndex:
+    """Tests for point-in-time resolution"""
+
+    def test_resolves_version_in_effect(self, versioning_session):
+        """Test each time resolves to the latest version that started by then"""
+        config = _config(versioning_session, 1, '2.0000', JAN)
+        _change(versioning_session, config, APR, unit_price=Decimal('1.5000'))
+        _change(versioning_session, config, JUL, unit_price=Decimal('1.2000'))
+
+        index = PriceVersionIndex.load(versioning_session)
+
+        assert index.resolve(config.id, datetime(2025, 12, 31)) is None
+        assert index.resolve(config.id, JAN).unit_price == Decimal('2.0000')
+        assert index.resolve(config.id, datetime(2026, 3, 31)).unit_price == Decimal('2.0000')
+        assert index.resolve(config.id, APR).unit_price == Decimal('1.5000')
+        current = index.resolve(config.id, datetime(2026, 10, 1))
+        assert (current.version_number, current.effective_to) == (3, None)
+        assert index.resolve(config.id, JAN).effective_to == APR
+
+    def test_customer_resolution_follows_activation(self, versioning_session):
+        """Test the customer's active config at the time is used"""
+        old = _config(versioning_session, 2, '3.0000', JAN)
+        new = _config(versioning_session, 2, '2.5000', JAN, is_active=False)
+        _change(versioning_session, old, APR, is_active=False)
+        _change(versioning_session, new, APR, is_active=True)
+
+        index = PriceVersionIndex.load(versioning_session, customer_ids=[2, 3])
+
+        assert index.resolve_customer(2, datetime(2026, 2, 1)).config_id == old.id
+        assert index.resolve_customer(2, datetime(2026, 5, 1)).config_id == new.id
+        assert index.has_history(2) and not index.has_history(3)
+        assert index.resolve_customer(3, JUL) is None
+
+    def test_config_created_after_period_start(self, versioning_session):
+        """Test a customer priced only after the period start falls back to the earliest version"""
+        config = _config(versioning_session, 1, '2.0000', APR)
+        _change(versioning_session, config, JUL, unit_price=Decimal('1.5000'))
+        _config(versioning_session, 2, '3.0000', APR, is_active=False)
+
+        index = PriceVersionIndex.load(versioning_session)
+
+        assert index.resolve_customer(1, JAN).version_number == 1
+        assert index.resolve_customer(1, JAN).unit_price == Decimal('2.0000')
+        assert index.resolve_customer(2, JAN) is None
+
+    def test_one_query_per_chunk_and_usable_for_calculation(self, versioning_session):
+        """Test loading issues one query and resolved prices feed calculate_settlement"""
+        configs = [_config(versioning_session, customer_id, '2.0000', JAN) for customer_id in (1, 2, 3)]
+        _change(versioning_session, configs[0], APR, unit_price=Decimal('1.0000'))
+        statements = []
+        event.listen(
+            versioning_session.get_bind(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+
+        index = PriceVersionIndex.load(versioning_session, customer_ids=[1, 2, 3])
+        result = SettlementService().calculate_settlement(
+            customer_id=1, config=index.resolve_customer(1, datetime(2026, 2, 1)),
+            usage_quantity=Decimal('100'), period_start=datetime(2026, 2, 1), period_end=datetime(2026, 2, 28)
+        )
+
+        assert len(statements) == 1
+        assert index.version_count == 4
+        assert result['total_amount'] == 200.0
@@ -0,0 +1,170 @@
+"""
+Tests for Pricing Simulation - Story 3.1
+Tests for vectorized re-rating and what-if comparisons against billed totals
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.api.settlements import simulate_pricing
+from backend.models.archive_models import settlement_records_archive
+from backend.models.database_models import Base, Customer, PriceConfig, SettlementRecord
+from backend.services import pricing_simulation as simulation_module
+from backend.services.pricing_simulation import (
+    PricingSimulationError,
+    PricingSimulator,
+    TierTable,
+    rate_usage
+)
+
+TIERS = [
+    {'min_quantity': 0, 'max_quantity': 100, 'unit_price': 0.10},
+    {'min_quantity': 100, 'max_quantity': 500, 'unit_price': 0.08},
+    {'min_quantity': 500, 'max_quantity': None, 'unit_price': 0.05},
+]
+
+
+@pytest.fixture
+def simulation_session():
+    """SQLite session with billed settlements of three customers"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(
+        engine, tables=[
+            Customer.__table__, PriceConfig.__table__, SettlementRecord.__table__, settlement_records_archive
+        ]
+    )
+    session = sessionmaker(bind=engine)()
+    for index in (1, 2, 3):
+        session.add(Customer(
+            customer_id=f'cust-{index}', company_name=f'Company {index}',
+            contact_name='Contact', contact_phone='13800138000'
+        ))
+    session.add(PriceConfig(
+        config_id=str(uuid.uuid4()), customer_id=1, name='Standard', price_model='single',
+        unit_price=Decimal('0.1000')
+    ))
+    session.flush()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _settlement(session, customer_id, usage, total, month=1, status='approved'):
+    session.add(SettlementRecord(
+        record_id=str(uuid.uuid4()), customer_id=customer_id, config_id=1,
+        period_start=datetime(2026, month, 1), period_end=datetime(2026, month, 28),
+        usage_quantity=Decimal(usage), unit='GB', price_model='single',
+        unit_price=Decimal('0.1000'), total_amount=Decimal(total), status=status
+    ))
+
+
+class TestRating:
+    """Tests for vectorized rating"""
+
+    def test_price_models(self):
+        """Test single, multi and tiered amounts"""
+        usage = np.array([0, 50, 100, 600])
+
+        single = rate_usage(usage, TierTable('single', unit_price=0.1))
+        multi = rate_usage(usage, TierTable('multi', tiers=TIERS))
+        tiered = rate_usage(usage, TierTable('tiered', tiers=TIERS))
+
+        assert single.tolist() == [0.0, 5.0, 10.0, 60.0]
+        assert multi.tolist() == [0.0, 5.0, 8.0, 30.0]
+        # 100 * 0.10 + 400 * 0.08 + 100 * 0.05
+        assert tiered.tolist() == [0.0, 5.0, 10.0, 47.0]
+
+    @pytest.mark.parametrize('spec', [
+        {'price_model': 'dynamic', 'unit_price': 1},
+        {'price_model': 'single'},
+        {'price_model': 'tiered', 'tiers': TIERS[1:]},
+        {'price_model': 'tiered', 'tiers': [TIERS[0], TIERS[2]]},
+        {'price_model': 'tiered', 'tiers': TIERS[:2]},
+        {'price_model': 'multi', 'tiers': [{'min_quantity': 0, 'max_quantity': None, 'unit_price': -1}]},
+    ])
+    def test_invalid_candidates(self, spec):
+        """Test unsupported models and malformed tier tables are rejected"""
+        with pytest.raises(PricingSimulationError):
+            TierTable.from_spec(spec)
+
+    def test_process_pool_matches_inline(self, monkeypatch):
+        """Test chunked process pool rating equals inline rating"""
+        monkeypatch.setattr(simulation_module, 'RATING_CHUNK_SIZE', 1000)
+        usage = np.random.default_rng(7).uniform(0, 2000, size=5000).round(2)
+        table = TierTable('tiered', tiers=TIERS)
+
+        result = PricingSimulator(max_workers=2, parallel_threshold=0).rate(usage, table)
+
+        assert np.array_equal(result, rate_usage(usage, table))
+
+
+class TestSimulate:
+    """Tests for what-if comparisons"""
+
+    def test_per_customer_deltas_and_summary(self, simulation_session):
+        """Test per-settlement re-rating summed per customer against billed totals"""
+        _settlement(simulation_session, 1, '600', '60.00', month=1)
+        _settlement(simulation_session, 1, '50', '5.00', month=2)
+        _settlement(simulation_session, 2, '100', '10.00')
+        _settlement(simulation_session, 3, '1000', '100.00', status='cancelled')
+        _settlement(simulation_session, 3, '80', '8.00', month=5)
+        simulation_session.flush()
+
+        result = PricingSimulator().simulate(
+            simulation_session, TierTable.from_spec({'price_model': 'tiered', 'tiers': TIERS}),
+            datetime(2026, 1, 1), datetime(2026, 3, 31)
+        )
+
+        assert result['customers'] == [
+            {'customer_id': 1, 'settlements': 2, 'old_total': 65.0, 'new_total': 52.0,
+             'delta': -13.0, 'delta_pct': -20.0},
+            {'customer_id': 2, 'settlements': 1, 'old_total': 10.0, 'new_total': 10.0,
+             'delta': 0.0, 'delta_pct': 0.0},
+        ]
+        summary = result['summary']
+        assert (summary['customers'], summary['settlements']) == (2, 3)
+        assert (summary['old_total'], summary['new_total'], summary['delta_total']) == (75.0, 62.0, -13.0)
+        assert (summary['increased'], summary['decreased'], summary['unchanged']) == (0, 1, 1)
+        assert sum(bucket['customers'] for bucket in summary['delta_pct_histogram']) == 2
+
+    def test_customer_filter_top_and_no_writes(self, simulation_session):
+        """Test customer selection, top-N truncation and that nothing is written"""
+        _settlement(simulation_session, 1, '100', '10.00')
+        _settlement(simulation_session, 2, '1000', '100.00')
+        _settlement(simulation_session, 3, '10', '1.00')
+        simulation_session.commit()
+
+        result = PricingSimulator().simulate(
+            simulation_session, TierTable('single', unit_price=0.2),
+            datetime(2026, 1, 1), datetime(2026, 1, 31), customer_ids=[1, 2], top=1
+        )
+
+        assert [row['customer_id'] for row in result['customers']] == [2]
+        assert result['summary']['customers'] == 2
+        assert not simulation_session.new and not simulation_session.dirty
+        assert simulation_session.scalar(select(func.sum(SettlementRecord.total_amount))) == Decimal('111.00')
+
+    @pytest.mark.parametrize('top', [0, -5, 'all', 2.5, True])
+    def test_invalid_top_is_rejected(self, top):
+        """Test the API rejects a top that is not a positive integer before querying"""
+        factory = Mock()
+        request = Mock(json={
+            'period_start': '2026-01-01', 'period_end': '2026-01-31',
+            'candidate': {'price_model': 'single', 'unit_price': 0.2}, 'top': top
+        })
+
+        with patch('backend.api.settlements.DatabaseSessionFactory', factory):
+            response = asyncio.run(simulate_pricing(request))
+
+        assert response.status == 400
+        assert json.loads(response.body)['error'] == 'Invalid top'
+        factory.assert_not_called()
@@ -0,0 +1,220 @@
+"""
+Tests for Progress Events - Story 6.4
+Tests for the progress event bus, coalescing publisher and batch task events
+"""
+
+import asyncio
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from backend.services.batch_processing_service import BatchProcessingService
+from backend.services.batch_task_store import MemoryTaskStore
+from backend.services.progress_events import (
+    MemoryProgressBus,
+    ProgressEventError,
+    ProgressPublisher,
+    create_progress_bus,
+    encode_event,
+    is_final_event
+)
+
+
+class TestMemoryProgressBus:
+    """Tests for the in-process broadcaster"""
+
+    def test_fan_out_from_worker_thread(self):
+        """Test events published from another thread reach every subscriber"""
+        bus = MemoryProgressBus()
+
+        async def scenario():
+            first = await bus.subscribe('task-1')
+            second = await bus.subscribe('task-1')
+            other = await bus.subscribe('task-2')
+
+            worker = threading.Thread(target=bus.publish, args=('task-1', {'progress': 10}))
+            worker.start()
+            worker.join()
+
+            received = (await first.get(timeout=1), await second.get(timeout=1), await other.get(timeout=0.05))
+            for subscription in (first, second, other):
+                await subscription.close()
+            return received
+
+        assert asyncio.run(scenario()) == ({'progress': 10}, {'progress': 10}, None)
+        assert bus.subscriber_count('task-1') == 0
+
+    def test_slow_subscriber_drops_oldest(self):
+        """Test a full subscriber queue keeps the newest events"""
+        bus = MemoryProgressBus()
+
+        async def scenario():
+            async with await bus.subscribe('task') as subscription:
+                for progress in range(150):
+                    bus.publish('task', {'progress': progress})
+                await asyncio.sleep(0)
+                return await subscription.get(timeout=1)
+
+        assert asyncio.run(scenario()) == {'progress': 50}
+
+
+class TestProgressPublisher:
+    """Tests for coalescing"""
+
+    def test_intermediate_events_are_coalesced(self):
+        """Test only one progress event per interval is published"""
+        bus = Mock()
+        publisher = ProgressPublisher(bus, min_interval=60)
+        build = Mock(return_value={'progress': 1})
+
+        results = [publisher.publish('task', build) for _ in range(5)]
+
+        assert results == [True, False, False, False, False]
+        assert build.call_count == 1
+        assert bus.publish.call_count == 1
+
+    def test_final_event_always_published(self):
+        """Test final events bypass coalescing"""
+        bus = Mock()
+        publisher = ProgressPublisher(bus, min_interval=60)
+
+        publisher.publish('task', lambda: {'status': 'processing'})
+        assert publisher.publish('task', lambda: {'status': 'completed'}, final=True)
+
+        assert bus.publish.call_count == 2
+
+    def test_last_suppressed_event_is_flushed(self):
+        """Test the newest suppressed event is published when the interval ends"""
+        bus = Mock()
+        flushed = threading.Event()
+        bus.publish.side_effect = lambda key, event: event['progress'] == 3 and flushed.set()
+        publisher = ProgressPublisher(bus, min_interval=0.05)
+
+        for progress in (1, 2, 3):
+            publisher.publish('task', lambda progress=progress: {'progress': progress})
+
+        assert flushed.wait(timeout=2)
+        assert [call.args[1]['progress'] for call in bus.publish.call_args_list] == [1, 3]
+        assert publisher.pending_count() == 0
+
+    def test_final_event_cancels_pending_flush(self):
+        """Test a final event replaces a suppressed progress event"""
+        bus = Mock()
+        publisher = ProgressPublisher(bus, min_interval=60)
+
+        publisher.publish('task', lambda: {'progress': 1})
+        publisher.publish('task', lambda: {'progress': 2})
+        publisher.publish('task', lambda: {'status': 'completed'}, final=True)
+
+        assert publisher.pending_count() == 0
+        assert [call.args[1] for call in bus.publish.call_args_list] == [{'progress': 1}, {'status': 'completed'}]
+
+    def test_publish_times_are_pruned(self):
+        """Test tasks that never send a final event do not accumulate"""
+        publisher = ProgressPublisher(Mock(), min_interval=0)
+
+        with patch('backend.services.progress_events.PUBLISHER_PRUNE_THRESHOLD', 10):
+            for i in range(100):
+                publisher.publish(f'task-{i}', dict)
+
+        assert len(publisher._last_published) <= 11
+
+    def test_bus_errors_do_not_propagate(self):
+        """Test a failing bus never fails the task"""
+        bus = Mock()
+        bus.publish.side_effect = ConnectionError('down')
+
+        assert ProgressPublisher(bus, min_interval=0).publish('task', dict) is False
+
+
+class TestProgressEventHelpers:
+    """Tests for helpers and factory"""
+
+    def test_is_final_event(self):
+        """Test final detection for batch task and Celery events"""
+        assert is_final_event({'status': 'cancelled'})
+        assert is_final_event({'state': 'SUCCESS', 'status': 'completed'})
+        assert not is_final_event({'status': 'processing'})
+        assert not is_final_event({'state': 'PROGRESS', 'status': 'Imported 100/200 rows'})
+
+    def test_encode_event_serializes_datetimes(self):
+        """Test events are JSON encoded"""
+        from datetime import datetime
+        assert encode_event({'at': datetime(2026, 1, 2)}) == '{"at": "2026-01-02T00:00:00"}'
+
+    def test_create_progress_bus(self):
+        """Test backend selection"""
+        assert isinstance(create_progress_bus('memory'), MemoryProgressBus)
+        with pytest.raises(ProgressEventError):
+            create_progress_bus('kafka')
+
+
+class TestBatchTaskEvents:
+    """Tests for events published by batch tasks"""
+
+    def test_task_lifecycle_streams_to_subscriber(self):
+        """Test progress and final events of a batch task reach a subscriber"""
+        bus = MemoryProgressBus()
+        publisher = ProgressPublisher(bus, min_interval=60)
+        service = BatchProcessingService(max_workers=2, store=MemoryTaskStore())
+
+        async def scenario():
+            task = service.create_task('process', 1, total_records=50)
+            events = []
+            async with await bus.subscribe(task.id) as subscription:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, service.process_batch, task, list(range(50)), bool, 5
+                )
+                while True:
+                    event = await subscription.get(timeout=1)
+                    events.append(event)
+                    if is_final_event(event):
+                        return events
+
+        with patch('backend.services.batch_processing_service.progress_publisher', publisher):
+            events = asyncio.run(scenario())
+
+        # start event, coalesced progress, then the final state
+        assert events[0]['status'] == 'processing'
+        assert len(events) == 2
+        assert events[-1]['status'] == 'completed'
+        assert events[-1]['progress'] == 100
+
+    def test_cancel_task_publishes_final_event(self):
+        """Test cancelling through the service notifies subscribers"""
+        publisher = Mock()
+        service = BatchProcessingService(store=MemoryTaskStore())
+        task = service.create_task('import', 1)
+
+        with patch('backend.services.batch_processing_service.progress_publisher', publisher):
+            assert service.cancel_task(task.id, user_id=1)
+
+        key, build_event = publisher.publish.call_args[0]
+        assert key == task.id
+        assert build_event()['status'] == 'cancelled'
+        assert publisher.publish.call_args[1] == {'final': True}
+
+
+class TestCeleryProgressEvents:
+    """Tests for events published by Celery tasks"""
+
+    def test_report_progress_publishes_under_batch_task(self):
+        """Test Celery progress is recorded and published for the batch task"""
+        from backend.tasks import report_progress
+
+        celery_task = Mock()
+        celery_task.request.id = 'celery-1'
+        publisher = Mock()
+
+        with patch('backend.tasks.progress_publisher', publisher):
+            report_progress(celery_task, 'PROGRESS', {'current': 5, 'total': 10}, batch_task_id='batch-1')
+            report_progress(celery_task, 'SUCCESS', {'status': 'completed'}, batch_task_id='batch-1', final=True)
+
+        celery_task.update_state.assert_called_once_with(state='PROGRESS', meta={'current': 5, 'total': 10})
+        key, build_event = publisher.publish.call_args_list[0][0]
+        assert key == 'batch-1'
+        assert build_event() == {
+            'task_id': 'batch-1', 'celery_task_id': 'celery-1', 'state': 'PROGRESS', 'current': 5, 'total': 10
+        }
+        assert publisher.publish.call_args_list[1][1] == {'final': True}
@@ -0,0 +1,267 @@
+"""
+Tests for Reminder Dispatcher - Story 3.5
+Tests for the overdue query, per-customer rendering, transports and bulk recording
+"""
+
+import smtplib
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.auth import User
+from backend.models.database_models import Base, Customer, SettlementRecord
+from backend.models.reminder_models import ReminderRecord
+from backend.services.reminder_dispatcher import (
+    MemoryTransport,
+    RateLimiter,
+    ReminderDispatcher,
+    ReminderDispatchError,
+    ReminderMessage,
+    SMTPTransport,
+    create_transport
+)
+
+AS_OF = datetime(2026, 10, 1, 1, 0, 0)
+
+
+@pytest.fixture
+def reminder_session():
+    """SQLite session with customers, settlements and reminder records"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(
+        engine, tables=[User.__table__, Customer.__table__, SettlementRecord.__table__, ReminderRecord.__table__]
+    )
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _add_customer(session, index, email='finance@example.com'):
+    customer = Customer(
+        customer_id=f'cust-{index}',
+        company_name=f'Company {index}',
+        contact_name=f'Contact {index}',
+        contact_phone='13800138000',
+        email=email
+    )
+    session.add(customer)
+    session.flush()
+    return customer
+
+
+def _add_settlement(session, customer, age_days, status='pending', amount='1000.00', currency='CNY'):
+    created_at = AS_OF - timedelta(days=age_days)
+    settlement = SettlementRecord(
+        record_id=f'SET-{customer.id}-{age_days}-{status}',
+        customer_id=customer.id,
+        config_id=1,
+        period_start=created_at - timedelta(days=30),
+        period_end=created_at,
+        usage_quantity=Decimal('10'),
+        unit='GB',
+        price_model='fixed',
+        unit_price=Decimal('100'),
+        total_amount=Decimal(amount),
+        currency=currency,
+        status=status,
+        created_at=created_at
+    )
+    session.add(settlement)
+    session.flush()
+    return settlement
+
+
+def _dispatcher(session, transport=None, **kwargs):
+    return ReminderDispatcher(
+        session, transport=transport or MemoryTransport(), rate_limiter=RateLimiter(0), **kwargs
+    )
+
+
+class TestOverdueDispatch:
+    """Tests for ReminderDispatcher.dispatch"""
+
+    def test_one_message_per_customer_and_one_record_per_settlement(self, reminder_session):
+        """Test overdue settlements are grouped per customer"""
+        first = _add_customer(reminder_session, 1)
+        second = _add_customer(reminder_session, 2, email='ap@example.com')
+        _add_settlement(reminder_session, first, 45, amount='100.50')
+        _add_settlement(reminder_session, first, 40, status='approved', amount='200.00', currency='USD')
+        _add_settlement(reminder_session, first, 10)  # within the payment term
+        _add_settlement(reminder_session, first, 90, status='paid')
+        _add_settlement(reminder_session, second, 60)
+        reminder_session.commit()
+        transport = MemoryTransport()
+
+        totals = _dispatcher(reminder_session, transport).dispatch(as_of=AS_OF)
+
+        assert totals == {'customers': 2, 'settlements': 3, 'sent': 3, 'failed': 0, 'skipped': 0}
+        assert [message.recipient for message in transport.sent] == ['finance@example.com', 'ap@example.com']
+        body = transport.sent[0].body
+        assert 'CNY 100.50' in body and 'USD 200.00' in body
+        assert '逾期 15 天' in body
+        assert transport.opened == 1
+
+        records = reminder_session.execute(select(ReminderRecord)).scalars().all()
+        assert len(records) == 3
+        assert {record.reminder_count for record in records} == {1}
+        assert {record.reminder_method for record in records} == {'email_template:first'}
+
+    def test_interval_and_escalation(self, reminder_session):
+        """Test reminders repeat after the interval, escalate and stop at the maximum"""
+        customer = _add_customer(reminder_session, 1)
+        _add_settlement(reminder_session, customer, 45)
+        reminder_session.commit()
+        transport = MemoryTransport()
+        dispatcher = _dispatcher(reminder_session, transport, interval_days=7, max_reminders=2)
+
+        dispatcher.dispatch(as_of=AS_OF)
+        same_night = dispatcher.dispatch(as_of=AS_OF + timedelta(hours=1))
+        dispatcher.dispatch(as_of=AS_OF + timedelta(days=8))
+        after_max = dispatcher.dispatch(as_of=AS_OF + timedelta(days=16))
+
+        assert same_night['customers'] == 0
+        assert after_max['customers'] == 0
+        assert [message.level for message in transport.sent] == ['first', 'second']
+
+    def test_failed_sends_are_recorded_and_retried(self, reminder_session):
+        """Test a refused recipient is recorded as failed and reminded again next run"""
+        customer = _add_customer(reminder_session, 1, email='bounce@example.com')
+        _add_settlement(reminder_session, customer, 45)
+        no_email = _add_customer(reminder_session, 2, email=None)
+        _add_settlement(reminder_session, no_email, 45)
+        reminder_session.commit()
+
+        totals = _dispatcher(reminder_session, MemoryTransport(fail_recipients=['bounce@example.com'])).dispatch(
+            as_of=AS_OF
+        )
+        retry = _dispatcher(reminder_session).dispatch(as_of=AS_OF + timedelta(hours=1))
+
+        assert totals['failed'] == 1
+        assert totals['skipped'] == 1
+        assert retry['sent'] == 1
+        statuses = reminder_session.execute(
+            select(ReminderRecord.send_status, ReminderRecord.reminder_count).order_by(ReminderRecord.id)
+        ).all()
+        assert statuses == [('failed', 1), ('sent', 1)]
+
+    def test_pages_never_split_a_customer(self, reminder_session):
+        """Test keyset pages keep each customer's settlements in one message"""
+        for index in range(1, 4):
+            customer = _add_customer(reminder_session, index, email=f'c{index}@example.com')
+            for age in range(40, 40 + index * 2):
+                _add_settlement(reminder_session, customer, age)
+        reminder_session.commit()
+        transport = MemoryTransport()
+
+        totals = _dispatcher(reminder_session, transport, page_size=3).dispatch(as_of=AS_OF)
+
+        assert totals['settlements'] == 12
+        assert [len(message.settlements) for message in transport.sent] == [2, 4, 6]
+
+    def test_one_select_per_page(self, reminder_session):
+        """Test the overdue rows of a page come from a single query"""
+        for index in range(1, 6):
+            _add_settlement(reminder_session, _add_customer(reminder_session, index), 45)
+        reminder_session.commit()
+        statements = []
+        event.listen(
+            reminder_session.get_bind(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+
+        _dispatcher(reminder_session).dispatch(as_of=AS_OF)
+
+        assert sum(1 for statement in statements if statement.lstrip().startswith('SELECT')) == 1
+        assert sum(1 for statement in statements if statement.lstrip().startswith('INSERT')) == 1
+
+    def test_reminders_are_looked_up_per_settlement(self, reminder_session):
+        """Test the page query reads earlier reminders by settlement instead of grouping the whole table"""
+        customer = _add_customer(reminder_session, 1)
+        _add_settlement(reminder_session, customer, 45)
+        reminder_session.commit()
+        statements = []
+        event.listen(
+            reminder_session.get_bind(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+
+        _dispatcher(reminder_session).dispatch(as_of=AS_OF)
+
+        page = next(statement for statement in statements if statement.lstrip().startswith('SELECT'))
+        assert 'GROUP BY' not in page
+        assert page.count('reminder_records.settlement_id = settlement_records.id') == 3
+
+    def test_dry_run_records_nothing(self, reminder_session):
+        """Test dry runs render without sending"""
+        _add_settlement(reminder_session, _add_customer(reminder_session, 1), 45)
+        reminder_session.commit()
+        transport = MemoryTransport()
+
+        totals = _dispatcher(reminder_session, transport).dispatch(as_of=AS_OF, dry_run=True)
+
+        assert totals['customers'] == 1
+        assert transport.sent == []
+        assert reminder_session.execute(select(ReminderRecord)).first() is None
+
+
+class TestTransports:
+    """Tests for transports and rate limiting"""
+
+    def _message(self, recipient='a@example.com'):
+        return ReminderMessage(1, recipient, 'Subject', 'Body', level='first', settlements=[])
+
+    def test_smtp_reuses_connection_and_reconnects(self):
+        """Test one SMTP connection serves many messages and is re-opened once dropped"""
+        smtp_class = Mock()
+        connection = smtp_class.return_value
+        connection.send_message.side_effect = [None, smtplib.SMTPServerDisconnected(), None, None]
+        transport = SMTPTransport(host='smtp.test', port=25, username='', use_tls=False, smtp_class=smtp_class)
+
+        with transport:
+            for _ in range(3):
+                transport.send(self._message())
+
+        assert smtp_class.call_count == 2
+        assert connection.send_message.call_count == 4
+        connection.quit.assert_called_once()
+
+    def test_smtp_recycles_connection_after_limit(self):
+        """Test connections are recycled after messages_per_connection sends"""
+        smtp_class = Mock()
+        transport = SMTPTransport(
+            host='smtp.test', use_tls=True, username='user', password='secret',
+            messages_per_connection=2, smtp_class=smtp_class
+        )
+
+        with transport:
+            for _ in range(5):
+                transport.send(self._message())
+
+        assert smtp_class.call_count == 3
+        smtp_class.return_value.login.assert_called_with('user', 'secret')
+
+    def test_rate_limiter_sleeps_when_bucket_empty(self):
+        """Test the token bucket enforces the sustained rate"""
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(rate=10, burst=2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            limiter.acquire()
+
+        assert sleeps == pytest.approx([0.1, 0.1])
+
+    def test_create_transport(self):
+        """Test transport selection"""
+        assert isinstance(create_transport('memory'), MemoryTransport)
+        with pytest.raises(ReminderDispatchError):
+            create_transport('pigeon')
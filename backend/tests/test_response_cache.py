@@ -0,0 +1,266 @@
+"""
+Tests for Response Cache - Story 4.1
+Tests for cached analytics responses, ETags, stale-while-revalidate, coalescing and invalidation
+"""
+
+import asyncio
+import threading
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sanic import json
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.auth import User
+from backend.models.database_models import Base, Customer, SettlementRecord
+from backend.services import response_cache as cache_module
+from backend.services.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    ResponseCacheError,
+    cached_response,
+    track_response_cache,
+    untrack_response_cache
+)
+
+
+def _request(path='/dashboard/metrics', args=None, headers=None, role=None):
+    """Minimal request carrying what the cache reads"""
+    req = SimpleNamespace(path=path, method='GET', args=args or {}, headers=headers or {})
+    if role:
+        req.current_user = {'user_id': 1, 'username': 'user', 'role': role}
+    return req
+
+
+def _handler(calls, delay=0, status=200):
+    async def handler(req):
+        calls.append(req)
+        if delay:
+            await asyncio.sleep(delay)
+        return json({'success': status == 200, 'data': {'calls': len(calls)}}, status=status)
+    return handler
+
+
+class TestServing:
+    """Tests for cache hits, keys and validators"""
+
+    def test_hit_and_not_modified(self):
+        """Test the second request is served from the cache and a matching ETag gets 304"""
+        cache, calls = ResponseCache(), []
+        view = cached_response(cache=cache)(_handler(calls))
+
+        async def scenario():
+            first = await view(_request())
+            second = await view(_request())
+            revalidated = await view(_request(headers={'If-None-Match': f'W/{first.headers["ETag"]}'}))
+            return first, second, revalidated
+
+        first, second, revalidated = asyncio.run(scenario())
+
+        assert len(calls) == 1
+        assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+        assert second.body == first.body and second.headers['ETag'] == first.headers['ETag']
+        assert revalidated.status == 304 and not revalidated.body
+        assert cache.metrics()['not_modified'] == 1
+
+    def test_key_normalizes_args_and_varies_by_role(self):
+        """Test argument order and cache busters share a key while roles do not"""
+        cache = ResponseCache()
+        tags = ('settlements',)
+
+        key = cache.key(_request(args={'dimension': ['month'], 'range': ['6']}), tags)
+
+        assert cache.key(_request(args={'range': ['6'], 'dimension': ['month'], '_': ['1700']}), tags) == key
+        assert cache.key(_request(args={'dimension': ['week'], 'range': ['6']}), tags) != key
+        assert cache.key(_request(args={'dimension': ['month'], 'range': ['6']}, role='admin'), tags) != key
+        with pytest.raises(ResponseCacheError):
+            cached_response(tags=('payments',))
+
+    def test_errors_are_not_cached(self):
+        """Test a failed response is recomputed on the next request"""
+        cache, calls = ResponseCache(), []
+        view = cached_response(cache=cache)(_handler(calls, status=500))
+
+        async def scenario():
+            return await view(_request()), await view(_request())
+
+        first, second = asyncio.run(scenario())
+
+        assert len(calls) == 2
+        assert first.status == second.status == 500
+        assert 'ETag' not in second.headers
+
+
+class TestConcurrency:
+    """Tests for request coalescing and stale-while-revalidate"""
+
+    def test_concurrent_misses_run_handler_once(self):
+        """Test simultaneous requests for one key share a single computation"""
+        cache, calls = ResponseCache(), []
+        view = cached_response(cache=cache)(_handler(calls, delay=0.05))
+
+        async def scenario():
+            return await asyncio.gather(*(view(_request()) for _ in range(5)))
+
+        responses = asyncio.run(scenario())
+
+        assert len(calls) == 1
+        assert len({response.body for response in responses}) == 1
+        assert cache.metrics()['coalesced'] == 4
+
+    def test_stale_served_while_one_refresh_runs(self):
+        """Test expired entries within the stale window are served and refreshed once"""
+        cache, calls = ResponseCache(ttl=0, stale_ttl=60), []
+        view = cached_response(cache=cache)(_handler(calls, delay=0.01))
+
+        async def scenario():
+            await view(_request())
+            stale = [await view(_request()), await view(_request())]
+            await asyncio.sleep(0.05)
+            refreshed = await view(_request())
+            await asyncio.sleep(0.05)
+            return stale, refreshed
+
+        stale, refreshed = asyncio.run(scenario())
+
+        assert [response.headers['X-Cache'] for response in stale] == ['STALE', 'STALE']
+        assert b'"calls":1' in stale[0].body
+        assert b'"calls":2' in refreshed.body
+        assert len(calls) == 3
+        assert cache.metrics()['refreshes'] == 2
+
+
+class TestInvalidation:
+    """Tests for invalidation on committed writes"""
+
+    @pytest.fixture
+    def session_factory(self):
+        """Response-cache-tracking session factory"""
+        engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(engine, tables=[User.__table__, Customer.__table__, SettlementRecord.__table__])
+        factory = sessionmaker(bind=engine)
+        track_response_cache(factory)
+        yield factory
+        untrack_response_cache(factory)
+        engine.dispose()
+
+    def test_commit_bumps_tag_generation(self, session_factory, monkeypatch):
+        """Test committed writes change keys of dependent responses only, rollbacks do not"""
+        cache = ResponseCache()
+        monkeypatch.setattr(cache_module, 'response_cache', cache)
+        stats_key = cache.key(_request('/dashboard/customer-stats'), ('customers',))
+        metrics_key = cache.key(_request(), ('settlements',))
+
+        session = session_factory()
+        session.add(Customer(
+            customer_id=f'cust-{uuid.uuid4().hex[:8]}', company_name='Company', contact_name='Contact',
+            contact_phone='13800138000'
+        ))
+        session.commit()
+        assert cache.key(_request('/dashboard/customer-stats'), ('customers',)) != stats_key
+        assert cache.key(_request(), ('settlements',)) == metrics_key
+
+        session.execute(update(SettlementRecord).values(status='approved'))
+        session.rollback()
+        assert cache.key(_request(), ('settlements',)) == metrics_key
+        session.execute(update(SettlementRecord).values(status='approved'))
+        session.commit()
+        assert cache.key(_request(), ('settlements',)) != metrics_key
+        session.close()
+
+    def test_invalidated_entries_are_recomputed(self):
+        """Test a response is recomputed after its tag is invalidated"""
+        cache, calls = ResponseCache(), []
+        view = cached_response(tags=('customers',), cache=cache)(_handler(calls))
+
+        async def scenario():
+            await view(_request())
+            cache.invalidate(['settlements'])
+            unaffected = await view(_request())
+            cache.invalidate(['customers'])
+            return unaffected, await view(_request())
+
+        unaffected, recomputed = asyncio.run(scenario())
+
+        assert unaffected.headers['X-Cache'] == 'HIT'
+        assert recomputed.headers['X-Cache'] == 'MISS'
+        assert len(calls) == 2
+        assert cache.metrics()['size'] == 1
+
+
+class TestSharedCache:
+    """Tests for the Redis tier"""
+
+    def test_entries_and_generations_shared(self, monkeypatch):
+        """Test another process serves the entry and sees invalidations"""
+        import redis
+        client = redis.Redis.from_url('redis://localhost:6379/15', decode_responses=True)
+        try:
+            client.ping()
+        except redis.exceptions.ConnectionError:
+            pytest.skip('Redis server not available')
+        monkeypatch.setattr(cache_module, 'COHERENCE_INTERVAL', 0)
+        prefix = f'test:{uuid.uuid4().hex}'
+        calls = []
+        api = cached_response(cache=ResponseCache(client=client, prefix=prefix))(_handler(calls))
+        worker_cache = ResponseCache(client=client, prefix=prefix)
+        worker = cached_response(cache=worker_cache)(_handler(calls))
+
+        async def scenario():
+            await api(_request())
+            shared = await worker(_request())
+            ResponseCache(client=client, prefix=prefix).invalidate(['settlements'])
+            return shared, await worker(_request())
+
+        shared, after = asyncio.run(scenario())
+
+        assert shared.headers['X-Cache'] == 'HIT'
+        assert worker_cache.metrics()['redis_hits'] == 1
+        assert after.headers['X-Cache'] == 'MISS'
+        assert len(calls) == 2
+
+    def test_redis_calls_run_off_the_event_loop(self, monkeypatch):
+        """Test serving reads and writes Redis in the executor, not on the event loop thread"""
+        monkeypatch.setattr(cache_module, 'COHERENCE_INTERVAL', 0)
+
+        class RecordingClient:
+            def __init__(self):
+                self.data, self.threads = {}, []
+
+            def get(self, key):
+                self.threads.append(threading.get_ident())
+                return self.data.get(key)
+
+            def set(self, key, value, ex=None):
+                self.threads.append(threading.get_ident())
+                self.data[key] = value
+
+            def mget(self, keys):
+                self.threads.append(threading.get_ident())
+                return [self.data.get(key) for key in keys]
+
+        client, calls = RecordingClient(), []
+        view = cached_response(cache=ResponseCache(client=client))(_handler(calls))
+        other = cached_response(cache=ResponseCache(client=client))(_handler(calls))
+
+        async def scenario():
+            await view(_request())
+            return threading.get_ident(), await other(_request())
+
+        loop_thread, shared = asyncio.run(scenario())
+
+        assert shared.headers['X-Cache'] == 'HIT' and len(calls) == 1
+        assert len(client.threads) == 5
+        assert loop_thread not in client.threads
+
+    def test_entry_round_trip(self):
+        """Test entries survive the Redis encoding"""
+        entry = CachedResponse(b'{"a": 1}', 200, 'application/json', ('customers',))
+
+        decoded = CachedResponse.decode(entry.encode())
+
+        assert (decoded.body, decoded.etag, decoded.tags, decoded.created_at) == (
+            entry.body, entry.etag, entry.tags, entry.created_at
+        )
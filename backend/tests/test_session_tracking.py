@@ -0,0 +1,75 @@
+"""
+Tests for Session Tracking
+Tests for the shared session hooks of balances, counters and caches
+"""
+
+from importlib import import_module
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models.database_models import Base, Customer
+from backend.services.session_tracking import (
+    TRACKED_MODULES,
+    SessionTracker,
+    track_sessions,
+    untrack_sessions
+)
+
+
+def _factory():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[Customer.__table__])
+    return sessionmaker(bind=engine)
+
+
+class TestSessionTracker:
+    """Tests for SessionTracker"""
+
+    def test_pending_state_follows_the_transaction(self):
+        """Test state is collected per transaction, handed over on commit and dropped on rollback"""
+        tracker = SessionTracker('test_tracker', set)
+        committed = []
+
+        @tracker.listens_for('after_flush')
+        def _after_flush(session, flush_context):
+            tracker.pending(session).update(obj.customer_id for obj in session.new)
+
+        @tracker.listens_for('after_commit')
+        def _after_commit(session):
+            committed.append(tracker.pop_pending(session))
+
+        factory = _factory()
+        tracker.track(factory)
+        tracker.track(factory)
+        session = factory()
+        session.add(Customer(customer_id='c1', company_name='A', contact_name='C', contact_phone='13800138000'))
+        session.flush()
+        assert tracker.peek_pending(session) == {'c1'}
+        session.rollback()
+        assert tracker.peek_pending(session) is None
+
+        session.add(Customer(customer_id='c2', company_name='B', contact_name='C', contact_phone='13800138000'))
+        session.commit()
+        assert committed == [{'c2'}]
+
+        tracker.untrack(factory)
+        session.add(Customer(customer_id='c3', company_name='C', contact_name='C', contact_phone='13800138000'))
+        session.commit()
+        assert committed == [{'c2'}]
+        assert not event.contains(factory, 'after_flush', _after_flush)
+        session.close()
+
+    def test_track_sessions_registers_every_module(self):
+        """Test the application's sessionmaker gets each consumer's listeners once"""
+        factory = _factory()
+
+        track_sessions(factory)
+        track_sessions(factory)
+        trackers = [import_module(name).session_tracker for name in TRACKED_MODULES]
+
+        assert all(tracker.is_tracking(factory) for tracker in trackers)
+        assert len({tracker.info_key for tracker in trackers}) == len(TRACKED_MODULES)
+        untrack_sessions(factory)
+        assert not any(tracker.is_tracking(factory) for tracker in trackers)
@@ -0,0 +1,247 @@
+"""
+Tests for Settlement Approval Service - Story 3.2
+Tests for bulk approval/rejection, concurrency conflicts and audit entries
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+import pytest
+from sanic.exceptions import Forbidden, NotFound, Unauthorized
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.api.settlement_approval import _single_transition
+from backend.api.settlements import settlement_bp
+from backend.models.archive_models import settlement_records_archive, settlement_writeoffs_archive
+from backend.models.auth import AccessLog, User
+from backend.models.customer_balance_models import CustomerBalance
+from backend.models.database_models import Base, Customer, SettlementRecord
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.services.customer_ledger import track_balances
+from backend.services.settlement_approval_service import (
+    SettlementApprovalError,
+    SettlementApprovalService
+)
+from backend.utils.jwt import create_access_token
+
+PERIOD_START = datetime(2026, 9, 1)
+PERIOD_END = datetime(2026, 9, 30)
+
+
+@pytest.fixture
+def approval_session():
+    """Balance-tracking SQLite session with an approver and two customers' settlements"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(
+        engine, tables=[
+            User.__table__, AccessLog.__table__, Customer.__table__, SettlementRecord.__table__,
+            PaymentRecord.__table__, SettlementWriteoff.__table__, CustomerBalance.__table__,
+            settlement_records_archive, settlement_writeoffs_archive
+        ]
+    )
+    factory = sessionmaker(bind=engine)
+    track_balances(factory)
+    session = factory()
+    session.add(User(username='approver', email='approver@example.com', password_hash='x', role='admin'))
+    for index in (1, 2):
+        session.add(Customer(
+            customer_id=f'cust-{index}', company_name=f'Company {index}',
+            contact_name='Contact', contact_phone='13800138000'
+        ))
+    session.flush()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _settlements(session, customer_id, count, status='pending', period_start=PERIOD_START):
+    settlements = [
+        SettlementRecord(
+            record_id=f'SET-{customer_id}-{status}-{period_start:%m}-{index}', customer_id=customer_id,
+            config_id=1, period_start=period_start, period_end=PERIOD_END, usage_quantity=Decimal('1'),
+            unit='GB', price_model='fixed', unit_price=Decimal('10.00'), total_amount=Decimal('10.00'),
+            status=status
+        )
+        for index in range(count)
+    ]
+    session.add_all(settlements)
+    session.commit()
+    return [settlement.id for settlement in settlements]
+
+
+def _statuses(session, ids):
+    return dict(session.execute(
+        select(SettlementRecord.id, SettlementRecord.status).where(SettlementRecord.id.in_(ids))
+    ).all())
+
+
+class TestBulkTransition:
+    """Tests for approving and rejecting by id"""
+
+    def test_per_record_outcomes(self, approval_session):
+        """Test updated, conflicting and missing records are reported individually"""
+        pending = _settlements(approval_session, 1, 3)
+        paid = _settlements(approval_session, 1, 1, status='paid')
+
+        result = SettlementApprovalService(chunk_size=2).bulk_transition(
+            approval_session, 'approve', 1, settlement_ids=pending + paid + [9999, pending[0]]
+        )
+
+        assert result['total'] == 5
+        assert (result['updated'], result['conflicts'], result['not_found']) == (3, 1, 1)
+        assert result['outcomes'][3] == {'settlement_id': paid[0], 'outcome': 'conflict', 'status': 'paid'}
+        assert result['outcomes'][4] == {'settlement_id': 9999, 'outcome': 'not_found', 'status': None}
+        assert set(_statuses(approval_session, pending).values()) == {'approved'}
+        approved = approval_session.get(SettlementRecord, pending[0])
+        assert approved.approved_at is not None
+
+    def test_status_guard_rejects_stale_selection(self, approval_session):
+        """Test a record changed between the SELECT and the UPDATE is a conflict"""
+        ids = _settlements(approval_session, 1, 2)
+
+        def concurrent_cancel(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('UPDATE settlement_records SET status'):
+                cursor.execute("UPDATE settlement_records SET status = 'cancelled' WHERE id = ?", (ids[1],))
+
+        event.listen(approval_session.get_bind(), 'before_cursor_execute', concurrent_cancel)
+        result = SettlementApprovalService().bulk_transition(
+            approval_session, 'approve', 1, settlement_ids=ids
+        )
+        event.remove(approval_session.get_bind(), 'before_cursor_execute', concurrent_cancel)
+
+        assert [outcome['outcome'] for outcome in result['outcomes']] == ['updated', 'conflict']
+        assert result['outcomes'][1]['status'] == 'cancelled'
+        assert _statuses(approval_session, ids) == {ids[0]: 'approved', ids[1]: 'cancelled'}
+        assert approval_session.execute(select(AccessLog.resource_id)).scalars().all() == [ids[0]]
+
+    def test_audit_entries_and_balances(self, approval_session):
+        """Test one audit entry per rejected record and balances follow the bulk UPDATE"""
+        ids = _settlements(approval_session, 1, 2)
+        assert approval_session.get(CustomerBalance, 1).open_amount == Decimal('20.00')
+
+        SettlementApprovalService().bulk_transition(
+            approval_session, 'reject', 1, settlement_ids=ids, remarks='用量数据错误', ip_address='10.0.0.1'
+        )
+
+        logs = approval_session.execute(select(AccessLog).order_by(AccessLog.resource_id)).scalars().all()
+        assert [(log.action, log.resource_type, log.resource_id, log.ip_address) for log in logs] == [
+            ('reject', 'settlement', ids[0], '10.0.0.1'), ('reject', 'settlement', ids[1], '10.0.0.1')
+        ]
+        assert json.loads(logs[0].accessed_fields) == {'from': 'pending', 'to': 'rejected', 'remarks': '用量数据错误'}
+        approval_session.expire_all()
+        assert approval_session.get(CustomerBalance, 1).open_amount == Decimal('0.00')
+
+    def test_invalid_requests(self, approval_session):
+        """Test unknown actions, statuses and missing selections are rejected"""
+        service = SettlementApprovalService()
+        with pytest.raises(SettlementApprovalError):
+            service.bulk_transition(approval_session, 'pay', 1, settlement_ids=[1])
+        with pytest.raises(SettlementApprovalError):
+            service.bulk_transition(approval_session, 'approve', 1)
+        with pytest.raises(SettlementApprovalError, match='paid'):
+            service.bulk_transition(approval_session, 'approve', 1, settlement_ids=[1], from_statuses=['paid'])
+        with pytest.raises(SettlementApprovalError, match='Unknown filters'):
+            service.bulk_transition(approval_session, 'approve', 1, filters={'run': 'gen-1'})
+
+
+class TestFilters:
+    """Tests for selecting settlements by filter"""
+
+    def test_filter_by_period_status_and_customers(self, approval_session):
+        """Test a filter selects one run's settlements of the given customers"""
+        first = _settlements(approval_session, 1, 2)
+        second = _settlements(approval_session, 2, 1)
+        rejected = _settlements(approval_session, 1, 1, status='rejected')
+        other_run = _settlements(approval_session, 1, 1, period_start=datetime(2026, 8, 1))
+
+        result = SettlementApprovalService().bulk_transition(
+            approval_session, 'approve', 1,
+            filters={'period_start': '2026-09-01', 'status': 'pending', 'customer_ids': [1]}
+        )
+
+        assert [outcome['settlement_id'] for outcome in result['outcomes']] == first
+        statuses = _statuses(approval_session, first + second + rejected + other_run)
+        assert [statuses[settlement_id] for settlement_id in second + rejected + other_run] == [
+            'pending', 'rejected', 'pending'
+        ]
+
+    def test_from_statuses_narrows_transition(self, approval_session):
+        """Test from_statuses keeps rejected records rejected"""
+        pending = _settlements(approval_session, 1, 1)
+        rejected = _settlements(approval_session, 1, 1, status='rejected')
+
+        result = SettlementApprovalService().bulk_transition(
+            approval_session, 'approve', 1, settlement_ids=pending + rejected, from_statuses=['pending']
+        )
+
+        assert [outcome['outcome'] for outcome in result['outcomes']] == ['updated', 'conflict']
+
+
+class TestSingleTransition:
+    """Tests for the per-record approve/reject endpoints"""
+
+    def _call(self, session, record_id, action, remarks=None):
+        session.close = Mock()
+        factory = Mock()
+        factory.return_value.get_session.return_value = session
+        with patch('backend.api.settlement_approval.DatabaseSessionFactory', factory):
+            return _single_transition(Mock(ip='10.0.0.1'), record_id, action, 1, remarks)
+
+    def test_transition_is_guarded_and_audited(self, approval_session):
+        """Test one record goes through the status guard and gets an audit entry"""
+        pending, paid = _settlements(approval_session, 1, 1) + _settlements(approval_session, 1, 1, status='paid')
+
+        approved = self._call(approval_session, pending, 'approve')
+        conflict = self._call(approval_session, paid, 'reject', remarks='Incorrect usage data')
+
+        assert approved.status == 200
+        assert json.loads(approved.body)['data'] == {'id': pending, 'status': 'approved', 'approved_by': 1}
+        assert conflict.status == 409
+        assert _statuses(approval_session, [pending, paid]) == {pending: 'approved', paid: 'paid'}
+        assert approval_session.execute(select(AccessLog.resource_id)).scalars().all() == [pending]
+        with pytest.raises(NotFound):
+            self._call(approval_session, 9999, 'approve')
+
+
+class TestApprovalRoutes:
+    """Tests for authentication of the approval endpoints"""
+
+    def _handler(self, uri):
+        return next(route.handler for route in settlement_bp._future_routes if route.uri == uri)
+
+    def _request(self, body, role=None):
+        headers = {}
+        if role:
+            token = create_access_token({'user_id': 1, 'username': 'approver', 'role': role})
+            headers['Authorization'] = f'Bearer {token}'
+        return Mock(json=body, headers=headers, ip='10.0.0.1', current_user=None)
+
+    def test_routes_require_an_approver(self):
+        """Test anonymous and operator requests are refused"""
+        for uri in ('/<record_id:int>/approve', '/<record_id:int>/reject'):
+            with pytest.raises(Unauthorized):
+                asyncio.run(self._handler(uri)(self._request({}), 1))
+            with pytest.raises(Forbidden):
+                asyncio.run(self._handler(uri)(self._request({}, role='operator'), 1))
+        for uri in ('/bulk-approve', '/bulk-reject'):
+            with pytest.raises(Unauthorized):
+                asyncio.run(self._handler(uri)(self._request({'settlement_ids': [1]})))
+
+    def test_actor_is_the_authenticated_user(self, approval_session):
+        """Test the audited actor comes from the token, not the request body"""
+        ids = _settlements(approval_session, 1, 2)
+        approval_session.close = Mock()
+        factory = Mock()
+        factory.return_value.get_session.return_value = approval_session
+        body = {'settlement_ids': ids, 'approved_by': 2, 'approval_remarks': 'Checked'}
+
+        with patch('backend.api.settlement_approval.DatabaseSessionFactory', factory):
+            response = asyncio.run(self._handler('/bulk-approve')(self._request(body, role='supervisor')))
+
+        assert response.status == 200
+        assert json.loads(response.body)['data']['approved'] == 2
+        assert set(approval_session.execute(select(AccessLog.user_id)).scalars()) == {1}
@@ -0,0 +1,160 @@
+"""
+Tests for Settlement Rule Engine - Story 3.3
+Tests for rule staging, short-circuiting, parallel rules and metrics
+"""
+
+import threading
+
+import pytest
+
+from backend.services.settlement_rule_engine import (
+    LatencyHistogram,
+    RuleEngine,
+    RuleEngineError,
+    ValidationRule
+)
+
+
+def _passes(settlement, context, params):
+    return [], {}
+
+
+def _fails(message):
+    def check(settlement, context, params):
+        return [message], None
+    return check
+
+
+class TestStages:
+    """Tests for rule ordering"""
+
+    def test_fatal_rules_first_then_dependency_order(self):
+        """Test stages put fatal rules first and dependents after their dependencies"""
+        engine = RuleEngine()
+        engine.register(ValidationRule('amount', _passes, depends_on=['format']))
+        engine.register(ValidationRule('format', _passes))
+        engine.register(ValidationRule('sign', _passes, severity='fatal'))
+
+        stages = [[rule.name for rule in stage] for stage in engine.stages()]
+
+        assert stages == [['sign'], ['format'], ['amount']]
+
+    def test_invalid_dependencies(self):
+        """Test unknown and circular dependencies are rejected"""
+        engine = RuleEngine()
+        engine.register(ValidationRule('a', _passes, depends_on=['b']))
+        with pytest.raises(RuleEngineError, match='unknown'):
+            engine.stages()
+
+        engine.register(ValidationRule('b', _passes, depends_on=['a']))
+        with pytest.raises(RuleEngineError, match='Circular'):
+            engine.stages()
+
+    def test_invalid_metadata(self):
+        """Test unknown severities and cost classes are rejected"""
+        with pytest.raises(RuleEngineError):
+            ValidationRule('a', _passes, severity='critical')
+        with pytest.raises(RuleEngineError):
+            ValidationRule('a', _passes, cost='slow')
+
+
+class TestEvaluate:
+    """Tests for evaluating rules on one record"""
+
+    def test_results_in_registration_order_and_by_severity(self):
+        """Test messages are reported by severity in registration order"""
+        engine = RuleEngine()
+        engine.register(ValidationRule('spike', _fails('spike'), severity='warning'))
+        engine.register(ValidationRule('price', _fails('price')))
+        engine.register(ValidationRule('sign', _passes, severity='fatal'))
+
+        result = engine.evaluate(object(), None, {})
+
+        assert result['is_valid'] is False
+        assert result['errors'] == ['price']
+        assert result['warnings'] == ['spike']
+        assert [detail['check'] for detail in result['validation_details']] == ['spike', 'price', 'sign']
+
+    def test_fatal_failure_short_circuits(self):
+        """Test rules after a failed fatal rule are skipped"""
+        calls = []
+
+        def later(settlement, context, params):
+            calls.append('later')
+            return [], {}
+
+        engine = RuleEngine()
+        engine.register(ValidationRule('later', later))
+        engine.register(ValidationRule('sign', _fails('negative'), severity='fatal'))
+
+        result = engine.evaluate(object(), None, {})
+
+        assert result['errors'] == ['negative']
+        assert result['skipped_rules'] == ['later']
+        assert calls == []
+
+    def test_dependent_rule_skipped_when_dependency_fails(self):
+        """Test a rule only runs once its dependencies passed"""
+        engine = RuleEngine()
+        engine.register(ValidationRule('format', _fails('bad format')))
+        engine.register(ValidationRule('amount', _fails('bad amount'), depends_on=['format']))
+
+        result = engine.evaluate(object(), None, {})
+
+        assert result['errors'] == ['bad format']
+        assert result['skipped_rules'] == ['amount']
+
+    def test_exceptions_are_reported_and_counted(self):
+        """Test a raising rule becomes a validation error of that rule"""
+        def broken(settlement, context, params):
+            raise KeyError('missing')
+
+        engine = RuleEngine()
+        engine.register(ValidationRule('broken', broken))
+        engine.register(ValidationRule('ok', _passes))
+
+        result = engine.evaluate(object(), None, {})
+        metrics = engine.metrics()
+
+        assert result['errors'] == ["Validation error in broken: 'missing'"]
+        assert metrics['broken']['exceptions'] == 1
+        assert metrics['ok']['calls'] == 1
+        assert metrics['ok']['latency']['count'] == 1
+
+    def test_expensive_rules_run_concurrently(self):
+        """Test independent expensive rules of a stage run in parallel"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def waits(settlement, context, params):
+            barrier.wait()
+            return [], {}
+
+        engine = RuleEngine(max_workers=2)
+        engine.register(ValidationRule('first', waits, cost='expensive'))
+        engine.register(ValidationRule('second', waits, cost='expensive'))
+
+        assert engine.evaluate(object(), None, {})['is_valid'] is True
+
+
+class TestParametersAndMetrics:
+    """Tests for parameter defaults and latency histograms"""
+
+    def test_parameter_defaults_without_session(self):
+        """Test defaults are used until parameters are loaded"""
+        engine = RuleEngine()
+        engine.register(ValidationRule('spike', _passes, parameters={'spike_percent': 50}))
+
+        assert engine.parameters() == {'spike_percent': 50}
+
+    def test_histogram_quantiles(self):
+        """Test observations land in their buckets"""
+        histogram = LatencyHistogram(buckets_ms=[1, 10, 100])
+        for seconds in [0.0005] * 8 + [0.005, 0.5]:
+            histogram.observe(seconds)
+
+        snapshot = histogram.snapshot()
+
+        assert snapshot['count'] == 10
+        assert snapshot['buckets'] == {'le_1': 8, 'le_10': 1, 'le_100': 0, 'le_inf': 1}
+        assert snapshot['p50_ms'] == 1
+        assert snapshot['p99_ms'] == 500.0
@@ -0,0 +1,169 @@
+"""
+Tests for Settlement Validation Service - Story 3.3
+Tests for the validation rules and batch validation with prefetched context
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.auth import User
+from backend.models.database_models import Base, Customer, PriceConfig, SettlementRecord
+from backend.models.system_parameters import SystemParameter
+from backend.services.price_config_cache import price_config_cache
+from backend.services.settlement_rule_engine import settlement_rule_engine
+from backend.services.settlement_validation_service import SettlementValidationService
+
+PERIOD = datetime(2026, 9, 1)
+
+
+@pytest.fixture
+def validation_session():
+    """SQLite session with customers, price configs, settlements and system parameters"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(
+        engine, tables=[
+            User.__table__, Customer.__table__, PriceConfig.__table__, SettlementRecord.__table__,
+            SystemParameter.__table__
+        ]
+    )
+    session = sessionmaker(bind=engine)()
+    settlement_rule_engine.invalidate_parameters()
+    price_config_cache.clear()
+    yield session
+    session.close()
+    engine.dispose()
+    settlement_rule_engine.invalidate_parameters()
+    price_config_cache.clear()
+
+
+def _customer(session, index, unit_price='2.0000'):
+    customer = Customer(
+        customer_id=f'cust-{index}', company_name=f'Company {index}',
+        contact_name='Contact', contact_phone='13800138000'
+    )
+    session.add(customer)
+    session.flush()
+    config = PriceConfig(
+        config_id=f'cfg-{index}', customer_id=customer.id, name='Standard',
+        price_model='fixed', unit_price=Decimal(unit_price)
+    )
+    session.add(config)
+    session.flush()
+    return customer, config
+
+
+def _settlement(session, customer, config, month, usage, unit_price='2.0000', total=None, status='pending'):
+    quantity, price = Decimal(usage), Decimal(unit_price)
+    settlement = SettlementRecord(
+        record_id=f'SET-{customer.id}-{month}-{status}', customer_id=customer.id, config_id=config.id,
+        period_start=PERIOD + timedelta(days=30 * month), period_end=PERIOD + timedelta(days=30 * (month + 1)),
+        usage_quantity=quantity, unit='GB', price_model='fixed', unit_price=price,
+        total_amount=Decimal(total) if total is not None else quantity * price, status=status
+    )
+    session.add(settlement)
+    session.flush()
+    return settlement
+
+
+def _month_run(session):
+    """Three customers with history and a month of new settlements"""
+    settlements = []
+    first, first_config = _customer(session, 1)
+    _settlement(session, first, first_config, 0, '100')
+    settlements.append(_settlement(session, first, first_config, 1, '180'))          # usage spike
+    second, second_config = _customer(session, 2, unit_price='3.0000')
+    _settlement(session, second, second_config, 0, '100', unit_price='3.0000')
+    _settlement(session, second, second_config, 1, '10', unit_price='3.0000', status='draft')
+    settlements.append(_settlement(session, second, second_config, 2, '40', unit_price='2.5000'))  # drop, price
+    settlements.append(_settlement(session, second, second_config, 3, '40', unit_price='3.0000', total='130'))
+    third, third_config = _customer(session, 3)
+    settlements.append(_settlement(session, third, third_config, 0, '50'))           # no history
+    session.commit()
+    return settlements
+
+
+class TestRules:
+    """Tests for the scalar validation path"""
+
+    def test_usage_spike_is_a_warning(self, validation_session):
+        """Test a >50% usage increase warns without failing"""
+        settlement = _month_run(validation_session)[0]
+
+        result = SettlementValidationService().validate_settlement(settlement, validation_session)
+
+        assert result['is_valid'] is True
+        assert result['warnings'] == ['用量突增警告：当前用量 180.0 比上期用量 100.0 增长了 80.00%']
+
+    def test_price_and_total_errors(self, validation_session):
+        """Test unit price and total amount mismatches are errors"""
+        settlements = _month_run(validation_session)
+        service = SettlementValidationService()
+
+        price = service.validate_settlement(settlements[1], validation_session)
+        total = service.validate_settlement(settlements[2], validation_session)
+
+        assert price['is_valid'] is False
+        assert price['errors'][0].startswith('单价不一致')
+        assert total['errors'] == ['总金额计算错误：期望总额 ¥120.00，实际总额 ¥130.00，差异 ¥10.00']
+
+    def test_negative_values_short_circuit(self, validation_session):
+        """Test a fatal rule failure skips the remaining rules"""
+        customer, config = _customer(validation_session, 1)
+        settlement = _settlement(validation_session, customer, config, 0, '-5', total='10')
+
+        result = SettlementValidationService().validate_settlement(settlement, validation_session)
+
+        assert result['errors'] == ['用量不能为负数：-5.0']
+        assert result['skipped_rules'] == ['usage_spike', 'unit_price_consistency', 'total_amount_calculation']
+        assert result['validation_details'] == [{'check': 'negative_values'}]
+
+    def test_thresholds_from_system_parameters(self, validation_session):
+        """Test rule parameters are read from system_parameters"""
+        settlement = _month_run(validation_session)[0]
+        validation_session.add_all([
+            SystemParameter(key='validation_usage_spike_percent', value='100', value_type='decimal'),
+            SystemParameter(key='validation_amount_tolerance', value='abc', value_type='string')
+        ])
+        validation_session.commit()
+
+        result = SettlementValidationService().validate_settlement(settlement, validation_session)
+
+        assert result['warnings'] == []
+        assert settlement_rule_engine.parameters()['validation_amount_tolerance'] == Decimal('0.01')
+
+
+class TestValidateMany:
+    """Tests for batch validation"""
+
+    def test_results_identical_to_scalar_path(self, validation_session):
+        """Test every record gets the same result as validate_settlement"""
+        settlements = _month_run(validation_session)
+        service = SettlementValidationService()
+
+        scalar = [service.validate_settlement(settlement, validation_session) for settlement in settlements]
+        batch = service.validate_many(settlements, validation_session)
+
+        assert batch == scalar
+        assert [result['is_valid'] for result in batch] == [True, False, False, True]
+
+    def test_two_queries_per_batch(self, validation_session):
+        """Test the batch issues one window query, one price config query and one parameter read"""
+        settlements = _month_run(validation_session)
+        for settlement in settlements:
+            validation_session.refresh(settlement)
+        statements = []
+        event.listen(
+            validation_session.get_bind(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+
+        SettlementValidationService().validate_many(settlements, validation_session)
+
+        prefetch = [statement for statement in statements if 'system_parameters' not in statement]
+        assert len(statements) == 3
+        assert len(prefetch) == 2
+        assert 'row_number() OVER' in prefetch[0]
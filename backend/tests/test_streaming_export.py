@@ -0,0 +1,450 @@
+"""
+Tests for Streaming Export - Story 6.2
+Tests for constant-memory export, export datasets and export format writers
+"""
+
+import asyncio
+import csv
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sanic.exceptions import Forbidden, NotFound
+
+from backend.models.archive_models import access_logs_archive
+from backend.models.auth import AccessLog
+from backend.models.database_models import Base, Customer
+from backend.models.payment_models import PaymentRecord
+from backend.services.batch_processing_service import batch_service
+from backend.services.streaming_export import (
+    EXPORT_DATASETS,
+    HAS_PYARROW,
+    ExportError,
+    ExportWriter,
+    arrow_type_spec,
+    count_customers,
+    count_rows,
+    customer_export_statement,
+    export_customers_to_file,
+    export_dataset_to_file,
+    get_export_dataset,
+    get_export_file,
+    get_export_writer,
+    purge_export_files,
+    register_export_writer
+)
+from backend.utils.jwt import create_access_token
+
+
+def _add_customers(session, count, **overrides):
+    session.bulk_insert_mappings(Customer, [
+        dict({
+            'customer_id': f'cust-{i}',
+            'company_name': f'Company {i}',
+            'contact_name': f'Contact {i}',
+            'contact_phone': '13800138000',
+            'status': 'active' if i % 2 == 0 else 'inactive',
+            'created_at': datetime(2026, 1, 1, 12, 0, 0)
+        }, **overrides)
+        for i in range(count)
+    ])
+    session.commit()
+
+
+class TestExportFormats:
+    """Tests for the format writers"""
+
+    def test_csv(self, sqlite_session, tmp_path):
+        """Test CSV export with header and ISO timestamps"""
+        _add_customers(sqlite_session, 3)
+
+        export = export_customers_to_file(
+            sqlite_session, 'csv', fields=['company_name', 'created_at'], export_dir=str(tmp_path)
+        )
+
+        with open(export['file_path'], encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == ['company_name', 'created_at']
+        assert rows[1] == ['Company 0', '2026-01-01T12:00:00']
+        assert export['total'] == 3
+        assert export['file_type'] == 'text/csv'
+
+    def test_xlsx_write_only(self, sqlite_session, tmp_path):
+        """Test Excel export readable by openpyxl"""
+        import openpyxl
+        _add_customers(sqlite_session, 3)
+
+        export = export_customers_to_file(sqlite_session, 'excel', export_dir=str(tmp_path), batch_size=2)
+
+        sheet = openpyxl.load_workbook(export['file_path'], read_only=True).active
+        rows = list(sheet.iter_rows(values_only=True))
+        assert rows[0][1] == 'company_name'
+        assert len(rows) == 4
+        assert export['file_name'].endswith('.xlsx')
+
+    def test_jsonl(self, sqlite_session, tmp_path):
+        """Test JSON Lines export"""
+        _add_customers(sqlite_session, 2)
+
+        export = export_customers_to_file(
+            sqlite_session, 'jsonl', fields=['customer_id', 'created_at'], export_dir=str(tmp_path)
+        )
+
+        with open(export['file_path'], encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        assert lines == [
+            {'customer_id': 'cust-0', 'created_at': '2026-01-01T12:00:00'},
+            {'customer_id': 'cust-1', 'created_at': '2026-01-01T12:00:00'}
+        ]
+
+    @pytest.mark.skipif(not HAS_PYARROW, reason='pyarrow not installed')
+    def test_parquet(self, sqlite_session, tmp_path):
+        """Test Parquet export flushes a row group every row_group_size rows"""
+        import pyarrow.parquet as pq
+        _add_customers(sqlite_session, 5)
+
+        export = export_customers_to_file(
+            sqlite_session, 'parquet', export_dir=str(tmp_path), batch_size=2,
+            writer_options={'row_group_size': 2}
+        )
+
+        parquet_file = pq.ParquetFile(export['file_path'])
+        assert parquet_file.metadata.num_rows == 5
+        assert parquet_file.metadata.num_row_groups == 3
+
+    def test_unknown_format(self):
+        """Test unsupported formats are rejected"""
+        with pytest.raises(ExportError):
+            get_export_writer('pdf')
+
+    def test_register_writer_plugin(self, sqlite_session, tmp_path):
+        """Test custom writers plug into the engine"""
+        written = []
+
+        class ListWriter(ExportWriter):
+            extension = 'txt'
+
+            def open(self):
+                pass
+
+            def write_rows(self, rows):
+                written.extend(rows)
+                self.rows_written += len(rows)
+
+            def close(self):
+                pass
+
+        register_export_writer('test-list', ListWriter)
+        _add_customers(sqlite_session, 3)
+
+        export = export_customers_to_file(sqlite_session, 'test-list', fields=['customer_id'], export_dir=str(tmp_path))
+
+        assert export['total'] == 3
+        assert [tuple(row) for row in written] == [('cust-0',), ('cust-1',), ('cust-2',)]
+
+
+@pytest.fixture
+def ledger_session():
+    """SQLite session with the payment and access log tables"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine, tables=[PaymentRecord.__table__, AccessLog.__table__, access_logs_archive])
+    session = sessionmaker(bind=engine)()
+    session.bulk_insert_mappings(PaymentRecord, [
+        {
+            'payment_no': f'pay-{i}',
+            'customer_id': i % 2 + 1,
+            'payment_amount': Decimal('100.25') * (i + 1),
+            'payment_method': 'bank_transfer',
+            'payment_date': datetime(2026, 3, i + 1, 9, 30)
+        }
+        for i in range(4)
+    ])
+    session.bulk_insert_mappings(AccessLog, [
+        {'user_id': 1, 'action': action, 'resource_type': 'customer', 'created_at': datetime(2026, 3, 1)}
+        for action in ('view', 'export', 'view')
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+class TestExportDatasets:
+    """Tests for settlements, payments and audit log exports"""
+
+    def test_registered_datasets(self):
+        """Test the analytics datasets are registered"""
+        assert {'customers', 'settlements', 'payments', 'audit_logs'} <= set(EXPORT_DATASETS)
+        with pytest.raises(ExportError):
+            get_export_dataset('passwords')
+
+    def test_arrow_type_specs_follow_column_types(self):
+        """Test amounts map to decimal128 with column precision and timestamps stay typed"""
+        settlements = get_export_dataset('settlements')
+        specs = dict(zip(
+            ['unit_price', 'total_amount', 'period_start', 'config_id', 'currency'],
+            map(arrow_type_spec, settlements.column_types(
+                ['unit_price', 'total_amount', 'period_start', 'config_id', 'currency']
+            ))
+        ))
+
+        assert specs == {
+            'unit_price': ('decimal128', 12, 4),
+            'total_amount': ('decimal128', 12, 2),
+            'period_start': ('timestamp',),
+            'config_id': ('int64',),
+            'currency': ('string',)
+        }
+
+    def test_payments_with_date_range(self, ledger_session, tmp_path):
+        """Test equality and date range filters on a dataset export"""
+        filters = {'customer_id': 1, 'date_from': '2026-03-02', 'date_to': '2026-03-31'}
+
+        export = export_dataset_to_file(
+            ledger_session, 'payments', 'jsonl', filters=filters,
+            fields=['payment_no', 'payment_amount'], export_dir=str(tmp_path)
+        )
+
+        with open(export['file_path'], encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        assert lines == [{'payment_no': 'pay-2', 'payment_amount': '300.75'}]
+        assert export['file_name'].startswith('payments_')
+        assert count_rows(ledger_session, 'payments', filters) == 1
+
+    def test_invalid_date_filter(self, ledger_session, tmp_path):
+        """Test malformed date filters are rejected"""
+        with pytest.raises(ExportError):
+            export_dataset_to_file(
+                ledger_session, 'audit_logs', 'csv', filters={'date_from': 'yesterday'}, export_dir=str(tmp_path)
+            )
+
+    @pytest.mark.skipif(not HAS_PYARROW, reason='pyarrow not installed')
+    def test_parquet_typed_schema_and_compression(self, ledger_session, tmp_path):
+        """Test Parquet exports carry decimal and timestamp types"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        export = export_dataset_to_file(
+            ledger_session, 'payments', 'parquet', export_dir=str(tmp_path),
+            writer_options={'compression': 'zstd'}
+        )
+
+        parquet_file = pq.ParquetFile(export['file_path'])
+        schema = parquet_file.schema_arrow
+        assert schema.field('payment_amount').type == pa.decimal128(12, 2)
+        assert schema.field('payment_date').type == pa.timestamp('us', tz='UTC')
+        assert parquet_file.metadata.row_group(0).column(0).compression == 'ZSTD'
+        assert parquet_file.read().column('payment_amount')[0].as_py() == Decimal('100.25')
+
+    @pytest.mark.skipif(not HAS_PYARROW, reason='pyarrow not installed')
+    def test_arrow_ipc(self, ledger_session, tmp_path):
+        """Test Arrow IPC export"""
+        import pyarrow as pa
+
+        export = export_dataset_to_file(
+            ledger_session, 'audit_logs', 'arrow', export_dir=str(tmp_path), batch_size=2,
+            writer_options={'compression': 'lz4'}
+        )
+
+        with pa.ipc.open_file(export['file_path']) as reader:
+            assert reader.num_record_batches == 2
+            assert reader.read_all().num_rows == 3
+
+    @pytest.mark.parametrize('export_format, label', [('parquet', 'Parquet'), ('arrow', 'Arrow')])
+    def test_typed_formats_require_pyarrow(self, ledger_session, tmp_path, export_format, label):
+        """Test typed exports fail with an ExportError and leave no file without pyarrow"""
+        with patch('backend.services.streaming_export.HAS_PYARROW', False):
+            with pytest.raises(ExportError, match=f'pyarrow is required for {label} export'):
+                export_dataset_to_file(ledger_session, 'payments', export_format, export_dir=str(tmp_path))
+
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestStreamingExport:
+    """Tests for the streaming engine"""
+
+    def test_filters_and_field_selection(self, sqlite_session):
+        """Test filters apply and unknown fields are dropped"""
+        _add_customers(sqlite_session, 5)
+
+        statement, columns = customer_export_statement({'status': 'active'}, ['company_name', 'password'])
+
+        assert columns == ['company_name']
+        assert [row[0] for row in sqlite_session.execute(statement)] == ['Company 0', 'Company 2', 'Company 4']
+        assert count_customers(sqlite_session, {'status': 'active'}) == 3
+        with pytest.raises(ExportError):
+            customer_export_statement(fields=['password'])
+
+    def test_progress_reported_per_batch(self, sqlite_session, tmp_path):
+        """Test progress is reported after every batch of rows"""
+        _add_customers(sqlite_session, 25)
+        progress = []
+
+        export_customers_to_file(
+            sqlite_session, 'csv', export_dir=str(tmp_path), batch_size=10, progress_callback=progress.append
+        )
+
+        assert progress == [10, 20, 25]
+
+    def test_failed_export_removes_partial_file(self, sqlite_session, tmp_path):
+        """Test a failing export leaves no partial file behind"""
+        _add_customers(sqlite_session, 5)
+
+        def fail(written):
+            raise RuntimeError('disk full')
+
+        with pytest.raises(RuntimeError):
+            export_customers_to_file(
+                sqlite_session, 'csv', export_dir=str(tmp_path), batch_size=2, progress_callback=fail
+            )
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.slow
+    def test_peak_memory_independent_of_row_count(self, sqlite_session, tmp_path):
+        """Test peak memory stays flat as the customer count grows"""
+        def peak_for(count):
+            sqlite_session.query(Customer).delete()
+            sqlite_session.commit()
+            _add_customers(sqlite_session, count, remarks='x' * 200)
+            tracemalloc.start()
+            export_customers_to_file(sqlite_session, 'csv', export_dir=str(tmp_path), batch_size=500)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        small = peak_for(2000)
+        large = peak_for(20000)
+
+        assert large < small * 2
+
+
+class TestExportCustomersTask:
+    """Tests for the Celery export task"""
+
+    def test_task_streams_export_with_progress(self, sqlite_session, tmp_path):
+        """Test the task exports through the streaming engine"""
+        from backend.tasks import export_customers_task
+        _add_customers(sqlite_session, 5)
+        factory = Mock()
+        factory.return_value.get_session.return_value = sqlite_session
+
+        with patch('backend.tasks.DatabaseSessionFactory', factory), \
+                patch('backend.tasks.report_progress') as report, \
+                patch('backend.services.streaming_export.EXPORT_DIR', str(tmp_path)):
+            result = export_customers_task.apply(
+                kwargs={'filters': {'status': 'active'}, 'export_format': 'jsonl', 'batch_size': 2}
+            ).get()
+
+        assert result['total'] == 3
+        assert result['file_name'].endswith('.jsonl')
+        assert result['file_url'] is None
+        metas = [call.args[2] for call in report.call_args_list if call.args[1] == 'PROGRESS']
+        assert [meta['current'] for meta in metas] == [0, 2, 3]
+        assert metas[-1]['total'] == 3
+
+    def test_dataset_task(self, ledger_session, tmp_path):
+        """Test the generic dataset export task"""
+        from backend.tasks import export_dataset_task
+        factory = Mock()
+        factory.return_value.get_session.return_value = ledger_session
+
+        with patch('backend.tasks.DatabaseSessionFactory', factory), \
+                patch('backend.tasks.report_progress'), \
+                patch('backend.services.streaming_export.EXPORT_DIR', str(tmp_path)):
+            result = export_dataset_task.apply(
+                kwargs={'dataset': 'audit_logs', 'filters': {'action': 'view'}, 'export_format': 'csv'}
+            ).get()
+
+        assert result['dataset'] == 'audit_logs'
+        assert result['total'] == 2
+
+    def test_dataset_task_completes_its_batch_task(self, ledger_session, tmp_path):
+        """Test an async export drives its batch task to completed with a download URL"""
+        from backend.tasks import export_dataset_task
+        factory = Mock()
+        factory.return_value.get_session.return_value = ledger_session
+        task = batch_service.create_task('export', 1)
+
+        with patch('backend.tasks.DatabaseSessionFactory', factory), \
+                patch.object(export_dataset_task, 'update_state'), \
+                patch('backend.services.streaming_export.EXPORT_DIR', str(tmp_path)):
+            result = export_dataset_task.apply(
+                kwargs={'dataset': 'payments', 'export_format': 'csv', 'batch_size': 2, 'batch_task_id': task.id}
+            ).get()
+
+        finished = batch_service.get_task(task.id)
+        assert finished.status == 'completed'
+        assert (finished.processed_records, finished.progress) == (result['total'], 100)
+        assert finished.result_url == result['file_url'] == f"/batch-tasks/{task.id}/download/{result['file_name']}"
+        assert (tmp_path / result['file_name']).exists()
+
+    def test_dataset_task_fails_its_batch_task(self, ledger_session, tmp_path):
+        """Test a failed export marks its batch task failed"""
+        from backend.tasks import export_dataset_task
+        factory = Mock()
+        factory.return_value.get_session.return_value = ledger_session
+        task = batch_service.create_task('export', 1)
+
+        with patch('backend.tasks.DatabaseSessionFactory', factory), \
+                patch.object(export_dataset_task, 'update_state'), \
+                patch('backend.services.streaming_export.EXPORT_DIR', str(tmp_path)):
+            outcome = export_dataset_task.apply(
+                kwargs={'dataset': 'payments', 'export_format': 'pdf', 'batch_task_id': task.id}
+            )
+
+        assert outcome.failed()
+        failed = batch_service.get_task(task.id)
+        assert failed.status == 'failed'
+        assert 'Unsupported export format' in failed.error_message
+
+
+class TestExportDownload:
+    """Tests for downloading and expiring the files of async exports"""
+
+    def _download(self, task_id, file_name, user_id):
+        from backend.api.batch_tasks import download_batch_task_result
+        token = create_access_token({'user_id': user_id, 'username': 'ops', 'role': 'operator'})
+        req = Mock(headers={'Authorization': f'Bearer {token}'}, ip='10.0.0.1')
+        return asyncio.run(download_batch_task_result(req, task_id, file_name))
+
+    def test_only_the_owner_downloads_the_result_file(self, tmp_path):
+        """Test the result file is served to the task owner and no other file is"""
+        (tmp_path / 'payments_1.csv').write_text('id\n1\n')
+        (tmp_path / 'payments_2.csv').write_text('id\n2\n')
+        task = batch_service.create_task('export', 1)
+        task.start()
+
+        with patch('backend.services.streaming_export.EXPORT_DIR', str(tmp_path)):
+            with pytest.raises(NotFound):
+                self._download(task.id, 'payments_1.csv', 1)
+            task.complete(result_url=f'/batch-tasks/{task.id}/download/payments_1.csv')
+
+            response = self._download(task.id, 'payments_1.csv', 1)
+            with pytest.raises(Forbidden):
+                self._download(task.id, 'payments_1.csv', 2)
+            with pytest.raises(NotFound):
+                self._download(task.id, 'payments_2.csv', 1)
+
+        assert response.status == 200
+        assert response.content_type == 'text/csv'
+        assert 'payments_1.csv' in response.headers['Content-Disposition']
+
+    def test_lookup_and_purge(self, tmp_path):
+        """Test only plain names in the export directory resolve and old files are purged"""
+        (tmp_path / 'old.jsonl').write_text('{}')
+        (tmp_path / 'new.csv').write_text('id')
+        stale = time.time() - 3600
+        os.utime(tmp_path / 'old.jsonl', (stale, stale))
+
+        assert get_export_file('old.jsonl', str(tmp_path)) == (str(tmp_path / 'old.jsonl'), 'application/x-ndjson')
+        assert get_export_file('../old.jsonl', str(tmp_path)) is None
+        assert get_export_file('missing.csv', str(tmp_path)) is None
+        assert purge_export_files(60, str(tmp_path)) == 1
+        assert [entry.name for entry in tmp_path.iterdir()] == ['new.csv']
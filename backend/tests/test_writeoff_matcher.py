@@ -0,0 +1,193 @@
+"""
+Tests for Write-off Matcher - Story 3.4
+Tests for exact, merged and oldest-first matching and the parallel write-off run
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models.archive_models import settlement_writeoffs_archive
+from backend.models.auth import User
+from backend.models.database_models import Base, Customer, SettlementRecord
+from backend.models.payment_models import PaymentRecord, SettlementWriteoff
+from backend.services.writeoff_matcher import WriteoffMatcher, find_subset, load_open_items, match_customer
+
+DAY = datetime(2026, 9, 1)
+
+
+def _items(*amounts):
+    """(id, cents, date) items, one day apart, ids from 1"""
+    return [(index + 1, cents, DAY + timedelta(days=index)) for index, cents in enumerate(amounts)]
+
+
+class TestMatchCustomer:
+    """Tests for the matching passes"""
+
+    def test_exact_amounts_match_oldest_settlement_first(self):
+        """Test equal amounts are matched by hash lookup"""
+        allocations = match_customer(_items(500, 300, 500), _items(500, 500))
+
+        assert allocations == [(1, 1, 500, 'full'), (2, 3, 500, 'full')]
+
+    def test_merged_payment_covers_several_settlements(self):
+        """Test one payment equal to a subset of settlements"""
+        allocations = match_customer(_items(100, 250, 400, 150), _items(500), allow_partial=False)
+
+        # The oldest combination wins over 100 + 400
+        assert sorted(allocations) == [(1, 1, 100, 'merged'), (1, 2, 250, 'merged'), (1, 4, 150, 'merged')]
+
+    def test_oldest_first_allocation_of_remainders(self):
+        """Test remaining amounts are allocated to the oldest settlements"""
+        allocations = match_customer(_items(300, 300, 300), _items(450, 200))
+
+        assert allocations == [
+            (1, 1, 300, 'full'),
+            (1, 2, 150, 'partial'),
+            (2, 2, 150, 'partial'),
+            (2, 3, 50, 'partial')
+        ]
+
+    def test_no_partial_allocation_when_disabled(self):
+        """Test unmatched amounts stay open without allocation"""
+        assert match_customer(_items(300), _items(100), allow_partial=False) == []
+
+
+class TestFindSubset:
+    """Tests for the bounded subset-sum search"""
+
+    def test_finds_exact_subset(self):
+        """Test a subset summing to the target is found"""
+        assert find_subset([(1, 30), (2, 70), (3, 20), (4, 50)], 100) == [1, 2]
+
+    def test_respects_size_and_node_bounds(self):
+        """Test the search gives up at its bounds"""
+        candidates = [(index, 1) for index in range(30)]
+
+        assert find_subset(candidates, 5, max_size=4) is None
+        assert find_subset(candidates, 5, max_size=5) == [0, 1, 2, 3, 4]
+        assert find_subset([(index, 2) for index in range(40)], 41, max_nodes=1000) is None
+
+
+@pytest.fixture
+def session_factory():
+    """Session factory on a shared in-memory SQLite database"""
+    engine = create_engine(
+        'sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(
+        engine, tables=[
+            User.__table__, Customer.__table__, SettlementRecord.__table__,
+            PaymentRecord.__table__, SettlementWriteoff.__table__, settlement_writeoffs_archive
+        ]
+    )
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _seed(session, customer_index, settlement_amounts, payment_amounts, status='pending'):
+    customer = Customer(
+        customer_id=f'cust-{customer_index}', company_name=f'Company {customer_index}',
+        contact_name='Contact', contact_phone='13800138000'
+    )
+    session.add(customer)
+    session.flush()
+    for index, amount in enumerate(settlement_amounts):
+        session.add(SettlementRecord(
+            record_id=f'SET-{customer_index}-{index}', customer_id=customer.id, config_id=1,
+            period_start=DAY, period_end=DAY, usage_quantity=Decimal('1'), unit='GB', price_model='fixed',
+            unit_price=Decimal(amount), total_amount=Decimal(amount), status=status,
+            created_at=DAY + timedelta(days=index)
+        ))
+    for index, amount in enumerate(payment_amounts):
+        session.add(PaymentRecord(
+            payment_no=f'PAY-{customer_index}-{index}', customer_id=customer.id,
+            payment_amount=Decimal(amount), payment_method='bank_transfer',
+            payment_date=DAY + timedelta(days=index)
+        ))
+    session.commit()
+    return customer.id
+
+
+class TestWriteoffMatcher:
+    """Tests for the write-off run"""
+
+    def test_run_writes_offs_and_reports_match_rate(self, session_factory):
+        """Test write-offs are inserted, paid settlements closed and rates reported"""
+        session = session_factory()
+        _seed(session, 1, ['100.00', '250.50'], ['250.50'])
+        _seed(session, 2, ['10.00', '20.00'], ['30.00'])
+        _seed(session, 3, ['99.00'], [])
+        session.close()
+
+        result = WriteoffMatcher(session_factory, max_workers=2).run()
+
+        assert result['customers'] == 2
+        assert result['open_settlements'] == 4
+        assert result['paid_settlements'] == 3
+        assert result['match_rate'] == 0.75
+        assert result['by_type'] == {'full': 1, 'merged': 2, 'partial': 0}
+        assert result['matched_amount'] == 280.5
+
+        session = session_factory()
+        statuses = dict(session.execute(select(SettlementRecord.record_id, SettlementRecord.status)).all())
+        assert statuses == {'SET-1-0': 'pending', 'SET-1-1': 'paid', 'SET-2-0': 'paid', 'SET-2-1': 'paid', 'SET-3-0': 'pending'}
+        amount = session.execute(
+            select(SettlementWriteoff.writeoff_amount)
+            .join(SettlementRecord, SettlementRecord.id == SettlementWriteoff.settlement_id)
+            .where(SettlementRecord.record_id == 'SET-1-1')
+        ).scalar_one()
+        assert amount == Decimal('250.50')
+        session.close()
+
+    def test_rerun_only_allocates_new_money(self, session_factory):
+        """Test existing write-offs are netted out on the next run"""
+        session = session_factory()
+        customer_id = _seed(session, 1, ['300.00'], ['100.00'])
+        session.close()
+        matcher = WriteoffMatcher(session_factory, max_workers=1)
+
+        first = matcher.run()
+        unchanged = matcher.run()
+        session = session_factory()
+        session.add(PaymentRecord(
+            payment_no='PAY-late', customer_id=customer_id, payment_amount=Decimal('200.00'),
+            payment_method='bank_transfer', payment_date=DAY + timedelta(days=5)
+        ))
+        session.commit()
+        session.close()
+        last = matcher.run()
+
+        assert first['writeoffs'] == 1 and first['paid_settlements'] == 0
+        assert unchanged['writeoffs'] == 0
+        assert last['paid_settlements'] == 1
+        session = session_factory()
+        assert session.execute(select(SettlementRecord.status)).scalar_one() == 'paid'
+        session.close()
+
+    def test_items_are_locked_and_aggregated_per_customer(self, session_factory):
+        """Test a customer's items are locked before reading and write-offs are summed for them only"""
+        session = session_factory()
+        customer_id = _seed(session, 1, ['300.00'], ['100.00'])
+        _seed(session, 2, ['50.00'], ['50.00'])
+        statements = []
+        execute = session.execute
+
+        def recording_execute(statement, *args, **kwargs):
+            statements.append(str(statement.compile(dialect=mysql.dialect())))
+            return execute(statement, *args, **kwargs)
+
+        session.execute = recording_execute
+        settlements, payments = load_open_items(session, customer_id)
+
+        assert [item[1] for item in settlements] == [30000] and [item[1] for item in payments] == [10000]
+        assert statements[0].startswith('SELECT payment_records.id') and statements[0].endswith('FOR UPDATE')
+        assert statements[1].startswith('SELECT settlement_records.id') and statements[1].endswith('FOR UPDATE')
+        assert 'WHERE settlement_writeoffs.settlement_id IN' in statements[2]
+        assert 'WHERE settlement_writeoffs.payment_id IN' in statements[3]
+        session.close()